@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Benchmark: every analysis cycle against a synthetic large node.
+
+Generates a SyntheticNode (see synthetic_node.py), writes its forward,
+fee-change and fee-controller histories into a fresh database, wires the
+modules the way init() does (standalone, no hive) behind an in-process fake
+RPC, then times each cycle:
+
+- flow:          FlowAnalyzer.analyze_all_channels()
+- fee:           adjust_all_fees()
+- rebalance:     find_rebalance_candidates()
+- profitability: ChannelProfitabilityAnalyzer.analyze_all_channels()
+- portfolio:     OnlinePortfolioStats seed + PortfolioOptimizer.analyze_portfolio()
+
+For each cycle the first (cold) run and the median of --repeat further
+(warm) runs are reported, with SQL statement count, RPC calls by method and
+the process peak RSS after the cycle. time.sleep() is counted rather than
+slept (set_channel_fee waits before verifying each change); the requested
+total is reported as sleep_ms.
+
+Results go to a JSON baseline; --compare prints ratios against an older one
+and exits 1 when a warm time regresses by more than --fail-over.
+
+Usage:
+    python benchmarks/bench_cycles.py [--preset small|medium|large|xlarge]
+        [--channels N] [--forwards N] [--repeat 3] [--output FILE]
+        [--compare OLD.json] [--cache-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The plugin framework is not needed to exercise the cycles
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.channel_state_model import ChannelStateModel  # noqa: E402
+from modules.clboss_manager import ClbossManager  # noqa: E402
+from modules.config import Config  # noqa: E402
+from modules.database import Database  # noqa: E402
+from modules.fee_controller import PIDFeeController  # noqa: E402
+from modules.flow_analysis import FlowAnalyzer  # noqa: E402
+from modules.policy_manager import PolicyManager  # noqa: E402
+from modules.portfolio_optimizer import (  # noqa: E402
+    OnlinePortfolioStats, PORTFOLIO_WINDOW_DAYS, PortfolioOptimizer,
+)
+from modules.profitability_analyzer import ChannelProfitabilityAnalyzer  # noqa: E402
+from modules.rebalancer import EVRebalancer  # noqa: E402
+from synthetic_node import PRESETS, FakePlugin, FakeRpc, SyntheticNode  # noqa: E402
+
+CYCLES = ("flow", "fee", "rebalance", "profitability", "portfolio")
+
+
+class SleepCounter:
+    """Replaces time.sleep while a cycle runs; accumulates requested seconds."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self._real = time.sleep
+
+    def __call__(self, seconds):
+        self.seconds += max(0.0, seconds)
+
+    def __enter__(self):
+        time.sleep = self
+        return self
+
+    def __exit__(self, *exc):
+        time.sleep = self._real
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def build_database(node: SyntheticNode, path: str, cache_dir: str = None) -> dict:
+    """Populate path with the node's histories, reusing a cached copy when present."""
+    cached = None
+    if cache_dir:
+        desc = node.describe()
+        key = "node-{channels}c-{forwards}f-{fee_history}h-{history_days}d-s{seed}.db".format(**desc)
+        cached = os.path.join(cache_dir, key)
+        if os.path.exists(cached):
+            shutil.copyfile(cached, path)
+            return {"cached": True, "seconds": 0.0}
+
+    start = time.perf_counter()
+    database = Database(path, MagicMock())
+    database.initialize()
+
+    def progress(n):
+        print(f"  ... {n:,} forwards", file=sys.stderr)
+
+    counts = node.populate(database, progress if node.n_forwards >= 1_000_000 else None)
+    database._get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    database.close_all_connections()
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        shutil.copyfile(path, cached)
+    return {"cached": False, "seconds": round(time.perf_counter() - start, 2), **counts}
+
+
+class Harness:
+    """Modules wired as in init(), standalone, against FakeRpc."""
+
+    def __init__(self, node: SyntheticNode, db_path: str):
+        self.node = node
+        self.rpc = FakeRpc(node)
+        self.plugin = FakePlugin(self.rpc)
+        self.config = Config()
+        self.config.db_path = db_path
+        self.config.hive_enabled = 'false'
+
+        self.database = Database(db_path, self.plugin)
+        self.database.initialize()
+        self.clboss_manager = ClbossManager(self.plugin, self.config)
+        self.policy_manager = PolicyManager(self.database, self.plugin)
+        self.profitability = ChannelProfitabilityAnalyzer(self.plugin, self.config, self.database)
+        self.flow = FlowAnalyzer(self.plugin, self.config, self.database)
+        self.fees = PIDFeeController(self.plugin, self.config, self.database, self.clboss_manager,
+                                     self.policy_manager, self.profitability, None)
+        self.rebalancer = EVRebalancer(self.plugin, self.config, self.database,
+                                       self.clboss_manager, self.policy_manager, hive_bridge=None)
+        self.rebalancer.set_profitability_analyzer(self.profitability)
+        self.channel_state = ChannelStateModel(self.plugin)
+        for module in (self.flow, self.fees, self.rebalancer, self.profitability):
+            module.set_channel_state(self.channel_state)
+        self.channel_state.reconcile()
+
+    def run_portfolio(self):
+        stats = OnlinePortfolioStats()
+        stats.seed(self.database.get_forwards_since(
+            int(time.time()) - PORTFOLIO_WINDOW_DAYS * 86400))
+        optimizer = PortfolioOptimizer(database=self.database, plugin=self.plugin,
+                                       hive_bridge=None, online_stats=stats)
+        channels = self.plugin.rpc.listpeerchannels().get("channels", [])
+        return optimizer.analyze_portfolio(channels=channels, forwards=None, flow_states={})
+
+    def cycle(self, name: str):
+        return {
+            "flow": self.flow.analyze_all_channels,
+            "fee": self.fees.adjust_all_fees,
+            "rebalance": self.rebalancer.find_rebalance_candidates,
+            "profitability": self.profitability.analyze_all_channels,
+            "portfolio": self.run_portfolio,
+        }[name]
+
+    def measure(self, name: str) -> dict:
+        queries = Counter()
+        conn = self.database._get_connection()
+        conn.set_trace_callback(lambda sql: queries.update(("sql",)))
+        before = Counter(self.rpc.counts)
+        try:
+            with SleepCounter() as slept:
+                start = time.perf_counter()
+                self.cycle(name)()
+                elapsed = time.perf_counter() - start
+        finally:
+            conn.set_trace_callback(None)
+        rpc = self.rpc.counts - before
+        return {
+            "ms": round(elapsed * 1000, 1),
+            "queries": queries["sql"],
+            "rpc_calls": sum(rpc.values()),
+            "rpc": dict(sorted(rpc.items())),
+            "sleep_ms": round(slept.seconds * 1000, 1),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+def run(args) -> dict:
+    node = SyntheticNode.from_preset(
+        args.preset, channels=args.channels, peers=args.peers, forwards=args.forwards,
+        fee_history=args.fee_history, seed=args.seed,
+    )
+    print(f"Synthetic node: {node.describe()}", file=sys.stderr)
+
+    workdir = tempfile.mkdtemp(prefix="bench-cycles-")
+    try:
+        db_path = os.path.join(workdir, "revenue_ops.db")
+        populate = build_database(node, db_path, args.cache_dir)
+        print(f"Database ready ({populate})", file=sys.stderr)
+
+        harness = Harness(node, db_path)
+        results = {}
+        for name in args.cycles:
+            cold = harness.measure(name)
+            warm = [harness.measure(name) for _ in range(args.repeat)]
+            last = warm[-1] if warm else cold
+            results[name] = {
+                "cold_ms": cold["ms"],
+                "warm_ms": round(statistics.median(w["ms"] for w in warm), 1) if warm else None,
+                "queries": cold["queries"],
+                "warm_queries": last["queries"],
+                "rpc_calls": cold["rpc_calls"],
+                "rpc": cold["rpc"],
+                "sleep_ms": cold["sleep_ms"],
+                "peak_rss_mb": last["peak_rss_mb"],
+            }
+            print(f"{name:<14} cold {cold['ms']:>10.1f} ms   warm {results[name]['warm_ms']} ms   "
+                  f"{cold['queries']} queries   {cold['rpc_calls']} rpc   "
+                  f"rss {last['peak_rss_mb']} MB", file=sys.stderr)
+        harness.database.close_all_connections()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "node": node.describe(),
+            "populate": populate,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(old: dict, new: dict, fail_over: float) -> int:
+    """Print new/old ratios per cycle; return the number of warm-time regressions."""
+    if old["meta"].get("node") != new["meta"].get("node"):
+        print("warning: baselines were taken on different synthetic nodes")
+    regressions = 0
+    print(f"{'cycle':<14} {'warm ms':>22} {'ratio':>7} {'queries':>16} {'rpc':>12}")
+    for name, cur in new["results"].items():
+        prev = old["results"].get(name)
+        if not prev:
+            continue
+        base = prev.get("warm_ms") or prev["cold_ms"]
+        now = cur.get("warm_ms") or cur["cold_ms"]
+        ratio = now / base if base else float("inf")
+        flag = ""
+        if ratio > 1 + fail_over:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{name:<14} {base:>10.1f} -> {now:>9.1f} {ratio:>6.2f}x "
+              f"{prev['queries']:>7} -> {cur['queries']:<6} "
+              f"{prev['rpc_calls']:>4} -> {cur['rpc_calls']:<4}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--channels", type=int, help="override the preset channel count")
+    parser.add_argument("--peers", type=int, help="default: 80%% of channels")
+    parser.add_argument("--forwards", type=int, help="override the preset forward count")
+    parser.add_argument("--fee-history", type=int, help="fee changes per channel")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="warm runs per cycle")
+    parser.add_argument("--cycles", nargs="+", choices=CYCLES, default=list(CYCLES))
+    parser.add_argument("--output", help="baseline JSON to write (default: stdout)")
+    parser.add_argument("--compare", help="older baseline JSON to compare against")
+    parser.add_argument("--fail-over", type=float, default=0.25,
+                        help="warm-time regression ratio that fails --compare (default: 0.25)")
+    parser.add_argument("--cache-dir", help="keep populated databases here between runs")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        if compare(old, report, args.fail_over):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
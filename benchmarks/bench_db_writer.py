@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-thread read-write connections vs the single writer thread.
+
+Runs the same mixed workload twice on a fresh database:
+
+- "per_thread": every thread opens its own read-write connection (the
+  layout before modules/db_writer.py), so writers compete for the SQLite
+  write lock through busy_timeout
+- "writer": Database as shipped, reads on per-thread query_only
+  connections and writes through the DatabaseWriter
+
+The workload is --writers threads recording forwards (the forward event
+path) and fee changes, plus --readers threads running the flow-analysis
+window scan, for --seconds. Reported per mode: write throughput, write
+latency percentiles, "database is locked" errors, read latency, and the
+latency of one thread writing alone (the handoff cost of the writer).
+
+Usage:
+    python benchmarks/bench_db_writer.py [--writers 6] [--readers 2]
+        [--seconds 5] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The plugin framework is not needed to exercise the database
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.database import Database  # noqa: E402
+
+
+class PerThreadDatabase(Database):
+    """Database with the previous connection layout: one read-write connection per thread."""
+
+    def _get_connection(self):
+        if getattr(self._local, "conn", None) is None:
+            self._local.conn = self._open_writer_connection()
+        return self._local.conn
+
+
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summary_ms(samples):
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def seed_forwards(database, channels, count, rng):
+    now = int(time.time())
+    conn = database._get_connection()
+    conn.executemany("""
+        INSERT OR IGNORE INTO forwards
+        (in_channel, out_channel, in_msat, out_msat, fee_msat, timestamp, resolved_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, [
+        (rng.choice(channels), rng.choice(channels), 1_001_000, 1_000_000, 1000,
+         now - rng.randrange(7 * 86400), now)
+        for _ in range(count)
+    ])
+
+
+def run_mode(cls, workdir, mode, args):
+    path = os.path.join(workdir, mode, "revenue_ops.db")
+    database = cls(path, MagicMock())
+    database.initialize()
+    rng = random.Random(args.seed)
+    channels = [f"{800000 + i}x{i}x0" for i in range(args.channels)]
+    seed_forwards(database, channels, args.seed_forwards, rng)
+
+    # One thread writing alone: the cost of handing a write to the writer
+    solo = []
+    for i in range(args.solo_writes):
+        now = int(time.time())
+        start = time.perf_counter()
+        database.record_forward(channels[0], channels[1], 1_001_000 + i, 1_000_000, 1000,
+                                now, now + 1)
+        solo.append(time.perf_counter() - start)
+
+    stop = threading.Event()
+    write_lat, read_lat = [], []
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+
+    def writer(index):
+        local_rng = random.Random(args.seed + index)
+        lat, n = [], 0
+        while not stop.is_set():
+            n += 1
+            now = int(time.time())
+            start = time.perf_counter()
+            try:
+                if n % 10 == 0:
+                    database.record_fee_change(local_rng.choice(channels), "02" + "ab" * 32,
+                                               100, 110, "bench")
+                else:
+                    database.record_forward(local_rng.choice(channels), local_rng.choice(channels),
+                                            1_001_000 + n, 1_000_000, 1000 + index, now, now + 1)
+            except sqlite3.OperationalError as e:
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+                continue
+            lat.append(time.perf_counter() - start)
+        with lock:
+            write_lat.extend(lat)
+
+    def reader():
+        lat = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                database.get_daily_flow_buckets(7)
+            except sqlite3.OperationalError:
+                with lock:
+                    errors["other"] += 1
+                continue
+            lat.append(time.perf_counter() - start)
+        with lock:
+            read_lat.extend(lat)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "solo_write": summary_ms(solo),
+        "writes": summary_ms(write_lat),
+        "writes_per_second": round(len(write_lat) / elapsed, 1),
+        "reads": summary_ms(read_lat),
+        "errors": errors,
+    }
+    if cls is Database:
+        result["writer"] = database.writer.get_status()
+    database.close_all_connections()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=6)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--channels", type=int, default=200)
+    parser.add_argument("--seed-forwards", type=int, default=50_000)
+    parser.add_argument("--solo-writes", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON results to write (default: stdout)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench-writer-")
+    try:
+        results = {
+            "per_thread": run_mode(PerThreadDatabase, workdir, "per_thread", args),
+            "writer": run_mode(Database, workdir, "writer", args),
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for mode, r in results.items():
+        print(f"{mode:<11} {r['writes_per_second']:>8.0f} writes/s  "
+              f"write p50 {r['writes']['p50_ms']:.2f} p99 {r['writes']['p99_ms']:.2f} "
+              f"max {r['writes']['max_ms']:.1f} ms  "
+              f"read p50 {r['reads']['p50_ms']:.2f} ms  "
+              f"solo write p50 {r['solo_write']['p50_ms']:.3f} ms  "
+              f"locked {r['errors']['locked']}", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "writers": args.writers,
+            "readers": args.readers,
+            "seconds": args.seconds,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
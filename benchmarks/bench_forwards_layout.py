@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark: legacy vs compact forwards storage.
+
+Builds a database with the legacy forwards table (TEXT SCIDs, rowid table
+plus its indexes), fills it with a SyntheticNode's forwards, then runs
+Database.migrate_forwards_compact() on it. Before and after (each followed
+by VACUUM) it reports
+
+- bytes per table/index for the forwards storage (dbstat)
+- the median time of the hot forwards queries: per-channel volume and
+  count since a fee change, per-channel in/out sums, the flow-analysis
+  window scan and the all-time totals
+
+Usage:
+    python benchmarks/bench_forwards_layout.py [--channels 1000]
+        [--forwards 1000000] [--repeat 5] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The plugin framework is not needed to exercise the database
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.database import Database  # noqa: E402
+from synthetic_node import SyntheticNode  # noqa: E402
+
+LEGACY_FORWARDS_SQL = """
+    CREATE TABLE forwards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        in_channel TEXT NOT NULL,
+        out_channel TEXT NOT NULL,
+        in_msat INTEGER NOT NULL,
+        out_msat INTEGER NOT NULL,
+        fee_msat INTEGER NOT NULL,
+        resolution_time REAL DEFAULT 0,
+        timestamp INTEGER NOT NULL,
+        resolved_time INTEGER DEFAULT 0
+    )
+"""
+
+
+def storage_bytes(database: Database) -> dict:
+    conn = database._get_connection()
+    rows = conn.execute("""
+        SELECT m.name AS name, SUM(s.pgsize) AS bytes
+        FROM dbstat s JOIN sqlite_master m ON s.name = m.name
+        WHERE m.tbl_name IN ('forwards', 'forwards_compact')
+        GROUP BY m.name ORDER BY m.name
+    """).fetchall()
+    sizes = {row["name"]: row["bytes"] for row in rows}
+    sizes["total"] = sum(sizes.values())
+    return sizes
+
+
+def time_queries(database: Database, node: SyntheticNode, repeat: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    busy = sorted(range(len(node.channels)), key=lambda i: -node.popularity[i])
+    scids = [node.channels[i]["short_channel_id"] for i in busy[:20]]
+    since = node.now - 3 * 86400
+    queries = {
+        "volume_since": lambda: [database.get_volume_since(s, since) for s in scids],
+        "forward_count_since": lambda: [database.get_forward_count_since(s, since) for s in scids],
+        "channel_forwards": lambda: [database.get_channel_forwards(s, since) for s in scids],
+        "weighted_volume": lambda: [database.get_weighted_volume_since(s, since) for s in scids],
+        "flow_buckets_7d": lambda: database.get_daily_flow_buckets(7),
+        "flow_buckets_channel": lambda: database.get_daily_flow_buckets(7, rng.choice(scids)),
+        "lifetime_stats": database.get_lifetime_stats,
+    }
+    results = {}
+    for name, fn in queries.items():
+        fn()  # warm the page cache
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = round(statistics.median(samples), 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--forwards", type=int, default=1_000_000)
+    parser.add_argument("--history-days", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON results to write (default: stdout)")
+    args = parser.parse_args()
+
+    node = SyntheticNode(channels=args.channels, forwards=args.forwards,
+                         history_days=args.history_days, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench-fwd-")
+    try:
+        path = os.path.join(workdir, "revenue_ops.db")
+        conn = Database(path, MagicMock())._get_connection()
+        conn.execute(LEGACY_FORWARDS_SQL)
+        conn.close()
+
+        database = Database(path, MagicMock())
+        database.initialize()
+        assert database.forwards_migration_pending
+        start = time.perf_counter()
+        node.populate(database)
+        populate_s = time.perf_counter() - start
+        database._get_connection().execute("VACUUM")
+        print(f"Legacy database populated in {populate_s:.1f}s", file=sys.stderr)
+
+        legacy = {"bytes": storage_bytes(database),
+                  "query_ms": time_queries(database, node, args.repeat, args.seed)}
+
+        migration = database.migrate_forwards_compact()
+        database._get_connection().execute("VACUUM")
+        compact = {"bytes": storage_bytes(database),
+                   "query_ms": time_queries(database, node, args.repeat, args.seed)}
+        database.close_all_connections()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ratio = {"bytes": round(compact["bytes"]["total"] / legacy["bytes"]["total"], 3)}
+    ratio.update({q: round(compact["query_ms"][q] / legacy["query_ms"][q], 3)
+                  for q in legacy["query_ms"] if legacy["query_ms"][q]})
+    print(f"storage {legacy['bytes']['total'] / 1e6:.1f} MB -> "
+          f"{compact['bytes']['total'] / 1e6:.1f} MB ({ratio['bytes']}x), "
+          f"migration {migration['seconds']}s", file=sys.stderr)
+    for q, ms in legacy["query_ms"].items():
+        print(f"  {q:<22} {ms:>9.2f} ms -> {compact['query_ms'][q]:>9.2f} ms", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "node": node.describe(),
+            "repeat": args.repeat,
+        },
+        "legacy": legacy,
+        "compact": compact,
+        "migration": migration,
+        "compact_vs_legacy": ratio,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
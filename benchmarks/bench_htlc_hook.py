@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-HTLC overhead of the htlc_accepted hook and HtlcTracker.
+
+Replays a synthetic HTLC stream (accept, then settle/fail via forward_event)
+over --channels channels with about --inflight HTLCs outstanding, and
+reports nanoseconds per HTLC for:
+
+- passthrough: the old hook body (build and return {"result": "continue"})
+- accept:      HtlcTracker.on_htlc_accepted + the shared reply
+- resolve:     HtlcTracker.on_forward_event for the same HTLC
+- json:        decoding a hook request and encoding the reply, roughly what
+               pyln-client does per hook call regardless of the body
+
+The tracker costs should stay a small fraction of the JSON round trip.
+
+Usage:
+    python benchmarks/bench_htlc_hook.py [--htlcs 200000] [--channels 1000]
+        [--inflight 500] [--repeat 5] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The plugin framework is not needed to exercise the tracker
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.htlc_tracker import HtlcTracker  # noqa: E402
+
+_HTLC_CONTINUE = {"result": "continue"}
+
+
+def build_stream(htlcs: int, channels: int, seed: int):
+    """(htlc, onion, forward_event) triples with realistic field shapes."""
+    rng = random.Random(seed)
+    scids = [f"{800000 + i}x{rng.randint(1, 3000)}x{rng.randint(0, 3)}" for i in range(channels)]
+    next_id = {scid: 0 for scid in scids}
+    stream = []
+    for _ in range(htlcs):
+        in_scid, out_scid = rng.sample(scids, 2)
+        htlc_id = next_id[in_scid]
+        next_id[in_scid] += 1
+        amount = rng.randint(1_000, 5_000_000_000)
+        payment_hash = "%064x" % rng.getrandbits(256)
+        htlc = {"short_channel_id": in_scid, "id": htlc_id, "amount_msat": amount,
+                "cltv_expiry": 850000, "cltv_expiry_relative": 80,
+                "payment_hash": payment_hash}
+        onion = {"payload": "ab" * 40, "type": "tlv", "short_channel_id": out_scid,
+                 "forward_msat": amount - 1000, "outgoing_cltv_value": 849960,
+                 "shared_secret": "cd" * 32, "next_onion": "ef" * 650}
+        event = {"payment_hash": payment_hash, "in_channel": in_scid, "in_htlc_id": htlc_id,
+                 "out_channel": out_scid, "in_msat": amount, "out_msat": amount - 1000,
+                 "fee_msat": 1000, "status": "settled" if rng.random() < 0.7 else "failed",
+                 "received_time": 1.0, "resolved_time": 2.0}
+        stream.append((htlc, onion, event))
+    return scids, stream
+
+
+def time_ns(fn) -> float:
+    start = time.perf_counter_ns()
+    fn()
+    return time.perf_counter_ns() - start
+
+
+def run_once(scids, stream, inflight: int) -> dict:
+    tracker = HtlcTracker(SimpleNamespace(htlc_congestion_threshold=0.8))
+    tracker.sync([{"short_channel_id": scid, "htlcs": []} for scid in scids])
+    n = len(stream)
+
+    def passthrough():
+        for _ in stream:
+            reply = {"result": "continue"}  # noqa: F841
+
+    def accept_and_resolve():
+        # Keep `inflight` HTLCs outstanding: resolve the one accepted that
+        # many steps earlier
+        accepted_ns = resolved_ns = 0
+        clock = time.perf_counter_ns
+        on_accept = tracker.on_htlc_accepted
+        on_resolve = tracker.on_forward_event
+        for i, (htlc, onion, _) in enumerate(stream):
+            t0 = clock()
+            on_accept(htlc, onion)
+            reply = _HTLC_CONTINUE  # noqa: F841
+            t1 = clock()
+            accepted_ns += t1 - t0
+            if i >= inflight:
+                event = stream[i - inflight][2]
+                t0 = clock()
+                on_resolve(event)
+                resolved_ns += clock() - t0
+        return accepted_ns, resolved_ns
+
+    def json_roundtrip():
+        for htlc, onion, _ in stream[:n // 10]:
+            request = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "htlc_accepted",
+                                  "params": {"onion": onion, "htlc": htlc}})
+            json.loads(request)
+            json.dumps({"jsonrpc": "2.0", "id": 1, "result": _HTLC_CONTINUE})
+
+    passthrough_ns = time_ns(passthrough)
+    accepted_ns, resolved_ns = accept_and_resolve()
+    json_ns = time_ns(json_roundtrip) * 10
+    return {
+        "passthrough_ns": passthrough_ns / n,
+        "accept_ns": accepted_ns / n,
+        "resolve_ns": resolved_ns / max(1, n - inflight),
+        "json_ns": json_ns / n,
+        "inflight_end": tracker.get_status()["inflight_htlcs"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--htlcs", type=int, default=200_000)
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--inflight", type=int, default=500,
+                        help="HTLCs outstanding while the stream is replayed")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON results to write (default: stdout)")
+    args = parser.parse_args()
+
+    scids, stream = build_stream(args.htlcs, args.channels, args.seed)
+    runs = [run_once(scids, stream, args.inflight) for _ in range(args.repeat)]
+    results = {key: round(statistics.median(r[key] for r in runs), 1)
+               for key in ("passthrough_ns", "accept_ns", "resolve_ns", "json_ns")}
+    results["tracker_vs_json"] = round(
+        (results["accept_ns"] + results["resolve_ns"]) / results["json_ns"], 3)
+    print(f"per HTLC: passthrough {results['passthrough_ns']} ns   "
+          f"accept {results['accept_ns']} ns   resolve {results['resolve_ns']} ns   "
+          f"json round trip {results['json_ns']} ns", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "htlcs": args.htlcs,
+            "channels": args.channels,
+            "inflight": args.inflight,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark: global rebalance planner vs the greedy per-destination path.
+
+Builds a synthetic node (default 1000 channels), then times candidate
+selection both ways and compares total expected profit:
+
+- greedy:  _analyze_rebalance_ev() per depleted channel in listing order
+           until the job slots are full (the pre-planner behaviour). Source
+           capacity is not tracked, so the same source may be the primary
+           for several destinations; "overcommitted" counts chunks beyond a
+           source's spendable balance.
+- planner: _plan_rebalance_candidates() (EV matrix + min-cost flow).
+
+Usage:
+    python benchmarks/bench_rebalance_planner.py [--channels 1000] [--slots 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The plugin framework is not needed to exercise the planner
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.config import Config  # noqa: E402
+from modules.rebalancer import EVRebalancer  # noqa: E402
+
+
+def build_node(n_channels: int, seed: int):
+    """Synthetic channel set: (depleted, sources, flow states, inbound fees)."""
+    rng = random.Random(seed)
+    depleted, sources = [], []
+    states, inbound = {}, {}
+    for i in range(n_channels):
+        scid = f"{700000 + i}x{rng.randint(1, 3000)}x{rng.randint(0, 3)}"
+        peer = f"02{i:064x}"
+        capacity = rng.choice([1, 2, 5, 10, 20]) * 1_000_000
+        daily = capacity * rng.lognormvariate(-2.0, 1.2)
+        states[scid] = {
+            "state": rng.choices(["balanced", "sink", "source"], [6, 2, 2])[0],
+            "sats_in": int(daily * 3.5),
+            "sats_out": int(daily * 3.5),
+        }
+        inbound[peer] = int(rng.lognormvariate(5.5, 0.8))
+        r = rng.random()
+        if r < 0.4:
+            ratio = rng.uniform(0.0, 0.19)
+            dest_list = depleted
+        elif r < 0.8:
+            ratio = rng.uniform(0.81, 1.0)
+            dest_list = sources
+        else:
+            continue
+        info = {
+            "peer_id": peer,
+            "capacity": capacity,
+            "spendable_sats": int(capacity * ratio),
+            "fee_ppm": int(rng.lognormvariate(6.0, 0.9)),
+        }
+        dest_list.append((scid, info, ratio))
+    return depleted, sources, states, inbound
+
+
+def make_rebalancer(states, inbound):
+    config = Config()
+    config.enable_velocity_gate = False
+    database = MagicMock()
+    database.get_channel_state.side_effect = lambda scid: states.get(scid)
+    database.get_peer_uptime_percent.return_value = 100.0
+    database.get_fee_strategy_state.return_value = {}
+    database.get_peer_reputation.return_value = {"score": 0.5}
+    database.get_failure_count.return_value = (0, 0)
+    database.get_last_rebalance_time.return_value = None
+    plugin = MagicMock()
+    plugin.rpc.getinfo.return_value = {"id": "02" + "0" * 64, "blockheight": 0}
+    rebalancer = EVRebalancer(plugin, config, database, MagicMock())
+    rebalancer._estimate_inbound_fee = (
+        lambda peer_id, amount_msat=100000000: inbound.get(peer_id, 1000)
+    )
+    return rebalancer
+
+
+def run_greedy(rebalancer, depleted, sources, slots):
+    candidates = []
+    for dest_id, info, ratio in depleted:
+        candidate = rebalancer._analyze_rebalance_ev(dest_id, info, ratio, sources, {})
+        if candidate:
+            candidates.append(candidate)
+            if len(candidates) >= slots:
+                break
+    return candidates
+
+
+def overcommitted(candidates, sources):
+    spendable = {cid: info["spendable_sats"] for cid, info, _ in sources}
+    used = Counter()
+    for c in candidates:
+        used[c.source_candidates[0]] += c.amount_sats
+    return sum(1 for cid, amount in used.items() if amount > spendable[cid])
+
+
+def summarize(name, candidates, elapsed, sources):
+    profit = sum(c.expected_profit_sats for c in candidates)
+    print(
+        f"{name:8s} {elapsed * 1000:9.1f} ms  candidates={len(candidates):3d}  "
+        f"expected_profit={profit:8.0f} sats  "
+        f"overcommitted_sources={overcommitted(candidates, sources)}"
+    )
+    return profit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--slots", type=int, nargs="+", default=[5, 20, 100])
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    depleted, sources, states, inbound = build_node(args.channels, args.seed)
+    rebalancer = make_rebalancer(states, inbound)
+    print(
+        f"{args.channels} channels: {len(depleted)} depleted, {len(sources)} sources"
+    )
+
+    for slots in args.slots:
+        print(f"\nslots={slots}")
+        results = {}
+        for name, fn in (
+            ("greedy", lambda: run_greedy(rebalancer, depleted, sources, slots)),
+            ("planner", lambda: rebalancer._plan_rebalance_candidates(
+                depleted, sources, {}, slots)),
+        ):
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                candidates = fn()
+                best = min(best, time.perf_counter() - start)
+            results[name] = summarize(name, candidates, best, sources)
+        if results["greedy"]:
+            print(f"profit ratio planner/greedy: {results['planner'] / results['greedy']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
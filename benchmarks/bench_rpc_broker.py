@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Benchmark: RPC throughput and latency through the broker and proxy layers.
+
+Starts a FakeLightningd (fake_lightningd.py) on a temporary Unix socket and
+drives a weighted mix of the plugin's RPC calls from --threads threads for
+--duration seconds per layer:
+
+- raw:    RawRpcClient straight to the socket (transport + server baseline)
+- broker: RpcBroker.request() (subprocess, queues, pickled results)
+- proxy:  ThreadSafeRpcProxy (breakers, metrics, profiler stages)
+
+Per layer it reports calls/s and per-method p50/p95/p99 latency, outcomes
+(ok, rpc_error, timeout, breaker_open, exception) and broker restarts.
+Faults (latency, payload padding, errors, hangs, dropped connections) are
+injected by the server, so timeouts, restarts and breakers can be exercised
+offline. The broker and proxy layers load cl-revenue-ops.py and need
+pyln-client; without it only the raw layer runs.
+
+Usage:
+    python benchmarks/bench_rpc_broker.py [--layers raw broker proxy]
+        [--threads 4] [--duration 10] [--channels 1000] [--latency-ms 1]
+        [--error-rate 0.01] [--hang-rate 0.0] [--timeout 2] [--output FILE]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The broker layers need the real pyln-client; the modules package only
+# needs something importable
+try:
+    import pyln.client  # noqa: F401
+    HAVE_PYLN = True
+except ImportError:
+    HAVE_PYLN = False
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from fake_lightningd import FakeLightningd, FaultPlan, RawRpcClient, RawRpcError  # noqa: E402
+from modules.rpc_metrics import LatencyHistogram  # noqa: E402
+from synthetic_node import FakePlugin, SyntheticNode  # noqa: E402
+
+
+def _load_plugin_module():
+    """cl-revenue-ops.py as module cl_revenue_ops, or None without pyln-client."""
+    if not HAVE_PYLN:
+        return None
+    spec = importlib.util.spec_from_file_location(
+        "cl_revenue_ops", os.path.join(ROOT, "cl-revenue-ops.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["cl_revenue_ops"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+# Loaded at import: the spawned broker process re-imports this script and
+# must find RpcBroker._broker_main under the same module name
+PLUGIN = _load_plugin_module()
+
+LAYERS = ("raw", "broker", "proxy")
+
+# (method, weight): roughly a fee + rebalance cycle's mix
+DEFAULT_MIX = {
+    "listpeerchannels": 30,
+    "setchannel": 20,
+    "bkpr-listaccountevents": 15,
+    "listfunds": 10,
+    "sling-stats": 10,
+    "hive-status": 10,
+    "listforwards": 5,
+}
+
+# Called as rpc.<method>(**kwargs) by the plugin; the rest via rpc.call()
+ATTR_METHODS = {"listpeerchannels", "setchannel", "listfunds", "listforwards"}
+
+
+def build_request(method: str, node: SyntheticNode, rng: random.Random) -> dict:
+    if method == "setchannel":
+        scid = rng.choice(node.channels)["short_channel_id"]
+        return {"id": scid, "feebase": 0, "feeppm": rng.randint(1, 2000)}
+    if method == "listforwards":
+        return {"status": "settled"}
+    if method == "sling-stats":
+        return {"json": True}
+    if method == "bkpr-listaccountevents":
+        return {"account": rng.choice(node.channels)["channel_id"]}
+    return {}
+
+
+def classify(exc: BaseException) -> str:
+    name = type(exc).__name__
+    if isinstance(exc, (socket.timeout, TimeoutError)) or name == "RPCTimeoutError":
+        return "timeout"
+    if name == "RPCBreakerOpen":
+        return "breaker_open"
+    if isinstance(exc, RawRpcError) or name == "RpcError":
+        return "rpc_error"
+    return "exception"
+
+
+class Layer:
+    """A way of issuing one RPC: call(method, params)."""
+
+    def __init__(self, name: str, socket_path: str, timeout: float, breaker_seconds: int):
+        self.name = name
+        self.broker = None
+        if name == "raw":
+            self._raw = RawRpcClient(socket_path, timeout=timeout)
+            return
+
+        plugin = FakePlugin(rpc=None)
+        self.broker = PLUGIN.RpcBroker(socket_path, plugin)
+        if name == "proxy":
+            config = PLUGIN.Config()
+            config.rpc_timeout_seconds = max(1, int(timeout))
+            config.rpc_circuit_breaker_seconds = breaker_seconds
+            PLUGIN.config = config
+            self._proxy = PLUGIN.ThreadSafeRpcProxy(self.broker, plugin)
+        self._timeout = max(1, int(timeout))
+
+    def call(self, method: str, params: dict):
+        if self.name == "raw":
+            return self._raw.call(method, params)
+        if self.name == "broker":
+            if method in ATTR_METHODS:
+                return self.broker.request(kind="attr", method=method, kwargs=params,
+                                           timeout=self._timeout)
+            return self.broker.request(kind="call", method=method, payload=params,
+                                       timeout=self._timeout)
+        if method in ATTR_METHODS:
+            return getattr(self._proxy, method)(**params)
+        return self._proxy.call(method, params)
+
+    def close(self):
+        if self.broker is not None:
+            self.broker.stop()
+
+
+def run_layer(layer: Layer, node: SyntheticNode, mix: dict, threads: int,
+              duration: float, seed: int) -> dict:
+    methods, weights = zip(*mix.items())
+    latency = defaultdict(LatencyHistogram)
+    outcomes = defaultdict(Counter)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        local_latency = defaultdict(LatencyHistogram)
+        local_outcomes = defaultdict(Counter)
+        while time.monotonic() < deadline:
+            method = rng.choices(methods, weights)[0]
+            params = build_request(method, node, rng)
+            start = time.perf_counter()
+            try:
+                layer.call(method, params)
+                outcome = "ok"
+            except Exception as e:
+                outcome = classify(e)
+            local_latency[method].observe((time.perf_counter() - start) * 1000.0)
+            local_outcomes[method][outcome] += 1
+            if outcome == "breaker_open":
+                time.sleep(0.01)  # a real caller skips its cycle
+        with lock:
+            for method, hist in local_latency.items():
+                latency[method].merge(hist)
+            for method, counts in local_outcomes.items():
+                outcomes[method].update(counts)
+
+    workers = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    overall = LatencyHistogram()
+    for hist in latency.values():
+        overall.merge(hist)
+    total = Counter()
+    for counts in outcomes.values():
+        total.update(counts)
+    result = {
+        "seconds": round(elapsed, 2),
+        "calls": overall.count,
+        "calls_per_second": round(overall.count / elapsed, 1) if elapsed else 0.0,
+        "latency": overall.to_dict(),
+        "outcomes": dict(total),
+        "methods": {
+            method: {"calls": latency[method].count, "latency": latency[method].to_dict(),
+                     "outcomes": dict(outcomes[method])}
+            for method in sorted(latency, key=lambda m: -latency[m].total_ms)
+        },
+    }
+    if layer.broker is not None:
+        result["broker_restarts"] = layer.broker.metrics.snapshot()["broker_restarts"]
+    return result
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        method, _, weight = part.partition("=")
+        mix[method.strip()] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--layers", nargs="+", choices=LAYERS, default=list(LAYERS))
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per layer")
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--forwards", type=int, default=10_000,
+                        help="forwards returned by listforwards")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="method=weight,... (default: fee/rebalance cycle mix)")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--fault-methods", nargs="+", help="limit faults to these methods")
+    parser.add_argument("--timeout", type=float, default=15.0, help="RPC timeout (seconds)")
+    parser.add_argument("--breaker-seconds", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON results to write (default: stdout)")
+    args = parser.parse_args()
+
+    layers = list(args.layers)
+    if PLUGIN is None and set(layers) - {"raw"}:
+        print("pyln-client is not installed: running the raw layer only", file=sys.stderr)
+        layers = [name for name in layers if name == "raw"]
+
+    node = SyntheticNode(channels=args.channels, forwards=args.forwards,
+                         rpc_forwards=args.forwards, seed=args.seed)
+    node.load_recent_forwards()
+    faults = FaultPlan(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, pad_bytes=args.pad_bytes,
+        error_rate=args.error_rate, hang_rate=args.hang_rate, drop_rate=args.drop_rate,
+        hang_seconds=args.timeout * 4,
+        methods=set(args.fault_methods) if args.fault_methods else None,
+    )
+
+    # Unix socket paths are limited to ~100 bytes; keep it short
+    workdir = tempfile.mkdtemp(prefix="fakeln-")
+    results = {}
+    try:
+        with FakeLightningd(node, os.path.join(workdir, "rpc"), faults, seed=args.seed) as fake:
+            for name in layers:
+                layer = Layer(name, fake.socket_path, args.timeout, args.breaker_seconds)
+                try:
+                    results[name] = run_layer(layer, node, args.mix, args.threads,
+                                              args.duration, args.seed)
+                finally:
+                    layer.close()
+                r = results[name]
+                print(f"{name:<7} {r['calls_per_second']:>9.1f} calls/s   "
+                      f"p50 {r['latency']['p50_ms']} ms   p99 {r['latency']['p99_ms']} ms   "
+                      f"{r['outcomes']}", file=sys.stderr)
+            server = fake.stats()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "node": node.describe(),
+            "threads": args.threads,
+            "duration": args.duration,
+            "mix": args.mix,
+            "faults": {k: (sorted(v) if isinstance(v, set) else v)
+                       for k, v in vars(faults).items()},
+        },
+        "server": server,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Fake lightningd: a JSON-RPC server on a Unix socket.
+
+Speaks the lightningd wire format (JSON requests; JSON responses followed
+by a blank line), so pyln-client's LightningRpc and therefore RpcBroker can
+be pointed at it. Responses come from a SyntheticNode (listpeerchannels,
+listforwards, listfunds, setchannel, sling-*, bkpr-*, ...) or from canned
+results registered per method, which take precedence (hive-* has canned
+defaults).
+
+Faults are drawn per request from a FaultPlan:
+
+- latency_ms / jitter_ms, or per-method latency
+- pad_bytes: filler added to every object result, to inflate payloads
+- error_rate: a JSON-RPC error response
+- hang_rate: never answer (until hang_seconds or server shutdown)
+- drop_rate: close the connection without answering
+
+Faults can be limited to some methods and changed while the server runs.
+
+Usage:
+    python benchmarks/fake_lightningd.py --socket /tmp/lightning-rpc
+        [--channels 1000] [--forwards 100000] [--latency-ms 5]
+        [--error-rate 0.01] [--hang-rate 0.001]
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Set
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic_node import SyntheticNode  # noqa: E402
+
+
+# lightningd error codes
+JSONRPC2_METHOD_NOT_FOUND = -32601
+LIGHTNINGD = -1
+
+DEFAULT_CANNED = {
+    "hive-status": {"status": "active", "membership": {"tier": "member"}, "members": 3},
+    "hive-members": {"members": []},
+    "hive-fee-intel-query": {"profiles": []},
+}
+
+
+@dataclass
+class FaultPlan:
+    """Per-request fault and latency injection."""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    method_latency_ms: Dict[str, float] = field(default_factory=dict)
+    pad_bytes: int = 0
+    error_rate: float = 0.0
+    hang_rate: float = 0.0
+    hang_seconds: float = 3600.0
+    drop_rate: float = 0.0
+    methods: Optional[Set[str]] = None  # None = faults apply to every method
+
+    def applies_to(self, method: str) -> bool:
+        return self.methods is None or method in self.methods
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    """One client connection; requests are answered in order."""
+
+    def handle(self):
+        server: "FakeLightningd" = self.server.fake
+        decoder = json.JSONDecoder()
+        buff = ""
+        while not server.stopping.is_set():
+            try:
+                chunk = self.request.recv(65536)
+            except OSError:
+                return
+            if not chunk:
+                return
+            buff += chunk.decode("utf-8")
+            while True:
+                stripped = buff.lstrip()
+                if not stripped:
+                    buff = ""
+                    break
+                try:
+                    request, end = decoder.raw_decode(stripped)
+                except json.JSONDecodeError:
+                    buff = stripped
+                    break   # incomplete object, wait for more
+                buff = stripped[end:]
+                response = server.respond(request)
+                if response is None:
+                    return  # dropped or hung: close without answering
+                try:
+                    self.request.sendall(json.dumps(response).encode("utf-8") + b"\n\n")
+                except OSError:
+                    return
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeLightningd:
+    """
+    Threaded JSON-RPC server backed by a SyntheticNode.
+
+        with FakeLightningd(node, "/tmp/x/lightning-rpc") as fake:
+            fake.faults.error_rate = 0.05
+            ...
+    """
+
+    def __init__(self, node: SyntheticNode, socket_path: str,
+                 faults: Optional[FaultPlan] = None, seed: int = 0):
+        self.node = node
+        self.socket_path = socket_path
+        self.faults = faults or FaultPlan()
+        self.canned: Dict[str, Any] = dict(DEFAULT_CANNED)
+        self.counts: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.stopping = threading.Event()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[_Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def set_response(self, method: str, result: Any) -> None:
+        """Canned result for method: a value, or a callable taking params."""
+        self.canned[method] = result
+
+    # =========================================================================
+    # Lifecycle
+    # =========================================================================
+
+    def start(self) -> "FakeLightningd":
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.stopping.clear()
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="fake_lightningd", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopping.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self) -> "FakeLightningd":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # =========================================================================
+    # Requests
+    # =========================================================================
+
+    def _draw(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def respond(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Response object for one request, or None to hang up without one."""
+        method = request.get("method", "")
+        req_id = request.get("id")
+        params = request.get("params")
+        with self._lock:
+            self.counts[method] += 1
+        faults = self.faults
+
+        if faults.applies_to(method):
+            delay = faults.method_latency_ms.get(method, faults.latency_ms)
+            if faults.jitter_ms:
+                delay += self._draw() * faults.jitter_ms
+            if delay > 0:
+                time.sleep(delay / 1000.0)
+
+            roll = self._draw()
+            if roll < faults.hang_rate:
+                self._count_fault("hang")
+                self.stopping.wait(faults.hang_seconds)
+                return None
+            roll -= faults.hang_rate
+            if roll < faults.drop_rate:
+                self._count_fault("drop")
+                return None
+            roll -= faults.drop_rate
+            if roll < faults.error_rate:
+                self._count_fault("error")
+                return self._error(req_id, LIGHTNINGD, f"injected failure in {method}")
+
+        try:
+            canned = self.canned.get(method)
+            if canned is not None:
+                result = canned(params) if callable(canned) else canned
+            else:
+                result = self.node.handle(method, params)
+        except (TypeError, ValueError) as e:
+            return self._error(req_id, LIGHTNINGD, str(e))
+
+        if faults.pad_bytes and isinstance(result, dict) and faults.applies_to(method):
+            result = dict(result, padding="x" * faults.pad_bytes)
+        return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+    def _count_fault(self, kind: str) -> None:
+        with self._lock:
+            self.injected[kind] += 1
+
+    @staticmethod
+    def _error(req_id: Any, code: int, message: str) -> Dict[str, Any]:
+        return {"jsonrpc": "2.0", "id": req_id, "error": {"code": code, "message": message}}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"requests": dict(self.counts), "injected": dict(self.injected)}
+
+
+class RawRpcError(Exception):
+    def __init__(self, method: str, error: Any):
+        super().__init__(f"RPC call failed: method: {method}, error: {error}")
+        self.method = method
+        self.error = error
+
+
+class RawRpcClient:
+    """
+    Minimal stdlib client for the lightningd socket.
+
+    Like LightningRpc it opens one connection per call. Used as the
+    transport-only baseline and where pyln-client is not installed.
+    """
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = 15.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._ids = iter(range(1, 1 << 62))
+        self._id_lock = threading.Lock()
+
+    def call(self, method: str, params: Any = None) -> Any:
+        with self._id_lock:
+            req_id = next(self._ids)
+        request = {"jsonrpc": "2.0", "id": req_id, "method": method,
+                   "params": {} if params is None else params}
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request).encode("utf-8"))
+            buff = b""
+            while b"\n\n" not in buff:
+                chunk = sock.recv(max(65536, len(buff)))
+                if not chunk:
+                    raise RawRpcError(method, "Connection to RPC server lost.")
+                buff += chunk
+        finally:
+            sock.close()
+        response = json.loads(buff.split(b"\n\n", 1)[0])
+        if "error" in response:
+            raise RawRpcError(method, response["error"])
+        return response["result"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--channels", type=int, default=1000)
+    parser.add_argument("--forwards", type=int, default=100_000,
+                        help="forwards returned by listforwards")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--pad-bytes", type=int, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--fault-methods", nargs="+", help="limit faults to these methods")
+    args = parser.parse_args()
+
+    node = SyntheticNode(channels=args.channels, forwards=args.forwards,
+                         rpc_forwards=args.forwards, seed=args.seed)
+    node.load_recent_forwards()
+    faults = FaultPlan(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, pad_bytes=args.pad_bytes,
+        error_rate=args.error_rate, hang_rate=args.hang_rate, drop_rate=args.drop_rate,
+        methods=set(args.fault_methods) if args.fault_methods else None,
+    )
+    with FakeLightningd(node, args.socket, faults, seed=args.seed) as fake:
+        print(f"Serving {node.describe()} on {args.socket} (Ctrl-C to stop)", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            pass
+        print(json.dumps(fake.stats(), indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+Backtest: replay a forward stream against the fee controller in simulated time.
+
+A demand model gives each channel a forward rate that depends on its fee,
+with ElasticityTracker-style elasticity e at a reference fee f_ref:
+
+    rate(f) = rate_ref * exp(e * (f / f_ref - 1))
+
+Elasticity at fee f is e * f / f_ref, so revenue peaks at f* = f_ref / |e|
+(unit elasticity), clamped to the configured fee range. Channel parameters
+come from a SyntheticNode (--channels) or are fitted from a recorded
+database (--from-db): forward rate, amount and effective fee per channel,
+elasticity from ElasticityTracker fed with the windows between recorded
+fee changes.
+
+Each simulated cycle advances the clock by --cycle-minutes, draws the
+forwards that happened at the channels' current fees into the database,
+then runs adjust_all_fees() (HillClimbingFeeController, standalone: fake
+RPC, no hive, no profitability analyzer). time.time() in the plugin modules
+reads the simulated clock and time.sleep() returns at once.
+
+Reported: revenue against the expected revenue at f*, per-channel
+convergence time (last entry into +-tolerance of f* that held to the end),
+fee churn (setchannel calls, mean relative step) and controller CPU time
+per cycle, which makes the run a regression benchmark for the
+Thompson/AIMD path as well.
+
+Usage:
+    python benchmarks/fee_backtest.py [--channels 20] [--days 14]
+        [--cycle-minutes 30] [--forwards-per-day 2000] [--from-db PATH]
+        [--output FILE]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from unittest.mock import MagicMock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# The plugin framework is not needed to run the controller offline
+try:
+    import pyln.client  # noqa: F401
+except ImportError:
+    _pyln = MagicMock()
+    _pyln.RpcError = Exception
+    sys.modules['pyln'] = _pyln
+    sys.modules['pyln.client'] = _pyln
+
+from modules.clboss_manager import ClbossManager  # noqa: E402
+from modules.config import Config  # noqa: E402
+from modules.database import Database  # noqa: E402
+from modules.fee_controller import ElasticityTracker, HillClimbingFeeController  # noqa: E402
+from modules.policy_manager import PolicyManager  # noqa: E402
+from synthetic_node import FakePlugin, FakeRpc, SyntheticNode, encode_forward_rows  # noqa: E402
+
+_real_time = time
+
+
+class SimClock:
+    """Stand-in for the time module: simulated time(), instant sleep()."""
+
+    def __init__(self, start: float):
+        self.now = float(start)
+        self.slept = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept += max(0.0, seconds)
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(_real_time, name)
+
+    def install(self) -> List[Any]:
+        """Point every loaded plugin module's `time` at this clock."""
+        patched = []
+        for name, module in list(sys.modules.items()):
+            if name.startswith("modules.") and getattr(module, "time", None) is _real_time:
+                module.time = self
+                patched.append(module)
+        return patched
+
+    @staticmethod
+    def uninstall(patched: List[Any]) -> None:
+        for module in patched:
+            module.time = _real_time
+
+
+class ChannelDemand:
+    """Fee-dependent forward rate of one channel."""
+
+    def __init__(self, scid: str, rate_per_hour: float, ref_fee_ppm: int,
+                 elasticity: float, amount_msat: float):
+        self.scid = scid
+        self.rate_per_hour = rate_per_hour
+        self.ref_fee_ppm = max(1, ref_fee_ppm)
+        self.elasticity = min(-0.05, elasticity)
+        self.amount_msat = amount_msat
+
+    def rate(self, fee_ppm: int) -> float:
+        return self.rate_per_hour * math.exp(
+            self.elasticity * (fee_ppm / self.ref_fee_ppm - 1.0))
+
+    def optimal_fee(self, min_fee: int, max_fee: int) -> int:
+        return int(min(max_fee, max(min_fee, self.ref_fee_ppm / -self.elasticity)))
+
+    def expected_revenue_msat(self, fee_ppm: int, hours: float) -> float:
+        return self.rate(fee_ppm) * hours * self.amount_msat * fee_ppm / 1_000_000
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rate_per_hour": round(self.rate_per_hour, 3), "ref_fee_ppm": self.ref_fee_ppm,
+                "elasticity": round(self.elasticity, 3), "amount_msat": int(self.amount_msat)}
+
+
+def synthetic_demand(node: SyntheticNode, forwards_per_day: float,
+                     rng: random.Random) -> Dict[str, ChannelDemand]:
+    """Rates split by the node's popularity; elasticity in the typical -0.3..-2.5 range."""
+    total = sum(node.popularity)
+    demand = {}
+    for ch, weight in zip(node.channels, node.popularity):
+        demand[ch["short_channel_id"]] = ChannelDemand(
+            ch["short_channel_id"],
+            rate_per_hour=forwards_per_day / 24.0 * weight / total,
+            ref_fee_ppm=ch["fee_proportional_millionths"],
+            elasticity=-rng.uniform(0.3, 2.5),
+            amount_msat=rng.lognormvariate(13.0, 1.0) + 1000,
+        )
+    return demand
+
+
+def recorded_demand(path: str, default_elasticity: float = -1.0) -> Dict[str, ChannelDemand]:
+    """
+    Fit per-channel demand from a recorded revenue_ops database.
+
+    Elasticity comes from an ElasticityTracker fed with one observation per
+    window between consecutive fee changes (volume and revenue rate in it).
+    """
+    import sqlite3
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    rows = conn.execute("""
+        SELECT out_channel, COUNT(*), SUM(out_msat), SUM(fee_msat),
+               MIN(timestamp), MAX(timestamp)
+        FROM forwards GROUP BY out_channel
+    """).fetchall()
+    demand = {}
+    clock = SimClock(0)
+    patched = clock.install()
+    try:
+        for scid, count, out_msat, fee_msat, first, last in rows:
+            if not scid or not out_msat:
+                continue
+            hours = max(1.0, (last - first) / 3600.0)
+            ref_fee = max(1, int(round((fee_msat or 0) * 1_000_000 / out_msat)))
+            changes = conn.execute(
+                "SELECT new_fee_ppm, timestamp FROM fee_changes WHERE channel_id = ? "
+                "ORDER BY timestamp", (scid,)).fetchall()
+            tracker = ElasticityTracker()
+            for (fee, start), (_, end) in zip(changes, changes[1:] + [(None, last)]):
+                if end <= start:
+                    continue
+                volume, revenue = conn.execute(
+                    "SELECT COALESCE(SUM(out_msat), 0) / 1000, COALESCE(SUM(fee_msat), 0) / 1000 "
+                    "FROM forwards WHERE out_channel = ? AND timestamp >= ? AND timestamp < ?",
+                    (scid, start, end)).fetchone()
+                clock.now = end
+                tracker.add_observation(fee, volume, revenue / ((end - start) / 3600.0))
+            elasticity = tracker.current_elasticity if tracker.confidence > 0 else default_elasticity
+            demand[scid] = ChannelDemand(scid, count / hours, ref_fee, elasticity, out_msat / count)
+    finally:
+        SimClock.uninstall(patched)
+        conn.close()
+    return demand
+
+
+def poisson(rng: random.Random, mean: float) -> int:
+    if mean <= 0:
+        return 0
+    if mean > 50:
+        return max(0, int(round(rng.gauss(mean, math.sqrt(mean)))))
+    # Knuth
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+class Backtester:
+    """Drives HillClimbingFeeController over a demand model in simulated time."""
+
+    def __init__(self, node: SyntheticNode, demand: Dict[str, ChannelDemand],
+                 workdir: str, seed: int = 42, tolerance: float = 0.2):
+        self.node = node
+        self.demand = demand
+        self.tolerance = tolerance
+        self.rng = random.Random(seed)
+        random.seed(seed)   # Thompson sampling draws from the global generator
+
+        self.rpc = FakeRpc(node)
+        self.plugin = FakePlugin(self.rpc)
+        self.config = Config()
+        self.config.db_path = os.path.join(workdir, "revenue_ops.db")
+        self.config.hive_enabled = 'false'
+        self.database = Database(self.config.db_path, self.plugin)
+        self.database.initialize()
+        self.controller = HillClimbingFeeController(
+            self.plugin, self.config, self.database, ClbossManager(self.plugin, self.config),
+            PolicyManager(self.database, self.plugin), None, None,
+        )
+        self.in_channels = [ch["short_channel_id"] for ch in node.channels]
+        for ch in node.channels:
+            capacity = ch["total_msat"] // 1000
+            self.database.update_channel_state(
+                ch["short_channel_id"], ch["peer_id"], "balanced", 0.0, 0, 0, capacity)
+
+    def fee(self, scid: str) -> int:
+        return self.node._by_scid[scid]["fee_proportional_millionths"]
+
+    def _draw_forwards(self, start: float, seconds: float) -> float:
+        """Insert the forwards of one interval at current fees; returns fee msat earned."""
+        rows, earned = [], 0.0
+        hours = seconds / 3600.0
+        for scid, channel in self.demand.items():
+            if scid not in self.node._by_scid:
+                continue
+            fee = self.fee(scid)
+            for _ in range(poisson(self.rng, channel.rate(fee) * hours)):
+                out_msat = int(channel.amount_msat * self.rng.lognormvariate(-0.125, 0.5))
+                fee_msat = out_msat * fee // 1_000_000
+                ts = int(start + self.rng.random() * seconds)
+                in_channel = self.rng.choice(self.in_channels)
+                rows.append((in_channel, scid, out_msat + fee_msat, out_msat, fee_msat,
+                             0.5, ts, ts + 1))
+                earned += fee_msat
+        if rows:
+            conn = self.database._get_connection()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("""
+                INSERT OR IGNORE INTO {fwd}
+                ({in_ch}, {out_ch}, in_msat, out_msat, fee_msat,
+                 resolution_time, timestamp, resolved_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """.format(**self.database._fwd()), encode_forward_rows(self.database, rows))
+            conn.execute("COMMIT")
+        return earned
+
+    def run(self, days: float, cycle_minutes: float) -> Dict[str, Any]:
+        cfg = self.config
+        step = cycle_minutes * 60.0
+        cycles = int(days * 86400 / step)
+        scids = [s for s in self.demand if s in self.node._by_scid]
+        optimal = {s: self.demand[s].optimal_fee(cfg.min_fee_ppm, cfg.max_fee_ppm) for s in scids}
+
+        clock = SimClock(self.node.now)
+        patched = clock.install()
+        revenue_msat = optimal_msat = 0.0
+        cpu_ms: List[float] = []
+        wall_start = _real_time.perf_counter()
+        changes, relative_steps = 0, []
+        last_outside = {s: 0.0 for s in scids}
+        try:
+            for cycle in range(cycles):
+                start = clock.now
+                revenue_msat += self._draw_forwards(start, step)
+                optimal_msat += sum(self.demand[s].expected_revenue_msat(optimal[s], step / 3600.0)
+                                    for s in scids)
+                clock.advance(step)
+
+                before = {s: self.fee(s) for s in scids}
+                cpu_start = _real_time.process_time()
+                self.controller.adjust_all_fees()
+                cpu_ms.append((_real_time.process_time() - cpu_start) * 1000.0)
+
+                elapsed_h = (cycle + 1) * step / 3600.0
+                for s in scids:
+                    fee = self.fee(s)
+                    if fee != before[s]:
+                        changes += 1
+                        relative_steps.append(abs(fee - before[s]) / max(1, before[s]))
+                    if abs(fee - optimal[s]) > self.tolerance * optimal[s]:
+                        last_outside[s] = elapsed_h
+        finally:
+            SimClock.uninstall(patched)
+            wall = _real_time.perf_counter() - wall_start
+            self.database.close_all_connections()
+
+        horizon_h = cycles * step / 3600.0
+        converged = {s: h for s, h in last_outside.items() if h < horizon_h}
+        channel_cycles = cycles * len(scids)
+        return {
+            "cycles": cycles,
+            "simulated_hours": round(horizon_h, 1),
+            "revenue": {
+                "sats": int(revenue_msat / 1000),
+                "optimal_expected_sats": int(optimal_msat / 1000),
+                "efficiency": round(revenue_msat / optimal_msat, 3) if optimal_msat else None,
+            },
+            "convergence": {
+                "tolerance": self.tolerance,
+                "converged_channels": len(converged),
+                "channels": len(scids),
+                "median_hours": round(statistics.median(converged.values()), 1) if converged else None,
+            },
+            "churn": {
+                "fee_changes": changes,
+                "changes_per_channel_day": round(changes / len(scids) / (horizon_h / 24.0), 2)
+                if scids and horizon_h else 0.0,
+                "mean_relative_step": round(statistics.mean(relative_steps), 3) if relative_steps else 0.0,
+            },
+            "cpu": {
+                "per_cycle_ms": _spread(cpu_ms),
+                "per_channel_cycle_ms": round(sum(cpu_ms) / channel_cycles, 3) if channel_cycles else 0.0,
+                "cycles_per_second": round(cycles / wall, 1) if wall else None,
+                "wall_seconds": round(wall, 2),
+            },
+            "channels": {
+                s: {"optimal_fee_ppm": optimal[s], "final_fee_ppm": self.fee(s),
+                    "converged_hours": converged.get(s), **self.demand[s].to_dict()}
+                for s in scids
+            },
+        }
+
+
+def _spread(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        "mean": round(statistics.mean(ordered), 3),
+        "p50": round(ordered[len(ordered) // 2], 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--days", type=float, default=14.0)
+    parser.add_argument("--cycle-minutes", type=float, default=30.0)
+    parser.add_argument("--forwards-per-day", type=float, default=2000.0,
+                        help="synthetic demand at the starting fees")
+    parser.add_argument("--from-db", help="fit demand from a recorded revenue_ops database")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="convergence band around the optimal fee (default: 0.2)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON report to write (default: stdout)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.from_db:
+        demand = recorded_demand(args.from_db)
+        node = SyntheticNode(channels=len(demand), forwards=0, seed=args.seed)
+        # Replay on the recorded channel ids and fees
+        remapped = {}
+        for ch, channel in zip(node.channels, demand.values()):
+            node._by_scid.pop(ch["short_channel_id"])
+            ch["short_channel_id"] = channel.scid
+            ch["fee_proportional_millionths"] = channel.ref_fee_ppm
+            ch["updates"]["local"]["fee_proportional_millionths"] = channel.ref_fee_ppm
+            node._by_scid[channel.scid] = ch
+            remapped[channel.scid] = channel
+        demand = remapped
+    else:
+        node = SyntheticNode(channels=args.channels, forwards=0, seed=args.seed)
+        demand = synthetic_demand(node, args.forwards_per_day, rng)
+
+    workdir = tempfile.mkdtemp(prefix="fee-backtest-")
+    try:
+        result = Backtester(node, demand, workdir, seed=args.seed,
+                            tolerance=args.tolerance).run(args.days, args.cycle_minutes)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{result['cycles']} cycles ({result['simulated_hours']}h simulated) in "
+          f"{result['cpu']['wall_seconds']}s: revenue efficiency "
+          f"{result['revenue']['efficiency']}, converged "
+          f"{result['convergence']['converged_channels']}/{result['convergence']['channels']}, "
+          f"{result['churn']['fee_changes']} fee changes, "
+          f"cpu p50 {result['cpu']['per_cycle_ms'].get('p50')} ms/cycle", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": int(_real_time.time()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "source": args.from_db or "synthetic",
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "result": result,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        print(json.dumps(report, indent=2, sort_keys=True))
+
+
+if __name__ == "__main__":
+    main()
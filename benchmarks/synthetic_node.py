@@ -0,0 +1,445 @@
+"""
+Synthetic large node for benchmarks.
+
+SyntheticNode generates a deterministic (seeded) node: our channels in
+listpeerchannels shape, peers, a surrounding gossip graph, a forwards
+history and fee-change / fee-controller state histories. It can
+
+- populate a Database (forwards, fee_changes, fee_strategy_state)
+- answer lightningd RPC methods (handle()), through FakeRpc in-process or
+  a socket server
+
+Channel popularity is lognormal, so a few channels carry most forwards as
+on real routing nodes. Forwards are streamed into the database in
+transactions of INSERT_BATCH rows, so 50M-row histories do not have to fit
+in memory. listforwards returns only the newest rpc_forwards of them.
+"""
+
+import json
+import math
+import random
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+PRESETS = {
+    "small": {"channels": 100, "forwards": 10_000, "fee_history": 20},
+    "medium": {"channels": 1000, "forwards": 1_000_000, "fee_history": 50},
+    "large": {"channels": 5000, "forwards": 10_000_000, "fee_history": 50},
+    "xlarge": {"channels": 5000, "forwards": 50_000_000, "fee_history": 100},
+}
+
+INSERT_BATCH = 50_000
+
+# Positional parameter names, as lightningd maps them
+RPC_PARAMS = {
+    "getinfo": (),
+    "listpeerchannels": ("id",),
+    "listpeers": ("id", "level"),
+    "listchannels": ("short_channel_id", "source", "destination"),
+    "listfunds": ("spent",),
+    "listforwards": ("status", "in_channel", "out_channel"),
+    "feerates": ("style",),
+    "setchannel": ("id", "feebase", "feeppm", "htlcmin", "htlcmax", "enforcedelay",
+                   "ignorefeelimits"),
+    "plugin": ("subcommand",),
+}
+
+
+def _scid(block: int, tx: int, out: int) -> str:
+    return f"{block}x{tx}x{out}"
+
+
+def _node_id(prefix: str, i: int) -> str:
+    return prefix + f"{i:064x}"
+
+
+def encode_forward_rows(database, rows: List[Tuple]) -> List[Tuple]:
+    """Forward tuples (in_channel, out_channel, ...) in the database's forwards layout."""
+    if not database.forwards_compact:
+        return rows
+    from modules.database import scid_to_int
+    return [(scid_to_int(row[0]) or 0, scid_to_int(row[1]) or 0) + tuple(row[2:]) for row in rows]
+
+
+class SyntheticNode:
+    """Deterministic synthetic routing node."""
+
+    def __init__(self, channels: int = 100, peers: Optional[int] = None,
+                 forwards: int = 10_000, fee_history: int = 20,
+                 history_days: int = 60, graph_nodes: Optional[int] = None,
+                 rpc_forwards: int = 200_000, seed: int = 42,
+                 now: Optional[int] = None):
+        self.n_channels = channels
+        self.n_peers = max(1, min(channels, peers if peers else int(channels * 0.8)))
+        self.n_forwards = forwards
+        self.fee_history = fee_history
+        self.history_days = history_days
+        self.rpc_forwards = rpc_forwards
+        self.seed = seed
+        self.now = int(now if now is not None else time.time())
+        self.our_id = "03" + "ab" * 32
+        self.blockheight = 870_000
+
+        rng = random.Random(seed)
+        self.peer_ids = [_node_id("02", i) for i in range(self.n_peers)]
+        self.channels: List[Dict[str, Any]] = []
+        self.popularity: List[float] = []
+        for i in range(channels):
+            peer_id = self.peer_ids[i % self.n_peers]
+            capacity_sats = rng.choice([1, 2, 3, 5, 10, 16, 20, 50]) * 1_000_000
+            ratio = min(1.0, max(0.0, rng.betavariate(1.2, 1.2)))
+            to_us = int(capacity_sats * 1000 * ratio)
+            reserve = capacity_sats * 10       # 1% reserve, in msat
+            fee_ppm = int(rng.lognormvariate(5.5, 0.8))
+            block = self.blockheight - rng.randint(1_000, 200_000)
+            scid = _scid(block, rng.randint(1, 3000), rng.randint(0, 3))
+            htlcs = [{"direction": "out", "amount_msat": 1_000_000}] * (rng.random() < 0.1)
+            self.channels.append({
+                "peer_id": peer_id,
+                "peer_connected": rng.random() > 0.03,
+                "state": "CHANNELD_NORMAL",
+                "short_channel_id": scid,
+                "channel_id": f"{rng.getrandbits(256):064x}",
+                "funding_txid": f"{rng.getrandbits(256):064x}",
+                "funding_outnum": 0,
+                "opener": "local" if rng.random() < 0.6 else "remote",
+                "to_us_msat": to_us,
+                "total_msat": capacity_sats * 1000,
+                "spendable_msat": max(0, to_us - reserve),
+                "receivable_msat": max(0, capacity_sats * 1000 - to_us - reserve),
+                "fee_base_msat": 0,
+                "fee_proportional_millionths": fee_ppm,
+                "updates": {
+                    "local": {"fee_base_msat": 0, "fee_proportional_millionths": fee_ppm,
+                              "htlc_minimum_msat": 1, "htlc_maximum_msat": capacity_sats * 990,
+                              "cltv_expiry_delta": 80},
+                    "remote": {"fee_base_msat": 1000,
+                               "fee_proportional_millionths": int(rng.lognormvariate(5.0, 1.0)),
+                               "htlc_minimum_msat": 1, "htlc_maximum_msat": capacity_sats * 990,
+                               "cltv_expiry_delta": 80},
+                },
+                "htlc_minimum_msat": 1,
+                "htlc_maximum_msat": capacity_sats * 990,
+                "max_accepted_htlcs": 483,
+                "htlcs": htlcs,
+            })
+            self.popularity.append(rng.lognormvariate(0.0, 1.5))
+        self._by_scid = {ch["short_channel_id"]: ch for ch in self.channels}
+
+        # Surrounding graph: every peer has a handful of other channels
+        self.n_graph_nodes = graph_nodes or max(50, channels * 4)
+        self.graph_edges: List[Dict[str, Any]] = []
+        for ch in self.channels:
+            local, remote = ch["updates"]["local"], ch["updates"]["remote"]
+            self._add_edge(self.our_id, ch["peer_id"], ch["short_channel_id"], local,
+                           ch["total_msat"])
+            self._add_edge(ch["peer_id"], self.our_id, ch["short_channel_id"], remote,
+                           ch["total_msat"])
+        for j, peer_id in enumerate(self.peer_ids):
+            for k in range(rng.randint(2, 8)):
+                other = _node_id("02ff", rng.randrange(self.n_graph_nodes))
+                scid = _scid(self.blockheight - rng.randint(1_000, 400_000), 5000 + j, k)
+                amount = rng.choice([1, 2, 5, 10]) * 1_000_000_000
+                fees = {"fee_base_msat": 1000,
+                        "fee_proportional_millionths": int(rng.lognormvariate(5.0, 1.0))}
+                self._add_edge(peer_id, other, scid, fees, amount)
+                self._add_edge(other, peer_id, scid, fees, amount)
+
+        self._recent_forwards: deque = deque(maxlen=rpc_forwards)
+
+    def _add_edge(self, source: str, destination: str, scid: str,
+                  fees: Dict[str, int], amount_msat: int) -> None:
+        self.graph_edges.append({
+            "source": source,
+            "destination": destination,
+            "short_channel_id": scid,
+            "direction": 0 if source < destination else 1,
+            "public": True,
+            "amount_msat": amount_msat,
+            "base_fee_millisatoshi": fees["fee_base_msat"],
+            "fee_per_millionth": fees["fee_proportional_millionths"],
+            "delay": 80,
+            "htlc_minimum_msat": 1,
+            "htlc_maximum_msat": amount_msat * 99 // 100,
+            "active": True,
+            "last_update": self.now - 3600,
+        })
+
+    @classmethod
+    def from_preset(cls, name: str, **overrides) -> "SyntheticNode":
+        params = dict(PRESETS[name])
+        params.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(**params)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "channels": self.n_channels,
+            "peers": self.n_peers,
+            "forwards": self.n_forwards,
+            "fee_history": self.fee_history,
+            "history_days": self.history_days,
+            "graph_edges": len(self.graph_edges),
+            "seed": self.seed,
+        }
+
+    # =========================================================================
+    # Histories
+    # =========================================================================
+
+    def iter_forwards(self) -> Iterator[Tuple]:
+        """
+        Settled forwards, oldest first, as forwards table rows:
+        (in_channel, out_channel, in_msat, out_msat, fee_msat,
+         resolution_time, timestamp, resolved_time)
+        """
+        rng = random.Random(self.seed + 1)
+        scids = [ch["short_channel_id"] for ch in self.channels]
+        fees = [ch["fee_proportional_millionths"] for ch in self.channels]
+        cum_weights, total = [], 0.0
+        for weight in self.popularity:
+            total += weight
+            cum_weights.append(total)
+        n = len(scids)
+        span = self.history_days * 86400
+        start = self.now - span
+        produced = 0
+        while produced < self.n_forwards:
+            batch = min(INSERT_BATCH, self.n_forwards - produced)
+            outs = rng.choices(range(n), cum_weights=cum_weights, k=batch)
+            ins = rng.choices(range(n), cum_weights=cum_weights, k=batch)
+            for i in range(batch):
+                out_i, in_i = outs[i], ins[i]
+                if in_i == out_i:
+                    in_i = (in_i + 1) % n
+                out_msat = int(rng.lognormvariate(13.0, 1.6)) + 1000
+                fee_msat = out_msat * fees[out_i] // 1_000_000
+                ts = start + (produced + i) * span // self.n_forwards
+                resolution = round(rng.uniform(0.2, 5.0), 3)
+                yield (scids[in_i], scids[out_i], out_msat + fee_msat, out_msat, fee_msat,
+                       resolution, ts, ts + int(math.ceil(resolution)))
+            produced += batch
+
+    def populate(self, database, progress: Optional[Callable[[int], None]] = None) -> Dict[str, int]:
+        """
+        Write the histories into an initialized Database.
+
+        Rows are inserted with executemany directly (no per-row validation);
+        the newest rpc_forwards forwards are kept for listforwards.
+        """
+        from modules.fee_controller import ThompsonAIMDState
+
+        conn = database._get_connection()
+        inserted = 0
+        rows: List[Tuple] = []
+
+        def flush() -> int:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.total_changes
+            conn.executemany("""
+                INSERT OR IGNORE INTO {fwd}
+                ({in_ch}, {out_ch}, in_msat, out_msat, fee_msat,
+                 resolution_time, timestamp, resolved_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """.format(**database._fwd()), encode_forward_rows(database, rows))
+            conn.execute("COMMIT")
+            return conn.total_changes - before
+
+        for row in self.iter_forwards():
+            rows.append(row)
+            self._recent_forwards.append(row)
+            if len(rows) >= INSERT_BATCH:
+                inserted += flush()
+                rows = []
+                if progress:
+                    progress(inserted)
+        if rows:
+            inserted += flush()
+
+        rng = random.Random(self.seed + 2)
+        span = self.history_days * 86400
+        fee_rows = []
+        for ch in self.channels:
+            fee = ch["fee_proportional_millionths"]
+            for k in range(self.fee_history):
+                old, fee = fee, max(1, int(fee * rng.uniform(0.85, 1.15)))
+                ts = self.now - span + (k + 1) * span // (self.fee_history + 1)
+                fee_rows.append((ch["short_channel_id"], ch["peer_id"], old, fee,
+                                 "synthetic", 0, ts))
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany("""
+            INSERT INTO fee_changes
+            (channel_id, peer_id, old_fee_ppm, new_fee_ppm, reason, manual, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, fee_rows)
+        conn.execute("COMMIT")
+
+        # Controller state: Thompson observations along the fee history
+        for ch in self.channels:
+            fee = ch["fee_proportional_millionths"]
+            state = ThompsonAIMDState(last_fee_ppm=fee, last_broadcast_fee_ppm=fee)
+            for k in range(min(self.fee_history, state.thompson.MAX_OBSERVATIONS)):
+                ts = self.now - span + (k + 1) * span // (self.fee_history + 1)
+                state.thompson.observations.append(
+                    (max(1, int(fee * rng.uniform(0.7, 1.3))), rng.uniform(0, 50), 1.0, ts)
+                )
+            state.thompson._recompute_posterior()
+            database.update_fee_strategy_state(
+                channel_id=ch["short_channel_id"],
+                last_revenue_rate=state.last_revenue_rate,
+                last_fee_ppm=fee,
+                trend_direction=1,
+                last_broadcast_fee_ppm=fee,
+                v2_state_json=json.dumps(state.to_v2_dict()),
+            )
+        # update_fee_strategy_state stamps now; back-date so fee updates are due
+        conn.executemany(
+            "UPDATE fee_strategy_state SET last_update = ? WHERE channel_id = ?",
+            [(self.now - rng.randint(7200, 86400), ch["short_channel_id"]) for ch in self.channels],
+        )
+
+        return {"forwards": inserted, "fee_changes": len(fee_rows),
+                "fee_states": len(self.channels)}
+
+    def load_recent_forwards(self) -> int:
+        """Fill the listforwards window without writing a database."""
+        self._recent_forwards.clear()
+        self._recent_forwards.extend(self.iter_forwards())
+        return len(self._recent_forwards)
+
+    # =========================================================================
+    # RPC
+    # =========================================================================
+
+    def handle(self, method: str, params: Any = None) -> Any:
+        """Answer one lightningd RPC (params: dict, list of positionals or None)."""
+        if isinstance(params, (list, tuple)):
+            names = RPC_PARAMS.get(method, ())
+            params = dict(zip(names, params))
+        params = params or {}
+        handler = getattr(self, "rpc_" + method.replace("-", "_"), None)
+        if handler is not None:
+            return handler(**params)
+        if method.startswith("bkpr-"):
+            return {"events": [], "income_events": [], "accounts": []}
+        if method == "sling-stats":
+            return []
+        if method.startswith("sling-"):
+            return {}
+        if method.startswith("hive-"):
+            return {"error": "not a hive member"}
+        return {}
+
+    def rpc_getinfo(self) -> Dict[str, Any]:
+        return {"id": self.our_id, "alias": "synthetic", "blockheight": self.blockheight,
+                "num_active_channels": self.n_channels, "network": "bitcoin"}
+
+    def rpc_listpeerchannels(self, id: Optional[str] = None) -> Dict[str, Any]:
+        channels = self.channels if id is None else [c for c in self.channels if c["peer_id"] == id]
+        return {"channels": [dict(c) for c in channels]}
+
+    def rpc_listpeers(self, id: Optional[str] = None, level: Optional[str] = None) -> Dict[str, Any]:
+        connected: Dict[str, bool] = {}
+        for ch in self.channels:
+            connected[ch["peer_id"]] = connected.get(ch["peer_id"], False) or ch["peer_connected"]
+        peers = [{"id": peer, "connected": state, "num_channels": 1, "features": "08a0000a8a5961"}
+                 for peer, state in connected.items() if id is None or peer == id]
+        return {"peers": peers}
+
+    def rpc_listchannels(self, short_channel_id: Optional[str] = None,
+                         source: Optional[str] = None,
+                         destination: Optional[str] = None) -> Dict[str, Any]:
+        edges = self.graph_edges
+        if short_channel_id is not None:
+            edges = [e for e in edges if e["short_channel_id"] == short_channel_id]
+        if source is not None:
+            edges = [e for e in edges if e["source"] == source]
+        if destination is not None:
+            edges = [e for e in edges if e["destination"] == destination]
+        return {"channels": edges}
+
+    def rpc_listfunds(self, spent: bool = False) -> Dict[str, Any]:
+        return {
+            "outputs": [{"txid": "00" * 32, "output": 0, "amount_msat": 250_000_000_000,
+                         "status": "confirmed", "reserved": False}],
+            "channels": [{"peer_id": c["peer_id"], "short_channel_id": c["short_channel_id"],
+                          "our_amount_msat": c["to_us_msat"], "amount_msat": c["total_msat"],
+                          "funding_txid": c["funding_txid"], "state": c["state"],
+                          "connected": c["peer_connected"]} for c in self.channels],
+        }
+
+    def rpc_listforwards(self, status: Optional[str] = None, in_channel: Optional[str] = None,
+                         out_channel: Optional[str] = None) -> Dict[str, Any]:
+        forwards = []
+        for in_ch, out_ch, in_msat, out_msat, fee_msat, resolution, ts, resolved in self._recent_forwards:
+            if (in_channel and in_ch != in_channel) or (out_channel and out_ch != out_channel):
+                continue
+            forwards.append({
+                "in_channel": in_ch, "out_channel": out_ch, "in_msat": in_msat,
+                "out_msat": out_msat, "fee_msat": fee_msat, "status": "settled",
+                "style": "tlv", "received_time": float(ts), "resolved_time": float(resolved),
+            })
+        return {"forwards": forwards}
+
+    def rpc_feerates(self, style: str = "perkb") -> Dict[str, Any]:
+        perkb = {"opening": 5000, "mutual_close": 4000, "unilateral_close": 6000,
+                 "penalty": 6000, "min_acceptable": 1000, "max_acceptable": 100_000,
+                 "floor": 1000}
+        if style == "perkw":
+            return {"perkw": {k: v // 4 for k, v in perkb.items()}}
+        return {"perkb": perkb}
+
+    def rpc_setchannel(self, id: str, feebase: Optional[int] = None, feeppm: Optional[int] = None,
+                       **_ignored) -> Dict[str, Any]:
+        ch = self._by_scid.get(str(id).replace(":", "x"))
+        if ch is None:
+            raise ValueError(f"Could not find active channel {id}")
+        local = ch["updates"]["local"]
+        if feebase is not None:
+            ch["fee_base_msat"] = local["fee_base_msat"] = int(feebase)
+        if feeppm is not None:
+            ch["fee_proportional_millionths"] = local["fee_proportional_millionths"] = int(feeppm)
+        return {"channels": [{"peer_id": ch["peer_id"], "short_channel_id": ch["short_channel_id"],
+                              "fee_base_msat": ch["fee_base_msat"],
+                              "fee_proportional_millionths": ch["fee_proportional_millionths"]}]}
+
+    def rpc_plugin(self, subcommand: str = "list", **_ignored) -> Dict[str, Any]:
+        return {"command": subcommand, "plugins": [
+            {"name": "/usr/libexec/c-lightning/plugins/cl-revenue-ops.py", "active": True},
+            {"name": "/usr/libexec/c-lightning/plugins/sling", "active": True},
+        ]}
+
+
+class FakeRpc:
+    """In-process stand-in for plugin.rpc that counts calls per method."""
+
+    def __init__(self, node: SyntheticNode, latency: float = 0.0):
+        self.node = node
+        self.latency = latency
+        self.counts: Counter = Counter()
+
+    def call(self, method: str, payload: Any = None) -> Any:
+        self.counts[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return self.node.handle(method, payload)
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def method(*args, **kwargs):
+            return self.call(name, kwargs if kwargs or not args else list(args))
+        return method
+
+
+class FakePlugin:
+    """Minimal plugin: rpc plus a log that keeps only per-level counts."""
+
+    def __init__(self, rpc: FakeRpc):
+        self.rpc = rpc
+        self.log_counts: Counter = Counter()
+
+    def log(self, message: str, level: str = "info") -> None:
+        self.log_counts[level] += 1
@@ -30,13 +30,13 @@ License: MIT
 import os
 import time
 import json
-import random
 import threading
 import signal
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple, Any
 
 import multiprocessing
+import pickle
 import queue
 import uuid
 import traceback
@@ -49,8 +49,18 @@ from modules.rebalancer import EVRebalancer
 from modules.clboss_manager import ClbossManager
 from modules.config import Config
 from modules.database import Database
+from modules.forward_archive import ForwardArchive
 from modules.profitability_analyzer import ChannelProfitabilityAnalyzer
 from modules.capacity_planner import CapacityPlanner
+from modules.channel_state_model import ChannelStateModel
+from modules.htlc_tracker import HtlcTracker
+from modules.scheduler import Scheduler, Task
+from modules.adaptive_intervals import AdaptiveIntervals
+from modules.startup import StartupTracker
+from modules.warm_state import WarmStateStore
+from modules.rpc_metrics import RpcMetrics
+from modules.cycle_profiler import profiler as cycle_profiler
+from modules.openmetrics import MetricFamily, MetricsServer, metrics, write_textfile
 from modules.policy_manager import PolicyManager, FeeStrategy, RebalanceMode, PeerPolicy
 from modules.hive_bridge import HiveFeeIntelligenceBridge
 
@@ -278,11 +288,14 @@ class RpcBroker:
     - One broker process + one request queue + one response queue
     - Calls are serialized via an internal call lock (matches prior max_workers=1)
     - On timeout: terminate broker, recreate queues, restart broker, raise TimeoutError
+    - Results cross the queue pre-pickled, so their size is known for free
     """
 
-    def __init__(self, socket_path: str, plugin_instance: Plugin):
+    def __init__(self, socket_path: str, plugin_instance: Plugin,
+                 metrics: Optional[RpcMetrics] = None):
         self.socket_path = socket_path
         self._plugin = plugin_instance
+        self.metrics = metrics or RpcMetrics()
 
         # Use spawn for safety (avoid forking a process after threads have started).
         self._ctx = multiprocessing.get_context("spawn")
@@ -301,6 +314,7 @@ class RpcBroker:
     def _broker_main(socket_path: str, req_q, resp_q):
         # NOTE: Runs in a separate process.
         from pyln.client import LightningRpc, RpcError as _RpcError
+        import pickle as _pickle
         import traceback as _traceback
 
         rpc = LightningRpc(socket_path)
@@ -327,7 +341,8 @@ class RpcBroker:
                     # Generic rpc.call(method, payload)
                     result = rpc.call(method, {} if payload is None else payload)
 
-                resp_q.put({"id": req_id, "ok": True, "result": result})
+                blob = _pickle.dumps(result, protocol=_pickle.HIGHEST_PROTOCOL)
+                resp_q.put({"id": req_id, "ok": True, "result_blob": blob})
             except _RpcError as e:
                 # Serialize error details; caller reconstructs a compatible RpcError.
                 resp_q.put({
@@ -384,6 +399,7 @@ class RpcBroker:
     def restart(self, reason: str):
         # Keep logs rate-limited in caller layer; here we log once per restart.
         self._plugin.log(f"RPC broker restart: {reason}", level="warn")
+        self.metrics.record_restart(reason)
         self.stop()
         self.start()
 
@@ -400,7 +416,11 @@ class RpcBroker:
         if not method:
             raise RpcError("request", {}, "Empty RPC method")
 
+        wait_start = time.monotonic()
+        self.metrics.record_queued()
         with self._call_lock:
+            self.metrics.record_lock_wait(method, time.monotonic() - wait_start)
+
             # Broker may have died; restart defensively.
             if self._proc is None or (hasattr(self._proc, "is_alive") and not self._proc.is_alive()):
                 self.restart("broker not running")
@@ -431,7 +451,11 @@ class RpcBroker:
                 raise TimeoutError(f"RPC broker timeout on {method}")
 
             if resp.get("ok"):
-                return resp.get("result")
+                blob = resp.get("result_blob")
+                if blob is None:
+                    return resp.get("result")
+                self.metrics.record_response(method, len(blob))
+                return pickle.loads(blob)
 
             # Reconstruct a compatible RpcError in the main process.
             if resp.get("traceback"):
@@ -453,11 +477,13 @@ class ThreadSafeRpcProxy:
     - Bounded execution (RPC broker subprocess with hard timeouts)
     - Circuit Breaker (group-based cooldowns)
     - Broker restart on timeout (guarantees forward progress)
+    - Per-method latency / outcome metrics (broker.metrics)
     """
 
     def __init__(self, broker: RpcBroker, plugin_instance: Plugin):
         self._broker = broker
         self._plugin = plugin_instance
+        self._metrics = broker.metrics
         self._breakers: Dict[str, float] = {}
         self._log_history: Dict[Tuple[str, str], float] = {}
 
@@ -479,6 +505,9 @@ class ThreadSafeRpcProxy:
             return "revenue"
         if method_name == "listforwards":
             return "listforwards"
+        if method_name == "listchannels":
+            # Full-graph dumps are large; keep a slow one from tripping "general"
+            return "listchannels"
         return "general"
 
     def _should_log(self, group: str, msg_type: str, cooldown: int = 60) -> bool:
@@ -492,7 +521,7 @@ class ThreadSafeRpcProxy:
 
     def __getattr__(self, name):
         # Internal attribute access
-        if name in ("_broker", "_plugin", "_breakers", "_log_history",
+        if name in ("_broker", "_plugin", "_metrics", "_breakers", "_log_history",
                     "call", "_get_group", "_should_log"):
             return super().__getattribute__(name)
 
@@ -520,6 +549,7 @@ class ThreadSafeRpcProxy:
                     f"{datetime.fromtimestamp(until).strftime('%H:%M:%S')}. Skipping call.",
                     level="warn",
                 )
+            self._metrics.record_call(method_name, group, None, "breaker_open")
             raise RPCBreakerOpen(group, until)
 
         # 2. Timeouts from config
@@ -529,28 +559,39 @@ class ThreadSafeRpcProxy:
             timeout = config.rpc_timeout_seconds
             breaker_window = config.rpc_circuit_breaker_seconds
 
-        try:
-            # If payload is a list, this came from an attribute-style call like
-            # rpc.plugin("list") or rpc.listforwards(status="settled").
-            if isinstance(payload, list) or payload is None and kwargs:
-                args = payload if isinstance(payload, list) else []
-                return self._broker.request(
-                    kind="attr",
-                    method=method_name,
-                    args=args,
-                    kwargs=kwargs,
-                    timeout=timeout,
-                )
+        # Cycle profiler stage: cl-hive queries and setchannel are reported apart
+        if group == "hive" or method_name == "setchannel":
+            stage_name = group if group == "hive" else method_name
+        else:
+            stage_name = "rpc"
 
-            # Otherwise treat it as generic rpc.call(method, payload_dict).
-            return self._broker.request(
-                kind="call",
-                method=method_name,
-                payload={} if payload is None else payload,
-                timeout=timeout,
-            )
+        start = time.monotonic()
+        try:
+            with cycle_profiler.stage(stage_name):
+                # If payload is a list, this came from an attribute-style call like
+                # rpc.plugin("list") or rpc.listforwards(status="settled").
+                if isinstance(payload, list) or payload is None and kwargs:
+                    args = payload if isinstance(payload, list) else []
+                    result = self._broker.request(
+                        kind="attr",
+                        method=method_name,
+                        args=args,
+                        kwargs=kwargs,
+                        timeout=timeout,
+                    )
+                else:
+                    # Otherwise treat it as generic rpc.call(method, payload_dict).
+                    result = self._broker.request(
+                        kind="call",
+                        method=method_name,
+                        payload={} if payload is None else payload,
+                        timeout=timeout,
+                    )
+            self._metrics.record_call(method_name, group, time.monotonic() - start)
+            return result
 
         except TimeoutError:
+            self._metrics.record_call(method_name, group, time.monotonic() - start, "timeout")
             # Trip breaker on timeout and surface RPCTimeoutError
             self._breakers[group] = time.time() + breaker_window
             self._plugin.log(
@@ -560,8 +601,10 @@ class ThreadSafeRpcProxy:
             )
             raise RPCTimeoutError(method_name)
         except RpcError:
+            self._metrics.record_call(method_name, group, time.monotonic() - start, "rpc_error")
             raise
         except Exception as e:
+            self._metrics.record_call(method_name, group, time.monotonic() - start, "exception")
             self._plugin.log(f"RPC ERROR on {method_name}: {e}", level="error")
             raise
 
@@ -597,6 +640,14 @@ rpc_broker: Optional['RpcBroker'] = None  # RPC broker subprocess
 safe_plugin: Optional['ThreadSafePluginProxy'] = None  # Thread-safe plugin wrapper
 policy_manager: Optional[PolicyManager] = None  # v1.4: Peer policy management
 hive_bridge: Optional[HiveFeeIntelligenceBridge] = None  # v1.6: Hive intelligence
+portfolio_stats = None  # OnlinePortfolioStats, fed by forward_event (imported lazily)
+channel_state: Optional[ChannelStateModel] = None  # Notification-fed channel balances/states
+htlc_tracker: Optional[HtlcTracker] = None  # In-flight HTLCs per channel (htlc_accepted)
+scheduler: Optional[Scheduler] = None  # Runs all periodic background tasks
+adaptive_intervals: Optional[AdaptiveIntervals] = None  # Activity-scaled cycle intervals
+startup: Optional[StartupTracker] = None  # Startup phase timings and readiness flags
+warm_state: Optional[WarmStateStore] = None  # Warm-restart snapshot of in-memory state
+metrics_server: Optional[MetricsServer] = None  # Opt-in OpenMetrics HTTP exporter
 
 # SCID to Peer ID cache for reputation tracking
 # Maps short_channel_id -> peer_id for quick lookups
@@ -631,6 +682,78 @@ plugin.add_option(
     description='Interval in seconds for rebalance checks (default: 15 min)'
 )
 
+plugin.add_option(
+    name='revenue-ops-job-monitor-interval',
+    default='30',
+    description='Interval in seconds for checking active sling jobs (default: 30s)'
+)
+
+plugin.add_option(
+    name='revenue-ops-channel-state-reconcile-interval',
+    default='1800',
+    description='Interval in seconds for reconciling the event-driven channel state with listpeerchannels (default: 1800 = 30min)'
+)
+
+plugin.add_option(
+    name='revenue-ops-scheduler-max-workers',
+    default='3',
+    description='Maximum number of background tasks (cycles, snapshots, maintenance) running at once (default: 3)'
+)
+
+plugin.add_option(
+    name='revenue-ops-warm-state-interval',
+    default='900',
+    description='Seconds between warm-restart state snapshots; one is also written on clean shutdown (default: 900)'
+)
+
+plugin.add_option(
+    name='revenue-ops-metrics-port',
+    default='0',
+    description='Serve OpenMetrics/Prometheus metrics on 127.0.0.1:<port>/metrics (default: 0 = disabled)'
+)
+
+plugin.add_option(
+    name='revenue-ops-metrics-textfile',
+    default='',
+    description='Write Prometheus metrics atomically to this file for the node_exporter textfile collector (default: disabled)'
+)
+
+plugin.add_option(
+    name='revenue-ops-metrics-textfile-interval',
+    default='60',
+    description='Seconds between metrics textfile writes (default: 60)'
+)
+
+plugin.add_option(
+    name='revenue-ops-forward-archive-dir',
+    default='',
+    description='Move forwards pruned from the database into monthly archive files in this directory instead of dropping them (default: disabled)'
+)
+
+plugin.add_option(
+    name='revenue-ops-db-query-profile',
+    default='false',
+    description='Record per-statement SQL timings for revenue-db-stats (default: false)'
+)
+
+plugin.add_option(
+    name='revenue-ops-db-slow-query-ms',
+    default='250',
+    description='While profiling, log statements slower than this with their query plan (default: 250, 0 = off)'
+)
+
+plugin.add_option(
+    name='revenue-ops-db-convert-auto-vacuum',
+    default='false',
+    description='At startup, run the one-time VACUUM that lets a database created by older versions return free pages to the filesystem; blocks startup while it runs (default: false)'
+)
+
+plugin.add_option(
+    name='revenue-ops-adaptive-intervals',
+    default='false',
+    description='Shorten flow/fee/rebalance intervals during routing surges and stretch them when the node is quiet (default: false)'
+)
+
 plugin.add_option(
     name='revenue-ops-target-flow',
     default='100000',
@@ -812,10 +935,15 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
     2. Initialize the database
     3. Create instances of our analysis modules
     4. Set up timers for periodic execution
+
+    Anything that can wait (dependency checks, forwards hydration, peer
+    snapshot, hive discovery, channel state seeding) runs as one-shot
+    scheduler tasks so lightningd is not held up; see modules/startup.py.
     """
-    global flow_analyzer, fee_controller, rebalancer, clboss_manager, database, config, profitability_analyzer, capacity_planner, safe_plugin, policy_manager, hive_bridge
+    global flow_analyzer, fee_controller, rebalancer, clboss_manager, database, config, profitability_analyzer, capacity_planner, safe_plugin, policy_manager, hive_bridge, portfolio_stats, channel_state, scheduler, adaptive_intervals, startup, warm_state, metrics_server, htlc_tracker
     
     plugin.log("Initializing cl-revenue-ops plugin...")
+    startup = StartupTracker(plugin)
     
     # Build configuration from options
     config = Config(
@@ -823,6 +951,18 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
         flow_interval=int(options['revenue-ops-flow-interval']),
         fee_interval=int(options['revenue-ops-fee-interval']),
         rebalance_interval=int(options['revenue-ops-rebalance-interval']),
+        job_monitor_interval=int(options['revenue-ops-job-monitor-interval']),
+        channel_state_reconcile_interval=int(options['revenue-ops-channel-state-reconcile-interval']),
+        scheduler_max_workers=int(options['revenue-ops-scheduler-max-workers']),
+        enable_adaptive_intervals=options['revenue-ops-adaptive-intervals'].lower() == 'true',
+        warm_state_interval=int(options['revenue-ops-warm-state-interval']),
+        metrics_port=int(options['revenue-ops-metrics-port']),
+        metrics_textfile=options['revenue-ops-metrics-textfile'],
+        metrics_textfile_interval=int(options['revenue-ops-metrics-textfile-interval']),
+        forward_archive_dir=options['revenue-ops-forward-archive-dir'],
+        db_query_profile=options['revenue-ops-db-query-profile'].lower() == 'true',
+        db_slow_query_ms=int(options['revenue-ops-db-slow-query-ms']),
+        db_convert_auto_vacuum=options['revenue-ops-db-convert-auto-vacuum'].lower() == 'true',
         target_flow=int(options['revenue-ops-target-flow']),
         min_fee_ppm=int(options['revenue-ops-min-fee-ppm']),
         max_fee_ppm=int(options['revenue-ops-max-fee-ppm']),
@@ -857,6 +997,7 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
     plugin.log(f"Configuration loaded: target_flow={config.target_flow}, "
                f"fee_range=[{config.min_fee_ppm}, {config.max_fee_ppm}], "
                f"dry_run={config.dry_run}")
+    startup.checkpoint("config")
     
     # Create thread-safe RPC proxy (Phase 5.5: High-Uptime Stability)
     # All background threads share a single RPC connection - serialize access
@@ -879,55 +1020,20 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
     rpc_broker = RpcBroker(str(rpc_socket_path), plugin)
     safe_plugin = ThreadSafePluginProxy(plugin, rpc_broker)
     plugin.log(f"RPC broker initialized (socket={rpc_socket_path})", level="info")
+    startup.checkpoint("rpc_broker")
 
-    # =========================================================================
-    # STARTUP DEPENDENCY CHECKS (Phase 4: Stability & Scaling)
-    # Verify external plugins are available before initializing dependent modules
-    # =========================================================================
-    try:
-        # Try modern 'plugin list' command first, fallback to 'listplugins' for older nodes
-        try:
-            # Modern CLN (v23.08+)
-            plugins_result = safe_plugin.rpc.plugin("list")
-        except RpcError:
-            # Fallback for older CLN versions
-            plugins_result = safe_plugin.rpc.listplugins()
-            
-        active_plugins = [p.get("name", "").lower() for p in plugins_result.get("plugins", [])]
-        
-        # Check for sling plugin
-        sling_found = any("sling" in name for name in active_plugins)
-        if not sling_found:
-            plugin.log(
-                "Dependency 'sling' not found. Rebalancing module disabled. "
-                "Install cln-sling to enable rebalancing.",
-                level='warn'
-            )
-            config.sling_available = False
-        else:
-            plugin.log("Dependency check: sling plugin detected")
-            config.sling_available = True
-        
-        # Check for bookkeeper plugin
-        bookkeeper_found = any("bookkeeper" in name for name in active_plugins)
-        if not bookkeeper_found:
-            plugin.log(
-                "Dependency 'bookkeeper' not found. Using 'listforwards' fallback for flow analysis. "
-                "Enable bookkeeper for accurate cost tracking.",
-                level='info'
-            )
-        else:
-            plugin.log("Dependency check: bookkeeper plugin detected")
-            
-    except Exception as e:
-        plugin.log(f"Error checking plugin dependencies: {e}", level='warn')
-        # Assume plugins are available if check fails
-        config.sling_available = True
-    
-    
-    # Initialize database
+    # Initialize database (stays in init: notifications and RPC methods
+    # need the schema and migrations in place)
     database = Database(config.db_path, safe_plugin)
+    # Profiling follows db_query_profile (changeable with revenue-config)
+    database.query_profiler.config = config
     database.initialize()
+    # Opt-in: the full VACUUM holds the writer, so it runs here before
+    # forward_event ingestion starts rather than from run_maintenance()
+    if config.db_convert_auto_vacuum:
+        database.convert_auto_vacuum()
+    if config.forward_archive_dir:
+        database.set_forward_archive(ForwardArchive(config.forward_archive_dir, safe_plugin))
 
     # Issue #24: Clean up stale budget reservations on startup
     # Reservations from crashed jobs should be released immediately
@@ -944,84 +1050,15 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
     except Exception as e:
         plugin.log(f"Warning: Could not load config overrides: {e}", level='warn')
     
-    # =========================================================================
-    # FORWARDS TABLE HYDRATION (TODO #19: Double-Dip Fix)
-    # =========================================================================
-    # The forwards table is populated in real-time by forward_event hook.
-    # However, when the plugin restarts, we may have gaps in the data.
-    # This hydration fills those gaps by calling listforwards RPC ONCE on startup.
-    # After this, flow_analysis.py uses only local DB (no more RPC calls).
-    # =========================================================================
+    # Where the forwards hydration starts. Read now, before forward_event
+    # inserts newer rows; the hydration itself runs in the background.
     try:
-        # Check DB head: get timestamp of the most recent forward
         last_forward_ts = database.get_latest_forward_timestamp()
-        
-        if last_forward_ts is None:
-            # Empty database - hydrate from flow_window_days ago (or 14 days default)
-            hydrate_days = max(config.flow_window_days, 14)
-            start_time = int(time.time()) - (hydrate_days * 86400)
-            plugin.log(f"Forwards table empty. Hydrating last {hydrate_days} days of forwards...")
-        else:
-            # Have data - only fetch what we missed while offline
-            start_time = max(0, last_forward_ts - 3600)
-            plugin.log(f"Hydrating forwards since {time.strftime('%Y-%m-%d %H:%M', time.localtime(start_time))}...")
-        
-        # Fetch from RPC - this is the ONLY listforwards call we make
-        # CLN's listforwards doesn't support 'since' natively, so we filter client-side
-        result = safe_plugin.rpc.listforwards(status="settled")
-        forwards_to_insert = []
-        
-        for fwd in result.get("forwards", []):
-            received_time = fwd.get("received_time", 0)
-            if received_time > start_time:
-                forwards_to_insert.append({
-                    'in_channel': fwd.get("in_channel", ""),
-                    'out_channel': fwd.get("out_channel", ""),
-                    'in_msat': fwd.get("in_msat", fwd.get("in_msatoshi", 0)),
-                    'out_msat': fwd.get("out_msat", fwd.get("out_msatoshi", 0)),
-                    'fee_msat': fwd.get("fee_msat", fwd.get("fee_msatoshi", 0)),
-                    'resolution_time': (fwd.get("resolved_time", 0) - received_time) if fwd.get("resolved_time") else 0,
-                    'received_time': received_time,
-                    'resolved_time': int(fwd.get("resolved_time", 0) or 0)
-                })
-        
-        if forwards_to_insert:
-            inserted = database.bulk_insert_forwards(forwards_to_insert)
-            plugin.log(f"Hydration complete: inserted {inserted} forwards into local database")
-        else:
-            plugin.log("Hydration complete: no new forwards to insert")
-            
-    except Exception as e:
-        plugin.log(f"Warning: Forwards hydration failed: {e}", level='warn')
-        # Non-fatal - flow analysis will work with whatever data we have
-    
-    # Snapshot currently connected peers for baseline state on restart
-    # This establishes a known state for uptime tracking after plugin restarts
-    try:
-        peers = safe_plugin.rpc.listpeers()
-        total_peers = len(peers.get("peers", []))
-        connected_peers = 0
-        snapshot_count = 0
-        
-        plugin.log(f"Checking {total_peers} peers for connection snapshot...")
-        
-        for peer in peers.get("peers", []):
-            if peer.get("connected", False):
-                connected_peers += 1
-                peer_id = peer["id"]
-                # Only insert snapshot if no recent history exists (within 1 hour)
-                has_recent = database.has_recent_connection_history(peer_id, 3600)
-                plugin.log(f"Peer {peer_id[:12]}... is connected, has_recent_history={has_recent}", level='debug')
-                if not has_recent:
-                    database.record_connection_event(peer_id, "snapshot")
-                    snapshot_count += 1
-        
-        plugin.log(f"Connection baseline: {connected_peers} connected peers, snapshotted {snapshot_count} new peers")
     except Exception as e:
-        plugin.log(f"Error snapshotting peer connections: {e}", level='warn')
-        import traceback
-        plugin.log(f"Traceback: {traceback.format_exc()}", level='warn')
-    
+        last_forward_ts = None
+        plugin.log(f"Warning: Could not read forwards table head: {e}", level='warn')
+    startup.checkpoint("database")
+
     # Initialize clboss manager (handles unmanage commands)
     clboss_manager = ClbossManager(safe_plugin, config)
     
@@ -1039,45 +1076,11 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
         plugin.log("All fee optimization and rebalancing will use local-only algorithms")
         plugin.log("To join a hive, set revenue-ops-hive-enabled=auto or true")
         plugin.log("=" * 60)
+        startup.mark_ready("hive")
     else:
-        # Auto or required hive mode
-        # Retry a few times in case cl-hive loads after us
+        # Auto or required hive mode; availability is discovered by the
+        # startup-hive-discovery task (cl-hive may load after us)
         hive_bridge = HiveFeeIntelligenceBridge(safe_plugin, database)
-        hive_available = False
-        for attempt in range(3):
-            hive_available = hive_bridge.is_available()
-            if hive_available:
-                break
-            if attempt < 2:
-                plugin.log(f"Waiting for cl-hive (attempt {attempt + 1}/3)...")
-                time.sleep(5)
-
-        if config.hive_enabled == 'true' and not hive_available:
-            # Required mode but hive not available - warn but continue
-            plugin.log("=" * 60, level='warn')
-            plugin.log("WARNING: hive-enabled=true but hive mode not active!", level='warn')
-            plugin.log("Possible reasons:", level='warn')
-            plugin.log("  - cl-hive plugin not loaded", level='warn')
-            plugin.log("  - Node not yet a hive member (open channel to a member)", level='warn')
-            plugin.log("Hive features will be unavailable until membership established", level='warn')
-            plugin.log("Plugin will continue in standalone mode", level='warn')
-            plugin.log("=" * 60, level='warn')
-        elif hive_available:
-            plugin.log("=" * 60)
-            plugin.log("HIVE MODE ACTIVE: Authenticated hive member")
-            plugin.log("Hive features enabled:")
-            plugin.log("  - Coordinated fee recommendations")
-            plugin.log("  - Fleet-wide fee intelligence")
-            plugin.log("  - Rebalancing conflict detection")
-            plugin.log("  - Collective defense against drain attacks")
-            plugin.log("  - Anticipatory liquidity predictions")
-            plugin.log("=" * 60)
-        else:
-            plugin.log("=" * 60)
-            plugin.log("STANDALONE MODE: Not a hive member (hive-enabled=auto)")
-            plugin.log("All fee optimization and rebalancing will use local-only algorithms")
-            plugin.log("To join a hive: open a channel to any hive member")
-            plugin.log("=" * 60)
 
     # Initialize profitability analyzer with hive bridge for NNLB health reporting
     profitability_analyzer = ChannelProfitabilityAnalyzer(
@@ -1093,174 +1096,337 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
         hive_bridge=hive_bridge
     )
     rebalancer.set_profitability_analyzer(profitability_analyzer)
+
+    # Event-driven channel state, seeded by the first channel-state-reconcile
+    # run; modules fall back to listpeerchannels until then
+    channel_state = ChannelStateModel(safe_plugin)
+    for module in (flow_analyzer, fee_controller, rebalancer, profitability_analyzer):
+        module.set_channel_state(channel_state)
+
+    # Live HTLC slot usage, synced with listpeerchannels on each reconcile
+    htlc_tracker = HtlcTracker(config)
+    flow_analyzer.set_htlc_tracker(htlc_tracker)
+    fee_controller.set_htlc_tracker(htlc_tracker)
+
+    # Activity tracking for adaptive cycle intervals (seeded after hydration)
+    adaptive_intervals = AdaptiveIntervals(
+        config, mempool_intensity=lambda: fee_controller.mempool_intensity
+    )
+
+    # Warm-restart snapshot: saved periodically and on SIGTERM, restored by
+    # the startup-warm-state task
+    warm_state = WarmStateStore(plugin, database, PLUGIN_VERSION)
+    warm_state.register(
+        "fee_controller", fee_controller.export_warm_state, fee_controller.restore_warm_state
+    )
+    warm_state.register("channel_state", channel_state.export_rows, channel_state.restore)
+    warm_state.register("scid_to_peer", lambda: dict(_scid_to_peer_cache), _restore_scid_cache)
+    if hive_bridge is not None:
+        warm_state.register(
+            "hive_cache", hive_bridge.export_cache,
+            lambda entries, created_at: hive_bridge.restore_cache(entries)
+        )
+    startup.checkpoint("modules")
     
-    # Set up periodic background tasks using threading
-    # Note: plugin.log() is safe to call from threads in pyln-client
-    # We use daemon threads so they don't block shutdown
-    
-    def flow_analysis_loop():
-        """Background loop for flow analysis."""
-        # Initial delay to let lightningd fully start (interruptible)
-        if shutdown_event.wait(10):
-            plugin.log("Flow analysis loop cancelled during startup delay")
-            return
-        
-        while not shutdown_event.is_set():
+    # =========================================================================
+    # DEFERRED STARTUP (one-shot scheduler tasks; readiness in `startup`)
+    # =========================================================================
+
+    def check_dependencies():
+        """
+        STARTUP DEPENDENCY CHECKS (Phase 4: Stability & Scaling)
+
+        Verify external plugins are available, then clean up sling state
+        left by a previous run. Rebalance checks and the job monitor run
+        after this task.
+        """
+        try:
+            # Try modern 'plugin list' command first, fallback to 'listplugins' for older nodes
             try:
-                plugin.log("Running scheduled flow analysis...")
-                run_flow_analysis()
-                
-                # Run cleanup on each iteration (it's a fast DELETE query)
-                # Keeps history tables from growing unbounded over months
-                # Use flow_window_days + 1 day buffer, minimum 8 days
-                if database:
-                    days_to_keep = max(8, config.flow_window_days + 1)
-                    database.cleanup_old_data(days_to_keep=days_to_keep)
-                
-            except (RPCTimeoutError, RPCBreakerOpen) as e:
-                plugin.log(f"RPC degraded in flow analysis: {e}. Skipping this cycle.", level='warn')
-            except Exception as e:
-                plugin.log(f"Error in flow analysis: {e}", level='error')
+                # Modern CLN (v23.08+)
+                plugins_result = safe_plugin.rpc.plugin("list")
+            except RpcError:
+                # Fallback for older CLN versions
+                plugins_result = safe_plugin.rpc.listplugins()
             
-            # Calculate +/- 20% jitter
-            jitter_seconds = int(config.flow_interval * 0.2)
-            sleep_time = config.flow_interval + random.randint(-jitter_seconds, jitter_seconds)
-            plugin.log(f"Flow analysis sleeping for {sleep_time}s")
-            
-            # Interruptible sleep: wait for timeout OR shutdown signal
-            if shutdown_event.wait(sleep_time):
-                plugin.log("Flow analysis loop stopping due to shutdown signal")
-                break
-    
-    def fee_adjustment_loop():
-        """Background loop for fee adjustment."""
-        # Initial delay to let flow analysis run first (interruptible)
-        if shutdown_event.wait(60):
-            plugin.log("Fee adjustment loop cancelled during startup delay")
-            return
+            active_plugins = [p.get("name", "").lower() for p in plugins_result.get("plugins", [])]
         
-        while not shutdown_event.is_set():
-            try:
-                plugin.log("Running scheduled fee adjustment...")
-                run_fee_adjustment()
-            except (RPCTimeoutError, RPCBreakerOpen) as e:
-                plugin.log(f"RPC degraded in fee adjustment: {e}. Skipping this cycle.", level='warn')
-            except Exception as e:
-                plugin.log(f"Error in fee adjustment: {e}", level='error')
-            
-            # Calculate +/- 20% jitter
-            jitter_seconds = int(config.fee_interval * 0.2)
-            sleep_time = config.fee_interval + random.randint(-jitter_seconds, jitter_seconds)
-            plugin.log(f"Fee adjustment sleeping for {sleep_time}s")
+            # Check for sling plugin
+            sling_found = any("sling" in name for name in active_plugins)
+            if not sling_found:
+                plugin.log(
+                    "Dependency 'sling' not found. Rebalancing module disabled. "
+                    "Install cln-sling to enable rebalancing.",
+                    level='warn'
+                )
+                config.sling_available = False
+            else:
+                plugin.log("Dependency check: sling plugin detected")
+                config.sling_available = True
+        
+            # Check for bookkeeper plugin
+            bookkeeper_found = any("bookkeeper" in name for name in active_plugins)
+            if not bookkeeper_found:
+                plugin.log(
+                    "Dependency 'bookkeeper' not found. Using 'listforwards' fallback for flow analysis. "
+                    "Enable bookkeeper for accurate cost tracking.",
+                    level='info'
+                )
+            else:
+                plugin.log("Dependency check: bookkeeper plugin detected")
             
-            # Interruptible sleep: wait for timeout OR shutdown signal
-            if shutdown_event.wait(sleep_time):
-                plugin.log("Fee adjustment loop stopping due to shutdown signal")
-                break
-    
-    def rebalance_check_loop():
-        """Background loop for rebalance checks."""
-        # Skip rebalancing entirely if sling is not available
+        except Exception as e:
+            plugin.log(f"Error checking plugin dependencies: {e}", level='warn')
+            # Assume plugins are available if check fails
+            config.sling_available = True
+
         if not config.sling_available:
             plugin.log("Rebalance loop disabled: sling plugin not found")
-            return
-        
-        # Initial delay to let other analyses run first (interruptible)
-        if shutdown_event.wait(120):
-            plugin.log("Rebalance check loop cancelled during startup delay")
-            return
-        
-        while not shutdown_event.is_set():
+        else:
+            # STARTUP HYGIENE: Clean up orphan jobs from previous runs
             try:
-                plugin.log("Running scheduled rebalance check...")
-                run_rebalance_check()
-            except (RPCTimeoutError, RPCBreakerOpen) as e:
-                plugin.log(f"RPC degraded in rebalance check: {e}. Skipping this cycle.", level='warn')
+                rebalancer.job_manager.cleanup_orphans()
             except Exception as e:
-                plugin.log(f"Error in rebalance check: {e}", level='error')
-            
-            # Calculate +/- 20% jitter
-            jitter_seconds = int(config.rebalance_interval * 0.2)
-            sleep_time = config.rebalance_interval + random.randint(-jitter_seconds, jitter_seconds)
-            plugin.log(f"Rebalance check sleeping for {sleep_time}s")
-            
-            # Interruptible sleep: wait for timeout OR shutdown signal
-            if shutdown_event.wait(sleep_time):
-                plugin.log("Rebalance check loop stopping due to shutdown signal")
-                break
-    
-    def snapshot_peers_delayed():
+                plugin.log(f"Warning: Could not clean up orphan jobs: {e}", level='warn')
+
+            # PHASE 6: Sync peer exclusions with sling on startup
+            try:
+                rebalancer.job_manager.sync_peer_exclusions(policy_manager)
+            except Exception as e:
+                plugin.log(f"Warning: Could not sync peer exclusions: {e}", level='warn')
+        startup.mark_ready("dependencies")
+
+    def hydrate_forwards():
         """
-        One-time delayed snapshot of connected peers.
-        
-        Sleeps to allow lightningd to establish connections, then records
-        a snapshot for all currently connected peers. Exits after completion.
+        FORWARDS TABLE HYDRATION (TODO #19: Double-Dip Fix)
+
+        The forwards table is populated in real-time by forward_event hook.
+        However, when the plugin restarts, we may have gaps in the data.
+        This hydration fills those gaps by calling listforwards RPC ONCE on
+        startup. After this, flow_analysis.py uses only local DB (no more
+        RPC calls); flow analysis runs after this task.
         """
-        delay_seconds = 60
-        plugin.log(f"Startup snapshot: waiting {delay_seconds}s for network connections...")
+        global portfolio_stats
+
+        with startup.phase("forwards_hydration"):
+            try:
+                # DB head (timestamp of the most recent forward) was read in init
+                if last_forward_ts is None:
+                    # Empty database - hydrate from flow_window_days ago (or 14 days default)
+                    hydrate_days = max(config.flow_window_days, 14)
+                    start_time = int(time.time()) - (hydrate_days * 86400)
+                    plugin.log(f"Forwards table empty. Hydrating last {hydrate_days} days of forwards...")
+                else:
+                    # Have data - only fetch what we missed while offline
+                    start_time = max(0, last_forward_ts - 3600)
+                    plugin.log(f"Hydrating forwards since {time.strftime('%Y-%m-%d %H:%M', time.localtime(start_time))}...")
         
-        # Interruptible delay
-        if shutdown_event.wait(delay_seconds):
-            plugin.log("Startup snapshot cancelled due to shutdown signal")
-            return
+                # Fetch from RPC - this is the ONLY listforwards call we make
+                # CLN's listforwards doesn't support 'since' natively, so we filter client-side
+                result = safe_plugin.rpc.listforwards(status="settled")
+                forwards_to_insert = []
         
-        try:
-            peers = safe_plugin.rpc.listpeers()
-            connected_count = 0
-            snapshot_count = 0
-            
-            for peer in peers.get("peers", []):
-                if peer.get("connected", False):
-                    connected_count += 1
-                    peer_id = peer["id"]
-                    # Only snapshot if no recent history exists
-                    if not database.has_recent_connection_history(peer_id, 3600):
-                        database.record_connection_event(peer_id, "snapshot")
-                        snapshot_count += 1
+                for fwd in result.get("forwards", []):
+                    received_time = fwd.get("received_time", 0)
+                    if received_time > start_time:
+                        forwards_to_insert.append({
+                            'in_channel': fwd.get("in_channel", ""),
+                            'out_channel': fwd.get("out_channel", ""),
+                            'in_msat': fwd.get("in_msat", fwd.get("in_msatoshi", 0)),
+                            'out_msat': fwd.get("out_msat", fwd.get("out_msatoshi", 0)),
+                            'fee_msat': fwd.get("fee_msat", fwd.get("fee_msatoshi", 0)),
+                            'resolution_time': (fwd.get("resolved_time", 0) - received_time) if fwd.get("resolved_time") else 0,
+                            'received_time': received_time,
+                            'resolved_time': int(fwd.get("resolved_time", 0) or 0)
+                        })
+        
+                if forwards_to_insert:
+                    inserted = database.bulk_insert_forwards(forwards_to_insert)
+                    plugin.log(f"Hydration complete: inserted {inserted} forwards into local database")
+                else:
+                    plugin.log("Hydration complete: no new forwards to insert")
             
-            plugin.log(f"Startup snapshot: Recorded {snapshot_count} of {connected_count} connected peers")
+            except Exception as e:
+                plugin.log(f"Warning: Forwards hydration failed: {e}", level='warn')
+                # Non-fatal - flow analysis will work with whatever data we have
+        startup.mark_ready("forwards")
+
+        # Seed online portfolio statistics from the (now hydrated) forwards table.
+        # From here on forward_event keeps them current, so portfolio RPCs no
+        # longer pull bkpr-listincome/listforwards.
+        with startup.phase("portfolio_stats"):
+            try:
+                from modules.portfolio_optimizer import OnlinePortfolioStats, PORTFOLIO_WINDOW_DAYS
+                stats = OnlinePortfolioStats()
+                # Published before the query: forward_event buffers into it
+                # and seed() applies whatever the query did not return
+                stats.begin_seed()
+                portfolio_stats = stats
+                seeded = stats.seed(
+                    database.get_forwards_since(int(time.time()) - PORTFOLIO_WINDOW_DAYS * 86400),
+                    since=database.get_oldest_forward_timestamp()
+                )
+                plugin.log(f"Portfolio statistics seeded from {seeded} forwards")
+            except Exception as e:
+                portfolio_stats = None
+                plugin.log(f"Warning: Could not seed portfolio statistics: {e}", level='warn')
+        startup.mark_ready("portfolio_stats")
+
+        # Adaptive interval baseline from the last day of forwards
+        try:
+            totals = database.get_forward_totals_since(int(time.time()) - 86400)
+            adaptive_intervals.seed(totals["forward_count"], totals["volume_msat"], 86400)
         except Exception as e:
-            plugin.log(f"Error in delayed snapshot: {e}", level='warn')
-            import traceback
-            plugin.log(f"Traceback: {traceback.format_exc()}", level='warn')
+            plugin.log(f"Could not seed adaptive intervals: {e}", level='warn')
+
+    def restore_warm_state():
+        """Bulk-load the warm-restart snapshot before the first cycles."""
+        with startup.phase("warm_state"):
+            warm_state.load()
+            loaded = flow_analyzer.preload_kalman_filters()
+            plugin.log(f"Preloaded {loaded} Kalman filters")
+        startup.mark_ready("warm_state")
+
+    def discover_hive():
+        """Hive availability, retried a few times in case cl-hive loads after us."""
+        with startup.phase("hive_discovery"):
+            hive_available = False
+            for attempt in range(3):
+                hive_available = hive_bridge.is_available()
+                if hive_available:
+                    break
+                if attempt < 2:
+                    plugin.log(f"Waiting for cl-hive (attempt {attempt + 1}/3)...")
+                    if shutdown_event.wait(5):
+                        return
+
+            if config.hive_enabled == 'true' and not hive_available:
+                # Required mode but hive not available - warn but continue
+                plugin.log("=" * 60, level='warn')
+                plugin.log("WARNING: hive-enabled=true but hive mode not active!", level='warn')
+                plugin.log("Possible reasons:", level='warn')
+                plugin.log("  - cl-hive plugin not loaded", level='warn')
+                plugin.log("  - Node not yet a hive member (open channel to a member)", level='warn')
+                plugin.log("Hive features will be unavailable until membership established", level='warn')
+                plugin.log("Plugin will continue in standalone mode", level='warn')
+                plugin.log("=" * 60, level='warn')
+            elif hive_available:
+                plugin.log("=" * 60)
+                plugin.log("HIVE MODE ACTIVE: Authenticated hive member")
+                plugin.log("Hive features enabled:")
+                plugin.log("  - Coordinated fee recommendations")
+                plugin.log("  - Fleet-wide fee intelligence")
+                plugin.log("  - Rebalancing conflict detection")
+                plugin.log("  - Collective defense against drain attacks")
+                plugin.log("  - Anticipatory liquidity predictions")
+                plugin.log("=" * 60)
+            else:
+                plugin.log("=" * 60)
+                plugin.log("STANDALONE MODE: Not a hive member (hive-enabled=auto)")
+                plugin.log("All fee optimization and rebalancing will use local-only algorithms")
+                plugin.log("To join a hive: open a channel to any hive member")
+                plugin.log("=" * 60)
+        startup.mark_ready("hive")
+
+    # Periodic background work runs as tasks of a single scheduler (see
+    # modules/scheduler.py): one dispatcher orders the cycles by priority and
+    # dependencies instead of independent loops competing for the RPC broker
+    # and the SQLite writer.
+    # Note: plugin.log() is safe to call from threads in pyln-client
+
+    def run_scheduled_flow_analysis():
+        plugin.log("Running scheduled flow analysis...")
+        run_flow_analysis()
+
+    def run_scheduled_fee_adjustment():
+        plugin.log("Running scheduled fee adjustment...")
+        run_fee_adjustment()
+
+    def run_scheduled_rebalance_check():
+        plugin.log("Running scheduled rebalance check...")
+        run_rebalance_check()
 
-    def financial_snapshot_loop():
+    def run_maintenance():
         """
-        Background loop for daily financial snapshots (Phase 8: Dashboard).
+        Database pruning, incremental vacuum, WAL checkpoint and the
+        portfolio statistics drift check.
 
-        Takes a snapshot of TLV, balances, and accumulated P&L metrics
-        once every 24 hours for historical trend analysis.
+        Runs in idle windows. Pruning and vacuum work in short transactions
+        under a time budget, so forward_event inserts are never held up for
+        long; whatever is left over is done by the next run.
         """
-        SNAPSHOT_INTERVAL = 86400  # 24 hours in seconds
+        # Keeps history tables from growing unbounded over months
+        # Use flow_window_days + 1 day buffer, minimum 8 days, and at least
+        # the portfolio window so a restart can reseed it from the database
+        if database:
+            from modules.portfolio_optimizer import PORTFOLIO_WINDOW_DAYS
+            days_to_keep = max(8, config.flow_window_days + 1, PORTFOLIO_WINDOW_DAYS + 1)
+            database.cleanup_old_data(days_to_keep=days_to_keep)
+            database.reclaim_space()
+            database.checkpoint_wal()
+
+        # Full recompute of the online portfolio statistics to catch
+        # floating-point drift in the running moments
+        if portfolio_stats is not None:
+            report = portfolio_stats.verify()
+            plugin.log(
+                f"Portfolio statistics verified: {report['channels']} channels, "
+                f"max drift {report['max_rel_drift']:.2e}",
+                level='debug' if report['drift_ok'] else 'warn'
+            )
 
-        # Initial delay: wait 5 minutes to let everything stabilize
-        if shutdown_event.wait(300):
-            plugin.log("Financial snapshot loop cancelled during startup delay")
+    def monitor_sling_jobs():
+        """
+        Sling job monitoring on a short cadence, independent of
+        rebalance_interval, so finished jobs free their slots within seconds.
+        """
+        if rebalancer.job_manager.active_job_count == 0:
             return
+        result = rebalancer.job_manager.monitor_jobs()
+        finished = result['completed'] + result['failed'] + result['timed_out']
+        if finished:
+            plugin.log(
+                f"Job monitor: {result['completed']} completed, "
+                f"{result['failed']} failed, {result['timed_out']} timed out, "
+                f"{result['still_running']} running"
+            )
 
-        # Take an initial snapshot on startup
-        try:
-            _take_financial_snapshot()
-        except Exception as e:
-            plugin.log(f"Error taking initial financial snapshot: {e}", level='warn')
-
-        while not shutdown_event.is_set():
-            # Calculate +/- 10% jitter (about 2.4 hours variance)
-            jitter_seconds = int(SNAPSHOT_INTERVAL * 0.1)
-            sleep_time = SNAPSHOT_INTERVAL + random.randint(-jitter_seconds, jitter_seconds)
-            plugin.log(f"Financial snapshot sleeping for {sleep_time // 3600}h {(sleep_time % 3600) // 60}m")
-
-            # Interruptible sleep
-            if shutdown_event.wait(sleep_time):
-                plugin.log("Financial snapshot loop stopping due to shutdown signal")
-                break
+    def reconcile_channel_state():
+        """
+        Correct drift of the notification-fed channel state against
+        listpeerchannels and log what was found.
+        """
+        report = channel_state.reconcile()
+        htlc_tracker.sync(channel_state.channels())
+        if ChannelStateModel.has_discrepancies(report):
+            plugin.log(
+                f"Channel state reconcile: {report['drifted_channels']} drifted "
+                f"(total {report['total_drift_msat'] // 1000} sats, "
+                f"max {report['max_drift_msat'] // 1000} sats), "
+                f"{report['state_mismatches']} state / "
+                f"{report['connectivity_mismatches']} connectivity mismatches, "
+                f"{len(report['missing_channels'])} missing, "
+                f"{len(report['stale_channels'])} stale"
+            )
+        elif report is None:
+            plugin.log(f"Channel state seeded with {len(channel_state)} channels")
+        startup.mark_ready("channel_state")
 
-            try:
-                _take_financial_snapshot()
-            except (RPCTimeoutError, RPCBreakerOpen) as e:
-                plugin.log(f"RPC degraded in financial snapshot: {e}. Skipping this cycle.", level='warn')
-            except Exception as e:
-                plugin.log(f"Error in financial snapshot: {e}", level='error')
+    def snapshot_connected_peers():
+        """
+        One-time snapshot of connected peers, delayed to allow lightningd to
+        establish connections. Establishes a known state for uptime tracking
+        after plugin restarts.
+        """
+        with startup.phase("peer_snapshot"):
+            peers = safe_plugin.rpc.listpeers()
+            connected = [p["id"] for p in peers.get("peers", []) if p.get("connected", False)]
+            # Only snapshot peers without recent history (within 1 hour)
+            snapshot_count = database.record_connection_snapshots(connected, 3600)
+            plugin.log(
+                f"Startup snapshot: Recorded {snapshot_count} of {len(connected)} connected peers"
+            )
+        startup.mark_ready("peer_snapshot")
 
     def _take_financial_snapshot():
         """Take a single financial snapshot and record it to the database."""
@@ -1317,6 +1483,20 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
             except Exception as e:
                 plugin.log(f"Error stopping rebalance jobs: {e}", level='warn')
         
+        # Warm-restart snapshot (skipped if the previous one was never
+        # restored - it would be replaced by cold state)
+        if warm_state and startup.is_ready("warm_state"):
+            try:
+                warm_state.save(reason="shutdown")
+            except Exception as e:
+                plugin.log(f"Error saving warm state: {e}", level='warn')
+
+        if metrics_server:
+            try:
+                metrics_server.stop()
+            except Exception:
+                pass
+
         # Stop RPC broker subprocess
         if rpc_broker:
             try:
@@ -1333,28 +1513,128 @@ def init(options: Dict[str, Any], configuration: Dict[str, Any], plugin: Plugin,
 
     signal.signal(signal.SIGTERM, handle_shutdown_signal)
     
-    # =========================================================================
-    # STARTUP HYGIENE: Clean up orphan jobs from previous runs
-    # =========================================================================
-    if rebalancer and config.sling_available:
-        try:
-            rebalancer.job_manager.cleanup_orphans()
-        except Exception as e:
-            plugin.log(f"Warning: Could not clean up orphan jobs: {e}", level='warn')
-
-        # PHASE 6: Sync peer exclusions with sling on startup
+    # Start the background scheduler (daemon threads, exits on shutdown_event)
+    # Intervals get +/- 20% jitter (10% for the daily snapshot); the initial
+    # delays let lightningd settle and flow analysis run before the others.
+    # The startup-* tasks finish what init() deferred, most urgent first.
+    sling_enabled = lambda: config.sling_available
+    scheduler = Scheduler(
+        plugin, shutdown_event,
+        max_workers=config.scheduler_max_workers,
+        degraded_errors=(RPCTimeoutError, RPCBreakerOpen),
+        # Workers are long-lived: each keeps one read connection across runs
+        on_worker_exit=database.close_connection
+    )
+    scheduler.add(Task(
+        "startup-dependencies", check_dependencies, 0,
+        priority=0, one_shot=True
+    ))
+    scheduler.add(Task(
+        "startup-warm-state", restore_warm_state, 0,
+        priority=1, one_shot=True
+    ))
+    scheduler.add(Task(
+        "startup-hydration", hydrate_forwards, 0,
+        priority=5, one_shot=True
+    ))
+    if hive_bridge is not None:
+        scheduler.add(Task(
+            "startup-hive-discovery", discover_hive, 0,
+            priority=8, one_shot=True
+        ))
+    scheduler.add(Task(
+        "job-monitor", monitor_sling_jobs, lambda: config.job_monitor_interval,
+        priority=10, enabled=sling_enabled, blocks_idle=False,
+        after=("startup-dependencies",)
+    ))
+    scheduler.add(Task(
+        "channel-state-reconcile", reconcile_channel_state,
+        # The first run seeds the model; retry a failed seed after a minute
+        lambda: config.channel_state_reconcile_interval if channel_state.ready else 60,
+        priority=20, jitter=0.2
+    ))
+    def fee_cycle_interval():
+        # Adaptive mode: wake up when the next observation window closes
+        due = fee_controller.next_observation_due() if adaptive_intervals.enabled else None
+        due_in = due - time.time() if due is not None else None
+        return adaptive_intervals.interval("fee", config.fee_interval, due_in=due_in)
+
+    scheduler.add(Task(
+        "flow-analysis", run_scheduled_flow_analysis,
+        lambda: adaptive_intervals.interval("flow", config.flow_interval),
+        priority=30, jitter=0.2, initial_delay=10,
+        after=("startup-warm-state", "startup-hydration")
+    ))
+    scheduler.add(Task(
+        "fee-adjustment", run_scheduled_fee_adjustment, fee_cycle_interval,
+        priority=40, jitter=0.2, initial_delay=60, after=("flow-analysis",)
+    ))
+    scheduler.add(Task(
+        "rebalance-check", run_scheduled_rebalance_check,
+        lambda: adaptive_intervals.interval("rebalance", config.rebalance_interval),
+        priority=50, jitter=0.2, initial_delay=120, enabled=sling_enabled,
+        after=("startup-dependencies",), conflicts=("flow-analysis", "fee-adjustment")
+    ))
+    scheduler.add(Task(
+        "startup-snapshot", snapshot_connected_peers, 0,
+        priority=60, initial_delay=60, one_shot=True
+    ))
+    scheduler.add(Task(
+        "financial-snapshot", _take_financial_snapshot, 86400,
+        priority=70, jitter=0.1, initial_delay=300
+    ))
+    scheduler.add(Task(
+        "warm-state-snapshot", lambda: warm_state.save(), lambda: config.warm_state_interval,
+        priority=80, initial_delay=config.warm_state_interval,
+        enabled=lambda: startup.is_ready("warm_state"),
+        conflicts=("flow-analysis", "fee-adjustment")
+    ))
+    scheduler.add(Task(
+        "maintenance", run_maintenance, lambda: config.flow_interval,
+        priority=90, initial_delay=600, idle_only=True,
+        max_delay=6 * 3600  # Run anyway if no idle window for 6h
+    ))
+    if database.forwards_migration_pending:
+        # One-time copy of the legacy forwards table into the compact layout
+        scheduler.add(Task(
+            "forwards-migration", database.migrate_forwards_compact, 0,
+            priority=95, initial_delay=300, one_shot=True, idle_only=True,
+            max_delay=24 * 3600, after=("startup-hydration",), conflicts=("maintenance",)
+        ))
+
+    # Metrics exporter (opt-in). Collectors only read in-memory state, so a
+    # scrape never issues RPC or SQL
+    metrics.register_collector("rpc", rpc_broker.metrics.collect_metrics)
+    metrics.register_collector("scheduler", scheduler.collect_metrics)
+    metrics.register_collector("channel_state", channel_state.collect_metrics)
+    metrics.register_collector("htlc_tracker", htlc_tracker.collect_metrics)
+    metrics.register_collector("database", _database_file_metrics)
+    metrics.register_collector("database_maintenance", database.collect_metrics)
+    metrics.register_collector("database_writer", database.writer.collect_metrics)
+    if config.metrics_port:
         try:
-            rebalancer.job_manager.sync_peer_exclusions(policy_manager)
-        except Exception as e:
-            plugin.log(f"Warning: Could not sync peer exclusions: {e}", level='warn')
-    
-    # Start background threads (daemon=True so they don't block shutdown)
-    threading.Thread(target=flow_analysis_loop, daemon=True, name="flow-analysis").start()
-    threading.Thread(target=fee_adjustment_loop, daemon=True, name="fee-adjustment").start()
-    threading.Thread(target=rebalance_check_loop, daemon=True, name="rebalance-check").start()
-    threading.Thread(target=snapshot_peers_delayed, daemon=True, name="startup-snapshot").start()
-    threading.Thread(target=financial_snapshot_loop, daemon=True, name="financial-snapshot").start()
-
+            metrics_server = MetricsServer(
+                config.metrics_port, log=lambda msg: plugin.log(msg, level='warn')
+            )
+            metrics_server.start()
+            plugin.log(f"Metrics exporter listening on 127.0.0.1:{metrics_server.port}/metrics")
+        except OSError as e:
+            metrics_server = None
+            plugin.log(f"Metrics exporter disabled: cannot bind port {config.metrics_port}: {e}",
+                       level='warn')
+    if config.metrics_textfile:
+        scheduler.add(Task(
+            "metrics-textfile",
+            lambda: write_textfile(config.metrics_textfile,
+                                   on_error=lambda msg: plugin.log(msg, level='warn')),
+            lambda: config.metrics_textfile_interval,
+            priority=85, initial_delay=30, blocks_idle=False
+        ))
+
+    scheduler.start()
+    startup.checkpoint("scheduler")
+
+    startup.init_done()
     plugin.log("cl-revenue-ops plugin initialized successfully!")
     return None
 
@@ -1445,6 +1725,18 @@ def run_rebalance_check():
 # RPC METHODS - Exposed to lightning-cli
 # =============================================================================
 
+def _parse_bool(value: Any) -> bool:
+    """Boolean RPC parameter (lightning-cli passes 'true'/'false' strings)."""
+    if isinstance(value, str):
+        return value.lower() == "true"
+    return bool(value)
+
+
+def _pstats_path(loop: str) -> str:
+    """Where a cProfile dump of one cycle is written (next to the database)."""
+    db_dir = os.path.dirname(os.path.expanduser(config.db_path)) if config else "."
+    return os.path.join(db_dir, f"revenue-ops-{loop}-cycle-{int(time.time())}.pstats")
+
 @plugin.method("revenue-status")
 def revenue_status(plugin: Plugin) -> Dict[str, Any]:
     """
@@ -1469,11 +1761,43 @@ def revenue_status(plugin: Plugin) -> Dict[str, Any]:
             "dry_run": config.dry_run
         },
         "channel_states": channel_states,
+        "channel_state_model": channel_state.get_status() if channel_state else None,
+        "htlc_tracker": htlc_tracker.get_status() if htlc_tracker else None,
+        "scheduler": scheduler.get_status() if scheduler else None,
+        "adaptive_intervals": adaptive_intervals.get_status() if adaptive_intervals else None,
+        "startup": startup.get_status() if startup else None,
+        "warm_state": warm_state.get_status() if warm_state else None,
+        "metrics": {
+            "port": metrics_server.port if metrics_server else None,
+            "scrapes": metrics_server.scrapes if metrics_server else 0,
+            "textfile": config.metrics_textfile or None,
+        },
+        "database_writer": database.writer.get_status(),
+        "forward_archive": database.forward_archive.get_status() if database.forward_archive else None,
         "recent_fee_changes": fee_history,
         "recent_rebalances": rebalance_history
     }
 
 
+@plugin.method("revenue-rpc-stats")
+def revenue_rpc_stats(plugin: Plugin, reset: bool = False) -> Dict[str, Any]:
+    """
+    Get per-method and per-group RPC latency and broker metrics.
+
+    Methods are listed slowest (total time) first. Latency covers the whole
+    proxy call including lock_wait (time queued behind other callers).
+
+    Usage: lightning-cli revenue-rpc-stats [reset]
+
+    Args:
+        reset: Clear the counters after returning them
+    """
+    if rpc_broker is None:
+        return {"error": "Plugin not fully initialized"}
+
+    return rpc_broker.metrics.snapshot(reset=_parse_bool(reset))
+
+
 @plugin.method("revenue-hive-status")
 def revenue_hive_status(plugin: Plugin) -> Dict[str, Any]:
     """
@@ -1559,7 +1883,7 @@ def revenue_hive_status(plugin: Plugin) -> Dict[str, Any]:
 
 
 @plugin.method("revenue-rebalance-debug")
-def revenue_rebalance_debug(plugin: Plugin) -> Dict[str, Any]:
+def revenue_rebalance_debug(plugin: Plugin, profile_next_cycle: bool = False) -> Dict[str, Any]:
     """
     Diagnostic command to understand why rebalancing may not be happening.
 
@@ -1568,12 +1892,20 @@ def revenue_rebalance_debug(plugin: Plugin) -> Dict[str, Any]:
     - Depleted channels (potential destinations)
     - Source channels (potential sources)
     - Why candidates are rejected
+    - Per-stage timings of recent rebalance cycles
+
+    Usage: lightning-cli revenue-rebalance-debug [profile_next_cycle]
 
-    Usage: lightning-cli revenue-rebalance-debug
+    Args:
+        profile_next_cycle: Run the next rebalance cycle under cProfile and
+            write a pstats dump next to the database
     """
     if rebalancer is None:
         return {"error": "Rebalancer not initialized"}
 
+    if _parse_bool(profile_next_cycle):
+        cycle_profiler.request_pstats("rebalance", _pstats_path("rebalance"))
+
     result = {
         "sling_available": config.sling_available if config else False,
         "dry_run": config.dry_run if config else False,
@@ -1702,11 +2034,15 @@ def revenue_rebalance_debug(plugin: Plugin) -> Dict[str, Any]:
     except Exception as e:
         result["channels"]["error"] = str(e)
 
+    result["channel_graph"] = rebalancer.channel_graph.get_status()
+    result["cycle_context"] = rebalancer.last_cycle_context_status
+    result["profile"] = cycle_profiler.get_report("rebalance")
+
     return result
 
 
 @plugin.method("revenue-fee-debug")
-def revenue_fee_debug(plugin: Plugin) -> Dict[str, Any]:
+def revenue_fee_debug(plugin: Plugin, profile_next_cycle: bool = False) -> Dict[str, Any]:
     """
     Diagnostic command to understand why fee adjustments may not be happening.
 
@@ -1715,14 +2051,22 @@ def revenue_fee_debug(plugin: Plugin) -> Dict[str, Any]:
     - Why each channel was skipped in the last cycle
     - Dynamic window status
     - Hysteresis/sleep status
+    - Per-stage timings of recent fee and flow cycles
 
-    Usage: lightning-cli revenue-fee-debug
+    Usage: lightning-cli revenue-fee-debug [profile_next_cycle]
+
+    Args:
+        profile_next_cycle: Run the next fee cycle under cProfile and write a
+            pstats dump next to the database
     """
     if database is None or fee_controller is None:
         return {"error": "Plugin not fully initialized"}
 
+    if _parse_bool(profile_next_cycle):
+        cycle_profiler.request_pstats("fee", _pstats_path("fee"))
+
     # Import fee controller constants for accurate debug output
-    from .modules.fee_controller import HillClimbingFeeController
+    from modules.fee_controller import HillClimbingFeeController
     min_obs_hours = HillClimbingFeeController.MIN_OBSERVATION_HOURS
     min_forwards = HillClimbingFeeController.MIN_FORWARDS_FOR_SIGNAL
     max_obs_hours = HillClimbingFeeController.MAX_OBSERVATION_HOURS
@@ -1812,6 +2156,11 @@ def revenue_fee_debug(plugin: Plugin) -> Dict[str, Any]:
         })
         result["summary"]["total"] += 1
 
+    result["profile"] = {
+        "fee": cycle_profiler.get_report("fee"),
+        "flow": cycle_profiler.get_report("flow"),
+    }
+
     return result
 
 
@@ -2174,6 +2523,74 @@ def revenue_history(plugin: Plugin) -> Dict[str, Any]:
         return {"status": "error", "error": str(e)}
 
 
+@plugin.method("revenue-forward-history")
+def revenue_forward_history(plugin: Plugin, days: int = 90, channel_id: Optional[str] = None,
+                            group_by: str = "day") -> Dict[str, Any]:
+    """
+    Forward volume and fees over a long window, including archived months.
+
+    The hot database holds only flow_window_days + 1 days of raw forwards;
+    with revenue-ops-forward-archive-dir set, older forwards are read from
+    the monthly archive files.
+
+    Usage:
+      lightning-cli revenue-forward-history                      # Last 90 days by day
+      lightning-cli revenue-forward-history 365 null month       # Last year by month
+      lightning-cli revenue-forward-history 30 <scid>            # One outgoing channel
+      lightning-cli revenue-forward-history 180 null channel     # Per outgoing channel
+    """
+    if database is None:
+        return {"error": "Plugin not initialized"}
+
+    try:
+        now = int(time.time())
+        result = database.get_forward_history(
+            now - int(days) * 86400, channel_id=channel_id, group_by=group_by
+        )
+        archive = database.forward_archive
+        result["archive"] = archive.get_status() if archive else None
+        return result
+    except ValueError as e:
+        return {"error": str(e)}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+
+@plugin.method("revenue-db-stats")
+def revenue_db_stats(plugin: Plugin, limit: int = 20, sort: str = "total",
+                     reset: bool = False) -> Dict[str, Any]:
+    """
+    SQL statement profile and table/index sizes.
+
+    Statement timings are recorded while revenue-ops-db-query-profile is
+    enabled (lightning-cli revenue-config set db_query_profile true).
+    Statements slower than db_slow_query_ms are logged with their query
+    plan and listed under slow_queries. Sizes come from dbstat, which reads
+    the whole file.
+
+    Usage:
+      lightning-cli revenue-db-stats                  # Top 20 by total time
+      lightning-cli revenue-db-stats 50 p95           # Sort: total, calls, p95, max, rows
+      lightning-cli revenue-db-stats 20 total true    # Report, then clear the profile
+    """
+    if database is None:
+        return {"error": "Plugin not initialized"}
+
+    try:
+        result = {"profile": database.query_profiler.get_stats(
+            int(limit), sort, reset=_parse_bool(reset))}
+    except ValueError as e:
+        return {"error": str(e)}
+    try:
+        tables = database.get_table_sizes()
+        result["tables"] = tables
+        result["total_bytes"] = sum(t["bytes"] for t in tables)
+    except Exception as e:
+        result["tables"] = None
+        result["tables_error"] = str(e)
+    return result
+
+
 @plugin.method("revenue-remanage")
 def revenue_remanage(plugin: Plugin, peer_id: str, tag: Optional[str] = None) -> Dict[str, Any]:
     """
@@ -2805,6 +3222,40 @@ def revenue_dashboard(plugin: Plugin, window_days: int = 30) -> Dict[str, Any]:
 # PORTFOLIO OPTIMIZATION (Mean-Variance)
 # =============================================================================
 
+def _load_portfolio_forwards() -> Tuple[Optional[List[Dict[str, Any]]], str]:
+    """
+    Forwards input for the portfolio optimizer.
+
+    Returns (None, "online") when the online statistics are available - the
+    optimizer then reads precomputed moments and no forwards RPC is needed.
+    Otherwise pulls routed income from bookkeeper, falling back to
+    listforwards.
+
+    Returns:
+        Tuple of (forwards or None, statistics source name)
+    """
+    if portfolio_stats is not None:
+        return None, "online"
+
+    # Try bookkeeper first, fall back to listforwards
+    try:
+        income = safe_plugin.rpc.call("bkpr-listincome", {"consolidate_fees": False})
+        forwards = []
+        for event in income.get("income_events", []):
+            if event.get("tag") == "routed":
+                forwards.append({
+                    "out_channel": event.get("outpoint", "").split(":")[0] if ":" in event.get("outpoint", "") else event.get("account", ""),
+                    "received_time": event.get("timestamp", 0),
+                    "fee_msat": event.get("credit_msat", 0),
+                    "out_msat": event.get("debit_msat", 0)
+                })
+        return forwards, "bookkeeper"
+    except Exception:
+        # Fall back to listforwards
+        fwd_result = safe_plugin.rpc.listforwards(status="settled")
+        return fwd_result.get("forwards", []), "listforwards"
+
+
 @plugin.method("revenue-portfolio")
 def revenue_portfolio(
     plugin: Plugin,
@@ -2844,27 +3295,8 @@ def revenue_portfolio(
         # Get channel data
         channels = safe_plugin.rpc.listpeerchannels().get("channels", [])
 
-        # Get forwards from last 14 days
-        import time
-        now = int(time.time())
-        cutoff = now - (14 * 86400)
-
-        # Try bookkeeper first, fall back to listforwards
-        try:
-            income = safe_plugin.rpc.call("bkpr-listincome", {"consolidate_fees": False})
-            forwards = []
-            for event in income.get("income_events", []):
-                if event.get("tag") == "routed":
-                    forwards.append({
-                        "out_channel": event.get("outpoint", "").split(":")[0] if ":" in event.get("outpoint", "") else event.get("account", ""),
-                        "received_time": event.get("timestamp", 0),
-                        "fee_msat": event.get("credit_msat", 0),
-                        "out_msat": event.get("debit_msat", 0)
-                    })
-        except Exception:
-            # Fall back to listforwards
-            fwd_result = safe_plugin.rpc.listforwards(status="settled")
-            forwards = fwd_result.get("forwards", [])
+        # Forwards: online statistics when available, else bookkeeper/listforwards
+        forwards, statistics_source = _load_portfolio_forwards()
 
         # Get Kalman flow states if available
         flow_states = {}
@@ -2882,7 +3314,8 @@ def revenue_portfolio(
         optimizer = PortfolioOptimizer(
             database=database,
             plugin=plugin,
-            hive_bridge=None  # Can integrate later
+            hive_bridge=None,  # Can integrate later
+            online_stats=portfolio_stats
         )
 
         # Run analysis
@@ -2895,6 +3328,7 @@ def revenue_portfolio(
 
         return {
             "status": "ok",
+            "statistics_source": statistics_source,
             **analysis
         }
 
@@ -2959,27 +3393,12 @@ def revenue_portfolio_rebalance(
         channels = safe_plugin.rpc.listpeerchannels().get("channels", [])
 
         # Get forwards
-        import time
-        now = int(time.time())
-
-        try:
-            income = safe_plugin.rpc.call("bkpr-listincome", {"consolidate_fees": False})
-            forwards = []
-            for event in income.get("income_events", []):
-                if event.get("tag") == "routed":
-                    forwards.append({
-                        "out_channel": event.get("outpoint", "").split(":")[0] if ":" in event.get("outpoint", "") else event.get("account", ""),
-                        "received_time": event.get("timestamp", 0),
-                        "fee_msat": event.get("credit_msat", 0),
-                        "out_msat": event.get("debit_msat", 0)
-                    })
-        except Exception:
-            fwd_result = safe_plugin.rpc.listforwards(status="settled")
-            forwards = fwd_result.get("forwards", [])
+        forwards, statistics_source = _load_portfolio_forwards()
 
         optimizer = PortfolioOptimizer(
             database=database,
-            plugin=plugin
+            plugin=plugin,
+            online_stats=portfolio_stats
         )
 
         recommendations = optimizer.get_rebalance_priorities(
@@ -2990,6 +3409,7 @@ def revenue_portfolio_rebalance(
 
         return {
             "status": "ok",
+            "statistics_source": statistics_source,
             "recommendation_count": len(recommendations),
             "recommendations": recommendations
         }
@@ -3224,19 +3644,26 @@ def revenue_clear_reservations(plugin: Plugin) -> Dict[str, Any]:
 # HOOKS - React to Lightning events
 # =============================================================================
 
+# Shared, never mutated: saves building the reply dict per HTLC
+_HTLC_CONTINUE = {"result": "continue"}
+
+
 @plugin.hook("htlc_accepted")
 def on_htlc_accepted(onion: Dict, htlc: Dict, plugin: Plugin, **kwargs) -> Dict[str, str]:
     """
     Hook called when an HTLC is accepted.
-    
-    We can use this to track live routing activity and update our flow metrics
-    in real-time rather than waiting for periodic analysis.
-    
-    For now, we just let it pass through - the periodic analysis from bookkeeper
-    is sufficient for initial implementation.
+
+    Counts the HTLC against its incoming and outgoing channels' slots
+    (O(1), see HtlcTracker) and lets it through. Runs for every HTLC the
+    node sees, so nothing here may block or call RPC.
     """
-    # Just continue - we don't want to interfere with routing
-    return {"result": "continue"}
+    tracker = htlc_tracker
+    if tracker is not None:
+        try:
+            tracker.on_htlc_accepted(htlc, onion)
+        except Exception:
+            pass  # Never interfere with routing
+    return _HTLC_CONTINUE
 
 
 def _resolve_scid_to_peer(scid: str) -> Optional[str]:
@@ -3257,6 +3684,12 @@ def _resolve_scid_to_peer(scid: str) -> Optional[str]:
     # Check cache first
     if scid in _scid_to_peer_cache:
         return _scid_to_peer_cache[scid]
+
+    if channel_state is not None:
+        peer_id = channel_state.peer_for(scid)
+        if peer_id:
+            _scid_to_peer_cache[scid] = peer_id
+            return peer_id
     
     # Cache miss - refresh cache from listpeerchannels
     # Use safe_plugin for thread-safe RPC access
@@ -3275,6 +3708,31 @@ def _resolve_scid_to_peer(scid: str) -> Optional[str]:
         return None
         
 
+def _restore_scid_cache(entries: Dict[str, str], created_at: int) -> int:
+    """Warm restart: refill the SCID -> peer cache (an SCID never changes peer)."""
+    restored = 0
+    for scid, peer_id in entries.items():
+        if scid not in _scid_to_peer_cache:
+            _scid_to_peer_cache[scid] = peer_id
+            restored += 1
+    return restored
+
+
+def _database_file_metrics() -> List[MetricFamily]:
+    """Database and WAL file sizes for the exporter (os.stat only, no SQL)."""
+    sizes = MetricFamily("revenue_ops_db_file_bytes", "gauge",
+                         "Size of the SQLite database files", ("file",))
+    if config is None:
+        return [sizes]
+    db_path = os.path.expanduser(config.db_path)
+    for name, path in (("main", db_path), ("wal", db_path + "-wal")):
+        try:
+            sizes.set(os.path.getsize(path), file=name)
+        except OSError:
+            pass
+    return [sizes]
+
+
 def _parse_msat(msat_val: Any) -> int:
     """
     Safely convert msat values to integers.
@@ -3313,6 +3771,11 @@ def on_forward_event(forward_event: Dict, plugin: Plugin, **kwargs):
     """
     if database is None:
         return
+
+    if channel_state is not None:
+        channel_state.on_forward_event(forward_event)
+    if htlc_tracker is not None:
+        htlc_tracker.on_forward_event(forward_event)
     
     status = forward_event.get("status")
     in_channel = forward_event.get("in_channel")
@@ -3371,7 +3834,18 @@ def on_forward_event(forward_event: Dict, plugin: Plugin, **kwargs):
         resolved_time = forward_event.get("resolved_time", 0)
         resolution_duration = resolved_time - received_time if resolved_time > 0 else 0
         
-        database.record_forward(in_channel, out_channel, in_msat, out_msat, fee_msat, int(received_time or 0), int(resolved_time or 0), resolution_duration)
+        inserted = database.record_forward(in_channel, out_channel, in_msat, out_msat, fee_msat, int(received_time or 0), int(resolved_time or 0), resolution_duration)
+
+        # Keep online portfolio statistics current (skip replayed duplicates)
+        if inserted and portfolio_stats is not None:
+            portfolio_stats.record_forward(out_channel, fee_msat, out_msat, received_time)
+
+        # Activity signal for adaptive intervals; may close an observation window
+        if inserted:
+            if adaptive_intervals is not None:
+                adaptive_intervals.record_forward(out_msat)
+            if fee_controller is not None and out_channel:
+                fee_controller.note_forward(out_channel)
 
         # Report routing outcome to cl-hive for stigmergic learning (Yield Optimization Phase 2)
         # This enables pheromone-based fee learning and fleet coordination
@@ -3397,6 +3871,32 @@ def on_forward_event(forward_event: Dict, plugin: Plugin, **kwargs):
                 plugin.log(f"FORWARD_EVENT: Hive routing outcome report failed: {e}", level="debug")
 
 
+@plugin.subscribe("coin_movement")
+def on_coin_movement(plugin: Plugin, **kwargs):
+    """
+    Notification for every change to one of our accounts.
+
+    Keeps channel balances in the channel state model current for
+    movements that are not forwards (our payments, invoices, rebalances).
+    """
+    if channel_state is None:
+        return
+    moved_msat = channel_state.on_coin_movement(kwargs.get('coin_movement', kwargs))
+    if moved_msat and adaptive_intervals is not None:
+        adaptive_intervals.record_balance_movement(moved_msat)
+
+
+@plugin.subscribe("balance_snapshot")
+def on_balance_snapshot(plugin: Plugin, **kwargs):
+    """
+    Notification listing the balance of every account (sent once lightningd
+    has caught up with the chain). Overrides the modelled channel balances.
+    """
+    if channel_state is None:
+        return
+    channel_state.on_balance_snapshot(kwargs.get('balance_snapshot', kwargs))
+
+
 @plugin.subscribe("connect")
 def on_peer_connect(plugin: Plugin, **kwargs):
     """
@@ -3427,6 +3927,8 @@ def on_peer_connect(plugin: Plugin, **kwargs):
     
     if peer_id:
         database.record_connection_event(peer_id, "connected")
+        if channel_state is not None:
+            channel_state.set_peer_connected(peer_id, True)
         plugin.log(f"Peer connected: {peer_id[:12]}...", level='debug')
     else:
         plugin.log(f"Connect event - could not extract peer_id from: {kwargs}", level='warn')
@@ -3462,6 +3964,8 @@ def on_peer_disconnect(plugin: Plugin, **kwargs):
 
     if peer_id:
         database.record_connection_event(peer_id, "disconnected")
+        if channel_state is not None:
+            channel_state.set_peer_connected(peer_id, False)
         plugin.log(f"Peer disconnected: {peer_id[:12]}...", level='debug')
     else:
         plugin.log(f"Disconnect event - could not extract peer_id from: {kwargs}", level='warn')
@@ -3491,6 +3995,9 @@ def on_channel_state_changed(plugin: Plugin, **kwargs):
 
     plugin.log(f"Channel state changed: {event}", level='debug')
 
+    if channel_state is not None:
+        channel_state.on_channel_state_changed(event)
+
     # Extract channel information
     peer_id = event.get('peer_id')
     channel_id = event.get('channel_id')
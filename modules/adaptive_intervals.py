@@ -0,0 +1,191 @@
+"""
+Adaptive Intervals module for cl-revenue-ops
+
+Scales the flow, fee and rebalance cycle intervals with how fast the node
+is changing.
+
+With fixed intervals every cycle touches every channel, whether the node
+routed a thousand payments since the last cycle or none. AdaptiveIntervals
+tracks two exponentially decaying rates for each activity signal: a short
+one (minutes) and a long-run baseline (a day).
+
+- forward rate:      settled forwards (forward_event)
+- balance movement:  msat moved through our channels (forwards and
+                     coin movements)
+- mempool intensity: VegasReflexState.intensity (fee cycle only)
+
+activity = short rate / baseline. At 1.0 the configured interval is used.
+A surge shortens the interval and a quiet night stretches it, by
+activity^-1/2, bounded to [MIN_FACTOR, MAX_FACTOR] x the configured value.
+Until the baseline has seen MIN_BASELINE_EVENTS forwards, activity stays
+at 1.0.
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+SHORT_HALF_LIFE = 900          # 15 minutes: "right now"
+LONG_HALF_LIFE = 86400         # 1 day: what is normal for this node
+MIN_FACTOR = 0.25              # Surge: at most 4x faster
+MAX_FACTOR = 4.0               # Quiet: at most 4x slower
+MIN_INTERVAL_SECONDS = 60
+MIN_DUE_GAP_SECONDS = 300      # Batch channels whose windows close close together
+MIN_BASELINE_EVENTS = 24       # Forwards needed before the baseline is trusted
+MEMPOOL_ACTIVITY_WEIGHT = 3.0  # intensity 1.0 counts as activity 4.0 for fees
+
+
+class DecayingRate:
+    """Event rate with exponential forgetting (amount per second)."""
+
+    def __init__(self, half_life: float):
+        self.half_life = half_life
+        self._decay = math.log(2) / half_life
+        self.value = 0.0
+        self.updated = 0.0
+
+    def _decayed(self, now: float) -> float:
+        if self.updated <= 0:
+            return self.value
+        return self.value * math.exp(-self._decay * max(0.0, now - self.updated))
+
+    def add(self, amount: float, now: float) -> None:
+        self.value = self._decayed(now) + amount
+        self.updated = now
+
+    def rate(self, now: float) -> float:
+        return self._decayed(now) * self._decay
+
+    def set_rate(self, rate: float, now: float) -> None:
+        """Start at a steady-state rate (e.g. from stored history)."""
+        self.value = rate / self._decay
+        self.updated = now
+
+
+class AdaptiveIntervals:
+    """Chooses cycle intervals from recent node activity."""
+
+    LOOPS = ("flow", "fee", "rebalance")
+
+    def __init__(self, config, mempool_intensity: Optional[Callable[[], float]] = None,
+                 clock: Callable[[], float] = time.time):
+        self.config = config
+        self._mempool_intensity = mempool_intensity or (lambda: 0.0)
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._forwards = (DecayingRate(SHORT_HALF_LIFE), DecayingRate(LONG_HALF_LIFE))
+        self._movement = (DecayingRate(SHORT_HALF_LIFE), DecayingRate(LONG_HALF_LIFE))
+        self._baseline_events = 0
+        self._chosen: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.enable_adaptive_intervals)
+
+    def seed(self, forward_count: int, volume_msat: int, window_seconds: int) -> None:
+        """Initialize both rates from stored forwards (e.g. the last day)."""
+        if window_seconds <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            for rates, total in ((self._forwards, forward_count), (self._movement, volume_msat)):
+                for rate in rates:
+                    rate.set_rate(total / window_seconds, now)
+            self._baseline_events = forward_count
+
+    # =========================================================================
+    # Signals
+    # =========================================================================
+
+    def record_forward(self, amount_msat: int) -> None:
+        now = self._clock()
+        with self._lock:
+            for rate in self._forwards:
+                rate.add(1, now)
+            for rate in self._movement:
+                rate.add(amount_msat, now)
+            self._baseline_events += 1
+
+    def record_balance_movement(self, amount_msat: int) -> None:
+        now = self._clock()
+        with self._lock:
+            for rate in self._movement:
+                rate.add(abs(amount_msat), now)
+
+    @staticmethod
+    def _ratio(rates, now: float) -> float:
+        short, long = rates[0].rate(now), rates[1].rate(now)
+        if long <= 0:
+            return 1.0
+        return short / long
+
+    def activity(self, loop: str = "flow") -> float:
+        now = self._clock()
+        with self._lock:
+            if self._baseline_events < MIN_BASELINE_EVENTS:
+                activity = 1.0
+            else:
+                activity = max(self._ratio(self._forwards, now), self._ratio(self._movement, now))
+        if loop == "fee":
+            activity = max(activity, 1.0 + MEMPOOL_ACTIVITY_WEIGHT * self._mempool_intensity())
+        return activity
+
+    # =========================================================================
+    # Intervals
+    # =========================================================================
+
+    def factor(self, loop: str) -> float:
+        activity = self.activity(loop)
+        if activity <= 0:
+            return MAX_FACTOR
+        return min(MAX_FACTOR, max(MIN_FACTOR, activity ** -0.5))
+
+    def interval(self, loop: str, base_seconds: int, due_in: Optional[float] = None) -> int:
+        """
+        Interval for the next cycle of `loop` (base_seconds when disabled).
+
+        due_in: seconds until work scheduled for this loop is due (e.g. the
+                next fee observation window to close); the cycle is brought
+                forward to it, but not closer than MIN_DUE_GAP_SECONDS.
+        """
+        due_capped = False
+        if not self.enabled:
+            chosen, factor = base_seconds, 1.0
+        else:
+            factor = self.factor(loop)
+            chosen = max(MIN_INTERVAL_SECONDS, int(base_seconds * factor))
+            if due_in is not None and due_in < chosen:
+                chosen = max(MIN_DUE_GAP_SECONDS, int(due_in))
+                due_capped = True
+        with self._lock:
+            entry = self._chosen.setdefault(
+                loop, {"count": 0, "due_scheduled": 0, "min_s": chosen, "max_s": chosen}
+            )
+            entry.update(base_s=base_seconds, interval_s=chosen, factor=round(factor, 3))
+            entry["count"] += 1
+            entry["due_scheduled"] += int(due_capped)
+            entry["min_s"] = min(entry["min_s"], chosen)
+            entry["max_s"] = max(entry["max_s"], chosen)
+        return chosen
+
+    def get_status(self) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            signals = {
+                "forwards_per_hour": round(self._forwards[0].rate(now) * 3600, 2),
+                "baseline_forwards_per_hour": round(self._forwards[1].rate(now) * 3600, 2),
+                "sats_moved_per_hour": int(self._movement[0].rate(now) * 3600 / 1000),
+                "baseline_sats_moved_per_hour": int(self._movement[1].rate(now) * 3600 / 1000),
+                "baseline_ready": self._baseline_events >= MIN_BASELINE_EVENTS,
+            }
+            chosen = {loop: dict(entry) for loop, entry in self._chosen.items()}
+        signals["mempool_intensity"] = round(self._mempool_intensity(), 3)
+        return {
+            "enabled": self.enabled,
+            "activity": round(self.activity(), 3),
+            "fee_activity": round(self.activity("fee"), 3),
+            "signals": signals,
+            "intervals": chosen,
+        }
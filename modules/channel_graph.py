@@ -0,0 +1,367 @@
+"""
+Channel Graph module for cl-revenue-ops
+
+Local, compact copy of the public channel graph used by the rebalancer for
+inbound-fee and route-cost estimation.
+
+Without it, every rebalance cycle asks gossipd for each peer separately
+(listchannels source=<peer> for the last-hop fee, getroute for multi-hop
+cost). The graph here is built from a single listchannels call and kept
+fresh on two cadences:
+- Inbound refresh (every INBOUND_REFRESH_SECONDS): listchannels
+  destination=<us>, updating only the edges that point at our node
+  (these carry the last-hop fees and change most often)
+- Full refresh (every FULL_REFRESH_SECONDS): the whole graph
+
+Storage:
+- Node IDs are interned to integer ordinals
+- Directed edges live in parallel arrays (source, destination, base fee,
+  ppm, htlc max, active flag), keyed by (integer SCID, direction)
+- A compressed adjacency index (CSR) is rebuilt lazily after topology changes
+
+Last-hop fees for all peers then come from one table lookup, and multi-hop
+inbound cost estimates from a local Dijkstra run.
+"""
+
+import heapq
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from pyln.client import Plugin
+
+
+# Refresh cadence (seconds)
+FULL_REFRESH_SECONDS = 3600         # Whole graph
+INBOUND_REFRESH_SECONDS = 300       # Edges pointing at our node
+
+# Route estimation
+DEFAULT_MAX_HOPS = 6
+DEFAULT_ESTIMATE_AMOUNT_MSAT = 100_000_000
+
+
+def _scid_to_int(scid: str) -> Optional[int]:
+    """Encode "BLOCKxTXxOUT" as the 64-bit integer form (block << 40 | tx << 16 | out)."""
+    try:
+        block, tx, out = scid.split("x")
+        return (int(block) << 40) | (int(tx) << 16) | int(out)
+    except (ValueError, AttributeError):
+        return None
+
+
+def _msat(value: Any) -> int:
+    """Parse an msat field (int or "123msat")."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value.replace("msat", "").strip())
+        except ValueError:
+            return 0
+    return 0
+
+
+class ChannelGraph:
+    """
+    In-memory channel graph with last-hop fee table and local routing.
+
+    Thread-safe: refreshes and lookups take the same lock. All lookups are
+    served from memory; only refresh() talks to lightningd.
+    """
+
+    def __init__(self, plugin: Plugin, our_node_id: Optional[str] = None):
+        self.plugin = plugin
+        self._lock = threading.RLock()
+        self._our_node_id = our_node_id
+
+        # Node interning
+        self._node_index: Dict[str, int] = {}
+        self._node_ids: List[str] = []
+
+        # Directed edges (parallel arrays)
+        self._edge_index: Dict[int, int] = {}   # (scid_int << 1 | direction) -> edge
+        self._src = array("l")
+        self._dst = array("l")
+        self._base_msat = array("l")
+        self._ppm = array("l")
+        self._htlc_max_msat = array("q")
+        self._active = bytearray()
+
+        # Lazily built adjacency (CSR by source node)
+        self._adj_offsets = array("l")
+        self._adj_edges = array("l")
+        self._adj_dirty = True
+
+        # Derived tables
+        self._last_hop: Dict[int, int] = {}    # peer ordinal -> fee (ppm + base/1000)
+        self._route_cache: Dict[Tuple[int, int, int], Optional[int]] = {}
+
+        self._last_full_refresh = 0.0
+        self._last_inbound_refresh = 0.0
+        self._supports_destination = True
+
+        self.full_refreshes = 0
+        self.inbound_refreshes = 0
+        self.last_refresh_ms = 0.0
+
+    # =========================================================================
+    # Refresh
+    # =========================================================================
+
+    @property
+    def ready(self) -> bool:
+        """True once a full graph has been loaded."""
+        return self._last_full_refresh > 0
+
+    def set_our_node_id(self, node_id: str) -> None:
+        with self._lock:
+            if node_id and node_id != self._our_node_id:
+                self._our_node_id = node_id
+                self._rebuild_last_hop()
+
+    def refresh(self, force_full: bool = False) -> bool:
+        """
+        Refresh the graph if one of the cadences is due.
+
+        Returns:
+            True if anything was refreshed
+        """
+        now = time.time()
+        if force_full or now - self._last_full_refresh >= FULL_REFRESH_SECONDS:
+            return self._full_refresh()
+        if (self._supports_destination and self._our_node_id
+                and now - self._last_inbound_refresh >= INBOUND_REFRESH_SECONDS):
+            return self._inbound_refresh()
+        return False
+
+    def _full_refresh(self) -> bool:
+        started = time.time()
+        try:
+            channels = self.plugin.rpc.listchannels().get("channels", [])
+        except Exception as e:
+            self.plugin.log(f"ChannelGraph: full refresh failed: {e}", level='warn')
+            return False
+
+        with self._lock:
+            self._edge_index = {}
+            self._src = array("l")
+            self._dst = array("l")
+            self._base_msat = array("l")
+            self._ppm = array("l")
+            self._htlc_max_msat = array("q")
+            self._active = bytearray()
+            for ch in channels:
+                self._upsert_edge(ch)
+            self._adj_dirty = True
+            self._rebuild_last_hop()
+            self._last_full_refresh = self._last_inbound_refresh = time.time()
+            self.full_refreshes += 1
+            self.last_refresh_ms = round((time.time() - started) * 1000, 1)
+
+        self.plugin.log(
+            f"ChannelGraph: loaded {len(self._node_ids)} nodes, {len(self._src)} edges "
+            f"in {self.last_refresh_ms}ms",
+            level='debug'
+        )
+        return True
+
+    def _inbound_refresh(self) -> bool:
+        started = time.time()
+        try:
+            channels = self.plugin.rpc.listchannels(
+                destination=self._our_node_id
+            ).get("channels", [])
+        except Exception as e:
+            # Older lightningd without the destination filter: rely on full refreshes
+            self._supports_destination = False
+            self.plugin.log(
+                f"ChannelGraph: inbound refresh unavailable ({e}); using full refreshes only",
+                level='debug'
+            )
+            return False
+
+        with self._lock:
+            before = len(self._src)
+            for ch in channels:
+                self._upsert_edge(ch)
+            if len(self._src) != before:
+                self._adj_dirty = True
+            self._rebuild_last_hop()
+            self._last_inbound_refresh = time.time()
+            self.inbound_refreshes += 1
+            self.last_refresh_ms = round((time.time() - started) * 1000, 1)
+        return True
+
+    def _intern(self, node_id: str) -> int:
+        ordinal = self._node_index.get(node_id)
+        if ordinal is None:
+            ordinal = len(self._node_ids)
+            self._node_index[node_id] = ordinal
+            self._node_ids.append(node_id)
+        return ordinal
+
+    def _upsert_edge(self, ch: Dict[str, Any]) -> None:
+        source = ch.get("source")
+        destination = ch.get("destination")
+        scid_int = _scid_to_int(ch.get("short_channel_id", ""))
+        if not source or not destination or scid_int is None:
+            return
+        key = (scid_int << 1) | (int(ch.get("direction", 0)) & 1)
+        base = int(ch.get("base_fee_millisatoshi", 0) or 0)
+        ppm = int(ch.get("fee_per_millionth", 0) or 0)
+        htlc_max = _msat(ch.get("htlc_maximum_msat")) or _msat(ch.get("amount_msat"))
+        active = 1 if ch.get("active", True) else 0
+
+        edge = self._edge_index.get(key)
+        if edge is None:
+            self._edge_index[key] = len(self._src)
+            self._src.append(self._intern(source))
+            self._dst.append(self._intern(destination))
+            self._base_msat.append(base)
+            self._ppm.append(ppm)
+            self._htlc_max_msat.append(htlc_max)
+            self._active.append(active)
+            return
+        self._base_msat[edge] = base
+        self._ppm[edge] = ppm
+        self._htlc_max_msat[edge] = htlc_max
+        self._active[edge] = active
+
+    def _rebuild_last_hop(self) -> None:
+        """Rebuild the peer -> last-hop fee table and invalidate cached routes."""
+        self._route_cache = {}
+        self._last_hop = {}
+        us = self._node_index.get(self._our_node_id or "")
+        if us is None:
+            return
+        dst, src = self._dst, self._src
+        for edge in range(len(dst)):
+            if dst[edge] == us:
+                fee = self._ppm[edge] + self._base_msat[edge] // 1000
+                peer = src[edge]
+                # Parallel channels: the cheapest one is what a rebalance would use
+                if peer not in self._last_hop or fee < self._last_hop[peer]:
+                    self._last_hop[peer] = fee
+
+    def _build_adjacency(self) -> None:
+        n_nodes = len(self._node_ids)
+        counts = [0] * (n_nodes + 1)
+        for s in self._src:
+            counts[s + 1] += 1
+        for i in range(n_nodes):
+            counts[i + 1] += counts[i]
+        offsets = array("l", counts)
+        fill = list(counts[:n_nodes])
+        edges = array("l", [0] * len(self._src))
+        for edge, s in enumerate(self._src):
+            edges[fill[s]] = edge
+            fill[s] += 1
+        self._adj_offsets = offsets
+        self._adj_edges = edges
+        self._adj_dirty = False
+
+    # =========================================================================
+    # Lookups
+    # =========================================================================
+
+    def last_hop_fee(self, peer_id: str) -> Optional[int]:
+        """
+        Fee the peer charges on its channel to us (ppm + base_fee/1000).
+
+        Returns None if the peer has no public channel to us in the graph.
+        """
+        with self._lock:
+            peer = self._node_index.get(peer_id)
+            if peer is None:
+                return None
+            return self._last_hop.get(peer)
+
+    def route_fee_ppm(
+        self,
+        peer_id: str,
+        amount_msat: int = DEFAULT_ESTIMATE_AMOUNT_MSAT,
+        max_hops: int = DEFAULT_MAX_HOPS
+    ) -> Optional[int]:
+        """
+        Estimate the cost (PPM) of pushing `amount_msat` into our channel
+        with `peer_id` by a circular route.
+
+        Runs Dijkstra from our node to the peer over active edges with
+        enough htlc_maximum, excluding our direct channels with the peer
+        (a rebalance must arrive from elsewhere). Our own outgoing hop is
+        free; each later hop charges base + ppm of the amount. The peer's
+        last-hop fee is added when known.
+
+        Returns:
+            Estimated fee in PPM, or None if the peer is unreachable
+        """
+        if amount_msat <= 0:
+            return None
+        with self._lock:
+            us = self._node_index.get(self._our_node_id or "")
+            target = self._node_index.get(peer_id)
+            if us is None or target is None:
+                return None
+            cache_key = (target, amount_msat, max_hops)
+            if cache_key in self._route_cache:
+                return self._route_cache[cache_key]
+            if self._adj_dirty:
+                self._build_adjacency()
+
+            fee_msat = self._shortest_fee(us, target, amount_msat, max_hops)
+            result = None
+            if fee_msat is not None:
+                result = int(fee_msat * 1_000_000 // amount_msat)
+                last_hop = self._last_hop.get(target)
+                if last_hop is not None:
+                    result += last_hop
+            self._route_cache[cache_key] = result
+            return result
+
+    def _shortest_fee(self, us: int, target: int, amount_msat: int, max_hops: int) -> Optional[int]:
+        """Cheapest forwarding fee (msat) from `us` to `target`, or None."""
+        offsets, adj = self._adj_offsets, self._adj_edges
+        dst, base, ppm = self._dst, self._base_msat, self._ppm
+        htlc_max, active = self._htlc_max_msat, self._active
+
+        best: Dict[int, int] = {us: 0}
+        heap: List[Tuple[int, int, int]] = [(0, 0, us)]
+        while heap:
+            cost, hops, node = heapq.heappop(heap)
+            if node == target:
+                return cost
+            if cost > best.get(node, cost) or hops >= max_hops:
+                continue
+            for k in range(offsets[node], offsets[node + 1]):
+                edge = adj[k]
+                nxt = dst[edge]
+                if not active[edge] or htlc_max[edge] < amount_msat:
+                    continue
+                if node == us:
+                    if nxt == target:
+                        continue  # Direct channel: not a rebalance route
+                    step = 0      # We don't pay ourselves
+                else:
+                    step = base[edge] + amount_msat * ppm[edge] // 1_000_000
+                new_cost = cost + step
+                if new_cost < best.get(nxt, new_cost + 1):
+                    best[nxt] = new_cost
+                    heapq.heappush(heap, (new_cost, hops + 1, nxt))
+        return None
+
+    def get_status(self) -> Dict[str, Any]:
+        """Counters for status/debug RPCs."""
+        with self._lock:
+            now = time.time()
+            return {
+                "ready": self.ready,
+                "nodes": len(self._node_ids),
+                "edges": len(self._src),
+                "peers_with_last_hop": len(self._last_hop),
+                "full_refreshes": self.full_refreshes,
+                "inbound_refreshes": self.inbound_refreshes,
+                "last_refresh_ms": self.last_refresh_ms,
+                "full_refresh_age_seconds": int(now - self._last_full_refresh) if self.ready else None,
+                "inbound_refresh_supported": self._supports_destination,
+            }
@@ -0,0 +1,138 @@
+"""
+Channel Model module for cl-revenue-ops
+
+Typed per-cycle view of our channels built from a single listpeerchannels
+call.
+
+The rebalancer previously joined listfunds (balances) with a full
+listpeers walk (fees, HTLCs) and issued another listpeers for peer
+connectivity. listpeers with embedded channels is deprecated in CLN and
+heavy on large nodes; listpeerchannels already carries balances, fees,
+HTLC counts and peer connectivity for every channel.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional
+
+
+def _msat(value: Any) -> int:
+    """Parse an msat field (int or legacy '123msat' string)."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        value = value.replace("msat", "")
+        return int(value) if value.isdigit() else 0
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+@dataclass(frozen=True)
+class ChannelView:
+    """One CHANNELD_NORMAL channel as seen by the rebalancer."""
+    scid: str
+    peer_id: str
+    capacity_sats: int
+    local_sats: int              # to_us_msat: our total balance
+    spendable_sats: int          # spendable_msat: sendable right now (reserve, HTLCs)
+    receivable_sats: int
+    fee_ppm: int
+    base_fee_msat: int
+    htlcs: int
+    peer_connected: bool
+
+    @property
+    def outbound_ratio(self) -> float:
+        return self.local_sats / self.capacity_sats if self.capacity_sats > 0 else 0.0
+
+    def to_info(self) -> Dict[str, Any]:
+        """
+        Legacy channel info dict used throughout the rebalancer
+        ("spendable_sats" has always meant our local balance).
+        """
+        return {
+            "capacity": self.capacity_sats,
+            "spendable_sats": self.local_sats,
+            "peer_id": self.peer_id,
+            "fee_ppm": self.fee_ppm,
+            "base_fee_msat": self.base_fee_msat,
+            "htlcs": self.htlcs,
+            "peer_connected": self.peer_connected,
+        }
+
+
+class ChannelModel:
+    """Snapshot of all active channels keyed by SCID ('x' separators)."""
+
+    def __init__(self, channels: Dict[str, ChannelView]):
+        self.channels = channels
+
+    @classmethod
+    def from_listpeerchannels(cls, result: Dict[str, Any]) -> "ChannelModel":
+        return cls.from_channels(result.get("channels", []))
+
+    @classmethod
+    def from_channels(cls, raw_channels: Iterable[Dict[str, Any]]) -> "ChannelModel":
+        channels: Dict[str, ChannelView] = {}
+        for ch in raw_channels:
+            if ch.get("state") != "CHANNELD_NORMAL":
+                continue
+            scid = ch.get("short_channel_id")
+            if not scid:
+                continue
+            scid = scid.replace(':', 'x')
+
+            local_msat = _msat(ch.get("to_us_msat"))
+            spendable_msat = _msat(ch.get("spendable_msat"))
+            receivable_msat = _msat(ch.get("receivable_msat"))
+            total_msat = _msat(ch.get("total_msat"))
+            if not total_msat:
+                total_msat = spendable_msat + receivable_msat
+
+            # Fee info - in newer CLN it's under updates.local
+            local_updates = (ch.get("updates") or {}).get("local") or {}
+            fee_ppm = local_updates.get("fee_proportional_millionths")
+            if fee_ppm is None:
+                fee_ppm = ch.get("fee_proportional_millionths", 0)
+            base_fee = local_updates.get("fee_base_msat")
+            if base_fee is None:
+                base_fee = ch.get("fee_base_msat", 0)
+
+            channels[scid] = ChannelView(
+                scid=scid,
+                peer_id=ch.get("peer_id", ""),
+                capacity_sats=total_msat // 1000,
+                local_sats=local_msat // 1000,
+                spendable_sats=spendable_msat // 1000,
+                receivable_sats=receivable_msat // 1000,
+                fee_ppm=_msat(fee_ppm),
+                base_fee_msat=_msat(base_fee),
+                htlcs=len(ch.get("htlcs") or []),
+                peer_connected=bool(ch.get("peer_connected", False)),
+            )
+        return cls(channels)
+
+    @classmethod
+    def fetch(cls, plugin) -> "ChannelModel":
+        """Build the model from one listpeerchannels call (raises on RPC error)."""
+        return cls.from_listpeerchannels(plugin.rpc.listpeerchannels())
+
+    def get(self, scid: str) -> Optional[ChannelView]:
+        return self.channels.get(scid.replace(':', 'x'))
+
+    def info_map(self) -> Dict[str, Dict[str, Any]]:
+        """SCID -> legacy info dict (see ChannelView.to_info)."""
+        return {scid: ch.to_info() for scid, ch in self.channels.items()}
+
+    def peer_status(self) -> Dict[str, Dict[str, bool]]:
+        """peer_id -> {"connected": bool} for every peer we have a channel with."""
+        status: Dict[str, Dict[str, bool]] = {}
+        for ch in self.channels.values():
+            if ch.peer_id:
+                entry = status.setdefault(ch.peer_id, {"connected": False})
+                entry["connected"] = entry["connected"] or ch.peer_connected
+        return status
+
+    def __len__(self) -> int:
+        return len(self.channels)
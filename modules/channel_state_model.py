@@ -0,0 +1,384 @@
+"""
+Channel State Model module for cl-revenue-ops
+
+Long-lived, event-driven view of our channels.
+
+Flow analysis, fee adjustment, rebalancing and profitability analysis each
+polled listpeerchannels every cycle to re-derive balances and states that
+lightningd already announces through notifications. ChannelStateModel is
+seeded with one listpeerchannels call and then kept current from the
+notifications the plugin subscribes to:
+
+- forward_event (settled):   in_channel += in_msat, out_channel -= out_msat
+- coin_movement (channel):   credit/debit of non-routed movements (our own
+                             payments, invoices, rebalances); routed legs are
+                             already covered by forward_event
+- balance_snapshot:          authoritative per-channel balances
+- channel_state_changed:     state transitions; new channels are fetched
+                             lazily on the next read
+- connect / disconnect:      peer connectivity
+
+Readers get a listpeerchannels-shaped result (or a ChannelModel) from memory.
+A low-frequency reconcile() re-polls listpeerchannels, reports how far the
+model had drifted and replaces it with the polled state.
+
+Balances between notifications are approximate (in-flight HTLCs are not
+modelled); fees set by the plugin are applied via note_fee_update().
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .channel_model import ChannelModel, _msat
+from .openmetrics import MetricFamily
+
+
+# Balance differences at or below this are rounding, not drift
+DRIFT_TOLERANCE_MSAT = 1000
+
+# Report at most this many drifted channels in a reconcile report
+MAX_REPORTED_DRIFTS = 10
+
+# Warm-restart snapshots older than this are not used to seed the model
+WARM_RESTORE_MAX_AGE = 900
+
+
+def _scid(value: Optional[str]) -> Optional[str]:
+    return value.replace(':', 'x') if value else None
+
+
+class ChannelStateModel:
+    """
+    In-memory channel state shared by all modules.
+
+    Thread-safe: notifications arrive on the plugin thread while the
+    background loops read from their own threads.
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self._lock = threading.RLock()
+        self._rows: Dict[str, Dict[str, Any]] = {}     # scid -> listpeerchannels row
+        self._by_channel_id: Dict[str, str] = {}       # full channel_id -> scid
+        self._pending_peers: Set[str] = set()          # peers with channels to fetch
+        self.ready = False
+        self.seeded_at = 0
+        self.reconciled_at = 0
+        self.events_applied = 0
+        self.events_since_reconcile = 0
+        self.reconcile_count = 0
+        self.restored_from = 0          # snapshot time if seeded from a warm restart
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    # =========================================================================
+    # Seeding and reconciliation
+    # =========================================================================
+
+    def _index(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        indexed = {}
+        for row in rows:
+            scid = _scid(row.get("short_channel_id"))
+            if scid:
+                indexed[scid] = dict(row)
+        return indexed
+
+    def _install(self, rows: Dict[str, Dict[str, Any]]) -> None:
+        self._rows = rows
+        self._by_channel_id = {
+            row["channel_id"]: scid for scid, row in rows.items() if row.get("channel_id")
+        }
+
+    def reconcile(self) -> Optional[Dict[str, Any]]:
+        """
+        Poll listpeerchannels and replace the model with it.
+
+        The first call seeds the model and returns None; later calls return
+        a discrepancy report (also kept in last_report).
+        Raises on RPC error; the model is left unchanged.
+        """
+        result = self.plugin.rpc.listpeerchannels()
+        polled = self._index(result.get("channels", []))
+        now = int(time.time())
+
+        with self._lock:
+            report = self._diff(polled) if self.ready else None
+            self._install(polled)
+            self._pending_peers.clear()
+            self.events_since_reconcile = 0
+            if self.ready:
+                self.reconcile_count += 1
+                self.reconciled_at = now
+                self.last_report = report
+            else:
+                self.ready = True
+                self.seeded_at = self.reconciled_at = now
+        return report
+
+    # Seeding is a reconcile against an empty model
+    seed = reconcile
+
+    def export_rows(self) -> List[Dict[str, Any]]:
+        """Channel rows for the warm-restart snapshot."""
+        with self._lock:
+            return [dict(row) for row in self._rows.values()]
+
+    def restore(self, rows: List[Dict[str, Any]], taken_at: int) -> int:
+        """
+        Seed the model from a warm-restart snapshot.
+
+        Only a recent snapshot (WARM_RESTORE_MAX_AGE) is used, and only
+        before the first seed; the next reconcile() then reports how far
+        the snapshot was from the live state.
+
+        Returns:
+            Number of channels restored
+        """
+        if int(time.time()) - taken_at > WARM_RESTORE_MAX_AGE:
+            return 0
+        indexed = self._index(rows)
+        with self._lock:
+            if self.ready:
+                return 0
+            self._install(indexed)
+            self.ready = True
+            self.seeded_at = self.restored_from = taken_at
+        return len(indexed)
+
+    def _diff(self, polled: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        drifts = []
+        total_drift = 0
+        state_mismatches = 0
+        connectivity_mismatches = 0
+        for scid, row in polled.items():
+            mine = self._rows.get(scid)
+            if mine is None:
+                continue
+            drift = _msat(row.get("to_us_msat")) - _msat(mine.get("to_us_msat"))
+            if abs(drift) > DRIFT_TOLERANCE_MSAT:
+                drifts.append({"scid": scid, "drift_msat": drift})
+                total_drift += abs(drift)
+            if row.get("state") != mine.get("state"):
+                state_mismatches += 1
+            if bool(row.get("peer_connected")) != bool(mine.get("peer_connected")):
+                connectivity_mismatches += 1
+
+        drifts.sort(key=lambda d: abs(d["drift_msat"]), reverse=True)
+        return {
+            "channels_checked": len(polled),
+            "events_since_reconcile": self.events_since_reconcile,
+            "drifted_channels": len(drifts),
+            "total_drift_msat": total_drift,
+            "max_drift_msat": abs(drifts[0]["drift_msat"]) if drifts else 0,
+            "largest_drifts": drifts[:MAX_REPORTED_DRIFTS],
+            "state_mismatches": state_mismatches,
+            "connectivity_mismatches": connectivity_mismatches,
+            "missing_channels": sorted(set(polled) - set(self._rows)),
+            "stale_channels": sorted(set(self._rows) - set(polled)),
+        }
+
+    @staticmethod
+    def has_discrepancies(report: Optional[Dict[str, Any]]) -> bool:
+        if not report:
+            return False
+        return bool(
+            report["drifted_channels"] or report["state_mismatches"]
+            or report["connectivity_mismatches"] or report["missing_channels"]
+            or report["stale_channels"]
+        )
+
+    def _refresh_pending(self) -> None:
+        """Fetch channels of peers flagged by channel_state_changed."""
+        with self._lock:
+            peers, self._pending_peers = self._pending_peers, set()
+        for peer_id in peers:
+            try:
+                result = self.plugin.rpc.listpeerchannels(id=peer_id)
+            except Exception as e:
+                self.plugin.log(
+                    f"Channel state: could not fetch channels of {peer_id[:12]}...: {e}",
+                    level='debug'
+                )
+                with self._lock:
+                    self._pending_peers.add(peer_id)
+                continue
+            fetched = self._index(result.get("channels", []))
+            with self._lock:
+                for scid, row in fetched.items():
+                    self._rows[scid] = row
+                    if row.get("channel_id"):
+                        self._by_channel_id[row["channel_id"]] = scid
+
+    # =========================================================================
+    # Notification handlers
+    # =========================================================================
+
+    def _adjust(self, scid: Optional[str], delta_msat: int) -> bool:
+        """Move delta_msat into (or out of) our side of a channel."""
+        row = self._rows.get(scid) if scid else None
+        if row is None or not delta_msat:
+            return False
+        row["to_us_msat"] = max(0, _msat(row.get("to_us_msat")) + delta_msat)
+        row["spendable_msat"] = max(0, _msat(row.get("spendable_msat")) + delta_msat)
+        row["receivable_msat"] = max(0, _msat(row.get("receivable_msat")) - delta_msat)
+        return True
+
+    def _applied(self) -> None:
+        self.events_applied += 1
+        self.events_since_reconcile += 1
+
+    def on_forward_event(self, forward_event: Dict[str, Any]) -> None:
+        if forward_event.get("status") != "settled":
+            return
+        in_msat = _msat(forward_event.get("in_msat", forward_event.get("in_msatoshi")))
+        out_msat = _msat(forward_event.get("out_msat", forward_event.get("out_msatoshi")))
+        with self._lock:
+            changed = self._adjust(_scid(forward_event.get("in_channel")), in_msat)
+            changed = self._adjust(_scid(forward_event.get("out_channel")), -out_msat) or changed
+            if changed:
+                self._applied()
+
+    def on_coin_movement(self, movement: Dict[str, Any]) -> int:
+        """Apply a channel movement; returns the msat applied (0 if none)."""
+        if movement.get("type") != "channel_mvt":
+            return 0
+        tags = movement.get("tags")
+        if tags is None:
+            tags = [movement.get("primary_tag")] + list(movement.get("extra_tags") or [])
+        if "routed" in tags:
+            return 0  # forward legs are applied from forward_event
+        delta = _msat(movement.get("credit_msat")) - _msat(movement.get("debit_msat"))
+        with self._lock:
+            if self._adjust(self._by_channel_id.get(movement.get("account_id")), delta):
+                self._applied()
+                return delta
+        return 0
+
+    def on_balance_snapshot(self, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            for account in snapshot.get("accounts", []):
+                scid = self._by_channel_id.get(account.get("account_id"))
+                row = self._rows.get(scid) if scid else None
+                if row is None:
+                    continue
+                delta = _msat(account.get("balance_msat")) - _msat(row.get("to_us_msat"))
+                if self._adjust(scid, delta):
+                    self._applied()
+
+    def on_channel_state_changed(self, event: Dict[str, Any]) -> None:
+        new_state = event.get("new_state")
+        with self._lock:
+            scid = _scid(event.get("short_channel_id"))
+            if scid is None:
+                scid = self._by_channel_id.get(event.get("channel_id"))
+            if scid is None:
+                # Older CLN reported the SCID in channel_id
+                scid = _scid(event.get("channel_id"))
+            row = self._rows.get(scid) if scid else None
+            if row is not None:
+                row["state"] = new_state
+                self._applied()
+            elif new_state == "CHANNELD_NORMAL" and event.get("peer_id"):
+                self._pending_peers.add(event["peer_id"])
+                self._applied()
+
+    def set_peer_connected(self, peer_id: str, connected: bool) -> None:
+        with self._lock:
+            changed = False
+            for row in self._rows.values():
+                if row.get("peer_id") == peer_id:
+                    row["peer_connected"] = connected
+                    changed = True
+            if changed:
+                self._applied()
+
+    def note_fee_update(self, scid: str, base_fee_msat: int, fee_ppm: int) -> None:
+        """Record a fee we just set (there is no notification for it)."""
+        with self._lock:
+            row = self._rows.get(_scid(scid))
+            if row is None:
+                return
+            local = dict((row.get("updates") or {}).get("local") or {})
+            local["fee_base_msat"] = base_fee_msat
+            local["fee_proportional_millionths"] = fee_ppm
+            row["updates"] = dict(row.get("updates") or {}, local=local)
+            row["fee_base_msat"] = base_fee_msat
+            row["fee_proportional_millionths"] = fee_ppm
+
+    # =========================================================================
+    # Readers
+    # =========================================================================
+
+    def channels(self) -> List[Dict[str, Any]]:
+        """Copies of all channel rows (callers may annotate them)."""
+        if self._pending_peers:
+            self._refresh_pending()
+        with self._lock:
+            return [dict(row) for row in self._rows.values()]
+
+    def listpeerchannels(self) -> Dict[str, Any]:
+        """Drop-in for rpc.listpeerchannels() served from memory."""
+        return {"channels": self.channels()}
+
+    def channel_model(self) -> ChannelModel:
+        return ChannelModel.from_channels(self.channels())
+
+    def get_channel(self, scid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._rows.get(_scid(scid))
+            return dict(row) if row is not None else None
+
+    def local_balance_msat(self, scid: str) -> Optional[int]:
+        with self._lock:
+            row = self._rows.get(_scid(scid))
+            return _msat(row.get("to_us_msat")) if row is not None else None
+
+    def peer_for(self, scid: str) -> Optional[str]:
+        with self._lock:
+            row = self._rows.get(_scid(scid))
+            return row.get("peer_id") if row is not None else None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "channels": len(self._rows),
+                "seeded_at": self.seeded_at,
+                "reconciled_at": self.reconciled_at,
+                "reconcile_count": self.reconcile_count,
+                "restored_from": self.restored_from,
+                "events_applied": self.events_applied,
+                "events_since_reconcile": self.events_since_reconcile,
+                "pending_peer_fetches": len(self._pending_peers),
+                "last_reconcile": self.last_report,
+            }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Per-channel balance and fee gauges from memory (no pending-peer refresh)."""
+        local = MetricFamily("revenue_ops_channel_local_balance_msat", "gauge",
+                             "Local balance per channel", ("channel",))
+        capacity = MetricFamily("revenue_ops_channel_capacity_msat", "gauge",
+                                "Channel capacity", ("channel",))
+        fee = MetricFamily("revenue_ops_channel_fee_ppm", "gauge",
+                           "Our proportional fee per channel", ("channel",))
+        with self._lock:
+            for scid, row in self._rows.items():
+                local.set(_msat(row.get("to_us_msat")), channel=scid)
+                capacity.set(_msat(row.get("total_msat")), channel=scid)
+                ppm = row.get("fee_proportional_millionths")
+                if ppm is None:
+                    ppm = ((row.get("updates") or {}).get("local") or {}).get(
+                        "fee_proportional_millionths")
+                if ppm is not None:
+                    fee.set(int(ppm), channel=scid)
+        return [local, capacity, fee]
+
+
+def list_peer_channels(plugin, channel_state: Optional[ChannelStateModel]) -> Dict[str, Any]:
+    """listpeerchannels from the channel state model when ready, else RPC."""
+    if channel_state is not None and channel_state.ready:
+        return channel_state.listpeerchannels()
+    return plugin.rpc.listpeerchannels()
@@ -21,6 +21,10 @@ if TYPE_CHECKING:
 IMMUTABLE_CONFIG_KEYS: FrozenSet[str] = frozenset({
     'db_path',
     'dry_run',  # Safety: don't allow enabling dry_run to hide actions
+    'metrics_port',      # Exporter is started once at init
+    'metrics_textfile',
+    'forward_archive_dir',  # Archive is attached once at init
+    'db_convert_auto_vacuum',  # Only read at startup
 })
 
 # Type mapping for config fields (for validation)
@@ -28,6 +32,18 @@ CONFIG_FIELD_TYPES: Dict[str, type] = {
     'flow_interval': int,
     'fee_interval': int,
     'rebalance_interval': int,
+    'job_monitor_interval': int,
+    'channel_state_reconcile_interval': int,
+    'scheduler_max_workers': int,
+    'enable_adaptive_intervals': bool,
+    'warm_state_interval': int,
+    'metrics_port': int,
+    'metrics_textfile': str,
+    'metrics_textfile_interval': int,
+    'forward_archive_dir': str,
+    'db_query_profile': bool,
+    'db_slow_query_ms': int,
+    'db_convert_auto_vacuum': bool,
     'min_fee_ppm': int,
     'max_fee_ppm': int,
     'daily_budget_sats': int,
@@ -106,6 +122,13 @@ CONFIG_FIELD_RANGES: Dict[str, tuple] = {
     'hive_fee_ppm': (0, 100000),
     'hive_rebalance_tolerance': (0, 100000),
     'sling_chunk_size_sats': (1, 50000000),
+    'job_monitor_interval': (5, 3600),
+    'channel_state_reconcile_interval': (60, 86400),
+    'scheduler_max_workers': (1, 8),
+    'warm_state_interval': (60, 86400),
+    'metrics_port': (0, 65535),
+    'metrics_textfile_interval': (10, 3600),
+    'db_slow_query_ms': (0, 600000),
     'sling_max_hops': (2, 20),
     'sling_parallel_jobs': (1, 10),
     'sling_target_sink': (0.1, 0.9),
@@ -151,6 +174,18 @@ class Config:
     flow_interval: int = 3600      # 1 hour
     fee_interval: int = 1800       # 30 minutes
     rebalance_interval: int = 900  # 15 minutes
+    job_monitor_interval: int = 30   # Sling job checks (frees finished slots)
+    channel_state_reconcile_interval: int = 1800  # listpeerchannels drift check
+    scheduler_max_workers: int = 3   # Background tasks running at once
+    enable_adaptive_intervals: bool = False  # Scale intervals with node activity
+    warm_state_interval: int = 900   # Periodic warm-restart snapshot
+    metrics_port: int = 0            # OpenMetrics HTTP exporter on 127.0.0.1 (0 = off)
+    metrics_textfile: str = ''       # node_exporter textfile path ('' = off)
+    metrics_textfile_interval: int = 60
+    forward_archive_dir: str = ''    # Monthly cold-tier files for pruned forwards ('' = off)
+    db_query_profile: bool = False   # Per-statement timings for revenue-db-stats
+    db_slow_query_ms: int = 250      # Log slower statements with their plan (0 = off)
+    db_convert_auto_vacuum: bool = False  # One-time VACUUM of pre-auto_vacuum files at startup
     
     # Flow analysis parameters
     target_flow: int = 100000      # Target sats routed per day per channel
@@ -402,6 +437,18 @@ class ConfigSnapshot:
     flow_interval: int
     fee_interval: int
     rebalance_interval: int
+    job_monitor_interval: int
+    channel_state_reconcile_interval: int
+    scheduler_max_workers: int
+    enable_adaptive_intervals: bool
+    warm_state_interval: int
+    metrics_port: int
+    metrics_textfile: str
+    metrics_textfile_interval: int
+    forward_archive_dir: str
+    db_query_profile: bool
+    db_slow_query_ms: int
+    db_convert_auto_vacuum: bool
     
     # Flow analysis parameters
     target_flow: int
@@ -527,6 +574,18 @@ class ConfigSnapshot:
             flow_interval=config.flow_interval,
             fee_interval=config.fee_interval,
             rebalance_interval=config.rebalance_interval,
+            job_monitor_interval=config.job_monitor_interval,
+            channel_state_reconcile_interval=config.channel_state_reconcile_interval,
+            scheduler_max_workers=config.scheduler_max_workers,
+            enable_adaptive_intervals=config.enable_adaptive_intervals,
+            warm_state_interval=config.warm_state_interval,
+            metrics_port=config.metrics_port,
+            metrics_textfile=config.metrics_textfile,
+            metrics_textfile_interval=config.metrics_textfile_interval,
+            forward_archive_dir=config.forward_archive_dir,
+            db_query_profile=config.db_query_profile,
+            db_slow_query_ms=config.db_slow_query_ms,
+            db_convert_auto_vacuum=config.db_convert_auto_vacuum,
             target_flow=config.target_flow,
             flow_window_days=config.flow_window_days,
             source_threshold=config.source_threshold,
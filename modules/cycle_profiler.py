@@ -0,0 +1,307 @@
+"""
+Cycle Profiler module for cl-revenue-ops
+
+Named stage timers for the fee, flow and rebalance cycles.
+
+A cycle (adjust_all_fees, analyze_all_channels, find_rebalance_candidates)
+is wrapped with @profiled_cycle(loop). Inside it, code marks stages:
+
+    with stage("thompson"):
+        ...
+
+or decorates a helper with @timed_stage("bounds"). Stage time is
+exclusive: a stage nested in another is charged to itself and not to its
+parent, so RPC made while computing floors shows up under "rpc" and not
+"bounds". Time in no stage is reported as "other". The RPC proxy marks
+"rpc", "hive" (cl-hive calls) and "setchannel", so every caller gets them
+for free.
+
+begin_channel(channel_id) attributes the following stage time to a channel,
+giving per-channel percentiles for each stage. Outside an active cycle
+stage() and begin_channel() do nothing beyond a thread-local lookup.
+
+The last RING_SIZE cycle summaries per loop are kept in memory, and cycle
+durations and stage times are exported as metrics. On demand, the next
+cycle of a loop runs under cProfile and its stats are dumped to a pstats
+file.
+"""
+
+import cProfile
+import functools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .openmetrics import metrics
+
+
+RING_SIZE = 50
+
+# Per-cycle report: this many slowest channels are listed
+SLOWEST_CHANNELS = 5
+
+_CYCLE_SECONDS = metrics.histogram(
+    "revenue_ops_cycle_duration_seconds", "Wall time of fee, flow and rebalance cycles", ("loop",)
+)
+_STAGE_SECONDS = metrics.counter(
+    "revenue_ops_cycle_stage_seconds", "Exclusive time spent per cycle stage", ("loop", "stage")
+)
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _spread_ms(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "p50_ms": round(_percentile(values, 50) * 1000, 2),
+        "p95_ms": round(_percentile(values, 95) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+class _Frame:
+    __slots__ = ("name", "start", "child")
+
+    def __init__(self, name: str, start: float):
+        self.name = name
+        self.start = start
+        self.child = 0.0
+
+
+class _Cycle:
+    """Accumulates one cycle's stage times."""
+
+    def __init__(self, loop: str, start: float):
+        self.loop = loop
+        self.started_at = int(time.time())
+        self.start = start
+        self.stack: List[_Frame] = []
+        self.stages: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.channels: Dict[str, Dict[str, float]] = {}
+        self.channel_wall: Dict[str, float] = {}
+        self.channel: Optional[str] = None
+        self.channel_start = 0.0
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.channel is not None:
+            per_channel = self.channels.setdefault(self.channel, {})
+            per_channel[name] = per_channel.get(name, 0.0) + seconds
+
+    def close_channel(self, now: float) -> None:
+        if self.channel is not None:
+            self.channel_wall[self.channel] = (
+                self.channel_wall.get(self.channel, 0.0) + now - self.channel_start
+            )
+            self.channel = None
+
+    def summary(self, total: float) -> Dict[str, Any]:
+        stages = {
+            name: {"ms": round(seconds * 1000, 2), "calls": self.calls[name]}
+            for name, seconds in sorted(self.stages.items(), key=lambda kv: -kv[1])
+        }
+        other = max(0.0, total - sum(self.stages.values()))
+        per_channel_stages = {
+            name: _spread_ms([stages_.get(name, 0.0) for stages_ in self.channels.values()])
+            for name in sorted({n for stages_ in self.channels.values() for n in stages_})
+        }
+        slowest = sorted(self.channel_wall.items(), key=lambda kv: -kv[1])[:SLOWEST_CHANNELS]
+        return {
+            "loop": self.loop,
+            "started_at": self.started_at,
+            "total_ms": round(total * 1000, 2),
+            "stages": stages,
+            "other_ms": round(other * 1000, 2),
+            "channels": len(self.channel_wall),
+            "per_channel": {
+                "total": _spread_ms(list(self.channel_wall.values())),
+                "stages": per_channel_stages,
+            },
+            "slowest_channels": [
+                {"channel_id": cid, "ms": round(seconds * 1000, 2)} for cid, seconds in slowest
+            ],
+        }
+
+
+class CycleProfiler:
+    """Stage timers with a per-loop ring buffer of cycle summaries."""
+
+    def __init__(self, history: int = RING_SIZE,
+                 clock: Callable[[], float] = time.perf_counter):
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._history = history
+        self._cycles: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._pstats_requests: Dict[str, str] = {}
+        self._pstats_results: Dict[str, Dict[str, Any]] = {}
+
+    def _active(self) -> Optional[_Cycle]:
+        return getattr(self._local, "cycle", None)
+
+    # =========================================================================
+    # Instrumentation
+    # =========================================================================
+
+    @contextmanager
+    def cycle(self, loop: str):
+        """Profile one cycle. Nested cycles on the same thread are folded in."""
+        if self._active() is not None:
+            yield
+            return
+
+        with self._lock:
+            pstats_path = self._pstats_requests.pop(loop, None)
+        profile = None
+        if pstats_path:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError as e:
+                # Another profiler is active on this interpreter
+                self._pstats_results[loop] = {"path": None, "error": str(e)}
+                profile = None
+
+        current = _Cycle(loop, self._clock())
+        self._local.cycle = current
+        try:
+            yield
+        finally:
+            now = self._clock()
+            current.close_channel(now)
+            self._local.cycle = None
+            if profile is not None:
+                profile.disable()
+                try:
+                    profile.dump_stats(pstats_path)
+                    self._pstats_results[loop] = {"path": pstats_path, "error": None,
+                                                  "written_at": int(time.time())}
+                except OSError as e:
+                    self._pstats_results[loop] = {"path": pstats_path, "error": str(e)}
+            summary = current.summary(now - current.start)
+            with self._lock:
+                ring = self._cycles.setdefault(loop, deque(maxlen=self._history))
+                ring.append(summary)
+            _CYCLE_SECONDS.observe(now - current.start, loop=loop)
+            for name, seconds in current.stages.items():
+                _STAGE_SECONDS.inc(seconds, loop=loop, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a named stage of the active cycle (no-op outside one)."""
+        current = self._active()
+        if current is None:
+            yield
+            return
+
+        frame = _Frame(name, self._clock())
+        current.stack.append(frame)
+        try:
+            yield
+        finally:
+            current.stack.pop()
+            elapsed = self._clock() - frame.start
+            current.add(name, elapsed - frame.child)
+            if current.stack:
+                current.stack[-1].child += elapsed
+
+    def begin_channel(self, channel_id: str) -> None:
+        """Charge the following stage time to channel_id (ends the previous one)."""
+        current = self._active()
+        if current is None:
+            return
+        now = self._clock()
+        current.close_channel(now)
+        current.channel = channel_id
+        current.channel_start = now
+
+    def end_channel(self) -> None:
+        current = self._active()
+        if current is not None:
+            current.close_channel(self._clock())
+
+    def request_pstats(self, loop: str, path: str) -> None:
+        """Run the next cycle of loop under cProfile and dump stats to path."""
+        with self._lock:
+            self._pstats_requests[loop] = path
+
+    # =========================================================================
+    # Reporting
+    # =========================================================================
+
+    def get_report(self, loop: str, recent: int = 10) -> Dict[str, Any]:
+        """Last cycle in full, recent cycle totals and mean stage times."""
+        with self._lock:
+            cycles = list(self._cycles.get(loop, ()))
+            pending = loop in self._pstats_requests
+        mean_stages: Dict[str, float] = {}
+        for summary in cycles:
+            for name, entry in summary["stages"].items():
+                mean_stages[name] = mean_stages.get(name, 0.0) + entry["ms"]
+        return {
+            "cycles_recorded": len(cycles),
+            "last_cycle": cycles[-1] if cycles else None,
+            "recent": [
+                {"started_at": s["started_at"], "total_ms": s["total_ms"], "channels": s["channels"]}
+                for s in cycles[-recent:]
+            ],
+            "mean_stage_ms": {
+                name: round(total / len(cycles), 2)
+                for name, total in sorted(mean_stages.items(), key=lambda kv: -kv[1])
+            },
+            "pstats": {
+                "pending": pending,
+                "last": self._pstats_results.get(loop),
+            },
+        }
+
+
+# Shared by the cycle entry points, the RPC proxy and the debug RPCs
+profiler = CycleProfiler()
+
+
+def stage(name: str):
+    """Stage timer on the shared profiler."""
+    return profiler.stage(name)
+
+
+def timed_stage(name: str):
+    """Decorator: charge each call of a helper to a stage of the active cycle."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if profiler._active() is None:
+                return func(*args, **kwargs)
+            with profiler.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin_channel(channel_id: str) -> None:
+    profiler.begin_channel(channel_id)
+
+
+def end_channel() -> None:
+    profiler.end_channel()
+
+
+def profiled_cycle(loop: str):
+    """Decorator: profile each call of a cycle entry point on the shared profiler."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with profiler.cycle(loop):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
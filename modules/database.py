@@ -19,9 +19,101 @@ import json
 import math
 import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+from .db_writer import ConnectionProxy, DatabaseWriter
+from .openmetrics import MetricFamily
+from .query_profiler import QueryProfiler
+
+
+# =============================================================================
+# Compact forwards storage
+# =============================================================================
+# SCIDs are stored as packed integers: block << 40 | txindex << 16 | outnum
+# (24/24/16 bits, the BOLT #7 layout). SQLite integers are signed 64-bit,
+# so block heights are limited to 23 bits (8388607). 0 stands for an empty
+# or unparsable SCID and decodes to ''.
+
+def scid_to_int(scid: Optional[str]) -> Optional[int]:
+    """'812345x1234x0' (or '812345:1234:0') -> packed integer, None if invalid."""
+    if not scid:
+        return None
+    parts = scid.replace(':', 'x').split('x')
+    if len(parts) != 3:
+        return None
+    try:
+        block, tx, out = int(parts[0]), int(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+    if not (0 <= block < 1 << 23 and 0 <= tx < 1 << 24 and 0 <= out < 1 << 16):
+        return None
+    return block << 40 | tx << 16 | out
+
+
+def _scid_param(channel_id: Optional[str]) -> int:
+    """A channel id as an integer query parameter (-1, matching no row, if invalid)."""
+    value = scid_to_int(channel_id)
+    return value if value is not None else -1
+
+
+def int_to_scid(value: Optional[int]) -> str:
+    if not value:
+        return ''
+    return f"{value >> 40}x{(value >> 16) & 0xFFFFFF}x{value & 0xFFFF}"
+
+
+def _scid_decode_sql(col: str) -> str:
+    return (f"(CASE WHEN {col} = 0 THEN '' ELSE ({col} >> 40) || 'x' || "
+            f"(({col} >> 16) & 16777215) || 'x' || ({col} & 65535) END)")
+
+
+def _scid_encode_sql(expr: str, invalid: str = "NULL") -> str:
+    """
+    SQL twin of scid_to_int(): packed integer of a text SCID, 0 for an
+    empty one and `invalid` (NULL by default) for text that scid_to_int()
+    rejects (non-digits, extra parts, block >= 2^23, txindex >= 2^24,
+    outnum >= 2^16).
+    """
+    text = f"replace(COALESCE({expr}, ''), ':', 'x')"
+    rest = f"substr({text}, instr({text}, 'x') + 1)"
+    block = f"substr({text}, 1, instr({text}, 'x') - 1)"
+    tx = f"substr({rest}, 1, instr({rest}, 'x') - 1)"
+    out = f"substr({rest}, instr({rest}, 'x') + 1)"
+
+    def in_range(part: str, bits: int) -> str:
+        # Digits only, and at most 8 of them so the CAST cannot overflow
+        return (f"({part} <> '' AND {part} NOT GLOB '*[^0-9]*' AND length({part}) <= 8 "
+                f"AND CAST({part} AS INTEGER) < {1 << bits})")
+
+    return (f"(CASE WHEN {text} = '' THEN 0 "
+            f"WHEN instr({text}, 'x') > 1 AND instr({rest}, 'x') > 1 "
+            f"AND {in_range(block, 23)} AND {in_range(tx, 24)} AND {in_range(out, 16)} THEN "
+            f"(CAST({block} AS INTEGER) << 40) | (CAST({tx} AS INTEGER) << 16) | "
+            f"CAST({out} AS INTEGER) ELSE {invalid} END)")
+
+
+# Query fragments per forwards layout: {fwd} table, {in_ch}/{out_ch} channel
+# columns, {in_name}/{out_name} text SCIDs of alias f (for joins), {compact}
+# the select list matching the compact column order
+_COMPACT_COLUMNS = ("timestamp, out_scid, in_scid, in_msat, out_msat, fee_msat, "
+                    "resolved_time, resolution_time")
+_FORWARDS_LEGACY = {
+    "fwd": "forwards", "in_ch": "in_channel", "out_ch": "out_channel",
+    "in_name": "f.in_channel", "out_name": "f.out_channel",
+    "compact": (f"timestamp, {_scid_encode_sql('out_channel', '0')}, "
+                f"{_scid_encode_sql('in_channel', '0')}, "
+                "in_msat, out_msat, fee_msat, COALESCE(resolved_time, 0), "
+                "COALESCE(resolution_time, 0)"),
+}
+_FORWARDS_COMPACT = {
+    "fwd": "forwards_compact", "in_ch": "in_scid", "out_ch": "out_scid",
+    "in_name": _scid_decode_sql("f.in_scid"), "out_name": _scid_decode_sql("f.out_scid"),
+    "compact": _COMPACT_COLUMNS,
+}
+# Month files of the cold tier (modules/forward_archive.py)
+_FORWARDS_ARCHIVE = dict(_FORWARDS_COMPACT, fwd="forwards")
+
 
 class Database:
     """
@@ -39,6 +131,24 @@ class Database:
     - WAL mode enabled for better concurrent read/write performance
     """
     
+    # Forwards inserted per transaction by bulk_insert_forwards()
+    HYDRATION_BATCH_SIZE = 1000
+
+    # Legacy forwards rows copied per transaction by migrate_forwards_compact()
+    FORWARDS_MIGRATION_BATCH = 50000
+
+    # cleanup_old_data(): rows deleted per transaction, pause between
+    # transactions (lets forward_event inserts take the write lock), and the
+    # time budget per call; what is left is pruned by the next call
+    PRUNE_CHUNK_ROWS = 5000
+    PRUNE_YIELD_SECONDS = 0.02
+    MAINTENANCE_BUDGET_SECONDS = 30.0
+
+    # reclaim_space(): free pages returned to the filesystem per step
+    VACUUM_STEP_PAGES = 1000
+
+    WAL_SIZE_LIMIT = 64 * 1024 * 1024
+
     def __init__(self, db_path: str, plugin):
         """
         Initialize the database manager.
@@ -51,37 +161,91 @@ class Database:
         self.plugin = plugin
         # Thread-local storage for connections (Phase 5.5: Database Thread Safety)
         self._local = threading.local()
+        # The only read-write connection (started on the first write)
+        self.writer = DatabaseWriter(
+            self._open_writer_connection,
+            log=lambda msg, level: self.plugin.log(msg, level=level)
+        )
+        # Statement timings, off until a config with db_query_profile is set
+        self.query_profiler = QueryProfiler(
+            log=lambda msg, level: self.plugin.log(msg, level=level)
+        )
+        # Forwards layout (set by initialize()): compact table + view, or the
+        # legacy TEXT-SCID table waiting for migrate_forwards_compact()
+        self.forwards_compact = False
+        self.forwards_migration_pending = False
+        self._forwards_migrated_id = 0
+        # Cold tier for pruned forwards (set_forward_archive); None = aggregate only
+        self.forward_archive = None
+        # Totals from cleanup_old_data()/reclaim_space() for the exporter
+        self._maintenance_lock = threading.Lock()
+        self.maintenance_stats: Dict[str, Any] = {
+            "rows_pruned": {},
+            "prune_seconds": 0.0,
+            "pages_freed": 0,
+            "vacuum_seconds": 0.0,
+            "freelist_pages": 0,
+            "checkpoints": 0,
+            "checkpoint_partial": 0,
+            "wal_pages": 0,
+            "last_run": 0,
+        }
         
-    def _get_connection(self) -> sqlite3.Connection:
+    def _open_writer_connection(self) -> sqlite3.Connection:
+        """The read-write connection, opened on the DatabaseWriter thread."""
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(
+            self.db_path,
+            isolation_level=None  # Autocommit mode
+        )
+        conn.row_factory = sqlite3.Row
+
+        # Free pages are returned by cleanup_old_data() in small steps
+        # (incremental_vacuum) instead of a full VACUUM. Only takes effect
+        # on a new file, so it must precede journal_mode (which writes
+        # the header); existing files are converted by convert_auto_vacuum()
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+
+        # Enable Write-Ahead Logging for better multi-thread concurrency
+        # WAL allows readers and writers to operate concurrently
+        conn.execute("PRAGMA journal_mode=WAL;")
+        # Truncate the WAL back to this size after a checkpoint, so one
+        # large prune does not leave a huge -wal file behind
+        conn.execute(f"PRAGMA journal_size_limit={self.WAL_SIZE_LIMIT};")
+
+        # Other processes (sqlite3 CLI, backups) can still hold the lock
+        conn.execute("PRAGMA busy_timeout=5000;")
+        # Reasonable durability/performance tradeoff for WAL mode
+        conn.execute("PRAGMA synchronous=NORMAL;")
+        self.plugin.log("Database: Opened writer connection", level='debug')
+        return conn
+
+    def _get_connection(self) -> ConnectionProxy:
         """
-        Get or create a thread-local database connection.
-        
-        Each thread gets its own isolated connection to prevent race conditions
-        during concurrent database operations (e.g., when Rebalancer and Fee
-        Controller run simultaneously on different timer threads).
-        
+        Get or create this thread's database connection.
+
+        Each thread gets its own query_only connection for reads (Phase 5.5:
+        Database Thread Safety); writes and explicit transactions are run
+        by the single writer thread (see modules/db_writer.py), so threads
+        never compete for the SQLite write lock.
+
         Returns:
-            sqlite3.Connection: Thread-local database connection
+            ConnectionProxy: sqlite3.Connection look-alike for this thread
         """
         if not hasattr(self._local, 'conn') or self._local.conn is None:
             # Ensure directory exists
             os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-            
-            # Create new connection for this thread
-            self._local.conn = sqlite3.connect(
+
+            reader = sqlite3.connect(
                 self.db_path,
                 isolation_level=None  # Autocommit mode
             )
-            self._local.conn.row_factory = sqlite3.Row
-            
-            # Enable Write-Ahead Logging for better multi-thread concurrency
-            # WAL allows readers and writers to operate concurrently
-            self._local.conn.execute("PRAGMA journal_mode=WAL;")
-            
-            # Reduce "database is locked" errors under contention
-            self._local.conn.execute("PRAGMA busy_timeout=5000;")
-            # Reasonable durability/performance tradeoff for WAL mode
-            self._local.conn.execute("PRAGMA synchronous=NORMAL;")
+            reader.row_factory = sqlite3.Row
+            # Checkpoints and a starting writer can briefly lock out readers
+            reader.execute("PRAGMA busy_timeout=5000;")
+            reader.execute("PRAGMA query_only=ON;")
+            self._local.conn = ConnectionProxy(reader, self.writer, self.query_profiler)
             self.plugin.log(
                 f"Database: Created new thread-local connection (thread={threading.current_thread().name})",
                 level='debug'
@@ -111,21 +275,19 @@ class Database:
 
     def close_all_connections(self) -> None:
         """
-        Close the main thread's connection and checkpoint WAL.
+        Checkpoint the WAL, stop the writer and close this thread's connection.
 
         Should be called during plugin shutdown to ensure clean state.
         """
-        conn = getattr(self._local, 'conn', None)
-        if conn:
-            try:
-                # Checkpoint WAL to ensure all writes are in main database
-                conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
-                conn.close()
-                self.plugin.log("Database: Shutdown checkpoint complete", level='info')
-            except Exception as e:
-                self.plugin.log(f"Error during shutdown: {e}", level='warn')
-            finally:
-                self._local.conn = None
+        try:
+            # Checkpoint WAL to ensure all writes are in main database
+            self._get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE);")
+            self.writer.stop()
+            self.plugin.log("Database: Shutdown checkpoint complete", level='info')
+        except Exception as e:
+            self.plugin.log(f"Error during shutdown: {e}", level='warn')
+        finally:
+            self.close_connection()
 
     # =========================================================================
     # Security: Input Validation Constants and Methods (Accounting v2.0)
@@ -325,22 +487,9 @@ class Database:
             )
         """)
         
-        # Real-time forwards tracking
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS forwards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                in_channel TEXT NOT NULL,
-                out_channel TEXT NOT NULL,
-                in_msat INTEGER NOT NULL,
-                out_msat INTEGER NOT NULL,
-                fee_msat INTEGER NOT NULL,
-                resolution_time REAL DEFAULT 0,
-                timestamp INTEGER NOT NULL,
-                resolved_time INTEGER DEFAULT 0
-            )
-        """)
-        # Phase 2: Ensure forwards schema is idempotent and restart-safe
-        self._migrate_forwards_schema(conn)
+        # Real-time forwards tracking (compact layout, or the legacy table
+        # until migrate_forwards_compact() has run)
+        self._init_forwards_storage(conn)
 
         
         # Clboss unmanage tracking
@@ -467,6 +616,18 @@ class Database:
             )
         """)
         
+        # Warm-restart snapshot of in-memory state (single row, see
+        # modules/warm_state.py)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS warm_state (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                format_version INTEGER NOT NULL,
+                plugin_version TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        
         # Mempool fee history (Phase 7: Vegas Reflex MA calculation)
         # Tracks on-chain fee rates for detecting spikes
         conn.execute("""
@@ -480,19 +641,12 @@ class Database:
         # Create indexes for common queries
         conn.execute("CREATE INDEX IF NOT EXISTS idx_flow_history_channel ON flow_history(channel_id, timestamp)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_fee_changes_channel ON fee_changes(channel_id, timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_time ON forwards(timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_channels ON forwards(in_channel, out_channel)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_rebalance_costs_channel ON rebalance_costs(channel_id)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_channel_states_peer ON channel_states(peer_id)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_connection_history_peer_time ON peer_connection_history(peer_id, timestamp)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_mempool_time ON mempool_fee_history(timestamp)")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_rebalance_history_time ON rebalance_history(timestamp)")
         
-        # Composite index for get_volume_since optimization (TODO #17)
-        # Fee Controller queries by out_channel + timestamp every 30min
-        # This changes query complexity from O(N) to O(log N)
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_out_channel_time ON forwards(out_channel, timestamp)")
-        
         # Daily aggregated forwarding stats (Granular History)
         # Replacing the single 'lifetime_aggregates' counter with daily resolution
         conn.execute("""
@@ -625,13 +779,6 @@ class Database:
         except sqlite3.OperationalError:
             pass  # Column already exists
             
-        # Schema migration: Add resolution_time to forwards for risk premium
-        try:
-            conn.execute("ALTER TABLE forwards ADD COLUMN resolution_time REAL DEFAULT 0")
-            self.plugin.log("Added resolution_time column to forwards")
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        
         # Schema migration: Add last_broadcast_fee_ppm to fee_strategy_state
         try:
             conn.execute("ALTER TABLE fee_strategy_state ADD COLUMN last_broadcast_fee_ppm INTEGER DEFAULT 0")
@@ -752,6 +899,197 @@ class Database:
         self.plugin.log("Database initialized successfully")
     
 
+    def _init_forwards_storage(self, conn: sqlite3.Connection) -> None:
+        """
+        Compact forwards layout.
+
+        forwards_compact stores SCIDs as packed integers (scid_to_int) and is
+        a WITHOUT ROWID table clustered on its dedup key, which leads with
+        timestamp: the key doubles as the old UNIQUE index and time range
+        scans read the table in order. The two channel indexes carry the
+        key columns, so per-channel volume/fee sums are index-only.
+
+        `forwards` becomes a view with the old columns (text SCIDs; id is
+        NULL) and an INSTEAD OF INSERT trigger, for external readers and
+        older code paths. Queries that filter on channels use the table
+        directly (see _fwd()).
+
+        Databases with the legacy table keep using it until
+        migrate_forwards_compact() has copied the rows.
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS forwards_compact (
+                timestamp INTEGER NOT NULL,
+                out_scid INTEGER NOT NULL,
+                in_scid INTEGER NOT NULL,
+                in_msat INTEGER NOT NULL,
+                out_msat INTEGER NOT NULL,
+                fee_msat INTEGER NOT NULL,
+                resolved_time INTEGER NOT NULL DEFAULT 0,
+                resolution_time REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (timestamp, out_scid, in_scid, in_msat, out_msat, fee_msat, resolved_time)
+            ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_fwdc_out ON forwards_compact(out_scid, timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_fwdc_in ON forwards_compact(in_scid, timestamp)")
+
+        row = conn.execute(
+            "SELECT type FROM sqlite_master WHERE name = 'forwards'"
+        ).fetchone()
+        if row is None:
+            self._create_forwards_view(conn)
+        elif row["type"] == "table":
+            self._init_legacy_forwards(conn)
+            self.forwards_compact = False
+            self.forwards_migration_pending = True
+            return
+        self.forwards_compact = True
+        self.forwards_migration_pending = False
+
+    def _create_forwards_view(self, conn: sqlite3.Connection) -> None:
+        conn.execute(f"""
+            CREATE VIEW IF NOT EXISTS forwards AS
+            SELECT NULL AS id,
+                   {_scid_decode_sql('in_scid')} AS in_channel,
+                   {_scid_decode_sql('out_scid')} AS out_channel,
+                   in_msat, out_msat, fee_msat, resolution_time, timestamp, resolved_time
+            FROM forwards_compact
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS forwards_insert
+            INSTEAD OF INSERT ON forwards
+            BEGIN
+                INSERT INTO forwards_compact
+                (timestamp, out_scid, in_scid, in_msat, out_msat, fee_msat, resolved_time, resolution_time)
+                VALUES (NEW.timestamp, {_scid_encode_sql('NEW.out_channel')},
+                        {_scid_encode_sql('NEW.in_channel')}, NEW.in_msat, NEW.out_msat,
+                        NEW.fee_msat, COALESCE(NEW.resolved_time, 0),
+                        COALESCE(NEW.resolution_time, 0));
+            END
+        """)
+
+    def _init_legacy_forwards(self, conn: sqlite3.Connection) -> None:
+        """Pre-migration forwards table: the original schema and its indexes."""
+        try:
+            conn.execute("ALTER TABLE forwards ADD COLUMN resolution_time REAL DEFAULT 0")
+            self.plugin.log("Added resolution_time column to forwards")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        # Phase 2: Ensure forwards schema is idempotent and restart-safe
+        self._migrate_forwards_schema(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_time ON forwards(timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_channels ON forwards(in_channel, out_channel)")
+        # Composite index for get_volume_since optimization (TODO #17)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_forwards_out_channel_time ON forwards(out_channel, timestamp)")
+
+    def migrate_forwards_compact(self, batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        One-time online migration of the legacy forwards table.
+
+        Rows are copied in id order, one short transaction per batch, so
+        forward_event inserts and readers interleave with the copy. The
+        final batch, dropping the legacy table and creating the view run in
+        one IMMEDIATE transaction; rows inserted meanwhile are picked up by
+        that last copy. Safe to re-run after an interruption (duplicates are
+        ignored). Freed pages are reused by new rows; the file shrinks only
+        with a VACUUM.
+
+        Rows whose channel text does not encode as a SCID (see
+        scid_to_int) are not copied: they are kept, unchanged, in
+        forwards_unencodable and counted as rejected.
+        """
+        if not self.forwards_migration_pending:
+            return {"migrated": False, "reason": "not needed"}
+
+        batch_size = batch_size or self.FORWARDS_MIGRATION_BATCH
+        conn = self._get_connection()
+        start = time.time()
+        out_scid, in_scid = _scid_encode_sql("out_channel"), _scid_encode_sql("in_channel")
+        copy_sql = f"""
+            INSERT OR IGNORE INTO forwards_compact ({_COMPACT_COLUMNS})
+            SELECT timestamp, {out_scid}, {in_scid}, in_msat, out_msat, fee_msat,
+                   COALESCE(resolved_time, 0), COALESCE(resolution_time, 0)
+            FROM forwards
+            WHERE id > ? AND id <= ? AND {out_scid} IS NOT NULL AND {in_scid} IS NOT NULL
+        """
+        reject_sql = f"""
+            INSERT OR IGNORE INTO forwards_unencodable
+            SELECT * FROM forwards
+            WHERE id > ? AND id <= ? AND ({out_scid} IS NULL OR {in_scid} IS NULL)
+        """
+        conn.execute("CREATE TABLE IF NOT EXISTS forwards_unencodable AS SELECT * FROM forwards WHERE 0")
+        # A re-run after an interruption sets the same rows aside again
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_forwards_unencodable_id "
+                     "ON forwards_unencodable(id)")
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) AS m FROM forwards").fetchone()["m"]
+        copied = 0
+        while self._forwards_migrated_id + batch_size < max_id:
+            lower, upper = self._forwards_migrated_id, self._forwards_migrated_id + batch_size
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                copied += conn.execute(copy_sql, (lower, upper)).rowcount
+                conn.execute(reject_sql, (lower, upper))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._forwards_migrated_id = upper
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            copied += conn.execute(copy_sql, (self._forwards_migrated_id, 1 << 62)).rowcount
+            conn.execute(reject_sql, (self._forwards_migrated_id, 1 << 62))
+            rejected = conn.execute(
+                "SELECT COUNT(*) AS n FROM forwards_unencodable").fetchone()["n"]
+            legacy_rows = conn.execute("SELECT COUNT(*) AS n FROM forwards").fetchone()["n"]
+            conn.execute("DROP TABLE forwards")
+            self._create_forwards_view(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        self.forwards_compact = True
+        self.forwards_migration_pending = False
+        result = {
+            "migrated": True,
+            "legacy_rows": legacy_rows,
+            "copied": copied,
+            "rejected": rejected,
+            "duplicates": max(0, legacy_rows - copied - rejected),
+            "seconds": round(time.time() - start, 1),
+        }
+        self.plugin.log(
+            f"DB migration: forwards moved to the compact layout ({copied} of "
+            f"{legacy_rows} rows copied, {result['duplicates']} duplicates dropped) "
+            f"in {result['seconds']}s",
+            level="info"
+        )
+        if rejected:
+            self.plugin.log(
+                f"DB migration: {rejected} forwards with unparsable channel ids were not "
+                f"copied; they are kept in the forwards_unencodable table",
+                level="warn"
+            )
+        return result
+
+    def _fwd(self) -> Dict[str, str]:
+        """SQL fragments for the current forwards layout (see _FORWARDS_*)."""
+        return _FORWARDS_COMPACT if self.forwards_compact else _FORWARDS_LEGACY
+
+    def _channel_param(self, channel_id: str) -> Any:
+        """A channel id as the current forwards layout stores it."""
+        if not self.forwards_compact:
+            return channel_id
+        return _scid_param(channel_id)
+
+    def _channel_name(self, value: Any) -> str:
+        return int_to_scid(value) if self.forwards_compact else value
+
+    def set_forward_archive(self, archive) -> None:
+        """Move pruned forwards into this ForwardArchive instead of dropping them."""
+        self.forward_archive = archive
+
     def _migrate_forwards_schema(self, conn: sqlite3.Connection) -> None:
         """
         Phase 2: Make forwards ingestion idempotent and restart-safe.
@@ -991,6 +1329,12 @@ class Database:
             return dict(row)
         return None
     
+    def get_channel_states_map(self) -> Dict[str, Dict[str, Any]]:
+        """Get states of all tracked channels keyed by channel_id (one query)."""
+        conn = self._get_connection()
+        rows = conn.execute("SELECT * FROM channel_states").fetchall()
+        return {row['channel_id']: dict(row) for row in rows}
+
     def get_all_channel_states(self) -> List[Dict[str, Any]]:
         """Get states of all tracked channels."""
         conn = self._get_connection()
@@ -1361,6 +1705,23 @@ class Database:
             return row['last_time']
         return None
     
+    def get_last_rebalance_times(self) -> Dict[str, int]:
+        """
+        Get the last successful rebalance timestamp for every destination
+        channel in one grouped query (batch form of get_last_rebalance_time).
+
+        Returns:
+            Dict mapping to_channel -> unix timestamp
+        """
+        conn = self._get_connection()
+        rows = conn.execute("""
+            SELECT to_channel, MAX(timestamp) as last_time
+            FROM rebalance_history
+            WHERE status = 'success'
+            GROUP BY to_channel
+        """).fetchall()
+        return {row['to_channel']: row['last_time'] for row in rows if row['last_time']}
+
     def get_diagnostic_rebalance_stats(self, channel_id: str, days: int = 14) -> Dict[str, Any]:
         """
         Get stats for diagnostic rebalance attempts for a channel.
@@ -1426,9 +1787,9 @@ class Database:
         conn = self._get_connection()
         row = conn.execute("""
             SELECT COALESCE(SUM(fee_msat), 0) as total_fees_msat
-            FROM forwards
+            FROM {fwd}
             WHERE timestamp >= ?
-        """, (since_timestamp,)).fetchone()
+        """.format(**self._fwd()), (since_timestamp,)).fetchone()
         
         # Convert msat to sats
         return (row['total_fees_msat'] // 1000) if row else 0
@@ -1552,9 +1913,9 @@ class Database:
         rev_row = conn.execute("""
             SELECT COALESCE(SUM(fee_msat), 0) as revenue_msat,
                    COUNT(*) as forward_count
-            FROM forwards
-            WHERE out_channel = ? AND timestamp >= ?
-        """, (channel_id, since)).fetchone()
+            FROM {fwd}
+            WHERE {out_ch} = ? AND timestamp >= ?
+        """.format(**self._fwd()), (self._channel_param(channel_id), since)).fetchone()
 
         # Rebalance costs for this channel
         cost_row = conn.execute("""
@@ -1605,9 +1966,9 @@ class Database:
             SELECT COALESCE(SUM(in_msat), 0) as sourced_volume_msat,
                    COALESCE(SUM(fee_msat), 0) as sourced_fee_msat,
                    COUNT(*) as sourced_forward_count
-            FROM forwards
-            WHERE in_channel = ? AND timestamp >= ?
-        """, (channel_id, since)).fetchone()
+            FROM {fwd}
+            WHERE {in_ch} = ? AND timestamp >= ?
+        """.format(**self._fwd()), (self._channel_param(channel_id), since)).fetchone()
 
         sourced_volume_sats = (inbound_row['sourced_volume_msat'] // 1000) if inbound_row else 0
         sourced_fee_sats = (inbound_row['sourced_fee_msat'] // 1000) if inbound_row else 0
@@ -2017,6 +2378,42 @@ class Database:
         
         return [dict(row) for row in rows]
 
+    def get_rebalance_history_by_peers(self, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Batch form of get_rebalance_history_by_peer for all peers: the most
+        recent `limit` rebalances into each peer's channels, in one query.
+
+        Returns:
+            Dict mapping peer_id -> list of rebalance records (newest first)
+        """
+        conn = self._get_connection()
+        rows = conn.execute("""
+            SELECT peer_id, to_channel, amount_sats, fee_paid_msat, amount_msat, status, timestamp
+            FROM (
+                SELECT
+                    cs.peer_id,
+                    rh.to_channel,
+                    rh.amount_sats,
+                    COALESCE(rh.actual_fee_sats, 0) * 1000 as fee_paid_msat,
+                    rh.amount_sats * 1000 as amount_msat,
+                    rh.status,
+                    rh.timestamp,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY cs.peer_id ORDER BY rh.timestamp DESC
+                    ) as rn
+                FROM rebalance_history rh
+                JOIN channel_states cs ON cs.channel_id = rh.to_channel
+            )
+            WHERE rn <= ?
+            ORDER BY peer_id, timestamp DESC
+        """, (limit,)).fetchall()
+
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            record = dict(row)
+            result.setdefault(record.pop('peer_id'), []).append(record)
+        return result
+
     def get_historical_inbound_fee_ppm(self, peer_id: str, window_days: int = 30,
                                         min_samples: int = 3) -> Optional[Dict[str, Any]]:
         """
@@ -2069,6 +2466,50 @@ class Database:
             ORDER BY timestamp DESC
         """, (*channel_ids, since)).fetchall()
 
+        return self._summarize_inbound_fees(rows, min_samples)
+
+    def get_historical_inbound_fee_ppms(self, window_days: int = 30,
+                                        min_samples: int = 3) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch form of get_historical_inbound_fee_ppm for all peers in one query.
+
+        Returns:
+            Dict mapping peer_id -> summary dict (peers with fewer than
+            min_samples successful rebalances are omitted)
+        """
+        conn = self._get_connection()
+        since = int(time.time()) - (window_days * 86400)
+
+        rows = conn.execute("""
+            SELECT
+                cs.peer_id,
+                rh.amount_sats,
+                rh.actual_fee_sats,
+                (rh.actual_fee_sats * 1000000) / NULLIF(rh.amount_sats, 0) as fee_ppm
+            FROM rebalance_history rh
+            JOIN channel_states cs ON cs.channel_id = rh.to_channel
+            WHERE rh.status = 'success'
+              AND rh.actual_fee_sats IS NOT NULL
+              AND rh.actual_fee_sats > 0
+              AND rh.amount_sats > 0
+              AND rh.timestamp >= ?
+            ORDER BY rh.timestamp DESC
+        """, (since,)).fetchall()
+
+        by_peer: Dict[str, List[Any]] = {}
+        for row in rows:
+            by_peer.setdefault(row['peer_id'], []).append(row)
+
+        result = {}
+        for peer_id, peer_rows in by_peer.items():
+            summary = self._summarize_inbound_fees(peer_rows, min_samples)
+            if summary:
+                result[peer_id] = summary
+        return result
+
+    @staticmethod
+    def _summarize_inbound_fees(rows: List[Any], min_samples: int) -> Optional[Dict[str, Any]]:
+        """Volume-weighted average / median fee PPM over successful rebalance rows."""
         if len(rows) < min_samples:
             return None
 
@@ -2124,7 +2565,9 @@ class Database:
             Unix timestamp of the latest forward, or None if table is empty
         """
         conn = self._get_connection()
-        row = conn.execute("SELECT MAX(timestamp) as max_ts FROM forwards").fetchone()
+        row = conn.execute(
+            "SELECT MAX(timestamp) as max_ts FROM {fwd}".format(**self._fwd())
+        ).fetchone()
         return row['max_ts'] if row and row['max_ts'] else None
     
     
@@ -2133,6 +2576,8 @@ class Database:
             Bulk insert forwards from RPC hydration.
 
             Phase 2: Idempotent insert using INSERT OR IGNORE under a UNIQUE index.
+            Rows are committed in transactions of HYDRATION_BATCH_SIZE instead
+            of one autocommit per row.
 
             Args:
                 forwards: List of dicts with keys:
@@ -2145,37 +2590,48 @@ class Database:
             """
             conn = self._get_connection()
             inserted = 0
+            compact = self.forwards_compact
 
-            for fwd in forwards:
+            for start in range(0, len(forwards), self.HYDRATION_BATCH_SIZE):
+                conn.execute("BEGIN IMMEDIATE")
                 try:
-                    in_chan = (fwd.get('in_channel', '') or '').replace(':', 'x')
-                    out_chan = (fwd.get('out_channel', '') or '').replace(':', 'x')
-                    ts = int(fwd.get('received_time', 0) or 0)
-                    rt = int(fwd.get('resolved_time', 0) or 0)
-                    res_dur = float(fwd.get('resolution_time', 0) or 0)
-                    if rt <= 0 and res_dur and ts:
-                        rt = ts + int(res_dur)
-
-                    cur = conn.execute("""
-                        INSERT OR IGNORE INTO forwards
-                        (in_channel, out_channel, in_msat, out_msat, fee_msat, resolution_time, timestamp, resolved_time)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        in_chan,
-                        out_chan,
-                        int(fwd.get('in_msat', 0) or 0),
-                        int(fwd.get('out_msat', 0) or 0),
-                        int(fwd.get('fee_msat', 0) or 0),
-                        res_dur,
-                        ts,
-                        rt
-                    ))
-                    # sqlite3 cursor.rowcount is 1 for inserted, 0 for ignored
-                    if getattr(cur, "rowcount", 0) == 1:
-                        inserted += 1
+                    for fwd in forwards[start:start + self.HYDRATION_BATCH_SIZE]:
+                        try:
+                            in_chan = (fwd.get('in_channel', '') or '').replace(':', 'x')
+                            out_chan = (fwd.get('out_channel', '') or '').replace(':', 'x')
+                            ts = int(fwd.get('received_time', 0) or 0)
+                            rt = int(fwd.get('resolved_time', 0) or 0)
+                            res_dur = float(fwd.get('resolution_time', 0) or 0)
+                            if rt <= 0 and res_dur and ts:
+                                rt = ts + int(res_dur)
+
+                            if compact:
+                                in_chan = scid_to_int(in_chan) or 0
+                                out_chan = scid_to_int(out_chan) or 0
+                            cur = conn.execute("""
+                                INSERT OR IGNORE INTO {fwd}
+                                ({in_ch}, {out_ch}, in_msat, out_msat, fee_msat, resolution_time, timestamp, resolved_time)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                            """.format(**self._fwd()), (
+                                in_chan,
+                                out_chan,
+                                int(fwd.get('in_msat', 0) or 0),
+                                int(fwd.get('out_msat', 0) or 0),
+                                int(fwd.get('fee_msat', 0) or 0),
+                                res_dur,
+                                ts,
+                                rt
+                            ))
+                            # sqlite3 cursor.rowcount is 1 for inserted, 0 for ignored
+                            if getattr(cur, "rowcount", 0) == 1:
+                                inserted += 1
+                        except Exception:
+                            # Skip invalid records
+                            pass
+                    conn.execute("COMMIT")
                 except Exception:
-                    # Skip invalid records
-                    pass
+                    conn.execute("ROLLBACK")
+                    raise
 
             return inserted
 
@@ -2207,30 +2663,43 @@ class Database:
         flow_data: Dict[str, list] = {}
 
         # Build query based on whether we're filtering by channel
+        fwd = self._fwd()
         if channel_id:
             query = """
-                SELECT in_channel, out_channel, in_msat, out_msat, timestamp
-                FROM forwards
-                WHERE timestamp >= ? AND (in_channel = ? OR out_channel = ?)
-            """
-            params = (start_time, channel_id, channel_id)
+                SELECT {in_ch} AS in_channel, {out_ch} AS out_channel, in_msat, out_msat, timestamp
+                FROM {fwd}
+                WHERE timestamp >= ? AND ({in_ch} = ? OR {out_ch} = ?)
+            """.format(**fwd)
+            param = self._channel_param(channel_id)
+            params = (start_time, param, param)
         else:
             query = """
-                SELECT in_channel, out_channel, in_msat, out_msat, timestamp
-                FROM forwards
+                SELECT {in_ch} AS in_channel, {out_ch} AS out_channel, in_msat, out_msat, timestamp
+                FROM {fwd}
                 WHERE timestamp >= ?
-            """
+            """.format(**fwd)
             params = (start_time,)
 
         rows = conn.execute(query, params).fetchall()
 
+        # Compact layout: decode each distinct SCID once
+        names: Dict[Any, str] = {}
+
+        def name(value):
+            if not self.forwards_compact:
+                return value
+            text = names.get(value)
+            if text is None:
+                text = names[value] = int_to_scid(value)
+            return text
+
         def init_bucket():
             """Initialize a single day bucket with v2.0 fields."""
             return {'in': 0, 'out': 0, 'count': 0, 'last_ts': 0}
 
         for row in rows:
-            in_channel = row['in_channel']
-            out_channel = row['out_channel']
+            in_channel = name(row['in_channel'])
+            out_channel = name(row['out_channel'])
             in_msat = row['in_msat'] or 0
             out_msat = row['out_msat'] or 0
             timestamp = row['timestamp']
@@ -2265,7 +2734,7 @@ class Database:
     
     
     def record_forward(self, in_channel: str, out_channel: str,
-                       in_msat: int, out_msat: int, fee_msat: int, *args) -> None:
+                       in_msat: int, out_msat: int, fee_msat: int, *args) -> bool:
         """
         Record a completed forward for real-time tracking.
 
@@ -2276,6 +2745,9 @@ class Database:
           - Legacy call: record_forward(in_channel, out_channel, in_msat, out_msat, fee_msat, resolution_time)
           - Phase 2 call: record_forward(in_channel, out_channel, in_msat, out_msat, fee_msat,
                                          received_time, resolved_time[, resolution_time])
+
+        Returns:
+            True if the forward was inserted, False if it was a duplicate
         """
         # Parse legacy vs Phase 2 call patterns
         received_time: int = 0
@@ -2325,11 +2797,15 @@ class Database:
 
         # MAJOR-10 FIX: Return whether this was a new insert or duplicate
         # Use cursor.rowcount to detect if INSERT OR IGNORE actually inserted
+        if self.forwards_compact:
+            in_value, out_value = scid_to_int(in_channel) or 0, scid_to_int(out_channel) or 0
+        else:
+            in_value, out_value = in_channel, out_channel
         cursor = conn.execute("""
-            INSERT OR IGNORE INTO forwards
-            (in_channel, out_channel, in_msat, out_msat, fee_msat, resolution_time, timestamp, resolved_time)
+            INSERT OR IGNORE INTO {fwd}
+            ({in_ch}, {out_ch}, in_msat, out_msat, fee_msat, resolution_time, timestamp, resolved_time)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (in_channel, out_channel, int(in_msat), int(out_msat), int(fee_msat),
+        """.format(**self._fwd()), (in_value, out_value, int(in_msat), int(out_msat), int(fee_msat),
                 float(resolution_time or 0), ts, rt))
 
         # Log duplicate detection for observability
@@ -2340,24 +2816,188 @@ class Database:
                 f"(received={received_time}, resolved={resolved_time})",
                 level='debug'
             )
+            return False
+        return True
+
+    def get_forwards_since(self, since_timestamp: int) -> List[Dict[str, Any]]:
+        """
+        Get raw settled forwards since a timestamp, oldest first.
+
+        Used to seed the online portfolio statistics at startup without
+        calling listforwards/bookkeeper. Reads the archived months too when
+        a forward archive is set, so the window is not cut at the prune
+        horizon of the hot table.
+
+        Returns:
+            List of dicts with out_channel, out_msat, fee_msat, received_time
+        """
+        forwards: List[Dict[str, Any]] = []
+        for tier, fwd, run, _ in self._forward_tiers(since_timestamp, int(time.time()) + 1):
+            decode = self._channel_name if tier == "hot" else int_to_scid
+            names: Dict[Any, str] = {}
+            for row in run("""
+                SELECT {out_ch} AS out_channel, out_msat, fee_msat, timestamp
+                FROM {fwd}
+                WHERE timestamp >= ?
+                ORDER BY timestamp
+            """.format(**fwd), (since_timestamp,)):
+                out_channel = row["out_channel"]
+                if out_channel not in names:
+                    names[out_channel] = decode(out_channel)
+                forwards.append({
+                    "out_channel": names[out_channel],
+                    "out_msat": row["out_msat"] or 0,
+                    "fee_msat": row["fee_msat"] or 0,
+                    "received_time": row["timestamp"],
+                })
+        return forwards
+
+    def get_oldest_forward_timestamp(self) -> Optional[int]:
+        """Timestamp of the oldest forward kept in any tier (None if there are none)."""
+        for _, fwd, run, _ in self._forward_tiers(0, int(time.time()) + 1):
+            for row in run("SELECT MIN(timestamp) AS ts FROM {fwd}".format(**fwd), ()):
+                if row["ts"] is not None:
+                    return int(row["ts"])
+        return None
+
+    # =========================================================================
+    # Forward history across the hot and cold tiers
+    # =========================================================================
+
+    FORWARD_HISTORY_GROUPS = ("day", "month", "channel")
+
+    def _forward_tiers(self, since: int, until: int) -> Iterator[Tuple[str, Dict[str, str], Any, Any]]:
+        """
+        (tier, fragments, run, channel_param) for each tier overlapping
+        [since, until): archived months oldest first, then the hot table.
+        run(sql, params) returns the rows of that tier.
+        """
+        archive = self.forward_archive
+        if archive is not None:
+            for year, month in archive.months_between(since, until):
+                def run(sql, params, year=year, month=month):
+                    conn = archive.connect(year, month)
+                    try:
+                        yield from conn.execute(sql, params)
+                    finally:
+                        conn.close()
+                yield "%04d-%02d" % (year, month), _FORWARDS_ARCHIVE, run, _scid_param
+        conn = self._get_connection()
+        yield "hot", self._fwd(), conn.execute, self._channel_param
+
+    def get_forward_history(self, since: int, until: Optional[int] = None,
+                            channel_id: Optional[str] = None,
+                            group_by: str = "day") -> Dict[str, Any]:
+        """
+        Forward volume and fees over any window, hot and archived.
+
+        Aggregates each tier in SQL and merges the buckets, so long windows
+        cost one indexed scan per archived month plus the hot table.
+
+        Args:
+            since: Window start (unix seconds, inclusive)
+            until: Window end (exclusive, default now)
+            channel_id: Only forwards routed out through this channel
+            group_by: 'day' (UTC midnight), 'month' ('YYYY-MM') or 'channel'
+
+        Returns:
+            Dict with buckets (oldest/lowest key first), totals and the
+            forwards read from each tier
+        """
+        if group_by not in self.FORWARD_HISTORY_GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(self.FORWARD_HISTORY_GROUPS)}")
+        until = until if until is not None else int(time.time()) + 1
+        keys = {
+            "day": ("(f.timestamp / 86400) * 86400", "1"),
+            "month": ("strftime('%Y-%m', f.timestamp, 'unixepoch')", "1"),
+            "channel": ("{out_name}", "f.{out_ch}"),
+        }
+        key_sql, group_sql = keys[group_by]
+
+        buckets: Dict[Any, Dict[str, Any]] = {}
+        tiers: Dict[str, int] = {}
+        for tier, fwd, run, channel_param in self._forward_tiers(since, until):
+            params: Tuple[Any, ...] = (since, until)
+            channel_filter = ""
+            if channel_id:
+                channel_filter = "AND f.{out_ch} = ?"
+                params += (channel_param(channel_id),)
+            sql = ("""
+                SELECT """ + key_sql + """ AS key, COUNT(*) AS forwards,
+                       COALESCE(SUM(f.in_msat), 0) AS in_msat,
+                       COALESCE(SUM(f.out_msat), 0) AS out_msat,
+                       COALESCE(SUM(f.fee_msat), 0) AS fee_msat
+                FROM {fwd} f
+                WHERE f.timestamp >= ? AND f.timestamp < ? """ + channel_filter + """
+                GROUP BY """ + group_sql).format(**fwd)
+            count = 0
+            for row in run(sql, params):
+                bucket = buckets.setdefault(row["key"], {
+                    "key": row["key"], "forwards": 0, "in_msat": 0, "out_msat": 0, "fee_msat": 0,
+                })
+                for field in ("forwards", "in_msat", "out_msat", "fee_msat"):
+                    bucket[field] += row[field]
+                count += row["forwards"]
+            tiers[tier] = count
+
+        ordered = [buckets[key] for key in sorted(buckets)]
+        return {
+            "since": since,
+            "until": until,
+            "group_by": group_by,
+            "channel_id": channel_id,
+            "buckets": ordered,
+            "totals": {
+                field: sum(b[field] for b in ordered)
+                for field in ("forwards", "in_msat", "out_msat", "fee_msat")
+            },
+            "tiers": tiers,
+        }
+
+    def iter_forwards(self, since: int, until: Optional[int] = None,
+                      channel_id: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Raw forwards in [since, until) from every tier, oldest first.
+
+        Streams rows (one tier at a time) for exports and offline analysis.
+        A forward archived by a prune that was interrupted before its hot
+        delete committed can appear twice until the next prune.
+        """
+        until = until if until is not None else int(time.time()) + 1
+        for _, fwd, run, channel_param in self._forward_tiers(since, until):
+            params: Tuple[Any, ...] = (since, until)
+            channel_filter = ""
+            if channel_id:
+                channel_filter = "AND f.{out_ch} = ?"
+                params += (channel_param(channel_id),)
+            sql = ("""
+                SELECT f.timestamp, {in_name} AS in_channel, {out_name} AS out_channel,
+                       f.in_msat, f.out_msat, f.fee_msat, f.resolved_time, f.resolution_time
+                FROM {fwd} f
+                WHERE f.timestamp >= ? AND f.timestamp < ? """ + channel_filter + """
+                ORDER BY f.timestamp""").format(**fwd)
+            for row in run(sql, params):
+                yield dict(row)
 
     def get_channel_forwards(self, channel_id: str, since_timestamp: int) -> Dict[str, int]:
         """Get aggregate forward stats for a channel since a timestamp."""
         conn = self._get_connection()
         
         # Get inbound flow (channel received HTLCs)
+        fwd = self._fwd()
+        param = self._channel_param(channel_id)
         row_in = conn.execute("""
             SELECT COALESCE(SUM(in_msat), 0) as total_in_msat
-            FROM forwards
-            WHERE in_channel = ? AND timestamp >= ?
-        """, (channel_id, since_timestamp)).fetchone()
+            FROM {fwd}
+            WHERE {in_ch} = ? AND timestamp >= ?
+        """.format(**fwd), (param, since_timestamp)).fetchone()
         
         # Get outbound flow (channel sent HTLCs)
         row_out = conn.execute("""
             SELECT COALESCE(SUM(out_msat), 0) as total_out_msat
-            FROM forwards
-            WHERE out_channel = ? AND timestamp >= ?
-        """, (channel_id, since_timestamp)).fetchone()
+            FROM {fwd}
+            WHERE {out_ch} = ? AND timestamp >= ?
+        """.format(**fwd), (param, since_timestamp)).fetchone()
         
         return {
             'in_msat': row_in['total_in_msat'] if row_in else 0,
@@ -2383,9 +3023,9 @@ class Database:
         
         row = conn.execute("""
             SELECT COALESCE(SUM(out_msat), 0) as total_out_msat
-            FROM forwards
-            WHERE out_channel = ? AND timestamp > ?
-        """, (channel_id, timestamp)).fetchone()
+            FROM {fwd}
+            WHERE {out_ch} = ? AND timestamp > ?
+        """.format(**self._fwd()), (self._channel_param(channel_id), timestamp)).fetchone()
 
         # Convert msat to sats
         return (row['total_out_msat'] // 1000) if row else 0
@@ -2408,9 +3048,9 @@ class Database:
 
         row = conn.execute("""
             SELECT COUNT(*) as forward_count
-            FROM forwards
-            WHERE out_channel = ? AND timestamp > ?
-        """, (channel_id, timestamp)).fetchone()
+            FROM {fwd}
+            WHERE {out_ch} = ? AND timestamp > ?
+        """.format(**self._fwd()), (self._channel_param(channel_id), timestamp)).fetchone()
 
         return row['forward_count'] if row else 0
 
@@ -2431,9 +3071,9 @@ class Database:
 
         row = conn.execute("""
             SELECT MAX(timestamp) as last_ts
-            FROM forwards
-            WHERE out_channel = ?
-        """, (channel_id,)).fetchone()
+            FROM {fwd}
+            WHERE {out_ch} = ?
+        """.format(**self._fwd()), (self._channel_param(channel_id),)).fetchone()
 
         return row['last_ts'] if row and row['last_ts'] else None
 
@@ -2485,15 +3125,28 @@ class Database:
                 ),
                 0
             ) as weighted_out_msat
-            FROM forwards f
-            LEFT JOIN channel_states cs ON f.in_channel = cs.channel_id
+            FROM {fwd} f
+            LEFT JOIN channel_states cs ON cs.channel_id = {in_name}
             LEFT JOIN peer_reputation pr ON cs.peer_id = pr.peer_id
-            WHERE f.out_channel = ? AND f.timestamp > ?
-        """, (channel_id, timestamp)).fetchone()
+            WHERE f.{out_ch} = ? AND f.timestamp > ?
+        """.format(**self._fwd()), (self._channel_param(channel_id), timestamp)).fetchone()
         
         # Convert msat to sats
         return int(row['weighted_out_msat'] // 1000) if row else 0
     
+    def get_forward_totals_since(self, since_timestamp: int) -> Dict[str, int]:
+        """Count and total out_msat of settled forwards since a timestamp."""
+        conn = self._get_connection()
+        row = conn.execute("""
+            SELECT COUNT(*) as forward_count, COALESCE(SUM(out_msat), 0) as volume_msat
+            FROM {fwd}
+            WHERE timestamp >= ?
+        """.format(**self._fwd()), (since_timestamp,)).fetchone()
+        return {
+            "forward_count": row["forward_count"] if row else 0,
+            "volume_msat": row["volume_msat"] if row else 0,
+        }
+
     def get_daily_volume(self, days: int = 7) -> int:
         """Get total routing volume over the past N days."""
         conn = self._get_connection()
@@ -2501,9 +3154,9 @@ class Database:
         
         row = conn.execute("""
             SELECT COALESCE(SUM(out_msat), 0) as total_volume_msat
-            FROM forwards
+            FROM {fwd}
             WHERE timestamp >= ?
-        """, (since,)).fetchone()
+        """.format(**self._fwd()), (since,)).fetchone()
         
         return row['total_volume_msat'] // 1000 if row else 0
     
@@ -2525,10 +3178,10 @@ class Database:
         # We look at out_channel because that's where the capital was tied up
         rows = conn.execute("""
             SELECT f.resolution_time
-            FROM forwards f
-            JOIN channel_states cs ON f.out_channel = cs.channel_id
+            FROM {fwd} f
+            JOIN channel_states cs ON cs.channel_id = {out_name}
             WHERE cs.peer_id = ? AND f.timestamp >= ?
-        """, (peer_id, since)).fetchall()
+        """.format(**self._fwd()), (peer_id, since)).fetchall()
         
         if not rows:
             return {'avg': 0.0, 'std': 0.0}
@@ -2724,7 +3377,7 @@ class Database:
         
         # Current revenue from forwards table (in msat) - not yet pruned
         revenue_row = conn.execute(
-            "SELECT COALESCE(SUM(fee_msat), 0) as total FROM forwards"
+            "SELECT COALESCE(SUM(fee_msat), 0) as total FROM {fwd}".format(**self._fwd())
         ).fetchone()
         current_revenue_msat = revenue_row["total"] if revenue_row else 0
         
@@ -2763,7 +3416,7 @@ class Database:
 
         # Current forward count from forwards table
         count_row = conn.execute(
-            "SELECT COUNT(*) as total FROM forwards"
+            "SELECT COUNT(*) as total FROM {fwd}".format(**self._fwd())
         ).fetchone()
         current_forwards = count_row["total"] if count_row else 0
         
@@ -3405,6 +4058,20 @@ class Database:
             return (row["failure_count"], row["last_failure_time"])
         return (0, 0)
     
+    def get_all_failure_counts(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Get (failure_count, last_failure_time) for every channel with
+        recorded failures (batch form of get_failure_count).
+        """
+        conn = self._get_connection()
+        rows = conn.execute(
+            "SELECT channel_id, failure_count, last_failure_time FROM channel_failures"
+        ).fetchall()
+        return {
+            row["channel_id"]: (row["failure_count"], row["last_failure_time"])
+            for row in rows
+        }
+
     def increment_failure_count(self, channel_id: str) -> int:
         """
         Increment the failure count for a channel and update last failure time.
@@ -3609,7 +4276,8 @@ class Database:
     # Cleanup Methods
     # =========================================================================
     
-    def cleanup_old_data(self, days_to_keep: int = 8):
+    def cleanup_old_data(self, days_to_keep: int = 8,
+                         max_seconds: Optional[float] = None) -> Dict[str, Any]:
         """
         Remove old data to prevent database bloat.
         
@@ -3620,104 +4288,327 @@ class Database:
         
         LIFETIME PRESERVATION:
         Before deleting old forwards, we aggregate their revenue and count into
-        the lifetime_aggregates table. This ensures revenue-history remains
+        the daily_forwarding_stats table. This ensures revenue-history remains
         accurate even after pruning.
+
+        CHUNKED: rows are deleted oldest first, PRUNE_CHUNK_ROWS per
+        transaction with a short pause in between, so forward_event inserts
+        never wait behind one large delete. Stops after max_seconds
+        (default MAINTENANCE_BUDGET_SECONDS); the next call continues.
+        Space is returned by reclaim_space(), not here.
         
         Args:
             days_to_keep: Number of days of data to retain (default 8)
+            max_seconds: Time budget for this call
+
+        Returns:
+            Dict with rows pruned per table, preserved revenue, seconds and
+            whether everything past the cutoffs was pruned
         """
         conn = self._get_connection()
         now = int(time.time())
         cutoff = now - (days_to_keep * 86400)
+        # AUDIT LOG CLEANUP: Keep 90 days of audit history (vs 8 days for flow data)
+        audit_cutoff = now - (90 * 86400)
+        # SNAPSHOT CLEANUP: Keep 1 year of financial snapshots for trend analysis
+        snapshot_cutoff = now - (365 * 86400)
+        budget = self.MAINTENANCE_BUDGET_SECONDS if max_seconds is None else max_seconds
+        start = time.monotonic()
+        deadline = start + budget
 
-        flow_count = 0
-        forwards_count = 0
         pruned_revenue = 0
-        pruned_count = 0
-
-        # Atomic aggregation + deletion to avoid double-counting if interrupted.
-        # If we update lifetime_aggregates but fail before deleting forwards, we'd
-        # count the same forwards again later. Using a transaction prevents this.
-        with conn:
-            # Count rows before deletion for logging
-            flow_count = conn.execute(
-                "SELECT COUNT(*) as cnt FROM flow_history WHERE timestamp < ?", (cutoff,)
-            ).fetchone()["cnt"]
-            forwards_count = conn.execute(
-                "SELECT COUNT(*) as cnt FROM forwards WHERE timestamp < ?", (cutoff,)
-            ).fetchone()["cnt"]
-
-            # LIFETIME PRESERVATION: Aggregate revenue from forwards about to be pruned
-            # and store in daily_forwarding_stats for granular history.
-            if forwards_count > 0:
-                # Group by channel and day (86400s)
-                # SQLite integer division floor handles the day bucket
-                rows = conn.execute("""
-                    SELECT 
-                        out_channel,
-                        (timestamp / 86400) * 86400 as day_ts,
-                        COALESCE(SUM(in_msat), 0) as sum_in,
-                        COALESCE(SUM(out_msat), 0) as sum_out,
-                        COALESCE(SUM(fee_msat), 0) as sum_fee,
-                        COUNT(*) as count
-                    FROM forwards 
-                    WHERE timestamp < ?
-                    GROUP BY out_channel, day_ts
-                """, (cutoff,)).fetchall()
-                
-                for r in rows:
-                    pruned_revenue += r['sum_fee']
-                    pruned_count += r['count']
-                    
-                    # Upsert into daily stats
-                    conn.execute("""
-                        INSERT INTO daily_forwarding_stats 
-                        (channel_id, date, total_in_msat, total_out_msat, total_fee_msat, forward_count)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                        ON CONFLICT(channel_id, date) DO UPDATE SET
-                            total_in_msat = total_in_msat + excluded.total_in_msat,
-                            total_out_msat = total_out_msat + excluded.total_out_msat,
-                            total_fee_msat = total_fee_msat + excluded.total_fee_msat,
-                            forward_count = forward_count + excluded.forward_count
-                    """, (r['out_channel'], r['day_ts'], r['sum_in'], r['sum_out'], r['sum_fee'], r['count']))
-                
-                # We NO LONGER update lifetime_aggregates for new data, 
-                # but we leave the table alone as it contains legacy history.
-
-            conn.execute("DELETE FROM flow_history WHERE timestamp < ?", (cutoff,))
-            conn.execute("DELETE FROM forwards WHERE timestamp < ?", (cutoff,))
-            conn.execute("DELETE FROM peer_connection_history WHERE timestamp < ?", (cutoff,))
-
-            # AUDIT LOG CLEANUP: Prevent unbounded growth of operational logs
-            # Keep 90 days of audit history (vs 8 days for flow data)
-            audit_cutoff = now - (90 * 86400)
-            conn.execute("DELETE FROM fee_changes WHERE timestamp < ?", (audit_cutoff,))
-            conn.execute("DELETE FROM rebalance_history WHERE timestamp < ?", (audit_cutoff,))
-
-            # SNAPSHOT CLEANUP: Keep 1 year of financial snapshots for trend analysis
-            snapshot_cutoff = now - (365 * 86400)
-            conn.execute("DELETE FROM financial_snapshots WHERE timestamp < ?", (snapshot_cutoff,))
-
-        # VACUUM to reclaim disk space after pruning
-        # SQLite DELETE only marks pages as free; VACUUM actually shrinks the file.
-        # This is safe to run from a background thread (blocking is acceptable).
-        if flow_count > 0 or forwards_count > 0:
-            try:
-                conn.execute("VACUUM")
-                self.plugin.log("Database VACUUM completed to reclaim disk space")
-            except Exception as e:
-                self.plugin.log(f"VACUUM failed (non-fatal): {e}", level='warn')
-
-        if forwards_count > 0:
+        rows: Dict[str, int] = {}
+        complete = True
+        for table, table_cutoff in (
+            ("forwards", cutoff),
+            ("flow_history", cutoff),
+            ("peer_connection_history", cutoff),
+            ("fee_changes", audit_cutoff),
+            ("rebalance_history", audit_cutoff),
+            ("financial_snapshots", snapshot_cutoff),
+        ):
+            while True:
+                if time.monotonic() >= deadline:
+                    complete = False
+                    break
+                if table == "forwards":
+                    count, revenue = self._prune_forwards_chunk(conn, table_cutoff)
+                    pruned_revenue += revenue
+                else:
+                    count = conn.execute(f"""
+                        DELETE FROM {table} WHERE rowid IN (
+                            SELECT rowid FROM {table} WHERE timestamp < ? LIMIT ?
+                        )
+                    """, (table_cutoff, self.PRUNE_CHUNK_ROWS)).rowcount
+                if count:
+                    rows[table] = rows.get(table, 0) + count
+                # Forwards chunks also end early at archive month boundaries
+                if count == 0 or (table != "forwards" and count < self.PRUNE_CHUNK_ROWS):
+                    break
+                time.sleep(self.PRUNE_YIELD_SECONDS)
+            if not complete:
+                break
+
+        seconds = time.monotonic() - start
+        with self._maintenance_lock:
+            stats = self.maintenance_stats
+            for table, count in rows.items():
+                stats["rows_pruned"][table] = stats["rows_pruned"].get(table, 0) + count
+            stats["prune_seconds"] += seconds
+            stats["last_run"] = now
+
+        if rows.get("forwards"):
             self.plugin.log(
-                f"Preserved {pruned_revenue // 1000} sats revenue from {pruned_count} forwards before pruning"
+                f"Preserved {pruned_revenue // 1000} sats revenue from {rows['forwards']} "
+                f"forwards before pruning"
             )
-
-        if flow_count > 0 or forwards_count > 0:
+        if rows.get("forwards") or rows.get("flow_history"):
             self.plugin.log(
                 f"Cleaned up data older than {days_to_keep} days: "
-                f"{flow_count} flow_history rows, {forwards_count} forwards rows"
+                f"{rows.get('flow_history', 0)} flow_history rows, "
+                f"{rows.get('forwards', 0)} forwards rows in {seconds:.1f}s"
+                + ("" if complete else " (time budget reached, continuing next run)")
             )
+        return {
+            "rows_pruned": rows,
+            "preserved_revenue_msat": pruned_revenue,
+            "seconds": round(seconds, 3),
+            "complete": complete,
+        }
+
+    def _prune_forwards_chunk(self, conn: sqlite3.Connection, cutoff: int) -> Tuple[int, int]:
+        """
+        Aggregate and delete the oldest PRUNE_CHUNK_ROWS forwards before cutoff.
+
+        The chunk ends at a timestamp boundary (all rows of the last second
+        are included), and the aggregation into daily_forwarding_stats and
+        the delete share one transaction, so an interrupted prune can never
+        count a forward twice.
+
+        With a forward archive the chunk also stops at the end of its month
+        and is copied into that month's file first (INSERT OR IGNORE, so a
+        copy repeated after an interruption adds nothing).
+
+        Returns:
+            (rows deleted, fee_msat of those rows)
+        """
+        fwd = self._fwd()
+        row = conn.execute(
+            "SELECT timestamp FROM {fwd} WHERE timestamp < ? ORDER BY timestamp "
+            "LIMIT 1 OFFSET ?".format(**fwd),
+            (cutoff, self.PRUNE_CHUNK_ROWS - 1)
+        ).fetchone()
+        bound = min(row["timestamp"] + 1, cutoff) if row else cutoff
+
+        archive = self.forward_archive
+        if archive is not None:
+            oldest = conn.execute(
+                "SELECT MIN(timestamp) AS ts FROM {fwd} WHERE timestamp < ?".format(**fwd),
+                (cutoff,)
+            ).fetchone()["ts"]
+            if oldest is None:
+                return 0, 0
+            schema, month_end = archive.attach(conn, oldest)
+            bound = min(bound, month_end)
+
+        pruned_revenue = 0
+        archived = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if archive is not None:
+                archived = conn.execute("""
+                    INSERT OR IGNORE INTO {schema}.forwards ({columns})
+                    SELECT {compact} FROM {fwd} WHERE timestamp < ?
+                """.format(schema=schema, columns=_COMPACT_COLUMNS, **fwd), (bound,)).rowcount
+
+            # Group by channel and day (86400s)
+            # SQLite integer division floor handles the day bucket
+            rows = conn.execute("""
+                SELECT 
+                    {out_ch} AS out_channel,
+                    (timestamp / 86400) * 86400 as day_ts,
+                    COALESCE(SUM(in_msat), 0) as sum_in,
+                    COALESCE(SUM(out_msat), 0) as sum_out,
+                    COALESCE(SUM(fee_msat), 0) as sum_fee,
+                    COUNT(*) as count
+                FROM {fwd} 
+                WHERE timestamp < ?
+                GROUP BY {out_ch}, day_ts
+            """.format(**fwd), (bound,)).fetchall()
+
+            for r in rows:
+                pruned_revenue += r['sum_fee']
+                # Upsert into daily stats
+                conn.execute("""
+                    INSERT INTO daily_forwarding_stats 
+                    (channel_id, date, total_in_msat, total_out_msat, total_fee_msat, forward_count)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(channel_id, date) DO UPDATE SET
+                        total_in_msat = total_in_msat + excluded.total_in_msat,
+                        total_out_msat = total_out_msat + excluded.total_out_msat,
+                        total_fee_msat = total_fee_msat + excluded.total_fee_msat,
+                        forward_count = forward_count + excluded.forward_count
+                """, (self._channel_name(r['out_channel']), r['day_ts'], r['sum_in'],
+                      r['sum_out'], r['sum_fee'], r['count']))
+
+            # lifetime_aggregates is no longer updated for new data; it only
+            # holds legacy history
+            deleted = conn.execute(
+                "DELETE FROM {fwd} WHERE timestamp < ?".format(**fwd), (bound,)
+            ).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            if archive is not None:
+                archive.detach(conn)
+        if archived:
+            archive.record_archived(archived)
+        return deleted, pruned_revenue
+
+    def reclaim_space(self, max_seconds: float = 5.0) -> Dict[str, Any]:
+        """
+        Return free pages to the filesystem a few MB at a time.
+
+        SQLite DELETE only puts pages on the freelist (new rows reuse them).
+        With auto_vacuum=INCREMENTAL each incremental_vacuum step truncates
+        VACUUM_STEP_PAGES pages in a short write transaction, instead of the
+        full VACUUM that used to rewrite the whole file and block every
+        writer. Pages left after max_seconds are reclaimed by the next call.
+
+        Files created before auto_vacuum was enabled are left alone: their
+        free pages are reused by new rows, and convert_auto_vacuum() switches
+        them over when the operator asks for it.
+        """
+        conn = self._get_connection()
+        start = time.monotonic()
+        free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_before and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            deadline = start + max_seconds
+            free = free_before
+            while free and time.monotonic() < deadline:
+                # executescript steps the pragma to completion; execute()
+                # would free a single page
+                conn.executescript(f"PRAGMA incremental_vacuum({self.VACUUM_STEP_PAGES})")
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free:
+                    time.sleep(self.PRUNE_YIELD_SECONDS)
+        free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        seconds = time.monotonic() - start
+        freed = max(0, free_before - free_after)
+
+        with self._maintenance_lock:
+            stats = self.maintenance_stats
+            stats["pages_freed"] += freed
+            stats["vacuum_seconds"] += seconds
+            stats["freelist_pages"] = free_after
+        if freed:
+            self.plugin.log(
+                f"Reclaimed {freed} free pages in {seconds:.2f}s ({free_after} left)",
+                level='debug'
+            )
+        return {"pages_freed": freed, "freelist_pages": free_after,
+                "seconds": round(seconds, 3)}
+
+    def convert_auto_vacuum(self) -> bool:
+        """
+        Switch a file created before auto_vacuum was enabled to INCREMENTAL.
+
+        Changing the mode needs one full VACUUM, which rewrites the whole
+        file and holds the writer for its duration, so it only runs when
+        requested (db_convert_auto_vacuum, at startup before forwards are
+        ingested). Returns True if the file was converted.
+        """
+        conn = self._get_connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        start = time.monotonic()
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        except Exception as e:
+            self.plugin.log(f"VACUUM failed (non-fatal): {e}", level='warn')
+            return False
+        self.plugin.log(
+            f"Database converted to incremental auto-vacuum in {time.monotonic() - start:.1f}s"
+        )
+        return True
+
+    def checkpoint_wal(self) -> Dict[str, int]:
+        """
+        PASSIVE WAL checkpoint: copies what it can without waiting on (or
+        blocking) readers and writers. After a full checkpoint the next
+        writer restarts the WAL, truncated to WAL_SIZE_LIMIT.
+        """
+        conn = self._get_connection()
+        _, wal_pages, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        # Frames still needed by a reader (or appended meanwhile) are left
+        partial = 0 <= checkpointed < wal_pages
+        with self._maintenance_lock:
+            stats = self.maintenance_stats
+            stats["checkpoints"] += 1
+            stats["checkpoint_partial"] += 1 if partial else 0
+            stats["wal_pages"] = max(0, wal_pages)
+        return {"wal_pages": wal_pages, "checkpointed_pages": checkpointed, "complete": not partial}
+
+    def get_table_sizes(self) -> List[Dict[str, Any]]:
+        """
+        Bytes and pages per table and index, largest first (dbstat).
+
+        Reads every page of the file, so it is meant for on-demand
+        diagnostics (revenue-db-stats), not for a cycle. Raises
+        sqlite3.OperationalError if SQLite was built without dbstat.
+        """
+        conn = self._get_connection()
+        rows = conn.execute("""
+            SELECT s.name AS name, COALESCE(m.type, 'table') AS type,
+                   COALESCE(m.tbl_name, s.name) AS tbl_name,
+                   SUM(s.pgsize) AS bytes, COUNT(*) AS pages,
+                   SUM(s.unused) AS unused_bytes
+            FROM dbstat s LEFT JOIN sqlite_master m ON m.name = s.name
+            GROUP BY s.name
+            ORDER BY bytes DESC
+        """).fetchall()
+        return [
+            {"name": r["name"], "type": r["type"], "table": r["tbl_name"],
+             "bytes": r["bytes"], "pages": r["pages"], "unused_bytes": r["unused_bytes"]}
+            for r in rows
+        ]
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Pruning, vacuum and checkpoint totals for the exporter (no SQL)."""
+        pruned = MetricFamily("revenue_ops_db_pruned_rows", "counter",
+                              "Rows deleted by retention pruning", ("table",))
+        prune_seconds = MetricFamily("revenue_ops_db_prune_seconds", "counter",
+                                     "Time spent pruning old rows")
+        freed = MetricFamily("revenue_ops_db_vacuum_pages_freed", "counter",
+                             "Pages returned to the filesystem by incremental vacuum")
+        vacuum_seconds = MetricFamily("revenue_ops_db_vacuum_seconds", "counter",
+                                      "Time spent in incremental vacuum")
+        freelist = MetricFamily("revenue_ops_db_freelist_pages", "gauge",
+                                "Free pages left after the last vacuum step")
+        checkpoints = MetricFamily("revenue_ops_db_wal_checkpoints", "counter",
+                                   "Maintenance WAL checkpoints", ("result",))
+        wal_pages = MetricFamily("revenue_ops_db_wal_pages", "gauge",
+                                 "WAL frames at the last checkpoint")
+        archived = MetricFamily("revenue_ops_db_archived_forwards", "counter",
+                                "Pruned forwards moved into the archive files")
+        if self.forward_archive is not None:
+            archived.set(self.forward_archive.rows_archived)
+        with self._maintenance_lock:
+            stats = self.maintenance_stats
+            for table, count in stats["rows_pruned"].items():
+                pruned.set(count, table=table)
+            prune_seconds.set(round(stats["prune_seconds"], 3))
+            freed.set(stats["pages_freed"])
+            vacuum_seconds.set(round(stats["vacuum_seconds"], 3))
+            freelist.set(stats["freelist_pages"])
+            checkpoints.set(stats["checkpoints"] - stats["checkpoint_partial"], result="complete")
+            checkpoints.set(stats["checkpoint_partial"], result="partial")
+            wal_pages.set(stats["wal_pages"])
+        return [pruned, prune_seconds, freed, vacuum_seconds, freelist, checkpoints, wal_pages,
+                archived]
     
     # =========================================================================
     # Peer Connection History Methods
@@ -3763,6 +4654,45 @@ class Database:
         """, (peer_id, cutoff)).fetchone()
         
         return row is not None
+
+    def record_connection_snapshots(self, peer_ids: List[str], seconds: int) -> int:
+        """
+        Record 'snapshot' events for connected peers without recent history.
+
+        Batched form of has_recent_connection_history() followed by
+        record_connection_event() for the startup baseline: one query for
+        all peers instead of one per peer.
+
+        Args:
+            peer_ids: Currently connected peers
+            seconds: Peers with any event within this window are skipped
+
+        Returns:
+            Number of snapshot events recorded
+        """
+        if not peer_ids:
+            return 0
+        conn = self._get_connection()
+        now = int(time.time())
+        recent = {
+            row['peer_id'] for row in conn.execute("""
+                SELECT DISTINCT peer_id FROM peer_connection_history
+                WHERE timestamp >= ?
+            """, (now - seconds,))
+        }
+        missing = [peer_id for peer_id in dict.fromkeys(peer_ids) if peer_id not in recent]
+        if missing:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("""
+                    INSERT INTO peer_connection_history (peer_id, event_type, timestamp)
+                    VALUES (?, 'snapshot', ?)
+                """, [(peer_id, now) for peer_id in missing])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return len(missing)
     
     def get_peer_uptime_percent(self, peer_id: str, duration_seconds: int) -> float:
         """
@@ -3791,10 +4721,6 @@ class Database:
             LIMIT 1
         """, (peer_id, window_start)).fetchone()
         
-        # Start state: connected if prior event was 'connected' or 'snapshot'
-        is_connected = prior_event is not None and prior_event['event_type'] in ('connected', 'snapshot')
-        last_interval_start = window_start
-        
         # 2. Get all events in the window
         rows = conn.execute("""
             SELECT event_type, timestamp FROM peer_connection_history
@@ -3802,17 +4728,74 @@ class Database:
             ORDER BY timestamp ASC
         """, (peer_id, window_start)).fetchall()
         
+        prior_type = prior_event['event_type'] if prior_event else None
+        events = [(row['event_type'], row['timestamp']) for row in rows]
+        return self._uptime_from_events(prior_type, events, window_start, now)
+
+    def get_peer_uptime_percents(self, duration_seconds: int) -> Dict[str, float]:
+        """
+        Batch form of get_peer_uptime_percent for every peer with connection
+        history, using two grouped queries.
+
+        Peers with no history at all are omitted; callers should treat them
+        as 100% (the cold-start rule of get_peer_uptime_percent).
+        """
+        conn = self._get_connection()
+        now = int(time.time())
+        window_start = now - duration_seconds
+
+        # Most recent event before the window, per peer
+        prior_rows = conn.execute("""
+            SELECT h.peer_id, h.event_type
+            FROM peer_connection_history h
+            JOIN (
+                SELECT peer_id, MAX(timestamp) as ts
+                FROM peer_connection_history
+                WHERE timestamp < ?
+                GROUP BY peer_id
+            ) last ON last.peer_id = h.peer_id AND last.ts = h.timestamp
+            ORDER BY h.id
+        """, (window_start,)).fetchall()
+        # Ties on timestamp: keep the last inserted row
+        prior = {row['peer_id']: row['event_type'] for row in prior_rows}
+
+        rows = conn.execute("""
+            SELECT peer_id, event_type, timestamp FROM peer_connection_history
+            WHERE timestamp >= ?
+            ORDER BY peer_id, timestamp ASC
+        """, (window_start,)).fetchall()
+        events: Dict[str, List[Tuple[str, int]]] = {}
+        for row in rows:
+            events.setdefault(row['peer_id'], []).append((row['event_type'], row['timestamp']))
+
+        return {
+            peer_id: self._uptime_from_events(
+                prior.get(peer_id), events.get(peer_id, []), window_start, now
+            )
+            for peer_id in set(prior) | set(events)
+        }
+
+    @staticmethod
+    def _uptime_from_events(prior_event_type: Optional[str], events: List[Tuple[str, int]],
+                            window_start: int, now: int) -> float:
+        """
+        Uptime percentage from the last event type before the window and the
+        (event_type, timestamp) events inside it, oldest first.
+        """
+        # Start state: connected if prior event was 'connected' or 'snapshot'
+        is_connected = prior_event_type in ('connected', 'snapshot')
+        
         # COLD START: If no history at all (neither prior nor in window), assume 100% uptime
-        if prior_event is None and not rows:
+        if prior_event_type is None and not events:
             return 100.0
             
         # Determine effective observation window
         # If we have history before the window, we use the full window.
         # If history starts inside the window, we only count time since that first event.
-        if prior_event:
+        if prior_event_type is not None:
             effective_start = window_start
         else:
-            effective_start = rows[0]['timestamp']
+            effective_start = events[0][1]
             
         actual_duration = now - effective_start
         
@@ -3823,10 +4806,7 @@ class Database:
         total_connected_time = 0
         last_interval_start = effective_start
         
-        for row in rows:
-            event_type = row['event_type']
-            timestamp = row['timestamp']
-            
+        for event_type, timestamp in events:
             if is_connected:
                 # We were connected until this event
                 total_connected_time += timestamp - last_interval_start
@@ -3878,6 +4858,27 @@ class Database:
         
         return new_version
 
+    def save_warm_state(self, format_version: int, plugin_version: str,
+                        created_at: int, payload: str) -> None:
+        """Replace the warm-restart snapshot."""
+        conn = self._get_connection()
+        conn.execute("""
+            INSERT OR REPLACE INTO warm_state (id, format_version, plugin_version, created_at, payload)
+            VALUES (1, ?, ?, ?, ?)
+        """, (format_version, plugin_version, created_at, payload))
+
+    def get_warm_state(self) -> Optional[Dict[str, Any]]:
+        """Get the warm-restart snapshot, or None if none was saved."""
+        conn = self._get_connection()
+        row = conn.execute("SELECT * FROM warm_state WHERE id = 1").fetchone()
+        return dict(row) if row else None
+
+    def get_fee_strategy_update_times(self) -> Dict[str, int]:
+        """channel_id -> last_update of every fee_strategy_state row."""
+        conn = self._get_connection()
+        rows = conn.execute("SELECT channel_id, last_update FROM fee_strategy_state").fetchall()
+        return {row['channel_id']: row['last_update'] or 0 for row in rows}
+
     def get_all_config_overrides(self) -> Dict[str, str]:
         """Get all config overrides as a dictionary."""
         conn = self._get_connection()
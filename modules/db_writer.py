@@ -0,0 +1,503 @@
+"""
+Database Writer module for cl-revenue-ops
+
+Single writer thread and per-thread read-only connections for SQLite.
+
+Every thread used to get its own read-write connection, so the forward
+handler, the cycles and RPC handlers raced for the WAL write lock and a
+burst ended in busy_timeout waits or "database is locked" errors. Now:
+
+- DatabaseWriter owns the only read-write connection, on its own thread.
+  INSERT/UPDATE/DELETE statements are queued and the thread commits
+  whatever is waiting as one transaction (group commit), each statement in
+  its own SAVEPOINT so a failing one does not take the others with it.
+  Schema changes, PRAGMA assignments, VACUUM and ATTACH run on their own.
+- An explicit transaction (BEGIN ... COMMIT/ROLLBACK) pins the writer to
+  the calling thread: the writer runs that thread's statements, reads
+  included, until the transaction ends (or stays idle for
+  SESSION_TIMEOUT, then it is rolled back).
+- ConnectionProxy is what Database._get_connection() hands out. It sends
+  reads to a query_only connection owned by the calling thread (one per
+  thread, opened on first use) and everything else to the writer, and
+  waits for the result. Callers keep using the sqlite3 API (execute,
+  executemany, rowcount, fetchone, ...). With db_query_profile on, it
+  also times each statement for the QueryProfiler.
+
+Reads never wait for the writer, and a read-heavy report cannot hold up
+the forward ingestion path. A write returns once it is committed, so a
+following read on the same thread sees it.
+"""
+
+import functools
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from .openmetrics import MetricFamily
+from .query_profiler import ProfiledCursor, QueryProfiler
+
+
+# Statement kinds
+READ = "read"            # Reader connection
+BATCH = "batch"          # Writer, may share a transaction with others
+EXCLUSIVE = "exclusive"  # Writer, runs alone in autocommit
+BEGIN = "begin"          # Writer, starts a pinned session
+
+_FIRST_WORD = re.compile(r"^\s*(?:--[^\n]*\n\s*)*(\w+)")
+_WRITE_WORDS = re.compile(r"\b(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+_READ_PRAGMAS = re.compile(r"^\s*PRAGMA\s+(\w+\.)?(\w+)\s*(\(|;|$)", re.IGNORECASE)
+# PRAGMAs that change the database even without an assignment
+_WRITER_PRAGMAS = frozenset(("wal_checkpoint", "incremental_vacuum", "optimize",
+                             "shrink_memory", "integrity_check", "quick_check"))
+
+
+@functools.lru_cache(maxsize=2048)
+def statement_kind(sql: str) -> str:
+    """Where a statement runs (READ, BATCH, EXCLUSIVE or BEGIN)."""
+    match = _FIRST_WORD.match(sql)
+    word = match.group(1).upper() if match else ""
+    if word == "SELECT":
+        return READ
+    if word == "WITH":
+        return BATCH if _WRITE_WORDS.search(sql) else READ
+    if word == "PRAGMA":
+        pragma = _READ_PRAGMAS.match(sql)
+        if pragma and "=" not in sql and pragma.group(2).lower() not in _WRITER_PRAGMAS:
+            return READ
+        return EXCLUSIVE
+    if word in ("INSERT", "UPDATE", "DELETE", "REPLACE"):
+        return BATCH
+    if word == "BEGIN":
+        return BEGIN
+    return EXCLUSIVE
+
+
+class _Result:
+    """Cursor stand-in for a statement run on the writer thread."""
+
+    __slots__ = ("rowcount", "lastrowid", "description", "_rows")
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self.description = cursor.description
+        self._rows: Deque[Any] = deque(cursor.fetchall() if cursor.description else ())
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+
+    def fetchone(self) -> Any:
+        return self._rows.popleft() if self._rows else None
+
+    def fetchall(self) -> List[Any]:
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.popleft()
+
+
+class _Op:
+    __slots__ = ("method", "sql", "params", "kind", "done", "result", "error", "submitted")
+
+    def __init__(self, method: str, sql: str, params: Any, kind: str):
+        self.method = method
+        self.sql = sql
+        self.params = params
+        self.kind = kind
+        self.done = threading.Event()
+        self.result: Optional[_Result] = None
+        self.error: Optional[BaseException] = None
+        self.submitted = time.monotonic()
+
+    def run(self, conn: sqlite3.Connection) -> None:
+        if self.method == "executescript":
+            self.result = _Result(conn.executescript(self.sql))
+        else:
+            self.result = _Result(getattr(conn, self.method)(self.sql, self.params))
+
+    def wait(self) -> _Result:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Session:
+    """An explicit transaction: the writer serves only this queue until it ends."""
+
+    def __init__(self, begin: _Op):
+        self.begin = begin
+        self.ops: "queue.Queue[_Op]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def submit(self, op: _Op) -> _Result:
+        with self.lock:
+            if self.closed:
+                raise sqlite3.OperationalError("transaction was rolled back (idle too long)")
+            self.ops.put(op)
+        return op.wait()
+
+
+class DatabaseWriter:
+    """
+    The only read-write connection, driven by its own thread.
+
+    The thread starts on the first write and exits after IDLE_SECONDS
+    without work (closing its connection); the next write starts it again.
+    """
+
+    MAX_BATCH = 256
+    SESSION_TIMEOUT = 30.0
+    IDLE_SECONDS = 60.0
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 log: Optional[Callable[[str, str], None]] = None):
+        self._connect = connect
+        self._log = log or (lambda msg, level: None)
+        self._cond = threading.Condition()
+        self._pending: Deque[Any] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Totals for get_status() / collect_metrics()
+        self.ops = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_ops = 0
+        self.max_batch = 0
+        self.sessions = 0
+        self.aborted_sessions = 0
+        self.wait_seconds = 0.0
+
+    # =========================================================================
+    # Callers
+    # =========================================================================
+
+    def submit(self, op: _Op) -> _Result:
+        self._enqueue(op)
+        try:
+            return op.wait()
+        finally:
+            self._record_wait(op)
+
+    def begin(self, op: _Op) -> _Session:
+        session = _Session(op)
+        self._enqueue(session)
+        try:
+            op.wait()
+        finally:
+            self._record_wait(op)
+        return session
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Finish queued work, close the connection and end the thread."""
+        with self._cond:
+            thread = self._thread
+            self._stopping = True
+            self._cond.notify_all()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        with self._cond:
+            self._stopping = False
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def _enqueue(self, item: Any) -> None:
+        with self._cond:
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _record_wait(self, op: _Op) -> None:
+        with self._cond:
+            self.ops += 1
+            self.failed += 1 if op.error is not None else 0
+            self.wait_seconds += time.monotonic() - op.submitted
+
+    # =========================================================================
+    # Writer thread
+    # =========================================================================
+
+    def _run(self) -> None:
+        conn = None
+        try:
+            conn = self._connect()
+            while True:
+                with self._cond:
+                    while not self._pending:
+                        if self._stopping or not self._cond.wait(self.IDLE_SECONDS):
+                            if not self._pending:
+                                self._thread = None
+                                return
+                    first = self._pending.popleft()
+                    batch = [first]
+                    if isinstance(first, _Op) and first.kind == BATCH:
+                        while (self._pending and len(batch) < self.MAX_BATCH
+                               and isinstance(self._pending[0], _Op)
+                               and self._pending[0].kind == BATCH):
+                            batch.append(self._pending.popleft())
+                if isinstance(first, _Session):
+                    self._serve_session(conn, first)
+                elif len(batch) == 1:
+                    self._run_alone(conn, first)
+                else:
+                    self._run_batch(conn, batch)
+        except BaseException as e:
+            # Cannot open the connection: fail what is queued, let the
+            # next write try again
+            with self._cond:
+                failed, self._pending = list(self._pending), deque()
+                self._thread = None
+            for item in failed:
+                op = item.begin if isinstance(item, _Session) else item
+                op.error = e
+                op.done.set()
+            self._log(f"Database writer stopped: {e}", "error")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _run_alone(self, conn: sqlite3.Connection, op: _Op) -> None:
+        try:
+            op.run(conn)
+        except Exception as e:
+            op.error = e
+        op.done.set()
+
+    def _run_batch(self, conn: sqlite3.Connection, batch: List[_Op]) -> None:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for op in batch:
+                conn.execute("SAVEPOINT write_op")
+                try:
+                    op.run(conn)
+                    conn.execute("RELEASE write_op")
+                except Exception as e:
+                    op.error = e
+                    conn.execute("ROLLBACK TO write_op")
+                    conn.execute("RELEASE write_op")
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing of this batch was committed
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    pass
+            for op in batch:
+                if op.error is None:
+                    op.error, op.result = e, None
+        with self._cond:
+            self.batches += 1
+            self.batched_ops += len(batch)
+            self.max_batch = max(self.max_batch, len(batch))
+        for op in batch:
+            op.done.set()
+
+    def _serve_session(self, conn: sqlite3.Connection, session: _Session) -> None:
+        with self._cond:
+            self.sessions += 1
+        op = session.begin
+        while True:
+            self._run_alone_in_session(conn, op)
+            if not conn.in_transaction:
+                with session.lock:
+                    session.closed = True
+                op.done.set()
+                return
+            op.done.set()
+            try:
+                op = session.ops.get(timeout=self.SESSION_TIMEOUT)
+            except queue.Empty:
+                with session.lock:
+                    if session.ops.empty():
+                        session.closed = True
+                if session.closed:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                    with self._cond:
+                        self.aborted_sessions += 1
+                    self._log(
+                        f"Database transaction idle for {self.SESSION_TIMEOUT:.0f}s, rolled back",
+                        "warn"
+                    )
+                    return
+                op = session.ops.get()
+
+    @staticmethod
+    def _run_alone_in_session(conn: sqlite3.Connection, op: _Op) -> None:
+        try:
+            op.run(conn)
+        except Exception as e:
+            op.error = e
+
+    # =========================================================================
+    # Reporting
+    # =========================================================================
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "running": self._thread is not None,
+                "queue_depth": len(self._pending),
+                "ops": self.ops,
+                "failed": self.failed,
+                "batches": self.batches,
+                "avg_batch": round(self.batched_ops / self.batches, 1) if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "sessions": self.sessions,
+                "aborted_sessions": self.aborted_sessions,
+                "avg_wait_ms": round(self.wait_seconds / self.ops * 1000, 3) if self.ops else 0.0,
+            }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        ops = MetricFamily("revenue_ops_db_write_ops", "counter",
+                           "Statements run by the database writer", ("outcome",))
+        batches = MetricFamily("revenue_ops_db_write_batches", "counter",
+                               "Group commits of queued writes")
+        batched = MetricFamily("revenue_ops_db_write_batched_ops", "counter",
+                               "Writes committed as part of a group commit")
+        sessions = MetricFamily("revenue_ops_db_write_sessions", "counter",
+                                "Explicit transactions run on the writer", ("outcome",))
+        wait = MetricFamily("revenue_ops_db_write_wait_seconds", "counter",
+                            "Time callers spent waiting for their writes")
+        depth = MetricFamily("revenue_ops_db_write_queue_depth", "gauge",
+                             "Writes and transactions waiting for the writer")
+        with self._cond:
+            ops.set(self.ops - self.failed, outcome="ok")
+            ops.set(self.failed, outcome="error")
+            batches.set(self.batches)
+            batched.set(self.batched_ops)
+            sessions.set(self.sessions - self.aborted_sessions, outcome="ended")
+            sessions.set(self.aborted_sessions, outcome="timed_out")
+            wait.set(round(self.wait_seconds, 3))
+            depth.set(len(self._pending))
+        return [ops, batches, batched, sessions, wait, depth]
+
+
+class ConnectionProxy:
+    """
+    sqlite3.Connection look-alike for one thread: reads on the thread's
+    query_only connection, writes through the DatabaseWriter.
+    """
+
+    def __init__(self, reader: sqlite3.Connection, writer: DatabaseWriter,
+                 profiler: Optional[QueryProfiler] = None):
+        self.reader = reader
+        self._writer = writer
+        self.profiler = profiler
+        self._session: Optional[_Session] = None
+        self._trace: Optional[Callable[[str], None]] = None
+        self.total_changes = 0
+
+    @property
+    def in_transaction(self) -> bool:
+        return self._session is not None
+
+    def _write(self, method: str, sql: str, params: Any, kind: str) -> _Result:
+        if self._trace is not None:
+            self._trace(sql)
+        op = _Op(method, sql, params, kind)
+        session = self._session
+        if session is not None:
+            try:
+                result = session.submit(op)
+            finally:
+                if session.closed:
+                    self._session = None
+        elif kind == BEGIN:
+            session = self._writer.begin(op)
+            result = op.result
+            if not session.closed:
+                self._session = session
+        else:
+            result = self._writer.submit(op)
+        if kind != READ and result.rowcount > 0:
+            self.total_changes += result.rowcount
+        return result
+
+    def execute(self, sql: str, params: Iterable[Any] = ()) -> Any:
+        profiler = self.profiler
+        if profiler is not None and profiler.enabled:
+            return self._profiled(profiler, "execute", sql, params)
+        kind = statement_kind(sql)
+        if kind == READ and self._session is None:
+            return self.reader.execute(sql, params)
+        return self._write("execute", sql, params, kind)
+
+    def executemany(self, sql: str, seq_of_params: Iterable[Any]) -> Any:
+        profiler = self.profiler
+        if profiler is not None and profiler.enabled:
+            return self._profiled(profiler, "executemany", sql, list(seq_of_params))
+        kind = statement_kind(sql)
+        return self._write("executemany", sql, list(seq_of_params),
+                           BATCH if kind == READ else kind)
+
+    def executescript(self, sql: str) -> Any:
+        profiler = self.profiler
+        if profiler is not None and profiler.enabled:
+            return self._profiled(profiler, "executescript", sql, None)
+        return self._write("executescript", sql, None, EXCLUSIVE)
+
+    def _profiled(self, profiler: QueryProfiler, method: str, sql: str, params: Any) -> Any:
+        kind = statement_kind(sql)
+        explain = None
+        if kind in (READ, BATCH) and method != "executescript":
+            first = params if method == "execute" else (params[0] if params else ())
+            explain = functools.partial(self.explain, sql, first)
+        started = time.perf_counter()
+        if method == "execute" and kind == READ and self._session is None:
+            cursor = self.reader.execute(sql, params)
+            return ProfiledCursor(cursor, profiler, sql, time.perf_counter() - started, explain)
+        if method == "executescript":
+            kind = EXCLUSIVE
+        elif method == "executemany" and kind == READ:
+            kind = BATCH
+        result = self._write(method, sql, params, kind)
+        rows = len(result._rows) if result.description else result.rowcount
+        profiler.record(sql, time.perf_counter() - started, rows, explain)
+        return result
+
+    def explain(self, sql: str, params: Iterable[Any] = ()) -> List[str]:
+        """EXPLAIN QUERY PLAN of a statement, one indented line per step."""
+        depth: Dict[int, int] = {0: -1}
+        lines = []
+        for step_id, parent, _, detail in self.reader.execute("EXPLAIN QUERY PLAN " + sql, params):
+            depth[step_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[step_id] + detail)
+        return lines
+
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]) -> None:
+        """Trace this thread's statements (reads on the reader, writes as submitted)."""
+        self._trace = callback
+        self.reader.set_trace_callback(callback)
+
+    def commit(self) -> None:
+        # Writes outside a transaction are committed before they return
+        if self._session is not None:
+            self.execute("COMMIT")
+
+    def rollback(self) -> None:
+        if self._session is not None:
+            self.execute("ROLLBACK")
+
+    def close(self) -> None:
+        if self._session is not None:
+            try:
+                self.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+        self.reader.close()
@@ -37,7 +37,7 @@ import time
 import random
 import math
 import json
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field, fields
 from typing import Dict, List, Optional, Any, Tuple, Union, TYPE_CHECKING
 from enum import Enum
 
@@ -47,12 +47,21 @@ from .config import Config, ChainCostDefaults, LiquidityBuckets
 from .database import Database
 from .clboss_manager import ClbossManager, ClbossTags
 from .policy_manager import PolicyManager, FeeStrategy
+from .channel_state_model import ChannelStateModel, list_peer_channels
+from .htlc_tracker import HtlcTracker
+from .cycle_profiler import begin_channel, end_channel, profiled_cycle, stage, timed_stage
+from .openmetrics import metrics
 
 if TYPE_CHECKING:
     from .profitability_analyzer import ChannelProfitabilityAnalyzer
     from .hive_bridge import HiveFeeIntelligenceBridge
 
 
+_FEE_CHANGES = metrics.counter(
+    "revenue_ops_fee_changes", "Fee updates applied with setchannel", ("trigger", "direction")
+)
+
+
 # =============================================================================
 # REASON CODES FOR EXPLAINABILITY
 # =============================================================================
@@ -1225,6 +1234,7 @@ class GaussianThompsonState:
 
         return modifier
 
+    @timed_stage("thompson")
     def sample_fee(self, floor: int, ceiling: int) -> int:
         """
         Sample a fee from the posterior distribution.
@@ -1265,6 +1275,7 @@ class GaussianThompsonState:
 
         return sampled_fee
 
+    @timed_stage("thompson")
     def sample_fee_contextual(self, context_key: str, floor: int, ceiling: int) -> int:
         """
         Sample fee using context-specific posterior if available.
@@ -1304,6 +1315,7 @@ class GaussianThompsonState:
         # Fall back to global posterior (which also applies modulation)
         return self.sample_fee(floor, ceiling)
 
+    @timed_stage("thompson")
     def update_posterior(
         self,
         fee: int,
@@ -1366,6 +1378,7 @@ class GaussianThompsonState:
         # Opposite buckets (low vs peak) are least similar
         return 0.2
 
+    @timed_stage("thompson")
     def update_contextual(
         self,
         context_key: str,
@@ -1564,6 +1577,7 @@ class GaussianThompsonState:
         """Get the current best estimate (posterior mean) without exploration."""
         return int(self.posterior_mean)
 
+    @timed_stage("thompson")
     def check_for_discovery(
         self,
         fee: int,
@@ -2685,6 +2699,113 @@ class HillClimbingFeeController:
         # Phase 7: Vegas Reflex state (global, not per-channel)
         self._vegas_state = VegasReflexState(decay_rate=config.vegas_decay_rate)
 
+        # Event-driven channel state (falls back to listpeerchannels if unset)
+        self._channel_state: Optional[ChannelStateModel] = None
+        # Live HTLC slot pressure between flow cycles (optional)
+        self._htlc_tracker: Optional[HtlcTracker] = None
+
+        # Channels inside an open observation window:
+        # channel_id -> [window closes at (unix ts), forwards still needed]
+        # With adaptive intervals they are skipped until due instead of being
+        # re-checked on every cycle.
+        self._observation_due: Dict[str, List[int]] = {}
+
+    def set_channel_state(self, channel_state: ChannelStateModel) -> None:
+        self._channel_state = channel_state
+
+    def set_htlc_tracker(self, htlc_tracker: HtlcTracker) -> None:
+        self._htlc_tracker = htlc_tracker
+
+    def note_forward(self, channel_id: str) -> None:
+        """A settled forward left channel_id (may close its observation window)."""
+        entry = self._observation_due.get(channel_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                self._observation_due.pop(channel_id, None)
+
+    @property
+    def mempool_intensity(self) -> float:
+        """Current Vegas Reflex intensity (0.0 to 1.0)."""
+        return self._vegas_state.intensity
+
+    def next_observation_due(self) -> Optional[int]:
+        """Earliest time a scheduled observation window closes (None if none)."""
+        due = [entry[0] for entry in list(self._observation_due.values())]
+        return min(due) if due else None
+
+    # =========================================================================
+    # Warm Restart (modules/warm_state.py)
+    # =========================================================================
+
+    # ThompsonAIMDState fields kept outside v2_state_json
+    _THOMPSON_LEGACY_FIELDS = (
+        "last_revenue_rate", "last_fee_ppm", "last_broadcast_fee_ppm", "last_update",
+        "last_state", "is_sleeping", "sleep_until", "stable_cycles",
+        "forward_count_since_update", "last_volume_sats",
+    )
+
+    def export_warm_state(self) -> Dict[str, Any]:
+        """In-memory controller states for the warm-restart snapshot."""
+        thompson = {}
+        for channel_id, state in list(self._thompson_aimd_states.items()):
+            entry = {name: getattr(state, name) for name in self._THOMPSON_LEGACY_FIELDS}
+            entry["v2"] = state.to_v2_dict()
+            entry["last_gossip_refresh"] = state.last_gossip_refresh
+            thompson[channel_id] = entry
+        return {
+            "thompson_aimd": thompson,
+            "hill_climb": {
+                channel_id: asdict(state)
+                for channel_id, state in list(self._hill_climb_states.items())
+            },
+            "observation_due": {
+                channel_id: list(entry)
+                for channel_id, entry in list(self._observation_due.items())
+            },
+        }
+
+    def restore_warm_state(self, data: Dict[str, Any], created_at: int) -> int:
+        """
+        Load controller states from a warm-restart snapshot.
+
+        A channel is only restored when its fee_strategy_state row has not
+        been written since the snapshot was taken; otherwise the database
+        copy is newer and is loaded lazily as before. Channels already in
+        memory are left alone.
+
+        Returns:
+            Number of controller states restored
+        """
+        update_times = self.database.get_fee_strategy_update_times()
+
+        def unchanged(channel_id: str) -> bool:
+            updated = update_times.get(channel_id)
+            return updated is not None and updated < created_at
+
+        restored = 0
+        for channel_id, entry in data.get("thompson_aimd", {}).items():
+            if channel_id in self._thompson_aimd_states or not unchanged(channel_id):
+                continue
+            state = ThompsonAIMDState.from_v2_dict(entry["v2"], entry)
+            state.last_gossip_refresh = entry.get("last_gossip_refresh", 0)
+            self._thompson_aimd_states[channel_id] = state
+            restored += 1
+
+        hill_climb_fields = {f.name for f in fields(HillClimbState)}
+        for channel_id, entry in data.get("hill_climb", {}).items():
+            if channel_id in self._hill_climb_states or not unchanged(channel_id):
+                continue
+            self._hill_climb_states[channel_id] = HillClimbState(
+                **{k: v for k, v in entry.items() if k in hill_climb_fields}
+            )
+            restored += 1
+
+        for channel_id, (due_at, forwards_needed) in data.get("observation_due", {}).items():
+            if channel_id in update_times:
+                self._observation_due.setdefault(channel_id, [int(due_at), int(forwards_needed)])
+        return restored
+
     # =========================================================================
     # Thompson Sampling + AIMD Helper Methods (v1.7.0)
     # =========================================================================
@@ -2988,6 +3109,7 @@ class HillClimbingFeeController:
         self._thompson_aimd_states[channel_id] = state
         return state
 
+    @timed_stage("persist")
     def _save_thompson_aimd_state(self, channel_id: str, state: ThompsonAIMDState) -> None:
         """Save Thompson+AIMD state to cache and database."""
         import json
@@ -3017,6 +3139,7 @@ class HillClimbingFeeController:
             v2_state_json=v2_json_str
         )
 
+    @timed_stage("bounds")
     def _get_balance_based_floor(self, local_balance_pct: float, global_min: int) -> int:
         """
         Calculate minimum fee floor based on local balance ratio (Issue #19).
@@ -3043,6 +3166,7 @@ class HillClimbingFeeController:
         else:
             return global_min
 
+    @timed_stage("bounds")
     def _get_saturation_protection_floor(
         self,
         channel_id: str,
@@ -3139,6 +3263,7 @@ class HillClimbingFeeController:
 
         return max(global_min, protection_floor)
 
+    @timed_stage("bounds")
     def _get_rebalance_cost_floor(
         self,
         channel_id: str,
@@ -3207,6 +3332,7 @@ class HillClimbingFeeController:
 
         return None
 
+    @timed_stage("bounds")
     def _get_flow_adjusted_ceiling(
         self,
         channel_id: str,
@@ -3273,6 +3399,7 @@ class HillClimbingFeeController:
             )
             return base_ceiling
 
+    @timed_stage("bounds")
     def _get_competitor_adjusted_bounds(
         self,
         peer_id: str,
@@ -3834,6 +3961,7 @@ class HillClimbingFeeController:
 
         return woken
 
+    @profiled_cycle("fee")
     def adjust_all_fees(self) -> List[FeeAdjustment]:
         """
         Adjust fees for all channels using Hill Climbing optimization.
@@ -3851,6 +3979,7 @@ class HillClimbingFeeController:
             "policy_static": 0,
             "policy_hive": 0,
             "sleeping": 0,
+            "observation_scheduled": 0,
             "waiting_time": 0,
             "waiting_forwards": 0,
             "fee_unchanged": 0,
@@ -3860,7 +3989,8 @@ class HillClimbingFeeController:
         }
 
         # Get all channel states from flow analysis
-        channel_states = self.database.get_all_channel_states()
+        with stage("db_prefetch"):
+            channel_states = self.database.get_all_channel_states()
         
         if not channel_states:
             self.plugin.log("No channel state data for fee adjustment")
@@ -3879,8 +4009,9 @@ class HillClimbingFeeController:
         # Phase 7: Vegas Reflex - update mempool acceleration state
         if cfg.enable_vegas_reflex and chain_costs:
             current_sat_vb = chain_costs.get("sat_per_vbyte", 1.0)
-            self.database.record_mempool_fee(current_sat_vb)
-            ma_sat_vb = self.database.get_mempool_ma(86400)  # 24h moving average
+            with stage("db_prefetch"):
+                self.database.record_mempool_fee(current_sat_vb)
+                ma_sat_vb = self.database.get_mempool_ma(86400)  # 24h moving average
             self._vegas_state.update(current_sat_vb, ma_sat_vb)
             if self._vegas_state.intensity > 0.1:
                 self.plugin.log(
@@ -3889,12 +4020,24 @@ class HillClimbingFeeController:
                     level='info'
                 )
         
+        cycle_now = int(time.time())
+
         for state in channel_states:
             channel_id = state.get("channel_id")
             peer_id = state.get("peer_id")
             
             if not channel_id or not peer_id:
                 continue
+            begin_channel(channel_id)
+
+            # Adaptive intervals: channels waiting on an observation window
+            # are revisited when it closes (by time or by forwards)
+            if cfg.enable_adaptive_intervals:
+                entry = self._observation_due.get(channel_id)
+                if entry is not None and entry[0] > cycle_now:
+                    skip_reasons["observation_scheduled"] += 1
+                    continue
+                self._observation_due.pop(channel_id, None)
             
             # Check policy for this peer (v1.4: Policy-Driven Architecture)
             if self.policy_manager:
@@ -3987,6 +4130,11 @@ class HillClimbingFeeController:
                             channel_id, hc_state.last_update)
                         if hours_elapsed < self.MIN_OBSERVATION_HOURS:
                             skip_reasons["waiting_time"] += 1
+                            if forward_count < self.MIN_FORWARDS_FOR_SIGNAL:
+                                self._observation_due[channel_id] = [
+                                    hc_state.last_update + int(self.MIN_OBSERVATION_HOURS * 3600),
+                                    self.MIN_FORWARDS_FOR_SIGNAL - forward_count,
+                                ]
                         elif forward_count < self.MIN_FORWARDS_FOR_SIGNAL:
                             skip_reasons["waiting_forwards"] += 1
                         else:
@@ -3998,6 +4146,7 @@ class HillClimbingFeeController:
             except Exception as e:
                 self.plugin.log(f"Error adjusting fee for {channel_id}: {e}", level='error')
                 skip_reasons["error"] += 1
+        end_channel()
 
         # Garbage Collection: Prune state for closed channels (TODO #18)
         active_channel_ids = set(channels.keys())
@@ -4210,7 +4359,11 @@ class HillClimbingFeeController:
             return None
 
         # Detect critical state (Phase 5.5)
-        is_congested = (state and state.get("state") == "congested")
+        # Flow state is from the last flow cycle; the tracker sees slots
+        # filling up since then
+        is_congested = bool(state and state.get("state") == "congested") or (
+            self._htlc_tracker is not None and self._htlc_tracker.is_congested(channel_id)
+        )
         
         # Get current fee
         raw_chain_fee = channel_info.get("fee_proportional_millionths", 0)
@@ -5957,7 +6110,7 @@ class HillClimbingFeeController:
             # Small delay to allow gossip propagation, then verify
             time.sleep(0.1)  # 100ms
             try:
-                verify_channels = self._get_channels_info()
+                verify_channels = self._get_channels_info(live=True)
                 verify_info = verify_channels.get(channel_id, {})
                 actual_fee = verify_info.get("fee_proportional_millionths", -1)
                 if actual_fee != fee_ppm and actual_fee != -1:
@@ -5972,7 +6125,7 @@ class HillClimbingFeeController:
 
                     # Issue #32: Verify retry succeeded
                     time.sleep(0.1)
-                    verify_channels2 = self._get_channels_info()
+                    verify_channels2 = self._get_channels_info(live=True)
                     verify_info2 = verify_channels2.get(channel_id, {})
                     final_fee = verify_info2.get("fee_proportional_millionths", -1)
                     if final_fee != fee_ppm and final_fee != -1:
@@ -5986,6 +6139,9 @@ class HillClimbingFeeController:
                 self.plugin.log(f"Fee verification failed: {verify_err}", level='warn')
                 # Don't fail on verification errors - fee may have been set correctly
 
+            if self._channel_state is not None:
+                self._channel_state.note_fee_update(channel_id, self.config.base_fee_msat, fee_ppm)
+
             # Step 3: Record the change with explainability data
             self.database.record_fee_change(
                 channel_id=channel_id,
@@ -6001,6 +6157,10 @@ class HillClimbingFeeController:
             result["success"] = True
             result["old_fee_ppm"] = old_fee_ppm
             result["message"] = f"Fee set to {fee_ppm} PPM"
+            _FEE_CHANGES.inc(
+                trigger="manual" if manual else "auto",
+                direction="up" if fee_ppm > old_fee_ppm else "down" if fee_ppm < old_fee_ppm else "same",
+            )
             
             self.plugin.log(
                 f"Set fee for {channel_id[:16]}...: {old_fee_ppm} -> {fee_ppm} PPM "
@@ -6016,6 +6176,7 @@ class HillClimbingFeeController:
         
         return result
     
+    @timed_stage("bounds")
     def _calculate_floor(self, capacity_sats: int, 
                          chain_costs: Optional[Dict[str, int]] = None,
                          peer_id: Optional[str] = None) -> int:
@@ -6248,6 +6409,7 @@ class HillClimbingFeeController:
         self._hill_climb_states[channel_id] = hc_state
         return hc_state
 
+    @timed_stage("persist")
     def _save_hill_climb_state(self, channel_id: str, state: HillClimbState):
         """Save Hill Climbing state to cache and database (including v2.0 fields)."""
         import json
@@ -6408,17 +6570,24 @@ class HillClimbingFeeController:
             self.plugin.log(f"Error getting failure rate for {channel_id}: {e}", level='debug')
             return 0.0
 
-    def _get_channels_info(self) -> Dict[str, Dict[str, Any]]:
+    def _get_channels_info(self, live: bool = False) -> Dict[str, Dict[str, Any]]:
         """
         Get current info for all channels.
 
+        Args:
+            live: Query lightningd instead of the channel state model
+                  (used to verify a fee we just set)
+
         Returns:
             Dict mapping channel_id to channel info
         """
         channels = {}
         
         try:
-            result = self.plugin.rpc.listpeerchannels()
+            if live:
+                result = self.plugin.rpc.listpeerchannels()
+            else:
+                result = list_peer_channels(self.plugin, self._channel_state)
             
             for channel in result.get("channels", []):
                 if channel.get("state") != "CHANNELD_NORMAL":
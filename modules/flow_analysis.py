@@ -33,6 +33,11 @@ from datetime import datetime, timedelta
 
 from pyln.client import Plugin, RpcError
 
+from .channel_state_model import ChannelStateModel, list_peer_channels
+from .htlc_tracker import HtlcTracker
+from .cycle_profiler import begin_channel, end_channel, profiled_cycle, stage, timed_stage
+from .openmetrics import metrics
+
 
 # =============================================================================
 # FLOW ANALYSIS v2.0 IMPROVEMENT PARAMETERS
@@ -56,6 +61,17 @@ MIN_FLOW_MULTIPLIER = 0.5  # Security: Floor
 MAX_FLOW_MULTIPLIER = 2.0  # Security: Ceiling
 MULTIPLIER_DEADBAND = 0.1  # Ignore flow_ratio changes smaller than this
 
+# Exported per channel after each flow cycle
+_FLOW_RATIO = metrics.gauge(
+    "revenue_ops_channel_flow_ratio", "Flow ratio per channel (positive = net outbound)", ("channel",)
+)
+_FLOW_STATE = metrics.gauge(
+    "revenue_ops_channel_flow_state", "Current flow state per channel (1 = active)", ("channel", "state")
+)
+_DAILY_VOLUME = metrics.gauge(
+    "revenue_ops_channel_daily_volume_sats", "Average daily routed volume per channel", ("channel",)
+)
+
 # Improvement #3: Flow Velocity Tracking
 # velocity = (current_ratio - previous_ratio) / time_hours
 # Security: Outlier detection, bounded range
@@ -434,6 +450,16 @@ class FlowAnalyzer:
         self.database = database
         # v2.1: Kalman filter state cache (channel_id -> KalmanFlowFilter)
         self._kalman_filters: Dict[str, KalmanFlowFilter] = {}
+        # Event-driven channel state (falls back to listpeerchannels if unset)
+        self._channel_state: Optional[ChannelStateModel] = None
+        # Live in-flight HTLC counts (falls back to the rows' htlcs arrays)
+        self._htlc_tracker: Optional[HtlcTracker] = None
+
+    def set_channel_state(self, channel_state: ChannelStateModel) -> None:
+        self._channel_state = channel_state
+
+    def set_htlc_tracker(self, htlc_tracker: HtlcTracker) -> None:
+        self._htlc_tracker = htlc_tracker
 
     # =========================================================================
     # v2.1 KALMAN FILTER METHODS
@@ -459,6 +485,24 @@ class FlowAnalyzer:
         self._kalman_filters[channel_id] = kf
         return kf
 
+    def preload_kalman_filters(self) -> int:
+        """
+        Load every persisted Kalman filter in one query (warm restart).
+
+        The kalman_state table is written on every update, so it is always
+        current; filters already in memory are kept.
+
+        Returns:
+            Number of filters loaded
+        """
+        loaded = 0
+        for row in self.database.get_all_kalman_states():
+            channel_id = row.get("channel_id")
+            if channel_id and channel_id not in self._kalman_filters:
+                self._kalman_filters[channel_id] = KalmanFlowFilter(KalmanFlowState.from_dict(row))
+                loaded += 1
+        return loaded
+
     def _save_kalman_filter(self, channel_id: str, kf: KalmanFlowFilter) -> None:
         """Save Kalman filter state to database."""
         self.database.save_kalman_state(channel_id, kf.state.to_dict())
@@ -504,6 +548,7 @@ class FlowAnalyzer:
         volatility = 0.5 + min(1.5, cv * 3.0)
         return volatility
 
+    @timed_stage("kalman")
     def _apply_kalman_filter(
         self,
         channel_id: str,
@@ -735,6 +780,7 @@ class FlowAnalyzer:
         # Security: enforce bounds
         return max(MIN_EMA_DECAY, min(MAX_EMA_DECAY, decay))
 
+    @profiled_cycle("flow")
     def analyze_all_channels(self) -> Dict[str, FlowMetrics]:
         """
         Analyze flow for all channels.
@@ -757,13 +803,15 @@ class FlowAnalyzer:
         
         # Get flow data from listforwards (most reliable source with correct channel IDs)
         # UPDATED: Now returns daily buckets for EMA calculation
-        flow_data_daily = self._get_daily_flow_from_listforwards()
+        with stage("db_prefetch"):
+            flow_data_daily = self._get_daily_flow_from_listforwards()
         
         # Analyze each channel
         for channel in channels:
             channel_id = channel.get("short_channel_id") or channel.get("channel_id")
             if not channel_id:
                 continue
+            begin_channel(channel_id)
 
             peer_id = channel.get("peer_id", "")
 
@@ -858,25 +906,27 @@ class FlowAnalyzer:
             results[channel_id] = metrics
 
             # Store in database (with v2.0 and v2.1 fields)
-            self.database.update_channel_state(
-                channel_id=channel_id,
-                peer_id=peer_id,
-                state=metrics.state.value,
-                flow_ratio=metrics.flow_ratio,
-                sats_in=total_in,
-                sats_out=total_out,
-                capacity=capacity,
-                # v2.0 fields
-                confidence=metrics.confidence,
-                velocity=metrics.velocity,
-                flow_multiplier=metrics.flow_multiplier,
-                ema_decay=metrics.ema_decay,
-                forward_count=forward_count,
-                # v2.1 Kalman fields
-                kalman_flow_ratio=metrics.kalman_flow_ratio,
-                kalman_velocity=metrics.kalman_velocity,
-                kalman_uncertainty=metrics.kalman_uncertainty
-            )
+            with stage("persist"):
+                self.database.update_channel_state(
+                    channel_id=channel_id,
+                    peer_id=peer_id,
+                    state=metrics.state.value,
+                    flow_ratio=metrics.flow_ratio,
+                    sats_in=total_in,
+                    sats_out=total_out,
+                    capacity=capacity,
+                    # v2.0 fields
+                    confidence=metrics.confidence,
+                    velocity=metrics.velocity,
+                    flow_multiplier=metrics.flow_multiplier,
+                    ema_decay=metrics.ema_decay,
+                    forward_count=forward_count,
+                    # v2.1 Kalman fields
+                    kalman_flow_ratio=metrics.kalman_flow_ratio,
+                    kalman_velocity=metrics.kalman_velocity,
+                    kalman_uncertainty=metrics.kalman_uncertainty
+                )
+        end_channel()
 
         # Reconcile: remove stale channel_states entries for closed channels.
         # _get_channels() only returns CHANNELD_NORMAL, so any channel_states
@@ -899,6 +949,9 @@ class FlowAnalyzer:
         except Exception as e:
             self.plugin.log(f"Warning: failed to clean stale channel states: {e}")
 
+        _FLOW_RATIO.replace({(cid,): m.flow_ratio for cid, m in results.items()})
+        _FLOW_STATE.replace({(cid, m.state.value): 1 for cid, m in results.items()})
+        _DAILY_VOLUME.replace({(cid,): m.daily_volume for cid, m in results.items()})
         return results
     
     def analyze_channel(self, channel_id: str) -> Optional[FlowMetrics]:
@@ -995,6 +1048,7 @@ class FlowAnalyzer:
 
         return metrics
 
+    @timed_stage("flow_math")
     def _calculate_metrics(
         self, channel_id: str, peer_id: str,
         sats_in: int, sats_out: int, capacity: int,
@@ -1213,10 +1267,14 @@ class FlowAnalyzer:
         - htlc_minimum_msat: Minimum HTLC amount
         - htlc_maximum_msat: Maximum HTLC amount
         - max_accepted_htlcs: Maximum number of HTLCs allowed
-        - htlcs: List of currently active HTLCs
+        - htlcs: List of currently active HTLCs (the live tracker's count
+          once it has synced, since the rows may be a reconcile old)
         """
+        tracker = self._htlc_tracker
+        if tracker is not None and tracker.synced_at is None:
+            tracker = None
         try:
-            result = self.plugin.rpc.listpeerchannels()
+            result = list_peer_channels(self.plugin, self._channel_state)
             channels = []
             
             # listpeerchannels returns channels grouped by peer
@@ -1234,6 +1292,9 @@ class FlowAnalyzer:
                     # Count active HTLCs from the htlcs array
                     htlcs = channel_info.get("htlcs", [])
                     channel_info["active_htlcs"] = len(htlcs) if htlcs else 0
+                    if tracker is not None and channel_info.get("short_channel_id"):
+                        channel_info["active_htlcs"] = tracker.active_htlcs(
+                            channel_info["short_channel_id"])
                     
                     channels.append(channel_info)
             
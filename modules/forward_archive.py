@@ -0,0 +1,161 @@
+"""
+Forward Archive module for cl-revenue-ops
+
+Cold tier for forwards older than the hot window.
+
+cleanup_old_data() keeps flow_window_days + 1 days of raw forwards in the
+main database and used to fold everything older into daily_forwarding_stats
+only. With an archive directory configured, pruned forwards are moved (not
+just aggregated) into one SQLite file per calendar month (UTC):
+
+    <archive_dir>/forwards-2026-03.db
+
+Each file holds a `forwards` table with the compact hot layout (integer
+SCIDs, WITHOUT ROWID, clustered on the dedup key) and one (out_scid,
+timestamp) index. Files are written only by the pruning connection, which
+ATTACHes the month being filled for the duration of one chunk; a copy that
+was interrupted is repeated with INSERT OR IGNORE, so rows are never
+duplicated in the archive.
+
+Reads open the month files that overlap the requested window read-only, so
+long-window queries never touch the hot database's locks. The fan-out
+across hot and cold tiers lives in Database.get_forward_history() and
+Database.iter_forwards().
+"""
+
+import calendar
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+ARCHIVE_FILE_RE = re.compile(r"^forwards-(\d{4})-(\d{2})\.db$")
+
+ARCHIVE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.forwards (
+        timestamp INTEGER NOT NULL,
+        out_scid INTEGER NOT NULL,
+        in_scid INTEGER NOT NULL,
+        in_msat INTEGER NOT NULL,
+        out_msat INTEGER NOT NULL,
+        fee_msat INTEGER NOT NULL,
+        resolved_time INTEGER NOT NULL DEFAULT 0,
+        resolution_time REAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (timestamp, out_scid, in_scid, in_msat, out_msat, fee_msat, resolved_time)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_forwards_out ON forwards(out_scid, timestamp)",
+)
+
+
+def month_of(timestamp: int) -> Tuple[int, int]:
+    """(year, month) of a unix timestamp, UTC."""
+    t = time.gmtime(timestamp)
+    return t.tm_year, t.tm_mon
+
+
+def month_start(year: int, month: int) -> int:
+    return calendar.timegm((year, month, 1, 0, 0, 0))
+
+
+def month_end(year: int, month: int) -> int:
+    """First second of the following month."""
+    return month_start(year + month // 12, month % 12 + 1)
+
+
+class ForwardArchive:
+    """
+    Monthly SQLite files holding forwards pruned from the hot database.
+    """
+
+    ATTACH_ALIAS = "forward_archive"
+
+    def __init__(self, archive_dir: str, plugin=None):
+        self.archive_dir = os.path.expanduser(archive_dir)
+        self.plugin = plugin
+        self._lock = threading.Lock()
+        self.rows_archived = 0
+
+    def path(self, year: int, month: int) -> str:
+        return os.path.join(self.archive_dir, f"forwards-{year:04d}-{month:02d}.db")
+
+    def months(self) -> List[Tuple[int, int]]:
+        """Archived months, oldest first."""
+        try:
+            names = os.listdir(self.archive_dir)
+        except OSError:
+            return []
+        found = []
+        for name in names:
+            match = ARCHIVE_FILE_RE.match(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2))))
+        return sorted(found)
+
+    def months_between(self, since: int, until: int) -> List[Tuple[int, int]]:
+        """Archived months overlapping [since, until)."""
+        return [(y, m) for y, m in self.months()
+                if month_end(y, m) > since and month_start(y, m) < until]
+
+    # =========================================================================
+    # Writer (pruning connection)
+    # =========================================================================
+
+    def attach(self, conn: sqlite3.Connection, timestamp: int) -> Tuple[str, int]:
+        """
+        ATTACH the month file that `timestamp` falls in (creating it).
+
+        Must be called outside a transaction. Returns the schema alias and
+        the end of the month: a chunk moved into this file must stop there.
+        """
+        year, month = month_of(timestamp)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        conn.execute("ATTACH DATABASE ? AS " + self.ATTACH_ALIAS, (self.path(year, month),))
+        try:
+            for sql in ARCHIVE_SCHEMA:
+                conn.execute(sql.format(schema=self.ATTACH_ALIAS))
+        except Exception:
+            self.detach(conn)
+            raise
+        return self.ATTACH_ALIAS, month_end(year, month)
+
+    def detach(self, conn: sqlite3.Connection) -> None:
+        try:
+            conn.execute("DETACH DATABASE " + self.ATTACH_ALIAS)
+        except sqlite3.OperationalError:
+            pass  # Not attached
+
+    def record_archived(self, count: int) -> None:
+        with self._lock:
+            self.rows_archived += count
+
+    # =========================================================================
+    # Readers
+    # =========================================================================
+
+    def connect(self, year: int, month: int) -> sqlite3.Connection:
+        """Read-only connection to one month file."""
+        uri = "file:" + self.path(year, month) + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get_status(self) -> Dict[str, Any]:
+        months = self.months()
+        size = 0
+        for year, month in months:
+            try:
+                size += os.path.getsize(self.path(year, month))
+            except OSError:
+                pass
+        return {
+            "dir": self.archive_dir,
+            "months": len(months),
+            "oldest": "%04d-%02d" % months[0] if months else None,
+            "newest": "%04d-%02d" % months[-1] if months else None,
+            "bytes": size,
+            "rows_archived": self.rows_archived,
+        }
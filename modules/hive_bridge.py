@@ -356,6 +356,36 @@ class HiveFeeIntelligenceBridge:
 
         return len(stale_peers)
 
+    def export_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Cached profiles for the warm-restart snapshot."""
+        return {
+            peer_id: {"data": cached.data, "timestamp": cached.timestamp}
+            for peer_id, cached in list(self._cache.items())
+        }
+
+    def restore_cache(self, entries: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Load cached profiles from a warm-restart snapshot.
+
+        Profiles keep their original timestamps, so the usual fresh/stale
+        TTLs apply; expired ones and peers already cached are skipped.
+
+        Returns:
+            Number of profiles restored
+        """
+        now = time.time()
+        restored = 0
+        newest_first = sorted(entries.items(), key=lambda e: e[1].get("timestamp", 0), reverse=True)
+        for peer_id, entry in newest_first:
+            if len(self._cache) >= MAX_CACHE_ENTRIES:
+                break
+            timestamp = float(entry.get("timestamp", 0))
+            if peer_id in self._cache or now - timestamp > STALE_CACHE_TTL_SECONDS:
+                continue
+            self._cache[peer_id] = CachedProfile(data=entry.get("data") or {}, timestamp=timestamp)
+            restored += 1
+        return restored
+
     def _stale_with_reduced_confidence(
         self,
         data: Dict,
@@ -0,0 +1,235 @@
+"""
+HTLC Tracker module for cl-revenue-ops
+
+Live count of in-flight HTLCs per channel, fed by the htlc_accepted hook.
+
+The hook used to return "continue" without looking at the HTLC, while
+congestion detection sampled listpeerchannels' htlcs arrays once per flow
+cycle. HtlcTracker keeps the same numbers current between cycles:
+
+- htlc_accepted:  +1 slot on the incoming and the outgoing channel
+- forward_event:  settled / failed / local_failed releases what the matching
+                  accept took (offered is ignored)
+- sync():         listpeerchannels rows (htlcs arrays, max_accepted_htlcs)
+                  replace the counts, correcting HTLCs whose resolution was
+                  missed and ones that predate the plugin
+
+Each update is O(1) on dicts keyed by SCID. Channels whose slot usage
+crosses htlc_congestion_threshold are kept in a set, so is_congested() is
+a lookup. HTLCs that terminate at this node carry no outgoing SCID and are
+not tracked; they hold a slot only until we settle them.
+"""
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .channel_model import _msat
+from .openmetrics import MetricFamily
+
+
+# Default max_accepted_htlcs per BOLT #2
+DEFAULT_MAX_HTLCS = 483
+
+# sync() keeps tracked HTLCs accepted this recently even when the polled
+# rows do not list them (the poll may predate the accept)
+SYNC_GRACE_SECONDS = 60
+
+RESOLVED_STATUSES = frozenset(("settled", "failed", "local_failed"))
+
+
+def _scid(value: Optional[str]) -> Optional[str]:
+    if value and ':' in value:
+        return value.replace(':', 'x')
+    return value or None
+
+
+class HtlcTracker:
+    """
+    In-flight HTLC slots and amounts per channel.
+
+    Thread-safe: the hook and notifications arrive on the plugin thread,
+    sync() and the readers run on background threads.
+    """
+
+    def __init__(self, config=None, clock=time.monotonic):
+        self.config = config
+        self._clock = clock
+        self._lock = threading.Lock()
+        # (in_scid, htlc_id) -> (out_scid, in_msat, out_msat, accepted_at)
+        self._inflight: Dict[Tuple[str, int], Tuple[Optional[str], int, int, float]] = {}
+        # scid -> [htlc count, msat in flight]
+        self._slots: Dict[str, List[int]] = {}
+        self._max_htlcs: Dict[str, int] = {}
+        self._congested: Set[str] = set()
+        self.synced_at: Optional[int] = None
+        self.accepted = 0
+        self.resolved = 0
+        self.unmatched = 0
+
+    def _threshold(self) -> float:
+        return self.config.htlc_congestion_threshold if self.config is not None else 0.8
+
+    def _add(self, scid: str, delta: int, msat: int, threshold: float) -> None:
+        entry = self._slots.get(scid)
+        if entry is None:
+            entry = self._slots[scid] = [0, 0]
+        count = entry[0] + delta
+        amount = entry[1] + msat
+        entry[0] = count if count > 0 else 0
+        entry[1] = amount if amount > 0 else 0
+        if count > threshold * self._max_htlcs.get(scid, DEFAULT_MAX_HTLCS):
+            self._congested.add(scid)
+        elif scid in self._congested:
+            self._congested.discard(scid)
+
+    # =========================================================================
+    # Hot path (plugin thread)
+    # =========================================================================
+
+    def on_htlc_accepted(self, htlc: Dict[str, Any], onion: Dict[str, Any]) -> None:
+        out_scid = onion.get("short_channel_id")
+        in_scid = htlc.get("short_channel_id")
+        if not out_scid or not in_scid:
+            return  # Terminates here (or a malformed hook payload)
+        in_scid = _scid(in_scid)
+        out_scid = _scid(out_scid)
+        in_msat = _msat(htlc.get("amount_msat"))
+        out_msat = _msat(onion.get("forward_msat")) or in_msat
+        threshold = self._threshold()
+        with self._lock:
+            key = (in_scid, htlc.get("id"))
+            if key in self._inflight:
+                return  # Replayed after a plugin restart
+            self._inflight[key] = (out_scid, in_msat, out_msat, self._clock())
+            self._add(in_scid, 1, in_msat, threshold)
+            self._add(out_scid, 1, out_msat, threshold)
+            self.accepted += 1
+
+    def on_forward_event(self, forward_event: Dict[str, Any]) -> None:
+        status = forward_event.get("status")
+        if status not in RESOLVED_STATUSES:
+            return
+        in_scid = _scid(forward_event.get("in_channel"))
+        if not in_scid:
+            return
+        threshold = self._threshold()
+        with self._lock:
+            entry = self._inflight.pop((in_scid, forward_event.get("in_htlc_id")), None)
+            if entry is None:
+                # Accepted before we were tracking (counted by sync), or no
+                # in_htlc_id: release what the event itself describes
+                self.unmatched += 1
+                if not self._slots.get(in_scid, (0,))[0]:
+                    return
+                in_msat = _msat(forward_event.get("in_msat"))
+                out_msat = _msat(forward_event.get("out_msat"))
+                out_scid = (_scid(forward_event.get("out_channel"))
+                            if status != "local_failed" else None)
+            else:
+                out_scid, in_msat, out_msat, _ = entry
+            self._add(in_scid, -1, -in_msat, threshold)
+            if out_scid:
+                self._add(out_scid, -1, -out_msat, threshold)
+            self.resolved += 1
+
+    # =========================================================================
+    # Reconciliation
+    # =========================================================================
+
+    def sync(self, channels: List[Dict[str, Any]]) -> None:
+        """Replace counts and slot limits with listpeerchannels rows."""
+        slots: Dict[str, List[int]] = {}
+        max_htlcs: Dict[str, int] = {}
+        listed: Set[Tuple[str, Any]] = set()
+        for row in channels:
+            scid = _scid(row.get("short_channel_id"))
+            if not scid:
+                continue
+            htlcs = row.get("htlcs") or []
+            max_htlcs[scid] = int(row.get("max_accepted_htlcs") or DEFAULT_MAX_HTLCS)
+            if htlcs:
+                slots[scid] = [len(htlcs), sum(_msat(h.get("amount_msat")) for h in htlcs)]
+            for h in htlcs:
+                if h.get("direction") == "in":
+                    listed.add((scid, h.get("id")))
+
+        threshold = self._threshold()
+        cutoff = self._clock() - SYNC_GRACE_SECONDS
+        with self._lock:
+            kept = {}
+            for key, entry in self._inflight.items():
+                if key in listed:
+                    kept[key] = entry
+                elif entry[3] >= cutoff:
+                    # Too recent for the poll: count it on top of the rows
+                    kept[key] = entry
+                    for scid, msat in ((key[0], entry[1]), (entry[0], entry[2])):
+                        counts = slots.setdefault(scid, [0, 0])
+                        counts[0] += 1
+                        counts[1] += msat
+            self._inflight = kept
+            self._slots = slots
+            self._max_htlcs = max_htlcs
+            self._congested = {
+                scid for scid, (count, _) in slots.items()
+                if max_htlcs.get(scid, DEFAULT_MAX_HTLCS) > 0
+                and count / max_htlcs.get(scid, DEFAULT_MAX_HTLCS) > threshold
+            }
+            self.synced_at = int(time.time())
+
+    # =========================================================================
+    # Readers
+    # =========================================================================
+
+    def active_htlcs(self, scid: str) -> int:
+        entry = self._slots.get(_scid(scid))
+        return entry[0] if entry else 0
+
+    def inflight_msat(self, scid: str) -> int:
+        entry = self._slots.get(_scid(scid))
+        return entry[1] if entry else 0
+
+    def slot_pressure(self, scid: str) -> float:
+        """Fraction of max_accepted_htlcs in use (0.0 - 1.0+)."""
+        scid = _scid(scid)
+        with self._lock:
+            entry = self._slots.get(scid)
+            limit = self._max_htlcs.get(scid, DEFAULT_MAX_HTLCS)
+            return entry[0] / limit if entry and limit > 0 else 0.0
+
+    def is_congested(self, scid: str) -> bool:
+        return _scid(scid) in self._congested
+
+    def get_status(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            busiest = sorted(self._slots.items(), key=lambda kv: -kv[1][0])[:top]
+            return {
+                "synced_at": self.synced_at,
+                "inflight_htlcs": len(self._inflight),
+                "channels_with_htlcs": sum(1 for c, _ in self._slots.values() if c),
+                "congested_channels": sorted(self._congested),
+                "accepted": self.accepted,
+                "resolved": self.resolved,
+                "unmatched_resolutions": self.unmatched,
+                "busiest": [
+                    {"channel": scid, "htlcs": count, "inflight_msat": msat,
+                     "max_htlcs": self._max_htlcs.get(scid, DEFAULT_MAX_HTLCS)}
+                    for scid, (count, msat) in busiest if count
+                ],
+            }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        htlcs = MetricFamily("revenue_ops_channel_inflight_htlcs", "gauge",
+                             "HTLCs in flight per channel", ("channel",))
+        msat = MetricFamily("revenue_ops_channel_inflight_msat", "gauge",
+                            "Amount in flight per channel", ("channel",))
+        congested = MetricFamily("revenue_ops_congested_channels", "gauge",
+                                 "Channels above the HTLC slot congestion threshold")
+        with self._lock:
+            for scid, (count, amount) in self._slots.items():
+                if count:
+                    htlcs.set(count, channel=scid)
+                    msat.set(amount, channel=scid)
+            congested.set(len(self._congested))
+        return [htlcs, msat, congested]
@@ -0,0 +1,279 @@
+"""
+OpenMetrics module for cl-revenue-ops
+
+Prometheus / OpenMetrics text exposition of plugin telemetry (opt-in).
+
+Two kinds of metrics feed one registry:
+
+- Families the loops keep incrementally: they are declared once at import
+  (metrics.counter/gauge/histogram) and updated as things happen, e.g. a
+  rebalance outcome or a cycle duration.
+- Collectors: callables run at scrape time that read state the plugin
+  already keeps in memory (RPC metrics, scheduler, channel state model,
+  database file sizes) and return fresh families.
+
+Neither path may issue RPC or SQL, so a scrape costs O(metrics). The text
+is served by MetricsServer on a local port and/or written atomically for
+the node_exporter textfile collector (write_textfile).
+"""
+
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Cycle durations (seconds)
+CYCLE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class MetricFamily:
+    """
+    One metric family: counter, gauge or histogram, keyed by label values.
+
+    Histograms keep non-cumulative bucket counts plus sum and count.
+    """
+
+    def __init__(self, name: str, kind: str, help_text: str,
+                 labelnames: Iterable[str] = (), buckets: Iterable[float] = CYCLE_BUCKETS):
+        if kind not in ("counter", "gauge", "histogram"):
+            raise ValueError(f"Unknown metric type {kind}")
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) if kind == "histogram" else ()
+        self._values: Dict[LabelValues, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if labels.keys() != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    # =========================================================================
+    # Updates
+    # =========================================================================
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            index = 0
+            while index < len(self.buckets) and value > self.buckets[index]:
+                index += 1
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def set_histogram(self, counts: List[int], total: float, **labels) -> None:
+        """Install pre-bucketed counts (len(buckets) + 1, last is overflow)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = [list(counts), total, sum(counts)]
+
+    def replace(self, values: Dict[LabelValues, float]) -> None:
+        """Swap in a full set of gauge values (drops label sets no longer present)."""
+        with self._lock:
+            self._values = dict(values)
+
+    def remove(self, **labels) -> None:
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+    def get(self, **labels) -> Any:
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    # =========================================================================
+    # Exposition
+    # =========================================================================
+
+    def render(self, out: List[str], openmetrics: bool = True) -> None:
+        with self._lock:
+            items = sorted(self._values.items())
+            items = [(k, (list(v[0]), v[1], v[2]) if self.kind == "histogram" else v)
+                     for k, v in items]
+        if not items:
+            return
+
+        sample = self.name + "_total" if self.kind == "counter" else self.name
+        type_name = self.name if openmetrics or self.kind != "counter" else sample
+        out.append(f"# TYPE {type_name} {self.kind}")
+        out.append(f"# HELP {type_name} {_escape(self.help)}")
+
+        for key, value in items:
+            pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+            if self.kind != "histogram":
+                label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+                out.append(f"{sample}{label_text} {_fmt(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                label_text = "{" + ",".join(pairs + [f'le="{_fmt(float(bound))}"']) + "}"
+                out.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = "{" + ",".join(pairs) + "}" if pairs else ""
+            out.append(f"{self.name}_count{label_text} {count}")
+            out.append(f"{self.name}_sum{label_text} {_fmt(total)}")
+
+
+class MetricsRegistry:
+    """Declared families plus scrape-time collectors."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: Dict[str, Callable[[], Iterable[MetricFamily]]] = {}
+
+    def _declare(self, family: MetricFamily) -> MetricFamily:
+        with self._lock:
+            existing = self._families.get(family.name)
+            if existing is not None:
+                return existing
+            self._families[family.name] = family
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._declare(MetricFamily(name, "counter", help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> MetricFamily:
+        return self._declare(MetricFamily(name, "gauge", help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = CYCLE_BUCKETS) -> MetricFamily:
+        return self._declare(MetricFamily(name, "histogram", help_text, labelnames, buckets))
+
+    def register_collector(self, name: str, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        """collector() runs at each scrape; it must only read in-memory state."""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self, openmetrics: bool = True, on_error: Optional[Callable[[str], None]] = None) -> str:
+        with self._lock:
+            families = list(self._families.values())
+            collectors = list(self._collectors.items())
+
+        out: List[str] = []
+        for family in families:
+            family.render(out, openmetrics)
+        scrape_errors = 0
+        for name, collector in collectors:
+            try:
+                for family in collector():
+                    family.render(out, openmetrics)
+            except Exception as e:
+                scrape_errors += 1
+                if on_error:
+                    on_error(f"metrics collector {name} failed: {e}")
+        errors = MetricFamily("revenue_ops_metrics_collector_errors", "gauge",
+                              "Collectors that failed during this scrape")
+        errors.set(scrape_errors)
+        errors.render(out, openmetrics)
+        if openmetrics:
+            out.append("# EOF")
+        return "\n".join(out) + "\n"
+
+
+# Shared by the loops, the collectors and the exporters
+metrics = MetricsRegistry()
+
+
+def write_textfile(path: str, registry: MetricsRegistry = metrics,
+                   on_error: Optional[Callable[[str], None]] = None) -> int:
+    """
+    Write Prometheus text format for the node_exporter textfile collector.
+
+    The file is replaced atomically (temp file + rename in the same
+    directory), so the collector never reads a partial file.
+    """
+    text = registry.render(openmetrics=False, on_error=on_error)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return len(text)
+
+
+class MetricsServer:
+    """HTTP exporter: GET /metrics on a local port, rendered per request."""
+
+    def __init__(self, port: int, registry: MetricsRegistry = metrics,
+                 host: str = "127.0.0.1", log: Optional[Callable[[str], None]] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._log = log
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self.scrapes = 0
+
+    def start(self) -> None:
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+                body = exporter.registry.render(openmetrics, on_error=exporter._log).encode("utf-8")
+                exporter.scrapes += 1
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics
+                                 else PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # one line per scrape would flood the plugin log
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True, name="metrics_server")
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -29,10 +29,20 @@ Security Mitigations:
 
 import time
 import math
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 
+try:
+    import numpy as np
+except ImportError:  # Optional: pure-Python fallback (fine for small nodes)
+    np = None
+
 
 # =============================================================================
 # CONFIGURATION CONSTANTS
@@ -42,6 +52,7 @@ from enum import Enum
 PORTFOLIO_WINDOW_DAYS = 14          # Rolling window for statistics
 MIN_OBSERVATIONS = 5                # Minimum data points per channel
 OBSERVATION_INTERVAL_HOURS = 4      # Sample interval for variance calculation
+MIN_COMMON_BUCKETS = 3              # Shared buckets needed for a pair covariance
 
 # Optimization parameters
 MIN_VARIANCE = 1e-10                # Floor to prevent divide-by-zero
@@ -56,6 +67,10 @@ DEFAULT_RISK_AVERSION = 1.0         # Lambda in E[R] - lambda * Var[R]
 # Correlation thresholds
 HIGH_CORRELATION_THRESHOLD = 0.7    # Channels moving together
 NEGATIVE_CORRELATION_THRESHOLD = -0.3  # Natural hedges
+CORRELATION_FLOOR = 0.1             # |correlation| below this is treated as 0
+
+# Pairwise statistics are computed in row blocks of about this many entries
+_PAIRWISE_BLOCK_ELEMENTS = 1 << 20
 
 
 def _safe_msat_to_sats(value: Any) -> int:
@@ -81,6 +96,599 @@ def _safe_msat_to_sats(value: Any) -> int:
         return 0
 
 
+def _forward_key(out_channel: Any, fee_msat: Any, out_msat: Any, timestamp: Any) -> Tuple[Any, ...]:
+    """Identity of a forward as both the database and forward_event report it."""
+    return (out_channel, int(_fee_msat_value({"fee_msat": fee_msat})),
+            _safe_msat_to_sats(out_msat), int(timestamp or 0))
+
+
+def _fee_msat_value(fwd: Dict[str, Any]) -> float:
+    """
+    Extract the fee earned by a forward in msat (sub-sat precision kept).
+
+    Accepts bookkeeper-style ("fee_msat") and listforwards-style ("fee")
+    fields, as integers or "1000msat" strings.
+    """
+    fee = fwd.get("fee_msat") or fwd.get("fee", 0)
+    if isinstance(fee, (int, float)):
+        return float(fee)
+    if isinstance(fee, str):
+        try:
+            return float(int(fee.replace("msat", "").strip()))
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+# =============================================================================
+# ARRAY ENGINE
+# =============================================================================
+# Portfolio math runs on a channels x buckets revenue matrix built once per
+# analysis. NumPy is used when installed (required for large nodes: the
+# pairwise statistics are a handful of matrix products instead of an
+# O(n^2 * T) Python loop); otherwise the same algorithms run on plain lists.
+
+def _observation_window(now: int) -> Tuple[int, int]:
+    """
+    [start, end) of the closed observation buckets in the portfolio window.
+
+    Buckets are aligned to the epoch and the one still open at `now` is left
+    out. This is the grid OnlinePortfolioStats keeps, so the batch and online
+    statistics see the same buckets.
+    """
+    interval_secs = OBSERVATION_INTERVAL_HOURS * 3600
+    end = (now // interval_secs) * interval_secs
+    buckets = (PORTFOLIO_WINDOW_DAYS * 24) // OBSERVATION_INTERVAL_HOURS
+    return end - buckets * interval_secs, end
+
+
+def _build_revenue_matrix(
+    scids: List[str],
+    forwards: List[Dict[str, Any]],
+    window_start: int,
+    window_end: int
+) -> Tuple[Any, Any]:
+    """
+    Bucket forward fees into a channels x buckets revenue-rate matrix.
+
+    Buckets start at window_start; window_end is exclusive.
+
+    Returns:
+        Tuple of (values, observed) where values[i][t] is the revenue rate
+        (sats/hour) of channel i in bucket t and observed[i][t] is True when
+        the channel had at least one forward in that bucket.
+    """
+    interval_secs = OBSERVATION_INTERVAL_HOURS * 3600
+    n_buckets = max(1, -(-(window_end - window_start) // interval_secs))
+    index = {scid: i for i, scid in enumerate(scids)}
+
+    rows: List[int] = []
+    cols: List[int] = []
+    rates: List[float] = []
+    for fwd in forwards:
+        row = index.get(fwd.get("out_channel"))
+        if row is None:
+            continue
+        ts = fwd.get("received_time") or fwd.get("timestamp", 0)
+        if ts < window_start or ts >= window_end:
+            continue
+        rows.append(row)
+        cols.append(int(ts - window_start) // interval_secs)
+        rates.append(_fee_msat_value(fwd) / 1000 / OBSERVATION_INTERVAL_HOURS)
+
+    n = len(scids)
+    if np is not None:
+        values = np.zeros((n, n_buckets))
+        observed = np.zeros((n, n_buckets), dtype=bool)
+        if rows:
+            np.add.at(values, (rows, cols), rates)
+            observed[rows, cols] = True
+        return values, observed
+
+    values = [[0.0] * n_buckets for _ in range(n)]
+    observed = [[False] * n_buckets for _ in range(n)]
+    for row, col, rate in zip(rows, cols, rates):
+        values[row][col] += rate
+        observed[row][col] = True
+    return values, observed
+
+
+def _centered_rows(values: Any, observed: Any) -> Tuple[Any, Any]:
+    """
+    Observation mask and row-centered revenue matrix (NumPy engine).
+
+    Each row is centered on its observed mean; covariance is shift invariant
+    and this keeps the one-pass sums numerically stable.
+    """
+    mask = observed.astype(float)
+    obs_count = mask.sum(axis=1)
+    row_mean = np.divide(
+        (values * mask).sum(axis=1), obs_count,
+        out=np.zeros(len(obs_count)), where=obs_count > 0
+    )
+    return mask, (values - row_mean[:, None]) * mask
+
+
+def _pairwise_block(x: Any, mask: Any, start: int, stop: int) -> Tuple[Any, Any, Any]:
+    """
+    Pairwise-complete statistics of channels start..stop against all channels.
+
+    Returns:
+        Tuple of (covariance, correlation, valid) (stop - start) x n arrays,
+        where valid marks pairs with at least MIN_COMMON_BUCKETS shared buckets.
+    """
+    xs, ms = x[start:stop], mask[start:stop]
+    n_common = ms @ mask.T
+    sum_a = xs @ mask.T             # sum of a over buckets shared with b
+    sum_b = ms @ x.T
+    sum_ab = xs @ x.T
+    sum_aa = (xs * xs) @ mask.T
+    sum_bb = ms @ (x * x).T
+
+    valid = n_common >= MIN_COMMON_BUCKETS
+    safe_n = np.where(valid, n_common, 1.0)
+    denom = np.where(valid, n_common - 1, 1.0)
+
+    cov = np.where(valid, (sum_ab - sum_a * sum_b / safe_n) / denom, 0.0)
+    var_a = (sum_aa - sum_a * sum_a / safe_n) / denom
+    var_b = (sum_bb - sum_b * sum_b / safe_n) / denom
+
+    corr_ok = valid & (var_a > MIN_VARIANCE) & (var_b > MIN_VARIANCE)
+    scale = np.sqrt(np.where(corr_ok, var_a * var_b, 1.0))
+    corr = np.where(corr_ok, np.clip(cov / scale, -1.0, 1.0), 0.0)
+    return cov, corr, valid
+
+
+def _pairwise_pure(values: List[List[float]], observed: List[List[bool]]):
+    """
+    Pairwise-complete statistics on plain lists.
+
+    Yields (i, j, covariance, correlation) for every pair i <= j with at
+    least MIN_COMMON_BUCKETS shared buckets.
+    """
+    n = len(values)
+    buckets = [
+        {t for t, seen in enumerate(observed[i]) if seen} for i in range(n)
+    ]
+    for i in range(n):
+        for j in range(i, n):
+            common = sorted(buckets[i] & buckets[j])
+            count = len(common)
+            if count < MIN_COMMON_BUCKETS:
+                continue
+            vals_a = [values[i][t] for t in common]
+            vals_b = [values[j][t] for t in common]
+            mean_a = sum(vals_a) / count
+            mean_b = sum(vals_b) / count
+            denominator = count - 1
+            c = sum(
+                (a - mean_a) * (b - mean_b) for a, b in zip(vals_a, vals_b)
+            ) / denominator
+            var_a = sum((a - mean_a) ** 2 for a in vals_a) / denominator
+            var_b = sum((b - mean_b) ** 2 for b in vals_b) / denominator
+            r = 0.0
+            if var_a > MIN_VARIANCE and var_b > MIN_VARIANCE:
+                r = max(-1.0, min(1.0, c / math.sqrt(var_a * var_b)))
+            yield i, j, c, r
+
+
+def _pairwise_statistics(values: Any, observed: Any) -> Tuple[Any, Any]:
+    """
+    Dense covariance and correlation between all channel pairs.
+
+    Uses pairwise-complete observations: each pair only considers buckets
+    where both channels saw forwards, and pairs with fewer than
+    MIN_COMMON_BUCKETS shared buckets get zero covariance/correlation.
+    Analysis uses the sparse variant; this one backs drift verification.
+
+    Returns:
+        Tuple of (covariance, correlation) n x n matrices.
+    """
+    if np is not None:
+        mask, x = _centered_rows(values, observed)
+        cov, corr, _ = _pairwise_block(x, mask, 0, len(x))
+        return cov, corr
+
+    n = len(values)
+    cov = [[0.0] * n for _ in range(n)]
+    corr = [[0.0] * n for _ in range(n)]
+    for i, j, c, r in _pairwise_pure(values, observed):
+        cov[i][j] = cov[j][i] = c
+        corr[i][j] = corr[j][i] = r
+    return cov, corr
+
+
+def _sparse_pairwise_statistics(
+    values: Any,
+    observed: Any,
+    floor: float = CORRELATION_FLOOR
+) -> "_SparsePairs":
+    """
+    Pairwise-complete statistics keeping only significant pairs.
+
+    The NumPy engine works in row blocks of about _PAIRWISE_BLOCK_ELEMENTS
+    entries, so peak memory is bounded by the block plus the kept pairs
+    rather than n x n.
+    """
+    n = len(values)
+    if np is not None:
+        mask, x = _centered_rows(values, observed)
+        block = max(1, _PAIRWISE_BLOCK_ELEMENTS // max(n, 1))
+        variance = np.zeros(n)
+        parts = []
+        columns = np.arange(n)
+        for start in range(0, n, block):
+            stop = min(n, start + block)
+            cov, corr, valid = _pairwise_block(x, mask, start, stop)
+            local = np.arange(stop - start)
+            variance[start:stop] = cov[local, local + start]
+            keep = (
+                (columns[None, :] > np.arange(start, stop)[:, None])
+                & valid & (np.abs(corr) >= floor)
+            )
+            r, c = np.nonzero(keep)
+            parts.append((r + start, c, cov[r, c], corr[r, c]))
+        if parts:
+            rows, cols, cov_vals, corr_vals = (np.concatenate(p) for p in zip(*parts))
+        else:
+            rows = cols = np.zeros(0, dtype=int)
+            cov_vals = corr_vals = np.zeros(0)
+        return _SparsePairs(n, rows, cols, cov_vals, corr_vals, variance)
+
+    rows, cols = array("l"), array("l")
+    cov_vals, corr_vals = array("d"), array("d")
+    variance = array("d", [0.0] * n)
+    for i, j, c, r in _pairwise_pure(values, observed):
+        if i == j:
+            variance[i] = c
+        elif abs(r) >= floor:
+            rows.append(i)
+            cols.append(j)
+            cov_vals.append(c)
+            corr_vals.append(r)
+    return _SparsePairs(n, rows, cols, cov_vals, corr_vals, variance)
+
+
+class _SparsePairs:
+    """
+    Symmetric channel-pair statistics stored as compact upper-triangle arrays.
+
+    Entry k describes channels rows[k] < cols[k] (ordinals), ordered
+    row-major. Only significant pairs are stored; every other off-diagonal
+    covariance/correlation is an implicit zero. The diagonal is kept
+    densely in `variance`. Memory therefore scales with the number of
+    significant pairs instead of n^2.
+
+    The optimizer uses the same structure for its regularized covariance
+    (variance = per-channel variance + REGULARIZATION_LAMBDA).
+    """
+
+    def __init__(self, n: int, rows: Any, cols: Any, cov: Any, corr: Any, variance: Any):
+        self.n = n
+        self.rows = rows
+        self.cols = cols
+        self.cov = cov
+        self.corr = corr
+        self.variance = variance
+        self._keys: Any = None
+
+    @classmethod
+    def from_dense(cls, cov: Any, corr: Any, floor: float = CORRELATION_FLOOR) -> "_SparsePairs":
+        """Threshold dense n x n covariance/correlation matrices."""
+        n = len(cov)
+        if np is not None:
+            cov = np.asarray(cov, dtype=float)
+            corr = np.asarray(corr, dtype=float)
+            rows, cols = np.nonzero(np.triu(np.abs(corr) >= floor, 1))
+            return cls(n, rows, cols, cov[rows, cols], corr[rows, cols], np.diag(cov).copy())
+
+        rows, cols = array("l"), array("l")
+        cov_vals, corr_vals = array("d"), array("d")
+        for i in range(n):
+            for j in range(i + 1, n):
+                if abs(corr[i][j]) >= floor:
+                    rows.append(i)
+                    cols.append(j)
+                    cov_vals.append(cov[i][j])
+                    corr_vals.append(corr[i][j])
+        return cls(n, rows, cols, cov_vals, corr_vals, array("d", (cov[i][i] for i in range(n))))
+
+    @classmethod
+    def from_moments(
+        cls, n_mat: Any, c_mat: Any, m2_mat: Any, floor: float = CORRELATION_FLOOR
+    ) -> "_SparsePairs":
+        """
+        Significant pairs straight from pairwise counts and (co-)moments.
+
+        Same values as _moments_to_statistics() + from_dense(), but pairs
+        with fewer than MIN_COMMON_BUCKETS shared buckets are skipped before
+        anything is computed, and the NumPy engine scans the counts in row
+        blocks, so no dense n x n covariance or correlation is built.
+        """
+        n = len(n_mat)
+        if np is not None:
+            variance = np.zeros(n)
+            parts = []
+            block = max(1, _PAIRWISE_BLOCK_ELEMENTS // max(n, 1))
+            columns = np.arange(n)
+            for start in range(0, n, block):
+                stop = min(n, start + block)
+                counts = n_mat[start:stop]
+                local = np.arange(stop - start)
+                diag = counts[local, local + start]
+                variance[start:stop] = np.where(
+                    diag >= MIN_COMMON_BUCKETS,
+                    c_mat[local + start, local + start] / np.maximum(diag - 1, 1.0), 0.0
+                )
+                r, c = np.nonzero(
+                    (counts >= MIN_COMMON_BUCKETS)
+                    & (columns[None, :] > np.arange(start, stop)[:, None])
+                )
+                r = r + start
+                denom = n_mat[r, c] - 1
+                cov = c_mat[r, c] / denom
+                var_a = np.maximum(m2_mat[r, c], 0.0) / denom
+                var_b = np.maximum(m2_mat[c, r], 0.0) / denom
+                corr_ok = (var_a > MIN_VARIANCE) & (var_b > MIN_VARIANCE)
+                scale = np.sqrt(np.where(corr_ok, var_a * var_b, 1.0))
+                corr = np.where(corr_ok, np.clip(cov / scale, -1.0, 1.0), 0.0)
+                keep = np.abs(corr) >= floor
+                parts.append((r[keep], c[keep], cov[keep], corr[keep]))
+            if parts:
+                rows, cols, cov_vals, corr_vals = (np.concatenate(p) for p in zip(*parts))
+            else:
+                rows = cols = np.zeros(0, dtype=int)
+                cov_vals = corr_vals = np.zeros(0)
+            return cls(n, rows, cols, cov_vals, corr_vals, variance)
+
+        rows, cols = array("l"), array("l")
+        cov_vals, corr_vals = array("d"), array("d")
+        variance = array("d", [0.0] * n)
+        for i in range(n):
+            count_row = n_mat[i]
+            if count_row[i] >= MIN_COMMON_BUCKETS:
+                variance[i] = c_mat[i][i] / (count_row[i] - 1)
+            for j in range(i + 1, n):
+                count = count_row[j]
+                if count < MIN_COMMON_BUCKETS:
+                    continue
+                var_a = max(m2_mat[i][j], 0.0) / (count - 1)
+                var_b = max(m2_mat[j][i], 0.0) / (count - 1)
+                if var_a <= MIN_VARIANCE or var_b <= MIN_VARIANCE:
+                    continue
+                c = c_mat[i][j] / (count - 1)
+                r = max(-1.0, min(1.0, c / math.sqrt(var_a * var_b)))
+                if abs(r) >= floor:
+                    rows.append(i)
+                    cols.append(j)
+                    cov_vals.append(c)
+                    corr_vals.append(r)
+        return cls(n, rows, cols, cov_vals, corr_vals, variance)
+
+    @property
+    def nnz(self) -> int:
+        """Number of stored (off-diagonal) pairs."""
+        return len(self.rows)
+
+    def _find(self, i: int, j: int) -> Optional[int]:
+        if i > j:
+            i, j = j, i
+        if self._keys is None:
+            if np is not None:
+                self._keys = np.asarray(self.rows, dtype=np.int64) * self.n + self.cols
+            else:
+                self._keys = array("q", (r * self.n + c for r, c in zip(self.rows, self.cols)))
+        key = i * self.n + j
+        if np is not None:
+            k = int(np.searchsorted(self._keys, key))
+        else:
+            k = bisect_left(self._keys, key)
+        if k < len(self._keys) and self._keys[k] == key:
+            return k
+        return None
+
+    def covariance(self, i: int, j: int) -> float:
+        if i == j:
+            return float(self.variance[i])
+        k = self._find(i, j)
+        return float(self.cov[k]) if k is not None else 0.0
+
+    def correlation(self, i: int, j: int) -> float:
+        if i == j:
+            return 1.0 if self.variance[i] > MIN_VARIANCE else 0.0
+        k = self._find(i, j)
+        return float(self.corr[k]) if k is not None else 0.0
+
+    def matvec(self, vector: Any) -> Any:
+        """Covariance-vector product in O(n + nnz)."""
+        if np is not None:
+            vector = np.asarray(vector, dtype=float)
+            return (
+                self.variance * vector
+                + np.bincount(self.rows, weights=self.cov * vector[self.cols], minlength=self.n)
+                + np.bincount(self.cols, weights=self.cov * vector[self.rows], minlength=self.n)
+            )
+        result = [v * x for v, x in zip(self.variance, vector)]
+        for i, j, c in zip(self.rows, self.cols, self.cov):
+            result[i] += c * vector[j]
+            result[j] += c * vector[i]
+        return result
+
+    def quadratic_form(self, weights: Any) -> float:
+        """w' * Cov * w."""
+        return float(sum(w * mv for w, mv in zip(weights, self.matvec(weights))))
+
+    def spectral_bound(self) -> float:
+        """Upper bound on the largest eigenvalue (Gershgorin: max abs row sum)."""
+        if self.n == 0:
+            return 0.0
+        if np is not None:
+            abs_cov = np.abs(self.cov)
+            sums = (
+                np.abs(self.variance)
+                + np.bincount(self.rows, weights=abs_cov, minlength=self.n)
+                + np.bincount(self.cols, weights=abs_cov, minlength=self.n)
+            )
+            return float(sums.max())
+        sums = [abs(v) for v in self.variance]
+        for i, j, c in zip(self.rows, self.cols, self.cov):
+            sums[i] += abs(c)
+            sums[j] += abs(c)
+        return max(sums)
+
+    def negative_correlation_sums(self) -> Any:
+        """Per channel, the sum of |correlation| over negatively correlated partners."""
+        if np is not None:
+            negative = np.clip(-np.asarray(self.corr, dtype=float), 0.0, None)
+            return (
+                np.bincount(self.rows, weights=negative, minlength=self.n)
+                + np.bincount(self.cols, weights=negative, minlength=self.n)
+            )
+        sums = [0.0] * self.n
+        for i, j, r in zip(self.rows, self.cols, self.corr):
+            if r < 0:
+                sums[i] -= r
+                sums[j] -= r
+        return sums
+
+    def reindexed(self, positions: List[Optional[int]], variance: List[float]) -> "_SparsePairs":
+        """
+        Same pairs in a new channel order.
+
+        positions[k] is the current ordinal of new channel k (None for
+        channels without pair statistics); `variance` is the new diagonal.
+        """
+        n = len(positions)
+        if positions == list(range(self.n)):
+            diagonal = np.asarray(variance, dtype=float) if np is not None else array("d", variance)
+            return _SparsePairs(n, self.rows, self.cols, self.cov, self.corr, diagonal)
+
+        if np is not None:
+            new_of = np.full(self.n, -1, dtype=int)
+            for k, p in enumerate(positions):
+                if p is not None:
+                    new_of[p] = k
+            r, c = new_of[self.rows], new_of[self.cols]
+            keep = (r >= 0) & (c >= 0)
+            lo = np.minimum(r, c)[keep]
+            hi = np.maximum(r, c)[keep]
+            order = np.argsort(lo * n + hi, kind="stable")
+            return _SparsePairs(
+                n, lo[order], hi[order],
+                np.asarray(self.cov)[keep][order], np.asarray(self.corr)[keep][order],
+                np.asarray(variance, dtype=float)
+            )
+
+        new_of = {p: k for k, p in enumerate(positions) if p is not None}
+        entries = sorted(
+            (min(new_of[i], new_of[j]), max(new_of[i], new_of[j]), c, r)
+            for i, j, c, r in zip(self.rows, self.cols, self.cov, self.corr)
+            if i in new_of and j in new_of
+        )
+        return _SparsePairs(
+            n,
+            array("l", (e[0] for e in entries)), array("l", (e[1] for e in entries)),
+            array("d", (e[2] for e in entries)), array("d", (e[3] for e in entries)),
+            array("d", variance)
+        )
+
+    def to_dense(self) -> List[List[float]]:
+        """Full covariance matrix as nested lists (debugging/tests only)."""
+        matrix = [[0.0] * self.n for _ in range(self.n)]
+        for i in range(self.n):
+            matrix[i][i] = float(self.variance[i])
+        for i, j, c in zip(self.rows, self.cols, self.cov):
+            matrix[i][j] = matrix[j][i] = float(c)
+        return matrix
+
+
+def _project_capped_simplex(
+    v: Any,
+    lower: float = MIN_SINGLE_ALLOCATION,
+    upper: float = MAX_SINGLE_ALLOCATION
+) -> Any:
+    """
+    Exact Euclidean projection onto {w : sum(w) = 1, lower <= w_i <= upper}.
+
+    The projection is clip(v - tau, lower, upper) for the unique tau where the
+    clipped vector sums to 1. The clipped sum is piecewise linear in tau with
+    breakpoints at v_i - lower and v_i - upper, so tau is found by binary
+    search over the sorted breakpoints and a final linear interpolation.
+
+    Bounds that make the set empty (e.g. 2 channels with a 40% cap) are
+    relaxed to 1/n so the result is always a valid allocation.
+    """
+    n = len(v)
+    if n == 0:
+        return v
+    lower = min(lower, 1.0 / n)
+    upper = max(upper, 1.0 / n)
+
+    if np is not None:
+        v = np.asarray(v, dtype=float)
+        breakpoints = np.sort(np.concatenate((v - lower, v - upper)))
+
+        def total(tau):
+            return float(np.clip(v - tau, lower, upper).sum())
+    else:
+        v = [float(x) for x in v]
+        breakpoints = sorted([x - lower for x in v] + [x - upper for x in v])
+
+        def total(tau):
+            return sum(min(upper, max(lower, x - tau)) for x in v)
+
+    # total() is non-increasing: n*upper at the first breakpoint, n*lower
+    # at the last, so the target sum of 1 is always bracketed.
+    lo_idx, hi_idx = 0, len(breakpoints) - 1
+    while hi_idx - lo_idx > 1:
+        mid = (lo_idx + hi_idx) // 2
+        if total(breakpoints[mid]) >= 1.0:
+            lo_idx = mid
+        else:
+            hi_idx = mid
+    tau_lo, tau_hi = float(breakpoints[lo_idx]), float(breakpoints[hi_idx])
+    f_lo, f_hi = total(tau_lo), total(tau_hi)
+    if f_lo - f_hi > 0:
+        tau = tau_lo + (f_lo - 1.0) * (tau_hi - tau_lo) / (f_lo - f_hi)
+    else:
+        tau = tau_lo
+
+    if np is not None:
+        return np.clip(v - tau, lower, upper)
+    return [min(upper, max(lower, x - tau)) for x in v]
+
+
+class _MatrixView(Mapping):
+    """
+    Read-only (scid_a, scid_b) -> value mapping over pair statistics.
+
+    Keeps the historical Dict[Tuple[str, str], float] interface of the
+    covariance/correlation caches without materializing n^2 tuple keys;
+    pairs that are not stored read as 0.0.
+    """
+
+    def __init__(self, index: Dict[str, int], lookup):
+        self._index = index
+        self._lookup = lookup
+
+    def __getitem__(self, key: Tuple[str, str]) -> float:
+        scid_a, scid_b = key
+        return self._lookup(self._index[scid_a], self._index[scid_b])
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, tuple) or len(key) != 2:
+            return False
+        return key[0] in self._index and key[1] in self._index
+
+    def __iter__(self):
+        for scid_a in self._index:
+            for scid_b in self._index:
+                yield (scid_a, scid_b)
+
+    def __len__(self) -> int:
+        return len(self._index) ** 2
+
+
 class ChannelRole(Enum):
     """Channel classification for portfolio analysis."""
     EXCHANGE = "exchange"       # High volume, high variance
@@ -90,6 +698,22 @@ class ChannelRole(Enum):
     UNKNOWN = "unknown"
 
 
+def _classify_by_forward_sizes(avg_size: float, size_count: int) -> ChannelRole:
+    """Role heuristic from the average size and number of valid forwards."""
+    if size_count <= 0:
+        return ChannelRole.UNKNOWN
+
+    # Large average forwards suggest exchange
+    if avg_size > 500000:  # > 500k sats average
+        return ChannelRole.EXCHANGE
+
+    # Many small forwards suggest merchant
+    if avg_size < 50000 and size_count > 20:  # < 50k sats, many forwards
+        return ChannelRole.MERCHANT
+
+    # Otherwise routing node
+    return ChannelRole.ROUTING
+
 @dataclass
 class ChannelStatistics:
     """
@@ -271,7 +895,7 @@ class PortfolioOptimizer:
     across channels that maximizes risk-adjusted returns.
     """
 
-    def __init__(self, database, plugin, hive_bridge=None):
+    def __init__(self, database, plugin, hive_bridge=None, online_stats=None):
         """
         Initialize the portfolio optimizer.
 
@@ -279,15 +903,21 @@ class PortfolioOptimizer:
             database: Database instance for accessing flow history
             plugin: Plugin instance for RPC and logging
             hive_bridge: Optional HiveBridge for fleet data
+            online_stats: Optional OnlinePortfolioStats used when no
+                          forwards are passed to analyze_portfolio()
         """
         self.database = database
         self.plugin = plugin
         self.hive_bridge = hive_bridge
+        self.online_stats = online_stats
 
         # Cached statistics
         self._channel_stats: Dict[str, ChannelStatistics] = {}
-        self._covariance_matrix: Dict[Tuple[str, str], float] = {}
-        self._correlation_matrix: Dict[Tuple[str, str], float] = {}
+        self._covariance_matrix: Mapping[Tuple[str, str], float] = {}
+        self._correlation_matrix: Mapping[Tuple[str, str], float] = {}
+        self._scid_index: Dict[str, int] = {}
+        self._pairs: Optional[_SparsePairs] = None
+        self._diversification_cache: Optional[Dict[str, float]] = None
         self._last_calculation: int = 0
         self._cache_ttl_seconds: int = 3600  # 1 hour cache
 
@@ -322,7 +952,7 @@ class PortfolioOptimizer:
         """
         stats: Dict[str, ChannelStatistics] = {}
         now = int(time.time())
-        window_start = now - (PORTFOLIO_WINDOW_DAYS * 86400)
+        window_start, window_end = _observation_window(now)
 
         # Build channel info map
         channel_info: Dict[str, Dict[str, Any]] = {}
@@ -339,11 +969,11 @@ class PortfolioOptimizer:
             local_sats = local // 1000
             total_local_sats += local_sats
 
-        # Filter forwards to window and group by channel
+        # Filter forwards to the closed buckets of the window and group by channel
         channel_forwards: Dict[str, List[Dict[str, Any]]] = {}
         for fwd in forwards:
             ts = fwd.get("received_time") or fwd.get("timestamp", 0)
-            if ts < window_start:
+            if ts < window_start or ts >= window_end:
                 continue
 
             out_scid = fwd.get("out_channel")
@@ -370,7 +1000,7 @@ class PortfolioOptimizer:
 
             # Calculate revenue statistics
             expected_return, variance, obs_count = self._calculate_revenue_stats(
-                fwds, window_start, now
+                fwds, window_start, window_end
             )
 
             # Calculate data quality
@@ -394,7 +1024,7 @@ class PortfolioOptimizer:
                 sizes = [_safe_msat_to_sats(f.get("out_msat", 0)) for f in fwds]
                 sizes = [s for s in sizes if s > 0]  # Filter out invalid entries
                 avg_size = sum(sizes) // len(sizes) if sizes else 0
-                hours = (now - window_start) / 3600
+                hours = (window_end - window_start) / 3600
                 freq = len(fwds) / hours if hours > 0 else 0
 
             stats[scid] = ChannelStatistics(
@@ -419,6 +1049,79 @@ class PortfolioOptimizer:
         self._channel_stats = stats
         return stats
 
+    def collect_online_statistics(
+        self,
+        channels: List[Dict[str, Any]],
+        flow_states: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, ChannelStatistics]:
+        """
+        Load channel statistics and covariances from the online accumulator.
+
+        Equivalent to collect_channel_statistics() + calculate_covariance_matrix()
+        (both use the closed, epoch-aligned buckets of _observation_window())
+        but reads the precomputed running moments instead of scanning forwards.
+
+        Args:
+            channels: List of channel info dicts from listpeerchannels
+            flow_states: Optional Kalman flow states per channel
+
+        Returns:
+            Dict mapping channel_id to ChannelStatistics
+        """
+        now = int(time.time())
+        channel_info: Dict[str, Dict[str, Any]] = {}
+        for ch in channels:
+            scid = ch.get("short_channel_id") or ch.get("channel_id")
+            if scid:
+                channel_info[scid] = ch
+        scids = list(channel_info)
+
+        snapshot = self.online_stats.snapshot(scids, now=now)
+        pairs = snapshot["pairs"]
+        total_local_sats = sum(
+            _safe_msat_to_sats(ch.get("to_us_msat", 0)) for ch in channel_info.values()
+        )
+        hours = snapshot["covered_hours"]
+
+        stats: Dict[str, ChannelStatistics] = {}
+        for scid, ch in channel_info.items():
+            online = snapshot["channels"][scid]
+            local_sats = _safe_msat_to_sats(ch.get("to_us_msat", 0))
+            obs_count = online["observation_count"]
+            variance = online["variance"]
+
+            kalman_velocity = None
+            kalman_uncertainty = None
+            if flow_states and scid in flow_states:
+                ks = flow_states[scid]
+                kalman_velocity = ks.get("flow_velocity")
+                kalman_uncertainty = ks.get("variance_velocity")
+
+            stats[scid] = ChannelStatistics(
+                channel_id=scid,
+                peer_id=ch.get("peer_id", ""),
+                expected_return=online["expected_return"],
+                variance=variance,
+                std_dev=math.sqrt(max(variance, MIN_VARIANCE)),
+                capacity_sats=_safe_msat_to_sats(ch.get("total_msat", 0)),
+                current_local_sats=local_sats,
+                current_allocation_pct=local_sats / total_local_sats if total_local_sats > 0 else 0,
+                observation_count=obs_count,
+                last_observation=now if online["forward_count"] else 0,
+                data_quality=min(1.0, obs_count / MIN_OBSERVATIONS) if obs_count > 0 else 0.0,
+                role=_classify_by_forward_sizes(
+                    online["avg_forward_size"], online["size_count"]
+                ),
+                avg_forward_size=online["avg_forward_size"],
+                forward_frequency=online["forward_count"] / hours if hours > 0 else 0.0,
+                kalman_velocity=kalman_velocity,
+                kalman_uncertainty=kalman_uncertainty
+            )
+
+        self._channel_stats = stats
+        self._set_pairwise_statistics(scids, pairs)
+        return stats
+
     def _calculate_revenue_stats(
         self,
         forwards: List[Dict[str, Any]],
@@ -428,8 +1131,9 @@ class PortfolioOptimizer:
         """
         Calculate expected return and variance from forwards.
 
-        Buckets forwards into OBSERVATION_INTERVAL_HOURS periods,
-        calculates revenue rate per bucket, then computes mean and variance.
+        Buckets forwards into OBSERVATION_INTERVAL_HOURS periods starting
+        at window_start (window_end exclusive), calculates revenue rate per
+        bucket, then computes mean and variance.
 
         Returns:
             Tuple of (expected_return_sats_per_hour, variance, observation_count)
@@ -443,10 +1147,10 @@ class PortfolioOptimizer:
         buckets: Dict[int, float] = {}
         for fwd in forwards:
             ts = fwd.get("received_time") or fwd.get("timestamp", 0)
-            if ts < window_start or ts > window_end:
+            if ts < window_start or ts >= window_end:
                 continue
 
-            bucket_idx = (ts - window_start) // interval_secs
+            bucket_idx = int(ts - window_start) // interval_secs
 
             # Get fee earned (safely handle string or int msat values)
             fee_msat = fwd.get("fee_msat") or fwd.get("fee", 0)
@@ -500,18 +1204,7 @@ class PortfolioOptimizer:
         if not sizes:
             return ChannelRole.UNKNOWN
 
-        avg_size = sum(sizes) / len(sizes)
-
-        # Large average forwards suggest exchange
-        if avg_size > 500000:  # > 500k sats average
-            return ChannelRole.EXCHANGE
-
-        # Many small forwards suggest merchant
-        if avg_size < 50000 and len(sizes) > 20:  # < 50k sats, many forwards
-            return ChannelRole.MERCHANT
-
-        # Otherwise routing node
-        return ChannelRole.ROUTING
+        return _classify_by_forward_sizes(sum(sizes) / len(sizes), len(sizes))
 
     # =========================================================================
     # COVARIANCE CALCULATION
@@ -521,18 +1214,19 @@ class PortfolioOptimizer:
         self,
         channels: List[Dict[str, Any]],
         forwards: List[Dict[str, Any]]
-    ) -> Dict[Tuple[str, str], float]:
+    ) -> Mapping[Tuple[str, str], float]:
         """
         Calculate covariance matrix between all channel pairs.
 
-        Uses time-bucketed revenue rates to compute covariances.
+        Builds the channels x buckets revenue matrix once and computes all
+        pairwise covariances/correlations from it (pairwise-complete: a pair
+        only uses buckets where both channels forwarded). Only pairs with
+        |correlation| >= CORRELATION_FLOOR are kept; all others read as 0.
 
         Returns:
-            Dict mapping (channel_a, channel_b) to covariance value
+            Mapping of (channel_a, channel_b) to covariance value
         """
-        now = int(time.time())
-        window_start = now - (PORTFOLIO_WINDOW_DAYS * 86400)
-        interval_secs = OBSERVATION_INTERVAL_HOURS * 3600
+        window_start, window_end = _observation_window(int(time.time()))
 
         # Get channel SCIDs
         scids = []
@@ -540,96 +1234,20 @@ class PortfolioOptimizer:
             scid = ch.get("short_channel_id") or ch.get("channel_id")
             if scid:
                 scids.append(scid)
+        scids = list(dict.fromkeys(scids))
 
-        # Build revenue rate time series per channel
-        channel_series: Dict[str, Dict[int, float]] = {scid: {} for scid in scids}
+        values, observed = _build_revenue_matrix(scids, forwards, window_start, window_end)
+        self._set_pairwise_statistics(scids, _sparse_pairwise_statistics(values, observed))
 
-        for fwd in forwards:
-            ts = fwd.get("received_time") or fwd.get("timestamp", 0)
-            if ts < window_start:
-                continue
+        return self._covariance_matrix
 
-            out_scid = fwd.get("out_channel")
-            if not out_scid or out_scid not in channel_series:
-                continue
-
-            bucket_idx = (ts - window_start) // interval_secs
-
-            fee = fwd.get("fee_msat") or fwd.get("fee", 0)
-            if isinstance(fee, str):
-                fee = int(fee.replace("msat", ""))
-            fee_sats = fee / 1000
-
-            if bucket_idx not in channel_series[out_scid]:
-                channel_series[out_scid][bucket_idx] = 0.0
-            channel_series[out_scid][bucket_idx] += fee_sats / OBSERVATION_INTERVAL_HOURS
-
-        # Calculate covariance for each pair
-        covariance_matrix: Dict[Tuple[str, str], float] = {}
-        correlation_matrix: Dict[Tuple[str, str], float] = {}
-
-        for i, scid_a in enumerate(scids):
-            for j, scid_b in enumerate(scids):
-                if j < i:
-                    # Use symmetry
-                    covariance_matrix[(scid_a, scid_b)] = covariance_matrix.get(
-                        (scid_b, scid_a), 0.0
-                    )
-                    correlation_matrix[(scid_a, scid_b)] = correlation_matrix.get(
-                        (scid_b, scid_a), 0.0
-                    )
-                    continue
-
-                series_a = channel_series[scid_a]
-                series_b = channel_series[scid_b]
-
-                # Find common buckets
-                common_buckets = set(series_a.keys()) & set(series_b.keys())
-
-                if len(common_buckets) < 3:
-                    # Not enough common data
-                    covariance_matrix[(scid_a, scid_b)] = 0.0
-                    correlation_matrix[(scid_a, scid_b)] = 0.0
-                    continue
-
-                # Get aligned values
-                vals_a = [series_a[b] for b in sorted(common_buckets)]
-                vals_b = [series_b[b] for b in sorted(common_buckets)]
-
-                # Safety check: need at least 2 values for variance calculation
-                n_samples = len(vals_a)
-                if n_samples < 2:
-                    covariance_matrix[(scid_a, scid_b)] = 0.0
-                    correlation_matrix[(scid_a, scid_b)] = 0.0
-                    continue
-
-                # Calculate covariance
-                mean_a = sum(vals_a) / n_samples
-                mean_b = sum(vals_b) / n_samples
-
-                # Use max(1, n-1) to prevent division by zero
-                denominator = max(1, n_samples - 1)
-                cov = sum(
-                    (a - mean_a) * (b - mean_b)
-                    for a, b in zip(vals_a, vals_b)
-                ) / denominator
-
-                covariance_matrix[(scid_a, scid_b)] = cov
-
-                # Calculate correlation
-                var_a = sum((a - mean_a) ** 2 for a in vals_a) / denominator
-                var_b = sum((b - mean_b) ** 2 for b in vals_b) / denominator
-
-                if var_a > MIN_VARIANCE and var_b > MIN_VARIANCE:
-                    corr = cov / (math.sqrt(var_a) * math.sqrt(var_b))
-                    correlation_matrix[(scid_a, scid_b)] = max(-1.0, min(1.0, corr))
-                else:
-                    correlation_matrix[(scid_a, scid_b)] = 0.0
-
-        self._covariance_matrix = covariance_matrix
-        self._correlation_matrix = correlation_matrix
-
-        return covariance_matrix
+    def _set_pairwise_statistics(self, scids: List[str], pairs: _SparsePairs) -> None:
+        """Install pair statistics whose ordinals follow `scids`."""
+        self._scid_index = {scid: i for i, scid in enumerate(scids)}
+        self._pairs = pairs
+        self._diversification_cache = None
+        self._covariance_matrix = _MatrixView(self._scid_index, pairs.covariance)
+        self._correlation_matrix = _MatrixView(self._scid_index, pairs.correlation)
 
     def get_correlation_pairs(
         self,
@@ -639,47 +1257,52 @@ class PortfolioOptimizer:
         Get notable correlation pairs.
 
         Args:
-            min_abs_correlation: Minimum |correlation| to include
+            min_abs_correlation: Minimum |correlation| to include (pairs
+                                 below CORRELATION_FLOOR are never stored)
 
         Returns:
             List of CorrelationPair objects sorted by |correlation|
         """
-        pairs = []
-        seen = set()
-
-        for (scid_a, scid_b), corr in self._correlation_matrix.items():
-            # Skip self-correlations and duplicates
-            if scid_a == scid_b:
-                continue
-            key = tuple(sorted([scid_a, scid_b]))
-            if key in seen:
-                continue
-            seen.add(key)
+        scids = list(self._scid_index)
+        stored = self._pairs
+        if len(scids) < 2 or stored is None:
+            return []
 
-            if abs(corr) < min_abs_correlation:
-                continue
+        if np is not None:
+            values = np.asarray(stored.corr, dtype=float)
+            keep = np.flatnonzero(np.abs(values) >= min_abs_correlation)
+            order = keep[np.argsort(-np.abs(values[keep]), kind="stable")]
+            candidates = [
+                (int(stored.rows[k]), int(stored.cols[k]), float(values[k]), float(stored.cov[k]))
+                for k in order
+            ]
+        else:
+            candidates = [
+                (i, j, r, c)
+                for i, j, r, c in zip(stored.rows, stored.cols, stored.corr, stored.cov)
+                if abs(r) >= min_abs_correlation
+            ]
+            # Sort by absolute correlation (highest first)
+            candidates.sort(key=lambda c: abs(c[2]), reverse=True)
 
+        pairs = []
+        for i, j, corr_ij, cov_ij in candidates:
             # Classify relationship
-            if corr >= HIGH_CORRELATION_THRESHOLD:
+            if corr_ij >= HIGH_CORRELATION_THRESHOLD:
                 relationship = "correlated"
-            elif corr <= NEGATIVE_CORRELATION_THRESHOLD:
+            elif corr_ij <= NEGATIVE_CORRELATION_THRESHOLD:
                 relationship = "hedging"
             else:
                 relationship = "independent"
 
-            cov = self._covariance_matrix.get((scid_a, scid_b), 0.0)
-
             pairs.append(CorrelationPair(
-                channel_a=scid_a,
-                channel_b=scid_b,
-                correlation=corr,
-                covariance=cov,
+                channel_a=scids[i],
+                channel_b=scids[j],
+                correlation=corr_ij,
+                covariance=cov_ij,
                 relationship=relationship
             ))
 
-        # Sort by absolute correlation (highest first)
-        pairs.sort(key=lambda p: abs(p.correlation), reverse=True)
-
         return pairs
 
     # =========================================================================
@@ -696,7 +1319,8 @@ class PortfolioOptimizer:
         Solves: max E[R] - lambda * Var[R]
         Subject to: sum(weights) = 1, weights >= MIN_ALLOCATION, weights <= MAX_ALLOCATION
 
-        Uses quadratic programming approximation with gradient descent.
+        Uses accelerated projected gradient (FISTA) with an exact projection
+        onto the bounded simplex.
 
         Args:
             risk_aversion: Override default risk aversion parameter
@@ -719,20 +1343,7 @@ class PortfolioOptimizer:
 
         # Extract returns and build covariance matrix
         returns = [self._channel_stats[scid].expected_return for scid in scids]
-
-        # Build full covariance matrix as nested list
-        cov_matrix = []
-        for i, scid_i in enumerate(scids):
-            row = []
-            for j, scid_j in enumerate(scids):
-                if i == j:
-                    # Diagonal: variance
-                    row.append(self._channel_stats[scid_i].variance + REGULARIZATION_LAMBDA)
-                else:
-                    # Off-diagonal: covariance
-                    cov = self._covariance_matrix.get((scid_i, scid_j), 0.0)
-                    row.append(cov)
-            cov_matrix.append(row)
+        cov_matrix = self._build_optimizer_covariance(scids)
 
         # Current weights (for comparison)
         total_local = sum(s.current_local_sats for s in self._channel_stats.values())
@@ -745,9 +1356,13 @@ class PortfolioOptimizer:
             else:
                 current_weights.append(1.0 / n)
 
-        # Optimize using projected gradient descent
-        optimal_weights = self._gradient_descent_optimize(
-            returns, cov_matrix, risk_aversion, n
+        if np is not None:
+            returns = np.asarray(returns, dtype=float)
+            current_weights = np.asarray(current_weights, dtype=float)
+
+        # Optimize using accelerated projected gradient
+        optimal_weights = self._accelerated_projected_gradient(
+            returns, cov_matrix, risk_aversion
         )
 
         # Calculate portfolio metrics
@@ -758,60 +1373,102 @@ class PortfolioOptimizer:
         summary.data_window_hours = PORTFOLIO_WINDOW_DAYS * 24
 
         # Build weights dict
-        weights_dict = {scids[i]: optimal_weights[i] for i in range(n)}
+        weights_dict = {scids[i]: float(optimal_weights[i]) for i in range(n)}
 
         self._last_calculation = now
 
         return weights_dict, summary
 
-    def _gradient_descent_optimize(
+    def _build_optimizer_covariance(self, scids: List[str]) -> _SparsePairs:
+        """
+        Regularized sparse covariance aligned to the given channel order.
+
+        Diagonal: per-channel variance + REGULARIZATION_LAMBDA.
+        Off-diagonal: the stored significant pairs (0 for everything else,
+        including channels not in the covariance calculation).
+        """
+        diagonal = [
+            self._channel_stats[scid].variance + REGULARIZATION_LAMBDA
+            for scid in scids
+        ]
+        if self._pairs is None:
+            empty = np.zeros(0, dtype=int) if np is not None else array("l")
+            empty_vals = np.zeros(0) if np is not None else array("d")
+            variance = np.asarray(diagonal, dtype=float) if np is not None else array("d", diagonal)
+            return _SparsePairs(len(scids), empty, empty, empty_vals, empty_vals, variance)
+        positions = [self._scid_index.get(scid) for scid in scids]
+        return self._pairs.reindexed(positions, diagonal)
+
+    def _accelerated_projected_gradient(
         self,
-        returns: List[float],
-        cov_matrix: List[List[float]],
+        returns: Any,
+        cov_matrix: _SparsePairs,
         risk_aversion: float,
-        n: int,
         max_iterations: int = 1000,
-        learning_rate: float = 0.01,
-        tolerance: float = 1e-6
-    ) -> List[float]:
+        tolerance: float = 1e-9
+    ) -> Any:
         """
-        Optimize using projected gradient descent.
+        Optimize using FISTA (accelerated projected gradient) with restarts.
 
         Objective: max sum(w_i * r_i) - lambda * sum(w_i * w_j * cov_ij)
-        """
-        # Initialize with equal weights
-        weights = [1.0 / n] * n
-
-        for iteration in range(max_iterations):
-            # Calculate gradient
-            gradient = []
-            for i in range(n):
-                # dE[R]/dw_i = r_i
-                grad_return = returns[i]
-
-                # dVar/dw_i = 2 * sum(w_j * cov_ij)
-                grad_var = 2 * sum(weights[j] * cov_matrix[i][j] for j in range(n))
 
-                # Combined gradient (we're maximizing, so positive gradient = increase)
-                grad = grad_return - risk_aversion * grad_var
-                gradient.append(grad)
-
-            # Update weights
-            new_weights = [
-                weights[i] + learning_rate * gradient[i]
+        The step size is 1/L with L = 2 * lambda * (Gershgorin bound on the
+        covariance spectrum), which guarantees monotone convergence of the
+        underlying projected-gradient step; momentum is reset whenever it
+        points against the last step (gradient restart).
+        """
+        n = len(returns)
+        lipschitz = 2 * risk_aversion * cov_matrix.spectral_bound()
+        step = 1.0 / lipschitz if lipschitz > 0 else 1.0
+
+        def ascent(point):
+            # dE[R]/dw - lambda * dVar/dw = r - 2 * lambda * cov @ w
+            grad_var = cov_matrix.matvec(point)
+            if np is not None:
+                return point + step * (returns - 2 * risk_aversion * grad_var)
+            return [
+                point[i] + step * (returns[i] - 2 * risk_aversion * grad_var[i])
                 for i in range(n)
             ]
 
-            # Project to feasible region (simplex with bounds)
-            new_weights = self._project_to_simplex(new_weights)
+        # Initialize with equal weights
+        weights = _project_capped_simplex([1.0 / n] * n)
+        momentum_point = weights
+        t = 1.0
 
-            # Check convergence
-            max_change = max(abs(new_weights[i] - weights[i]) for i in range(n))
-            weights = new_weights
+        for _ in range(max_iterations):
+            new_weights = _project_capped_simplex(ascent(momentum_point))
+
+            if np is not None:
+                delta = new_weights - weights
+                max_change = float(np.abs(delta).max())
+                restart = float((momentum_point - new_weights) @ delta) > 0
+            else:
+                delta = [new_weights[i] - weights[i] for i in range(n)]
+                max_change = max(abs(d) for d in delta)
+                restart = sum(
+                    (momentum_point[i] - new_weights[i]) * delta[i] for i in range(n)
+                ) > 0
 
             if max_change < tolerance:
+                weights = new_weights
                 break
 
+            if restart:
+                t = 1.0
+                momentum_point = new_weights
+            else:
+                t_next = (1 + math.sqrt(1 + 4 * t * t)) / 2
+                beta = (t - 1) / t_next
+                if np is not None:
+                    momentum_point = new_weights + beta * delta
+                else:
+                    momentum_point = [
+                        new_weights[i] + beta * delta[i] for i in range(n)
+                    ]
+                t = t_next
+            weights = new_weights
+
         return weights
 
     def _project_to_simplex(self, weights: List[float]) -> List[float]:
@@ -820,50 +1477,15 @@ class PortfolioOptimizer:
 
         Ensures: sum(w) = 1, MIN_ALLOCATION <= w <= MAX_ALLOCATION
         """
-        n = len(weights)
-
-        # Clip to bounds
-        weights = [
-            max(MIN_SINGLE_ALLOCATION, min(MAX_SINGLE_ALLOCATION, w))
-            for w in weights
-        ]
-
-        # Normalize to sum to 1
-        total = sum(weights)
-        if total > 0:
-            weights = [w / total for w in weights]
-        else:
-            weights = [1.0 / n] * n
-
-        # Re-apply bounds after normalization (iterative projection)
-        for _ in range(10):  # Max iterations for bound enforcement
-            needs_adjustment = False
-
-            for i in range(n):
-                if weights[i] < MIN_SINGLE_ALLOCATION:
-                    weights[i] = MIN_SINGLE_ALLOCATION
-                    needs_adjustment = True
-                elif weights[i] > MAX_SINGLE_ALLOCATION:
-                    weights[i] = MAX_SINGLE_ALLOCATION
-                    needs_adjustment = True
-
-            if not needs_adjustment:
-                break
-
-            # Renormalize
-            total = sum(weights)
-            if total > 0:
-                weights = [w / total for w in weights]
-
-        return weights
+        return [float(w) for w in _project_capped_simplex(weights)]
 
     def _calculate_portfolio_summary(
         self,
         scids: List[str],
-        returns: List[float],
-        cov_matrix: List[List[float]],
-        current_weights: List[float],
-        optimal_weights: List[float],
+        returns: Any,
+        cov_matrix: _SparsePairs,
+        current_weights: Any,
+        optimal_weights: Any,
         total_local_sats: int
     ) -> PortfolioSummary:
         """Calculate portfolio-level metrics."""
@@ -871,27 +1493,20 @@ class PortfolioOptimizer:
 
         # Current portfolio metrics
         current_return = sum(current_weights[i] * returns[i] for i in range(n))
-        current_variance = sum(
-            current_weights[i] * current_weights[j] * cov_matrix[i][j]
-            for i in range(n) for j in range(n)
-        )
+        current_variance = cov_matrix.quadratic_form(current_weights)
         current_std = math.sqrt(max(current_variance, MIN_VARIANCE))
         current_sharpe = current_return / current_std if current_std > 0 else 0.0
 
         # Optimal portfolio metrics
         optimal_return = sum(optimal_weights[i] * returns[i] for i in range(n))
-        optimal_variance = sum(
-            optimal_weights[i] * optimal_weights[j] * cov_matrix[i][j]
-            for i in range(n) for j in range(n)
-        )
+        optimal_variance = cov_matrix.quadratic_form(optimal_weights)
         optimal_std = math.sqrt(max(optimal_variance, MIN_VARIANCE))
         optimal_sharpe = optimal_return / optimal_std if optimal_std > 0 else 0.0
 
+        stds = [math.sqrt(max(float(v), MIN_VARIANCE)) for v in cov_matrix.variance]
+
         # Diversification ratio = weighted avg std / portfolio std
-        weighted_avg_std = sum(
-            optimal_weights[i] * math.sqrt(max(cov_matrix[i][i], MIN_VARIANCE))
-            for i in range(n)
-        )
+        weighted_avg_std = sum(optimal_weights[i] * stds[i] for i in range(n))
         diversification_ratio = weighted_avg_std / optimal_std if optimal_std > 0 else 1.0
 
         # Concentration index (Herfindahl)
@@ -899,19 +1514,20 @@ class PortfolioOptimizer:
 
         # Risk decomposition (simplified)
         # Systematic = average correlation * total variance
+        # (pairs that are not stored contribute zero)
         avg_correlation = 0.0
-        pair_count = 0
-        for i in range(n):
-            for j in range(i + 1, n):
-                std_i = math.sqrt(max(cov_matrix[i][i], MIN_VARIANCE))
-                std_j = math.sqrt(max(cov_matrix[j][j], MIN_VARIANCE))
-                if std_i > 0 and std_j > 0:
-                    corr = cov_matrix[i][j] / (std_i * std_j)
-                    avg_correlation += corr
-                    pair_count += 1
-
+        pair_count = n * (n - 1) // 2
         if pair_count > 0:
-            avg_correlation /= pair_count
+            if np is not None:
+                std_vec = np.asarray(stds)
+                avg_correlation = float(
+                    (cov_matrix.cov / (std_vec[cov_matrix.rows] * std_vec[cov_matrix.cols])).sum()
+                    / pair_count
+                )
+            else:
+                for i, j, c in zip(cov_matrix.rows, cov_matrix.cols, cov_matrix.cov):
+                    avg_correlation += c / (stds[i] * stds[j])
+                avg_correlation /= pair_count
 
         systematic_risk = max(0.0, avg_correlation)
         idiosyncratic_risk = 1.0 - systematic_risk
@@ -922,15 +1538,15 @@ class PortfolioOptimizer:
         return PortfolioSummary(
             total_liquidity_sats=total_local_sats,
             channel_count=n,
-            expected_portfolio_return=optimal_return,
+            expected_portfolio_return=float(optimal_return),
             portfolio_variance=optimal_variance,
             portfolio_std_dev=optimal_std,
-            portfolio_sharpe_ratio=optimal_sharpe,
-            diversification_ratio=diversification_ratio,
-            concentration_index=concentration,
-            current_sharpe=current_sharpe,
-            optimal_sharpe=optimal_sharpe,
-            improvement_potential=improvement,
+            portfolio_sharpe_ratio=float(optimal_sharpe),
+            diversification_ratio=float(diversification_ratio),
+            concentration_index=float(concentration),
+            current_sharpe=float(current_sharpe),
+            optimal_sharpe=float(optimal_sharpe),
+            improvement_potential=float(improvement),
             systematic_risk_pct=systematic_risk,
             idiosyncratic_risk_pct=idiosyncratic_risk
         )
@@ -1018,24 +1634,22 @@ class PortfolioOptimizer:
         Calculate diversification benefit of this channel.
 
         Higher benefit = more negative correlations with other channels.
+        Computed for all channels at once from the correlation matrix and
+        cached until the next covariance calculation.
         """
-        if not self._correlation_matrix:
-            return 0.0
-
-        negative_corr_sum = 0.0
-        count = 0
+        if self._diversification_cache is None:
+            self._diversification_cache = self._compute_diversification_benefits()
+        return self._diversification_cache.get(channel_id, 0.0)
 
-        for (scid_a, scid_b), corr in self._correlation_matrix.items():
-            if scid_a == channel_id or scid_b == channel_id:
-                if scid_a != scid_b:
-                    if corr < 0:
-                        negative_corr_sum += abs(corr)
-                    count += 1
-
-        if count == 0:
-            return 0.0
+    def _compute_diversification_benefits(self) -> Dict[str, float]:
+        """Mean |negative correlation| of each channel against all others."""
+        scids = list(self._scid_index)
+        n = len(scids)
+        if n < 2 or self._pairs is None:
+            return {}
 
-        return negative_corr_sum / count
+        sums = self._pairs.negative_correlation_sums()
+        return {scid: float(sums[i]) / (n - 1) for i, scid in enumerate(scids)}
 
     def _determine_priority(
         self,
@@ -1066,7 +1680,7 @@ class PortfolioOptimizer:
     def analyze_portfolio(
         self,
         channels: List[Dict[str, Any]],
-        forwards: List[Dict[str, Any]],
+        forwards: Optional[List[Dict[str, Any]]] = None,
         flow_states: Optional[Dict[str, Any]] = None,
         risk_aversion: Optional[float] = None
     ) -> Dict[str, Any]:
@@ -1075,18 +1689,22 @@ class PortfolioOptimizer:
 
         Args:
             channels: Channel list from listpeerchannels
-            forwards: Forward list from listforwards/bookkeeper
+            forwards: Forward list from listforwards/bookkeeper. When None,
+                      statistics come from the online accumulator.
             flow_states: Optional Kalman flow states
             risk_aversion: Risk aversion parameter (higher = more conservative)
 
         Returns:
             Complete analysis dict with statistics, allocations, correlations
         """
-        # Collect statistics
-        stats = self.collect_channel_statistics(channels, forwards, flow_states)
+        if forwards is None and self.online_stats is not None:
+            stats = self.collect_online_statistics(channels, flow_states)
+        else:
+            # Collect statistics
+            stats = self.collect_channel_statistics(channels, forwards or [], flow_states)
 
-        # Calculate covariances
-        self.calculate_covariance_matrix(channels, forwards)
+            # Calculate covariances
+            self.calculate_covariance_matrix(channels, forwards or [])
 
         # Optimize allocation
         optimal_weights, summary = self.optimize_allocation(risk_aversion)
@@ -1096,6 +1714,7 @@ class PortfolioOptimizer:
 
         # Get notable correlations
         correlations = self.get_correlation_pairs(min_abs_correlation=0.3)
+        correlation_dicts = [c.to_dict() for c in correlations]
 
         return {
             "summary": summary.to_dict(),
@@ -1106,19 +1725,19 @@ class PortfolioOptimizer:
                 scid: round(w * 100, 2) for scid, w in optimal_weights.items()
             },
             "recommendations": [r.to_dict() for r in recommendations],
-            "correlations": [c.to_dict() for c in correlations],
+            "correlations": correlation_dicts,
             "hedging_opportunities": [
-                c.to_dict() for c in correlations if c.relationship == "hedging"
+                c for c in correlation_dicts if c["relationship"] == "hedging"
             ],
             "concentration_risks": [
-                c.to_dict() for c in correlations if c.relationship == "correlated"
+                c for c in correlation_dicts if c["relationship"] == "correlated"
             ]
         }
 
     def get_rebalance_priorities(
         self,
         channels: List[Dict[str, Any]],
-        forwards: List[Dict[str, Any]],
+        forwards: Optional[List[Dict[str, Any]]] = None,
         max_recommendations: int = 5
     ) -> List[Dict[str, Any]]:
         """
@@ -1148,3 +1767,591 @@ class PortfolioOptimizer:
                 })
 
         return result
+
+
+# =============================================================================
+# ONLINE STATISTICS
+# =============================================================================
+
+_RING_BUFFERS = ("_revenue", "_observed", "_fwd_count", "_size_sum", "_size_count")
+_MOMENT_MATRICES = ("_n", "_mean", "_m2", "_c")
+
+class OnlinePortfolioStats:
+    """
+    Incrementally maintained revenue statistics for the portfolio optimizer.
+
+    Fed by the forward-ingestion path (forward_event notifications and startup
+    hydration) instead of re-pulling bookkeeper/listforwards on every
+    portfolio RPC. Per-channel revenue is kept in a ring buffer of
+    OBSERVATION_INTERVAL_HOURS buckets covering PORTFOLIO_WINDOW_DAYS. When a
+    bucket closes, Welford-style pairwise running means and co-moments are
+    updated for the channels that forwarded in it, and the bucket that falls
+    out of the window is subtracted again. Reads filter the significant
+    pairs straight from the moment matrices, with no RPC or SQL.
+
+    Co-moments are pairwise-complete (a pair only accumulates buckets where
+    both channels forwarded), matching PortfolioOptimizer.calculate_covariance_matrix.
+
+    verify() recomputes everything from the ring buffer, reports the drift
+    of the running moments and resynchronizes them.
+    """
+
+    def __init__(
+        self,
+        window_days: int = PORTFOLIO_WINDOW_DAYS,
+        interval_hours: int = OBSERVATION_INTERVAL_HOURS
+    ):
+        self._lock = threading.Lock()
+        self._interval = interval_hours * 3600
+        self._interval_hours = interval_hours
+        self._window_buckets = max(1, (window_days * 24) // interval_hours)
+        self._slots = self._window_buckets + 1   # closed window + open bucket
+
+        self._index: Dict[str, int] = {}
+        self._scids: List[str] = []
+        self._capacity = 0
+        self._head: Optional[int] = None          # absolute index of open bucket
+        self._counted: List[bool] = [False] * self._slots
+
+        # Ring buffers: [channel][slot]
+        self._revenue: Any = None       # revenue rate (sats/hour)
+        self._observed: Any = None      # at least one forward in bucket
+        self._fwd_count: Any = None
+        self._size_sum: Any = None      # sum of positive forward sizes (sats)
+        self._size_count: Any = None
+
+        # Pairwise moments: [i][j] describes channel i over buckets shared with j
+        self._n: Any = None
+        self._mean: Any = None
+        self._m2: Any = None
+        self._c: Any = None             # co-moment (symmetric)
+
+        self._reset_storage(0)
+
+        self._since: Optional[int] = None   # start of the seeded data, if inside the window
+        self._pending: Optional[List[Tuple[Any, ...]]] = None  # buffered by begin_seed()
+
+        self.forwards_recorded = 0
+        self.buckets_closed = 0
+        self.last_verify: Dict[str, Any] = {}
+
+    # -------------------------------------------------------------------------
+    # Storage
+    # -------------------------------------------------------------------------
+
+    def _zeros(self, rows: int, cols: int, dtype: Any = float) -> Any:
+        if np is not None:
+            return np.zeros((rows, cols), dtype=dtype)
+        fill = False if dtype is bool else 0.0
+        return [[fill] * cols for _ in range(rows)]
+
+    def _reset_storage(self, capacity: int) -> None:
+        self._capacity = capacity
+        self._revenue = self._zeros(capacity, self._slots)
+        self._observed = self._zeros(capacity, self._slots, bool)
+        self._fwd_count = self._zeros(capacity, self._slots)
+        self._size_sum = self._zeros(capacity, self._slots)
+        self._size_count = self._zeros(capacity, self._slots)
+        self._reset_moments()
+
+    def _reset_moments(self) -> None:
+        capacity = self._capacity
+        self._n = self._zeros(capacity, capacity)
+        self._mean = self._zeros(capacity, capacity)
+        self._m2 = self._zeros(capacity, capacity)
+        self._c = self._zeros(capacity, capacity)
+
+    def _grow(self, capacity: int) -> None:
+        """Grow all per-channel storage (amortized doubling)."""
+        for name in _RING_BUFFERS:
+            fill = False if name == "_observed" else 0.0
+            setattr(self, name, self._grown(getattr(self, name), capacity, self._slots, fill))
+        for name in _MOMENT_MATRICES:
+            setattr(self, name, self._grown(getattr(self, name), capacity, capacity, 0.0))
+        self._capacity = capacity
+
+    def _grown(self, matrix: Any, rows: int, cols: int, fill: Any) -> Any:
+        old_rows = self._capacity
+        if np is not None:
+            grown = np.zeros((rows, cols), dtype=matrix.dtype)
+            grown[:old_rows, :matrix.shape[1]] = matrix
+            return grown
+        for row in matrix:
+            row.extend([fill] * (cols - len(row)))
+        matrix.extend([[fill] * cols for _ in range(rows - old_rows)])
+        return matrix
+
+    def _ordinal(self, scid: str) -> int:
+        pos = self._index.get(scid)
+        if pos is None:
+            pos = len(self._scids)
+            if pos >= self._capacity:
+                self._grow(max(16, self._capacity * 2))
+            self._index[scid] = pos
+            self._scids.append(scid)
+        return pos
+
+    # -------------------------------------------------------------------------
+    # Welford updates
+    # -------------------------------------------------------------------------
+
+    def _column(self, slot: int) -> Tuple[List[int], List[float]]:
+        """Channels observed in a ring slot and their revenue rates."""
+        if np is not None:
+            rows = np.flatnonzero(self._observed[:len(self._scids), slot])
+            return rows.tolist(), self._revenue[rows, slot].tolist()
+        rows = [i for i in range(len(self._scids)) if self._observed[i][slot]]
+        return rows, [self._revenue[i][slot] for i in rows]
+
+    def _add_bucket(self, slot: int) -> None:
+        rows, x = self._column(slot)
+        self._counted[slot] = True
+        if not rows:
+            return
+        if np is not None:
+            sub = np.ix_(rows, rows)
+            xv = np.asarray(x)[:, None]
+            n_new = self._n[sub] + 1
+            dev = xv - self._mean[sub]
+            mean_new = self._mean[sub] + dev / n_new
+            dev_after = xv - mean_new
+            self._c[sub] += dev * dev_after.T
+            self._m2[sub] += dev * dev_after
+            self._mean[sub] = mean_new
+            self._n[sub] = n_new
+            return
+        # Partner means (mean[j][i]) are read in the same pass, so the new
+        # counts/means are staged and written afterwards.
+        staged = []
+        for a, i in enumerate(rows):
+            for b, j in enumerate(rows):
+                n_new = self._n[i][j] + 1
+                dev_i = x[a] - self._mean[i][j]
+                mean_i = self._mean[i][j] + dev_i / n_new
+                mean_j = self._mean[j][i] + (x[b] - self._mean[j][i]) / n_new
+                self._c[i][j] += dev_i * (x[b] - mean_j)
+                self._m2[i][j] += dev_i * (x[a] - mean_i)
+                staged.append((i, j, n_new, mean_i))
+        for i, j, n_new, mean_i in staged:
+            self._n[i][j] = n_new
+            self._mean[i][j] = mean_i
+
+    def _remove_bucket(self, slot: int) -> None:
+        rows, x = self._column(slot)
+        self._counted[slot] = False
+        if not rows:
+            return
+        if np is not None:
+            sub = np.ix_(rows, rows)
+            xv = np.asarray(x)[:, None]
+            n_old = self._n[sub]
+            n_new = n_old - 1
+            dev = xv - self._mean[sub]
+            mean_new = np.divide(
+                n_old * self._mean[sub] - xv, n_new,
+                out=np.zeros_like(n_new), where=n_new > 0
+            )
+            dev_removed = xv - mean_new
+            empty = n_new <= 0
+            self._c[sub] = np.where(empty, 0.0, self._c[sub] - dev_removed * dev.T)
+            self._m2[sub] = np.where(empty, 0.0, self._m2[sub] - dev_removed * dev)
+            self._mean[sub] = mean_new
+            self._n[sub] = np.maximum(n_new, 0)
+            return
+        staged = []
+        for a, i in enumerate(rows):
+            for b, j in enumerate(rows):
+                n_old = self._n[i][j]
+                n_new = n_old - 1
+                if n_new <= 0:
+                    self._c[i][j] = self._m2[i][j] = 0.0
+                    staged.append((i, j, 0, 0.0))
+                    continue
+                mean_i = (n_old * self._mean[i][j] - x[a]) / n_new
+                dev_removed = x[a] - mean_i
+                self._c[i][j] -= dev_removed * (x[b] - self._mean[j][i])
+                self._m2[i][j] -= dev_removed * (x[a] - self._mean[i][j])
+                staged.append((i, j, n_new, mean_i))
+        for i, j, n_new, mean_i in staged:
+            self._n[i][j] = n_new
+            self._mean[i][j] = mean_i
+
+    # -------------------------------------------------------------------------
+    # Bucket clock
+    # -------------------------------------------------------------------------
+
+    def _clear_slot(self, slot: int) -> None:
+        if self._counted[slot]:
+            self._remove_bucket(slot)
+        if np is not None:
+            for buf in (self._revenue, self._fwd_count, self._size_sum, self._size_count):
+                buf[:, slot] = 0.0
+            self._observed[:, slot] = False
+            return
+        for i in range(len(self._scids)):
+            self._revenue[i][slot] = 0.0
+            self._fwd_count[i][slot] = 0.0
+            self._size_sum[i][slot] = 0.0
+            self._size_count[i][slot] = 0.0
+            self._observed[i][slot] = False
+
+    def _advance_to(self, bucket: int) -> None:
+        """Close every bucket before `bucket` and open it."""
+        if self._head is None:
+            self._head = bucket
+            return
+        steps = bucket - self._head
+        if steps <= 0:
+            return
+        # Beyond one full ring every slot is cleared anyway.
+        for _ in range(min(steps, self._slots)):
+            self._add_bucket(self._head % self._slots)
+            self.buckets_closed += 1
+            self._head += 1
+            self._clear_slot(self._head % self._slots)
+        self._head = bucket
+
+    def advance(self, now: Optional[int] = None) -> None:
+        """Close any buckets that ended before `now`."""
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            self._advance_to(now // self._interval)
+
+    # -------------------------------------------------------------------------
+    # Ingestion
+    # -------------------------------------------------------------------------
+
+    def record_forward(
+        self,
+        out_channel: Optional[str],
+        fee_msat: Any,
+        out_msat: Any,
+        timestamp: Any
+    ) -> None:
+        """
+        Add one settled forward.
+
+        Forwards for an already closed bucket still inside the window are
+        applied by retracting and re-adding that bucket; older ones are
+        ignored. Between begin_seed() and seed() forwards are buffered.
+        """
+        if not out_channel:
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((out_channel, fee_msat, out_msat, timestamp))
+                return
+            self._record_locked(out_channel, fee_msat, out_msat, timestamp)
+
+    def _record_locked(self, out_channel: str, fee_msat: Any, out_msat: Any, timestamp: Any) -> None:
+        """record_forward() body; the caller holds the lock."""
+        ts = int(timestamp or 0) or int(time.time())
+        bucket = ts // self._interval
+        fee_rate = _fee_msat_value({"fee_msat": fee_msat}) / 1000 / self._interval_hours
+        size_sats = _safe_msat_to_sats(out_msat)
+
+        if self._head is not None and bucket <= self._head - self._slots:
+            return  # Older than the window
+        self._advance_to(max(bucket, self._head if self._head is not None else bucket))
+        slot = bucket % self._slots
+        late = bucket < self._head
+        if late and self._counted[slot]:
+            self._remove_bucket(slot)
+
+        pos = self._ordinal(out_channel)
+        if np is not None:
+            self._revenue[pos, slot] += fee_rate
+            self._observed[pos, slot] = True
+            self._fwd_count[pos, slot] += 1
+            if size_sats > 0:
+                self._size_sum[pos, slot] += size_sats
+                self._size_count[pos, slot] += 1
+        else:
+            self._revenue[pos][slot] += fee_rate
+            self._observed[pos][slot] = True
+            self._fwd_count[pos][slot] += 1
+            if size_sats > 0:
+                self._size_sum[pos][slot] += size_sats
+                self._size_count[pos][slot] += 1
+
+        if late:
+            self._add_bucket(slot)
+        self.forwards_recorded += 1
+
+    def begin_seed(self) -> None:
+        """
+        Buffer record_forward() calls until the next seed().
+
+        Lets the accumulator be published to the forward_event path before
+        the seed query runs: forwards arriving meanwhile are kept, and
+        seed() applies the ones its batch does not already contain.
+        """
+        with self._lock:
+            self._pending = []
+
+    def seed(
+        self,
+        forwards: List[Dict[str, Any]],
+        now: Optional[int] = None,
+        since: Optional[int] = None
+    ) -> int:
+        """
+        Rebuild state from a batch of forwards (e.g. the local forwards table).
+
+        Args:
+            forwards: Settled forwards (out_channel, fee_msat, out_msat and
+                received_time or timestamp)
+            now: Current time (default time.time())
+            since: Oldest time the batch has data for. When it falls inside
+                the window, rates are taken over the hours actually covered.
+
+        Returns:
+            Number of forwards applied
+        """
+        now = int(now if now is not None else time.time())
+        # First closed bucket the ring keeps at `now`
+        window_start = (now // self._interval - self._window_buckets) * self._interval
+        ordered = sorted(
+            (f for f in forwards
+             if (f.get("received_time") or f.get("timestamp", 0)) >= window_start),
+            key=lambda f: f.get("received_time") or f.get("timestamp", 0)
+        )
+        entries = [
+            (fwd.get("out_channel"), fwd.get("fee_msat") or fwd.get("fee", 0),
+             fwd.get("out_msat", 0), fwd.get("received_time") or fwd.get("timestamp", 0))
+            for fwd in ordered
+        ]
+        with self._lock:
+            self._index = {}
+            self._scids = []
+            self._head = None
+            self._counted = [False] * self._slots
+            self._reset_storage(0)
+            self._since = since if since is not None and since > window_start else None
+        for entry in entries:
+            if entry[0]:
+                with self._lock:
+                    self._record_locked(*entry)
+
+        # Forwards buffered since begin_seed(), minus those already in the
+        # batch; applied under the same lock that ends buffering
+        seeded = Counter(_forward_key(*entry) for entry in entries)
+        with self._lock:
+            for entry in self._pending or ():
+                key = _forward_key(*entry)
+                if seeded[key]:
+                    seeded[key] -= 1
+                else:
+                    self._record_locked(*entry)
+            self._pending = None
+            self._advance_to(now // self._interval)
+        return len(ordered)
+
+    # -------------------------------------------------------------------------
+    # Reads
+    # -------------------------------------------------------------------------
+
+    def _closed_slots(self) -> List[int]:
+        return [s for s in range(self._slots) if self._counted[s]]
+
+    def snapshot(self, scids: List[str], now: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Statistics for the given channels, in order.
+
+        Returns:
+            Dict with "channels" (per-channel mean/variance/observations and
+            forward size aggregates), "pairs" (the significant channel pairs
+            as _SparsePairs, ordinals following `scids`), "window_hours" and
+            "covered_hours" (the part of the window the data spans).
+        """
+        now = int(now if now is not None else time.time())
+        with self._lock:
+            self._advance_to(now // self._interval)
+            slots = self._closed_slots()
+            live = len(self._scids)
+            positions = [self._index.get(scid) for scid in scids]
+            window_hours = self._window_buckets * self._interval_hours
+            covered_hours = window_hours
+            if self._since is not None:
+                closed_end = (now // self._interval) * self._interval
+                covered_hours = min(window_hours, max(
+                    self._interval_hours, (closed_end - self._since) / 3600
+                ))
+            if np is not None:
+                pairs = _SparsePairs.from_moments(
+                    self._n[:live, :live], self._c[:live, :live], self._m2[:live, :live]
+                )
+            else:
+                pairs = _SparsePairs.from_moments(
+                    [row[:live] for row in self._n[:live]],
+                    [row[:live] for row in self._c[:live]],
+                    [row[:live] for row in self._m2[:live]],
+                )
+
+            channel_stats: Dict[str, Dict[str, Any]] = {}
+            for scid, p in zip(scids, positions):
+                obs = mean = m2 = fwd_total = size_sum = count = 0.0
+                if p is not None:
+                    if np is not None:
+                        obs, mean, m2 = self._n[p, p], self._mean[p, p], self._m2[p, p]
+                        fwd_total = float(self._fwd_count[p, slots].sum())
+                        size_sum = float(self._size_sum[p, slots].sum())
+                        count = float(self._size_count[p, slots].sum())
+                    else:
+                        obs, mean, m2 = self._n[p][p], self._mean[p][p], self._m2[p][p]
+                        fwd_total = sum(self._fwd_count[p][s] for s in slots)
+                        size_sum = sum(self._size_sum[p][s] for s in slots)
+                        count = sum(self._size_count[p][s] for s in slots)
+                obs = int(obs)
+                channel_stats[scid] = {
+                    "expected_return": float(mean) if obs > 0 else 0.0,
+                    "variance": max(0.0, float(m2) / (obs - 1)) if obs >= 2 else 0.0,
+                    "observation_count": obs,
+                    "forward_count": int(fwd_total),
+                    "avg_forward_size": int(size_sum // count) if count else 0,
+                    "size_count": int(count),
+                }
+
+        diagonal = [float(pairs.variance[p]) if p is not None else 0.0 for p in positions]
+        return {
+            "channels": channel_stats,
+            "pairs": pairs.reindexed(positions, diagonal),
+            "window_hours": window_hours,
+            "covered_hours": covered_hours,
+        }
+
+    def verify(self, tolerance: float = 1e-6) -> Dict[str, Any]:
+        """
+        Recompute statistics from the ring buffer and compare with the
+        running moments. Resynchronizes the moments (and drops channels with
+        no data left in the window) afterwards.
+
+        Returns:
+            Report with max absolute/relative covariance drift
+        """
+        started = time.time()
+        with self._lock:
+            slots = self._closed_slots()
+            live = len(self._scids)
+            if np is not None:
+                values = self._revenue[:live][:, slots]
+                observed = self._observed[:live][:, slots]
+                online_cov, _ = _moments_to_statistics(
+                    self._n[:live, :live], self._c[:live, :live], self._m2[:live, :live]
+                )
+            else:
+                values = [[row[s] for s in slots] for row in self._revenue[:live]]
+                observed = [[row[s] for s in slots] for row in self._observed[:live]]
+                online_cov, _ = _moments_to_statistics(
+                    [row[:live] for row in self._n[:live]],
+                    [row[:live] for row in self._c[:live]],
+                    [row[:live] for row in self._m2[:live]],
+                )
+            exact_cov, _ = _pairwise_statistics(values, observed)
+
+            if np is not None:
+                diff = np.abs(online_cov - exact_cov) if live else np.zeros(0)
+                max_abs = float(diff.max()) if live else 0.0
+                scale = float(np.abs(exact_cov).max()) if live else 0.0
+            else:
+                max_abs = max(
+                    (abs(online_cov[i][j] - exact_cov[i][j])
+                     for i in range(live) for j in range(live)),
+                    default=0.0
+                )
+                scale = max(
+                    (abs(exact_cov[i][j]) for i in range(live) for j in range(live)),
+                    default=0.0
+                )
+            max_rel = max_abs / scale if scale > 0 else 0.0
+
+            self._compact_and_rebuild(slots)
+
+            self.last_verify = {
+                "verified_at": int(started),
+                "channels": live,
+                "tracked_channels": len(self._scids),
+                "closed_buckets": len(slots),
+                "max_abs_drift": max_abs,
+                "max_rel_drift": max_rel,
+                "drift_ok": max_rel <= tolerance,
+                "duration_ms": round((time.time() - started) * 1000, 2),
+            }
+            return dict(self.last_verify)
+
+    def _compact_and_rebuild(self, slots: List[int]) -> None:
+        """Drop channels without data in the window and replay the moments."""
+        live = len(self._scids)
+        if np is not None:
+            keep = [i for i in range(live) if self._observed[i, :].any()]
+        else:
+            keep = [i for i in range(live) if any(self._observed[i])]
+
+        buffers = _RING_BUFFERS
+        if len(keep) < live:
+            kept_rows = {
+                name: [getattr(self, name)[i] for i in keep] for name in buffers
+            }
+            scids = [self._scids[i] for i in keep]
+            self._reset_storage(max(16, len(keep)) if keep else 0)
+            self._scids = scids
+            self._index = {scid: i for i, scid in enumerate(scids)}
+            for name in buffers:
+                for i, row in enumerate(kept_rows[name]):
+                    if np is not None:
+                        getattr(self, name)[i, :] = row
+                    else:
+                        getattr(self, name)[i] = list(row)
+        else:
+            self._reset_moments()
+
+        # Replay closed buckets oldest first so Welford sums are exact again.
+        counted = set(slots)
+        self._counted = [False] * self._slots
+        if self._head is not None:
+            for age in range(self._slots - 1, 0, -1):
+                slot = (self._head - age) % self._slots
+                if slot in counted:
+                    self._add_bucket(slot)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Counters for status/debug RPCs."""
+        with self._lock:
+            return {
+                "tracked_channels": len(self._scids),
+                "closed_buckets": len(self._closed_slots()),
+                "forwards_recorded": self.forwards_recorded,
+                "buckets_closed": self.buckets_closed,
+                "last_verify": dict(self.last_verify),
+            }
+
+
+def _moments_to_statistics(n_mat: Any, c_mat: Any, m2_mat: Any) -> Tuple[Any, Any]:
+    """Covariance/correlation from pairwise counts and (co-)moments."""
+    if np is not None:
+        n_mat = np.asarray(n_mat, dtype=float)
+        valid = n_mat >= MIN_COMMON_BUCKETS
+        denom = np.where(valid, n_mat - 1, 1.0)
+        cov = np.where(valid, np.asarray(c_mat) / denom, 0.0)
+        var_a = np.maximum(np.asarray(m2_mat), 0.0) / denom
+        var_b = var_a.T
+        corr_ok = valid & (var_a > MIN_VARIANCE) & (var_b > MIN_VARIANCE)
+        scale = np.sqrt(np.where(corr_ok, var_a * var_b, 1.0))
+        corr = np.where(corr_ok, np.clip(cov / scale, -1.0, 1.0), 0.0)
+        return cov, corr
+
+    n = len(n_mat)
+    cov = [[0.0] * n for _ in range(n)]
+    corr = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(n):
+            count = n_mat[i][j]
+            if count < MIN_COMMON_BUCKETS:
+                continue
+            c = c_mat[i][j] / (count - 1)
+            cov[i][j] = c
+            var_a = max(m2_mat[i][j], 0.0) / (count - 1)
+            var_b = max(m2_mat[j][i], 0.0) / (count - 1)
+            if var_a > MIN_VARIANCE and var_b > MIN_VARIANCE:
+                corr[i][j] = max(-1.0, min(1.0, c / math.sqrt(var_a * var_b)))
+    return cov, corr
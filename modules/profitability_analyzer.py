@@ -25,6 +25,8 @@ import threading
 
 from pyln.client import Plugin
 
+from .channel_state_model import ChannelStateModel, list_peer_channels
+
 if TYPE_CHECKING:
     from .hive_bridge import HiveFeeIntelligenceBridge
 
@@ -375,6 +377,12 @@ class ChannelProfitabilityAnalyzer:
         # Track last health report to avoid spam
         self._last_health_report: int = 0
         self._health_report_interval: int = 300  # Report every 5 minutes max
+
+        # Event-driven channel state (falls back to listpeerchannels if unset)
+        self._channel_state: Optional[ChannelStateModel] = None
+
+    def set_channel_state(self, channel_state: ChannelStateModel) -> None:
+        self._channel_state = channel_state
         
     def _parse_msat(self, msat_val: Any) -> int:
         """
@@ -1568,7 +1576,7 @@ class ChannelProfitabilityAnalyzer:
         channels = {}
         
         try:
-            result = self.plugin.rpc.listpeerchannels()
+            result = list_peer_channels(self.plugin, self._channel_state)
             
             for channel in result.get("channels", []):
                 state = channel.get("state", "")
@@ -0,0 +1,251 @@
+"""
+Query Profiler module for cl-revenue-ops
+
+Opt-in timings for the statements issued through Database._get_connection().
+
+With db_query_profile enabled, every ConnectionProxy statement is recorded
+under its normalized SQL (whitespace collapsed, literals and IN-lists
+replaced by placeholders): call count, total/max time, a window of recent
+durations for the p95, and rows (fetched for reads, changed for writes).
+Times are what the caller saw: a read includes fetching its rows, a write
+includes waiting for the writer thread.
+
+A statement slower than db_slow_query_ms is logged with its EXPLAIN QUERY
+PLAN (at most once per SLOW_LOG_INTERVAL per statement) and kept in a short
+list of recent slow queries for revenue-db-stats.
+
+When profiling is disabled the proxy pays one attribute check per
+statement; cursors are returned unwrapped.
+"""
+
+import functools
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+PROFILE_SORTS = ("total", "calls", "p95", "max", "rows")
+
+
+@functools.lru_cache(maxsize=4096)
+def normalize_sql(sql: str) -> str:
+    """One key per statement shape: literals and IN-lists become '?'."""
+    sql = _WHITESPACE.sub(" ", sql).strip().rstrip(";").strip()
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    return _PLACEHOLDER_LIST.sub("(?...)", sql)
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _StatementStats:
+    __slots__ = ("calls", "total", "max", "rows", "recent", "plan", "last_logged")
+
+    def __init__(self, samples: int):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.recent: Deque[float] = deque(maxlen=samples)
+        self.plan: Optional[List[str]] = None
+        self.last_logged = 0.0
+
+    def as_dict(self, sql: str) -> Dict[str, Any]:
+        return {
+            "sql": sql,
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "avg_ms": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "p95_ms": round(_percentile(list(self.recent), 0.95) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+        }
+
+
+class ProfiledCursor:
+    """
+    Cursor wrapper for reads: SQLite does most of a SELECT's work while
+    rows are fetched, so the call is recorded once the cursor is drained
+    (or dropped), with the fetch time and row count included.
+    """
+
+    def __init__(self, cursor, profiler: "QueryProfiler", sql: str, elapsed: float,
+                 explain: Optional[Callable[[], List[str]]]):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._sql = sql
+        self._elapsed = elapsed
+        self._explain = explain
+        self._rows = 0
+        self._done = False
+
+    def _fetched(self, started: float, count: int, exhausted: bool) -> None:
+        self._elapsed += time.perf_counter() - started
+        self._rows += count
+        if exhausted:
+            self._finish()
+
+    def _finish(self) -> None:
+        if not self._done:
+            self._done = True
+            self._profiler.record(self._sql, self._elapsed, self._rows, self._explain)
+
+    def fetchone(self) -> Any:
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, row is not None, row is None)
+        return row
+
+    def fetchall(self) -> List[Any]:
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows), True)
+        return rows
+
+    def fetchmany(self, size: int = 1) -> List[Any]:
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(started, len(rows), len(rows) < size)
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def close(self) -> None:
+        self._cursor.close()
+        self._finish()
+
+    def __getattr__(self, name: str) -> Any:
+        # rowcount, lastrowid, description, ...
+        return getattr(self._cursor, name)
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class QueryProfiler:
+    """Per-statement counters, p95 and slow-query log for the database."""
+
+    SAMPLES = 512              # Recent durations kept per statement (p95)
+    SLOW_LOG_INTERVAL = 300.0  # Seconds between log lines for one statement
+    SLOW_QUERIES_KEPT = 50
+
+    def __init__(self, config=None, log: Optional[Callable[[str, str], None]] = None):
+        self.config = config
+        self._log = log or (lambda msg, level: None)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _StatementStats] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=self.SLOW_QUERIES_KEPT)
+        self.since = int(time.time())
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config is not None and self.config.db_query_profile)
+
+    @property
+    def slow_query_seconds(self) -> float:
+        if self.config is None:
+            return 0.0
+        return max(0, int(self.config.db_slow_query_ms)) / 1000.0
+
+    def record(self, sql: str, seconds: float, rows: int,
+               explain: Optional[Callable[[], List[str]]] = None) -> None:
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _StatementStats(self.SAMPLES)
+            stats.calls += 1
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.rows += max(0, rows)
+            stats.recent.append(seconds)
+        threshold = self.slow_query_seconds
+        if threshold and seconds >= threshold:
+            self._slow_query(key, stats, seconds, rows, explain)
+
+    def _slow_query(self, key: str, stats: _StatementStats, seconds: float, rows: int,
+                    explain: Optional[Callable[[], List[str]]]) -> None:
+        now = time.time()
+        with self._lock:
+            log_it = now - stats.last_logged >= self.SLOW_LOG_INTERVAL
+            if log_it:
+                stats.last_logged = now
+            plan = stats.plan
+        if plan is None and explain is not None:
+            try:
+                plan = explain()
+            except Exception as e:
+                plan = [f"(no plan: {e})"]
+            with self._lock:
+                stats.plan = plan
+        entry = {
+            "sql": key,
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "timestamp": int(now),
+            "thread": threading.current_thread().name,
+            "plan": plan or [],
+        }
+        with self._lock:
+            self._slow.append(entry)
+        if log_it:
+            self._log(
+                f"Slow query ({entry['ms']:.0f} ms, {rows} rows): {key}"
+                + "".join(f"\n    {line}" for line in entry["plan"]),
+                "info"
+            )
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._slow.clear()
+            self.since = int(time.time())
+
+    def get_stats(self, limit: int = 20, sort: str = "total", reset: bool = False) -> Dict[str, Any]:
+        """
+        Top statements by `sort` (see PROFILE_SORTS) and recent slow queries.
+
+        With reset, the profile is cleared after it is read.
+        """
+        if sort not in PROFILE_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(PROFILE_SORTS)}")
+        with self._lock:
+            statements = [s.as_dict(sql) for sql, s in self._stats.items()]
+            slow = list(self._slow)
+            since = self.since
+            if reset:
+                self._stats.clear()
+                self._slow.clear()
+                self.since = int(time.time())
+        field = {"total": "total_ms", "calls": "calls", "p95": "p95_ms",
+                 "max": "max_ms", "rows": "rows"}[sort]
+        statements.sort(key=lambda s: s[field], reverse=True)
+        return {
+            "enabled": self.enabled,
+            "since": since,
+            "slow_query_ms": int(self.slow_query_seconds * 1000),
+            "distinct_statements": len(statements),
+            "calls": sum(s["calls"] for s in statements),
+            "total_ms": round(sum(s["total_ms"] for s in statements), 3),
+            "statements": statements[:max(0, int(limit))],
+            "slow_queries": slow[::-1],
+        }
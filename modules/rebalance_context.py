@@ -0,0 +1,107 @@
+"""
+Rebalance Cycle Context module for cl-revenue-ops
+
+Per-cycle, in-memory view of the database lookups the rebalancer makes for
+every channel and peer.
+
+EV analysis asks for the channel state, failure count, last rebalance time,
+peer uptime and inbound fee history of each candidate. Issued one row at a
+time, that is an N+1 query pattern which dominates the rebalance cycle at a
+few hundred channels. RebalanceCycleContext loads each of them for all
+channels and peers with one grouped query at cycle start and answers with
+the same method signatures as Database, so call sites read from memory.
+
+Lookups the context was not loaded for (e.g. a different uptime window)
+fall through to the database.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .database import Database
+
+
+UPTIME_WINDOW_SECONDS = 86400   # Flap-protection window used by the rebalancer
+INBOUND_FEE_WINDOW_DAYS = 30    # Defaults of Database.get_historical_inbound_fee_ppm
+INBOUND_FEE_MIN_SAMPLES = 3
+PEER_HISTORY_LIMIT = 20         # Default of Database.get_rebalance_history_by_peer
+
+
+class RebalanceCycleContext:
+    """
+    Snapshot of per-channel and per-peer rebalance lookups for one cycle.
+
+    Values reflect the database at load() time; writes made during the cycle
+    (e.g. by job handling) are not visible until the next cycle.
+    """
+
+    def __init__(self, database: Database):
+        self.database = database
+        self.loaded_at = 0
+        self.load_seconds = 0.0
+        self._channel_states: Dict[str, Dict[str, Any]] = {}
+        self._failure_counts: Dict[str, Tuple[int, int]] = {}
+        self._last_rebalance: Dict[str, int] = {}
+        self._uptime: Dict[str, float] = {}
+        self._inbound_fees: Dict[str, Dict[str, Any]] = {}
+        self._peer_history: Dict[str, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def load(cls, database: Database) -> "RebalanceCycleContext":
+        """Load all lookups with one grouped query each."""
+        ctx = cls(database)
+        start = time.perf_counter()
+        ctx._channel_states = database.get_channel_states_map()
+        ctx._failure_counts = database.get_all_failure_counts()
+        ctx._last_rebalance = database.get_last_rebalance_times()
+        ctx._uptime = database.get_peer_uptime_percents(UPTIME_WINDOW_SECONDS)
+        ctx._inbound_fees = database.get_historical_inbound_fee_ppms(
+            INBOUND_FEE_WINDOW_DAYS, INBOUND_FEE_MIN_SAMPLES
+        )
+        ctx._peer_history = database.get_rebalance_history_by_peers(PEER_HISTORY_LIMIT)
+        ctx.load_seconds = time.perf_counter() - start
+        ctx.loaded_at = int(time.time())
+        return ctx
+
+    # Database-compatible accessors
+
+    def get_channel_state(self, channel_id: str) -> Optional[Dict[str, Any]]:
+        return self._channel_states.get(channel_id)
+
+    def get_failure_count(self, channel_id: str) -> Tuple[int, int]:
+        return self._failure_counts.get(channel_id, (0, 0))
+
+    def get_last_rebalance_time(self, channel_id: str) -> Optional[int]:
+        return self._last_rebalance.get(channel_id)
+
+    def get_peer_uptime_percent(self, peer_id: str, duration_seconds: int) -> float:
+        if duration_seconds != UPTIME_WINDOW_SECONDS:
+            return self.database.get_peer_uptime_percent(peer_id, duration_seconds)
+        # No connection history at all -> cold start, assume 100%
+        return self._uptime.get(peer_id, 100.0)
+
+    def get_historical_inbound_fee_ppm(self, peer_id: str,
+                                       window_days: int = INBOUND_FEE_WINDOW_DAYS,
+                                       min_samples: int = INBOUND_FEE_MIN_SAMPLES
+                                       ) -> Optional[Dict[str, Any]]:
+        if window_days != INBOUND_FEE_WINDOW_DAYS or min_samples != INBOUND_FEE_MIN_SAMPLES:
+            return self.database.get_historical_inbound_fee_ppm(peer_id, window_days, min_samples)
+        return self._inbound_fees.get(peer_id)
+
+    def get_rebalance_history_by_peer(self, peer_id: str,
+                                      limit: int = PEER_HISTORY_LIMIT) -> List[Dict[str, Any]]:
+        if limit > PEER_HISTORY_LIMIT:
+            return self.database.get_rebalance_history_by_peer(peer_id, limit)
+        return self._peer_history.get(peer_id, [])[:limit]
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_seconds * 1000, 1),
+            "channel_states": len(self._channel_states),
+            "failure_counts": len(self._failure_counts),
+            "last_rebalance_times": len(self._last_rebalance),
+            "peer_uptimes": len(self._uptime),
+            "inbound_fee_histories": len(self._inbound_fees),
+            "peer_histories": len(self._peer_history),
+        }
@@ -0,0 +1,397 @@
+"""
+Rebalance Planner module for cl-revenue-ops
+
+Global assignment of rebalance sources to depleted destinations.
+
+The greedy path (EVRebalancer._analyze_rebalance_ev) walks destinations in
+listing order, picks the best-scoring source for each and stops once the
+job slots are full. That repeats the per-pair work for every destination
+and lets an early destination take a source that a later one needed more.
+
+The planner instead:
+1. Prepares every destination and every source once
+2. Builds the destination x source EV matrix in one pass (vectorized with
+   NumPy when installed, same arithmetic as the per-pair path otherwise)
+3. Solves a capacity-constrained assignment as a min-cost flow: each
+   destination takes at most one primary source, each source serves at
+   most `spendable // chunk` destinations, and at most `slots`
+   destinations are picked, maximizing total expected profit
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _numpy():
+    """
+    NumPy, imported on first use (None when not installed).
+
+    Importing NumPy takes longer than loading the rest of the plugin, and
+    only the rebalance cycle needs it, so it stays out of plugin startup.
+    """
+    module_globals = globals()
+    if "np" not in module_globals:
+        try:
+            import numpy
+        except ImportError:  # Optional: pure-Python fallback
+            numpy = None
+        module_globals["np"] = numpy
+    return module_globals["np"]
+
+
+def __getattr__(name):
+    if name == "np":
+        return _numpy()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@dataclass(frozen=True)
+class EVParams:
+    """Config values used by the pair EV arithmetic."""
+    hive_rebalance_tolerance: int
+    enable_kelly: bool
+    kelly_fraction: float
+    rebalance_min_profit: int
+    rebalance_min_profit_ppm: int
+
+    @classmethod
+    def from_config(cls, cfg) -> "EVParams":
+        return cls(
+            hive_rebalance_tolerance=cfg.hive_rebalance_tolerance,
+            enable_kelly=cfg.enable_kelly,
+            kelly_fraction=cfg.kelly_fraction,
+            rebalance_min_profit=cfg.rebalance_min_profit,
+            rebalance_min_profit_ppm=cfg.rebalance_min_profit_ppm,
+        )
+
+
+@dataclass
+class DestinationPlan:
+    """A depleted channel that passed all destination checks, with its sizing."""
+    channel_id: str
+    info: Dict[str, Any]
+    ratio: float
+    flow_state: str
+    bleeder_status: str
+    capacity: int
+    amount_needed: int
+    rebalance_amount: int
+    outbound_fee_ppm: int
+    inbound_fee_ppm: int
+    is_hive: bool
+    turnover_rate: float
+    utilization: float          # Expected utilization over the cooldown
+    reputation: float           # Peer success probability (Kelly)
+    profit_threshold: int       # Minimum expected profit (sats)
+
+    @property
+    def amount_msat(self) -> int:
+        return self.rebalance_amount * 1000
+
+
+@dataclass
+class SourceOption:
+    """A source channel that passed all destination-independent checks."""
+    channel_id: str
+    info: Dict[str, Any]
+    ratio: float
+    flow_state: str
+    fee_ppm: int
+    turnover_rate: float
+    opp_cost_ppm: int           # Flow-aware weighted opportunity cost
+    score: float                # Greedy ordering score (higher is better)
+    spendable_sats: int = field(default=0)
+
+
+@dataclass
+class PairEV:
+    """Economics of moving one chunk from a source into a destination."""
+    spread_ppm: int
+    max_budget_sats: int
+    max_budget_msat: int
+    max_fee_ppm: int
+    expected_profit: float
+
+
+def source_prefilter(spread_ppm: int, rebalance_amount: int, params: EVParams) -> bool:
+    """
+    Spread and minimum-profit gate applied when listing a destination's
+    sources (tolerance is scaled to the chunk amount).
+    """
+    tolerance_ppm = int((params.hive_rebalance_tolerance * 1_000_000) / max(rebalance_amount, 1))
+    if spread_ppm < -tolerance_ppm:
+        return False
+    expected_profit_estimate = (spread_ppm * rebalance_amount) // 1_000_000
+    if params.rebalance_min_profit_ppm > 0:
+        min_profit_threshold = (rebalance_amount * params.rebalance_min_profit_ppm) // 1_000_000
+    else:
+        min_profit_threshold = params.rebalance_min_profit
+    return expected_profit_estimate >= min_profit_threshold
+
+
+def evaluate_pair(
+    dest: DestinationPlan,
+    opp_cost_ppm: int,
+    source_fee_ppm: int,
+    source_turnover_rate: float,
+    params: EVParams
+) -> Optional[PairEV]:
+    """
+    Budget, fee cap and expected profit for one destination/source pair.
+
+    Returns None when the pair is rejected (spread beyond tolerance,
+    negative Kelly fraction or no usable fee cap). The profit threshold is
+    NOT applied here; callers compare expected_profit with
+    dest.profit_threshold.
+    """
+    spread_ppm = dest.outbound_fee_ppm - dest.inbound_fee_ppm - opp_cost_ppm
+
+    # Allow slightly negative spread up to configured tolerance.
+    tolerance_ppm = int((params.hive_rebalance_tolerance * 1_000_000) / max(dest.amount_needed, 1))
+    if spread_ppm < -tolerance_ppm:
+        return None
+
+    amount_msat = dest.amount_msat
+    effective_spread_ppm = max(1, spread_ppm) if spread_ppm > 0 else tolerance_ppm
+    raw_budget_msat = (effective_spread_ppm * amount_msat) // 1_000_000
+    max_budget_msat = max(1000, raw_budget_msat)
+    max_budget_sats = (max_budget_msat + 999) // 1000
+
+    if params.enable_kelly:
+        p = dest.reputation
+        cost_ppm = dest.inbound_fee_ppm + opp_cost_ppm
+        b = dest.outbound_fee_ppm / cost_ppm if cost_ppm > 0 else float('inf')
+        kelly_f = p - (1 - p) / b if b > 0 else -1.0
+        kelly_safe = min(kelly_f * params.kelly_fraction, 1.0)
+        if kelly_safe <= 0:
+            return None
+        max_budget_sats = int(max_budget_sats * kelly_safe)
+        max_budget_msat = max_budget_sats * 1000
+
+    if amount_msat <= 0:
+        return None
+    budget_ppm = (max_budget_msat * 1_000_000) // amount_msat
+    heuristic_ppm = dest.inbound_fee_ppm + (spread_ppm // 2)
+    max_fee_ppm = max(1, min(heuristic_ppm, budget_ppm)) if budget_ppm > 0 else 0
+    if max_fee_ppm <= 0:
+        return None
+
+    amount = dest.rebalance_amount
+    expected_income = (amount * dest.utilization * dest.outbound_fee_ppm) // 1_000_000
+    turnover_weight = min(1.0, source_turnover_rate * 7)
+    expected_source_loss = (amount * dest.utilization * source_fee_ppm * turnover_weight) // 1_000_000
+    expected_profit = expected_income - max_budget_sats - expected_source_loss
+
+    return PairEV(
+        spread_ppm=spread_ppm,
+        max_budget_sats=max_budget_sats,
+        max_budget_msat=max_budget_msat,
+        max_fee_ppm=max_fee_ppm,
+        expected_profit=expected_profit,
+    )
+
+
+def ev_matrix(
+    dests: List[DestinationPlan],
+    sources: List[SourceOption],
+    params: EVParams
+) -> Tuple[Any, Any]:
+    """
+    Expected profit and feasibility for every destination x source pair.
+
+    A pair is feasible when the source can fund the chunk, it passes
+    source_prefilter() and evaluate_pair(), and its expected profit meets
+    the destination's threshold.
+
+    Returns:
+        Tuple of (profit, feasible) D x S matrices (NumPy arrays or lists).
+    """
+    np = _numpy()
+    if np is None:
+        profit = [[0.0] * len(sources) for _ in dests]
+        feasible = [[False] * len(sources) for _ in dests]
+        for d, dest in enumerate(dests):
+            for s, src in enumerate(sources):
+                if src.spendable_sats < dest.rebalance_amount:
+                    continue
+                spread = dest.outbound_fee_ppm - dest.inbound_fee_ppm - src.opp_cost_ppm
+                if not source_prefilter(spread, dest.rebalance_amount, params):
+                    continue
+                pair = evaluate_pair(dest, src.opp_cost_ppm, src.fee_ppm, src.turnover_rate, params)
+                if pair is None or pair.expected_profit < dest.profit_threshold:
+                    continue
+                profit[d][s] = pair.expected_profit
+                feasible[d][s] = True
+        return profit, feasible
+
+    def col(values, dtype):
+        return np.asarray(values, dtype=dtype)[:, None]
+
+    out_fee = col([d.outbound_fee_ppm for d in dests], np.int64)
+    in_fee = col([d.inbound_fee_ppm for d in dests], np.int64)
+    amount = col([d.rebalance_amount for d in dests], np.int64)
+    amount_needed = col([d.amount_needed for d in dests], np.int64)
+    utilization = col([d.utilization for d in dests], float)
+    reputation = col([d.reputation for d in dests], float)
+    threshold = col([d.profit_threshold for d in dests], float)
+
+    opp = np.asarray([s.opp_cost_ppm for s in sources], dtype=np.int64)[None, :]
+    src_fee = np.asarray([s.fee_ppm for s in sources], dtype=np.int64)[None, :]
+    turnover_weight = np.minimum(
+        1.0, np.asarray([s.turnover_rate for s in sources], dtype=float) * 7
+    )[None, :]
+    spendable = np.asarray([s.spendable_sats for s in sources], dtype=np.int64)[None, :]
+
+    tolerance = params.hive_rebalance_tolerance * 1_000_000
+    spread = out_fee - in_fee - opp
+
+    # Source listing gate (tolerance scaled to the chunk)
+    tol_chunk = (tolerance / np.maximum(amount, 1)).astype(np.int64)
+    if params.rebalance_min_profit_ppm > 0:
+        min_profit = (amount * params.rebalance_min_profit_ppm) // 1_000_000
+    else:
+        min_profit = params.rebalance_min_profit
+    feasible = (
+        (spendable >= amount)
+        & (spread >= -tol_chunk)
+        & ((spread * amount) // 1_000_000 >= min_profit)
+    )
+
+    # Candidate gate (tolerance scaled to the full need)
+    tol_need = (tolerance / np.maximum(amount_needed, 1)).astype(np.int64)
+    feasible &= spread >= -tol_need
+
+    amount_msat = amount * 1000
+    effective = np.where(spread > 0, spread, tol_need)
+    max_budget_msat = np.maximum(1000, (effective * amount_msat) // 1_000_000)
+    max_budget_sats = (max_budget_msat + 999) // 1000
+
+    if params.enable_kelly:
+        cost = in_fee + opp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            odds = np.where(cost > 0, out_fee / np.where(cost > 0, cost, 1), np.inf)
+            kelly_f = np.where(odds > 0, reputation - (1 - reputation) / np.where(odds > 0, odds, 1), -1.0)
+        kelly_safe = np.minimum(kelly_f * params.kelly_fraction, 1.0)
+        feasible &= kelly_safe > 0
+        max_budget_sats = np.trunc(max_budget_sats * np.maximum(kelly_safe, 0)).astype(np.int64)
+        max_budget_msat = max_budget_sats * 1000
+
+    budget_ppm = (max_budget_msat * 1_000_000) // np.maximum(amount_msat, 1)
+    heuristic = in_fee + spread // 2
+    max_fee = np.where(budget_ppm > 0, np.maximum(1, np.minimum(heuristic, budget_ppm)), 0)
+    feasible &= (max_fee > 0) & (amount_msat > 0)
+
+    income = np.floor_divide(amount * utilization * out_fee, 1_000_000)
+    source_loss = np.floor_divide(amount * utilization * src_fee * turnover_weight, 1_000_000)
+    profit = income - max_budget_sats - source_loss
+    feasible &= profit >= threshold
+
+    return np.where(feasible, profit, 0.0), feasible
+
+
+def assign_sources(
+    profit: Any,
+    feasible: Any,
+    capacities: List[int],
+    slots: int
+) -> Dict[int, int]:
+    """
+    Pick at most `slots` destinations and one primary source for each.
+
+    Min-cost flow (successive shortest paths with Johnson potentials) on
+    S -> destination (cap 1) -> source (cap 1, cost -profit) -> T
+    (cap capacities[s]). Each augmentation adds one destination, so the
+    result for k picks is the maximum-profit k-assignment; augmentation
+    stops when slots are full or no feasible pair is left. Negative-profit
+    pairs that passed the thresholds are still used when a slot is free,
+    matching the greedy path.
+
+    Each destination only keeps its `slots` most profitable sources: at
+    most slots - 1 other picks can exhaust a source, so one of them is
+    always still available.
+
+    Returns:
+        Dict mapping destination index -> source index
+    """
+    n_dest = len(profit)
+    n_src = len(capacities)
+    if n_dest == 0 or n_src == 0 or slots <= 0:
+        return {}
+
+    source_node = 0
+    sink_node = 1 + n_dest + n_src
+    graph: List[List[List[Any]]] = [[] for _ in range(sink_node + 1)]
+
+    def add_edge(u, v, cap, cost):
+        graph[u].append([v, cap, cost, len(graph[v])])
+        graph[v].append([u, 0, -cost, len(graph[u]) - 1])
+
+    np = _numpy()
+    if np is not None:
+        profit = np.asarray(profit, dtype=float)
+        feasible = np.asarray(feasible, dtype=bool)
+
+    potential = [0.0] * (sink_node + 1)
+    for d in range(n_dest):
+        if np is not None:
+            row = np.flatnonzero(feasible[d])
+            if len(row) > slots:
+                row = row[np.argsort(-profit[d][row], kind="stable")[:slots]]
+            options = [(int(s), float(profit[d][s])) for s in row]
+        else:
+            options = [(s, profit[d][s]) for s in range(n_src) if feasible[d][s]]
+            options.sort(key=lambda o: -o[1])
+            options = options[:slots]
+        if not options:
+            continue
+        add_edge(source_node, 1 + d, 1, 0.0)
+        for s, value in options:
+            node = 1 + n_dest + s
+            add_edge(1 + d, node, 1, -value)
+            potential[node] = min(potential[node], -value)
+    for s, cap in enumerate(capacities):
+        if cap > 0:
+            node = 1 + n_dest + s
+            add_edge(node, sink_node, cap, 0.0)
+            potential[sink_node] = min(potential[sink_node], potential[node])
+
+    for _ in range(slots):
+        dist = [float('inf')] * (sink_node + 1)
+        prev: List[Optional[Tuple[int, int]]] = [None] * (sink_node + 1)
+        dist[source_node] = 0.0
+        heap = [(0.0, source_node)]
+        while heap:
+            du, u = heapq.heappop(heap)
+            if du > dist[u]:
+                continue
+            for idx, (v, cap, cost, _) in enumerate(graph[u]):
+                if cap <= 0:
+                    continue
+                # Reduced costs are >= 0 up to float rounding
+                nd = du + max(0.0, cost + potential[u] - potential[v])
+                if nd < dist[v] - 1e-12:
+                    dist[v] = nd
+                    prev[v] = (u, idx)
+                    heapq.heappush(heap, (nd, v))
+        if prev[sink_node] is None:
+            break
+        # Unreachable nodes take the largest distance so reduced costs of
+        # their edges into the reachable set stay non-negative
+        reach = max(d for d in dist if d < float('inf'))
+        for node in range(sink_node + 1):
+            potential[node] += dist[node] if dist[node] < float('inf') else reach
+        node = sink_node
+        while node != source_node:
+            u, idx = prev[node]
+            edge = graph[u][idx]
+            edge[1] -= 1
+            graph[node][edge[3]][1] += 1
+            node = u
+
+    assignment: Dict[int, int] = {}
+    for d in range(n_dest):
+        for v, cap, _, _ in graph[1 + d]:
+            if 1 + n_dest <= v < sink_node and cap == 0:
+                assignment[d] = v - 1 - n_dest
+    return assignment
@@ -20,6 +20,7 @@ Phase 4: Async Job Queue
 
 import time
 import json
+import threading
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Tuple, TYPE_CHECKING
 from enum import Enum
@@ -28,14 +29,35 @@ from pyln.client import Plugin, RpcError
 
 from .config import Config, ConfigSnapshot
 from .database import Database
+from .channel_graph import ChannelGraph
+from .channel_model import ChannelModel
+from .channel_state_model import ChannelStateModel
+from .cycle_profiler import begin_channel, end_channel, profiled_cycle, stage, timed_stage
+from .rebalance_context import RebalanceCycleContext
+from .rebalance_planner import (
+    DestinationPlan, EVParams, SourceOption, assign_sources, ev_matrix,
+    evaluate_pair, source_prefilter
+)
 from .clboss_manager import ClbossManager, ClbossTags
 from .policy_manager import PolicyManager, RebalanceMode, FeeStrategy
+from .openmetrics import metrics
 
 if TYPE_CHECKING:
     from .profitability_analyzer import ChannelProfitabilityAnalyzer
     from .hive_bridge import HiveFeeIntelligenceBridge
 
 
+_REBALANCES = metrics.counter(
+    "revenue_ops_rebalances", "Finished rebalance jobs by outcome", ("outcome",)
+)
+_REBALANCE_FEES = metrics.counter(
+    "revenue_ops_rebalance_fees_sats", "Fees paid for rebalancing"
+)
+_REBALANCE_AMOUNT = metrics.counter(
+    "revenue_ops_rebalance_amount_sats", "Liquidity moved by rebalance jobs"
+)
+
+
 class JobStatus(Enum):
     """Status of a sling background job."""
     PENDING = "pending"
@@ -196,6 +218,10 @@ class JobManager:
         # Active jobs indexed by target channel SCID (normalized format)
         self._active_jobs: Dict[str, ActiveJob] = {}
 
+        # Serializes job start/monitor/stop: the monitor runs on its own
+        # cadence in a separate thread from the rebalance cycle
+        self._lock = threading.RLock()
+
         # Configurable settings
         self.job_timeout_seconds = getattr(config, 'sling_job_timeout_seconds',
                                            self.DEFAULT_JOB_TIMEOUT_SECONDS)
@@ -306,22 +332,29 @@ class JobManager:
         # Sling expects format like 930866x2599x2 (with 'x' separators)
         return scid.replace(':', 'x')
     
-    def _get_channel_local_balance(self, channel_id: str) -> int:
-        """Get current local balance of a channel in sats."""
+    def _get_local_balances(self) -> Dict[str, int]:
+        """
+        Snapshot local balances (sats) of all channels from one listfunds,
+        keyed by normalized SCID. Empty dict on error.
+        """
+        balances = {}
         try:
             listfunds = self.plugin.rpc.listfunds()
-            normalized = self._normalize_scid(channel_id)
-            
             for channel in listfunds.get("channels", []):
                 scid = channel.get("short_channel_id", "")
-                if self._normalize_scid(scid) == normalized:
-                    our_amount_msat = channel.get("our_amount_msat", 0)
-                    if isinstance(our_amount_msat, str):
-                        our_amount_msat = int(our_amount_msat.replace("msat", ""))
-                    return our_amount_msat // 1000
+                if not scid:
+                    continue
+                our_amount_msat = channel.get("our_amount_msat", 0)
+                if isinstance(our_amount_msat, str):
+                    our_amount_msat = int(our_amount_msat.replace("msat", ""))
+                balances[self._normalize_scid(scid)] = our_amount_msat // 1000
         except Exception as e:
             self.plugin.log(f"Error getting channel balance: {e}", level='debug')
-        return 0
+        return balances
+
+    def _get_channel_local_balance(self, channel_id: str) -> int:
+        """Get current local balance of a channel in sats."""
+        return self._get_local_balances().get(self._normalize_scid(channel_id), 0)
 
     # NOTE: _get_channel_age_days removed - duplicate of EVRebalancer method and was never called
 
@@ -341,6 +374,10 @@ class JobManager:
         Returns:
             Dict with 'success' bool and 'message' or 'error'
         """
+        with self._lock:
+            return self._start_job(candidate, rebalance_id)
+
+    def _start_job(self, candidate: RebalanceCandidate, rebalance_id: int) -> Dict[str, Any]:
         normalized_scid = self._normalize_scid(candidate.to_channel)
         
         # Check if job already exists
@@ -482,9 +519,10 @@ class JobManager:
         Returns:
             True if job was stopped, False if not found or error
         """
-        normalized = self._normalize_scid(channel_id)
-        job = self._active_jobs.get(normalized)
-        
+        with self._lock:
+            normalized = self._normalize_scid(channel_id)
+            job = self._active_jobs.pop(normalized, None)
+
         if not job:
             return False
         
@@ -509,19 +547,24 @@ class JobManager:
         except Exception as e:
             self.plugin.log(f"Error stopping job {job.scid}: {e}", level='warn')
         
-        # Remove from tracking regardless
-        del self._active_jobs[normalized]
         return True
     
     def monitor_jobs(self) -> Dict[str, Any]:
         """
         Monitor all active jobs and handle completed/failed/timed-out ones.
         
-        This should be called periodically (e.g., every rebalance interval).
+        Called on its own short cadence (job_monitor_interval) so finished
+        jobs free their slots quickly, and at the start of each rebalance
+        cycle. Each pass takes ONE listfunds balance snapshot and ONE
+        sling-stats snapshot and evaluates every job against them.
         
         Returns:
             Summary dict with counts of various outcomes
         """
+        with self._lock:
+            return self._monitor_jobs()
+
+    def _monitor_jobs(self) -> Dict[str, Any]:
         summary = {
             "checked": 0,
             "completed": 0,
@@ -544,8 +587,9 @@ class JobManager:
         if not self._active_jobs:
             return summary
         
-        # Get sling stats for all jobs
+        # One snapshot of sling stats and channel balances for all jobs
         sling_stats = self._get_sling_stats()
+        balances = self._get_local_balances()
         
         # Copy keys to avoid modifying dict during iteration
         job_scids = list(self._active_jobs.keys())
@@ -560,12 +604,12 @@ class JobManager:
             # Check timeout first
             elapsed = now - job.start_time
             if elapsed > self.job_timeout_seconds:
-                self._handle_job_timeout(job)
+                self._handle_job_timeout(job, balances.get(job.scid_normalized, 0))
                 summary["timed_out"] += 1
                 continue
             
             # Check current channel balance for progress
-            current_balance = self._get_channel_local_balance(job.scid_normalized)
+            current_balance = balances.get(job.scid_normalized, 0)
             amount_transferred = current_balance - job.initial_local_sats
             
             # Get job-specific stats from sling
@@ -679,6 +723,10 @@ class JobManager:
             f"Fee: {fee_sats} sats, Profit: {actual_profit} sats"
         )
         
+        _REBALANCES.inc(outcome="success")
+        _REBALANCE_FEES.inc(fee_sats)
+        _REBALANCE_AMOUNT.inc(max(0, amount_transferred))
+
         # Update database
         self.database.update_rebalance_result(
             job.rebalance_id, 
@@ -729,6 +777,8 @@ class JobManager:
             level='warn'
         )
         
+        _REBALANCES.inc(outcome="failed")
+
         # Update database
         self.database.update_rebalance_result(
             job.rebalance_id,
@@ -766,6 +816,9 @@ class JobManager:
             level='warn'
         )
 
+        _REBALANCES.inc(outcome="exceeded_budget")
+        _REBALANCE_FEES.inc((fee_msat + 999) // 1000)
+
         # Update database (treat as failure with explicit error message)
         self.database.update_rebalance_result(
             job.rebalance_id,
@@ -792,15 +845,18 @@ class JobManager:
         # Stop the job
         self.stop_job(job.scid_normalized, reason="exceeded_budget")
 
-    def _handle_job_timeout(self, job: ActiveJob) -> None:
+    def _handle_job_timeout(self, job: ActiveJob, current_balance: Optional[int] = None) -> None:
         """Handle a timed-out job."""
         elapsed_hours = (int(time.time()) - job.start_time) / 3600
         
         # Check if any progress was made
-        current_balance = self._get_channel_local_balance(job.scid_normalized)
+        if current_balance is None:
+            current_balance = self._get_channel_local_balance(job.scid_normalized)
         amount_transferred = current_balance - job.initial_local_sats
         
+        _REBALANCES.inc(outcome="partial" if amount_transferred > 0 else "timeout")
         if amount_transferred > 0:
+            _REBALANCE_AMOUNT.inc(amount_transferred)
             # Partial success - still record the progress
             self.plugin.log(
                 f"Rebalance TIMEOUT (partial): {job.scid} after {elapsed_hours:.1f}h. "
@@ -1105,6 +1161,7 @@ class EVRebalancer:
         self._pending: Dict[str, int] = {}
         self._our_node_id: Optional[str] = None
         self._profitability_analyzer: Optional['ChannelProfitabilityAnalyzer'] = None
+        self._channel_state: Optional[ChannelStateModel] = None
 
         # NNLB health caching
         self._cached_health: Optional[Dict] = None
@@ -1112,6 +1169,22 @@ class EVRebalancer:
 
         # Initialize job manager for async execution (pass hive_bridge for outcome reporting)
         self.job_manager = JobManager(plugin, config, database, hive_bridge=hive_bridge)
+
+        # Local channel graph for last-hop / route fee estimation
+        self.channel_graph = ChannelGraph(plugin)
+
+        # Batched per-channel/per-peer lookups, set for the duration of
+        # find_rebalance_candidates (see _reads)
+        self._cycle_context: Optional[RebalanceCycleContext] = None
+        self.last_cycle_context_status: Optional[Dict[str, Any]] = None
+
+    @property
+    def _reads(self):
+        """
+        Source for per-channel/per-peer lookups: the preloaded cycle context
+        while a rebalance cycle is running, otherwise the database.
+        """
+        return self._cycle_context or self.database
     
     def _get_our_node_id(self) -> str:
         if self._our_node_id is None:
@@ -1168,6 +1241,9 @@ class EVRebalancer:
     def set_profitability_analyzer(self, analyzer: 'ChannelProfitabilityAnalyzer') -> None:
         self._profitability_analyzer = analyzer
 
+    def set_channel_state(self, channel_state: ChannelStateModel) -> None:
+        self._channel_state = channel_state
+
     def _calculate_nnlb_budget_multiplier(self) -> float:
         """
         Calculate OUR rebalance budget multiplier based on OUR health.
@@ -1212,6 +1288,7 @@ class EVRebalancer:
 
         return multiplier
 
+    @profiled_cycle("rebalance")
     def find_rebalance_candidates(self) -> List[RebalanceCandidate]:
         """
         Find channels that would benefit from rebalancing.
@@ -1223,13 +1300,18 @@ class EVRebalancer:
         4. Returns prioritized list of candidates
         
         Performance optimizations:
-        - Hoists listpeers RPC call to avoid N+1 queries
-        - Uses ephemeral fee cache for listchannels calls
+        - One listpeerchannels call (ChannelModel) replaces listfunds +
+          listpeers walks and the separate peer connectivity listpeers
+        - Fee estimates come from the local channel graph (refreshed here
+          when due) instead of per-peer listchannels/getroute calls
+        - Channel state, failure counts, cooldowns, peer uptime and inbound
+          fee history are loaded once per cycle (RebalanceCycleContext)
         """
         candidates = []
 
         # Initialize ephemeral fee cache for this run (cleared at end)
         self._fee_cache: Dict[str, Optional[int]] = {}
+        self._refresh_channel_graph()
 
         # Thread-safe config snapshot for this rebalance cycle
         cfg = self.config.snapshot()
@@ -1261,17 +1343,21 @@ class EVRebalancer:
                     f"{self.job_manager.max_concurrent_jobs} jobs active)"
                 )
                 return candidates
+
+            # Batch the per-channel/per-peer DB lookups used by EV analysis
+            self._load_cycle_context()
             
             # Check capital controls (pass cfg for thread-safe config access)
             if not self._check_capital_controls(cfg):
                 return candidates
             
-            channels = self._get_channels_with_balances()
-            if not channels:
+            # One listpeerchannels snapshot provides balances, fees, HTLCs
+            # and peer connectivity for the whole cycle
+            model = self._get_channel_model()
+            if not model:
                 return candidates
-            
-            # Hoist peer connection status call - do it once instead of per-candidate
-            peer_status = self._get_peer_connection_status()
+            channels = model.info_map()
+            peer_status = model.peer_status()
             
             # Get set of channels with active jobs
             active_channels = set(self.job_manager.active_channels)
@@ -1323,67 +1409,18 @@ class EVRebalancer:
                 f"(excluding {len(active_channels)} with active jobs)"
             )
             
-            for dest_id, dest_info, dest_ratio in depleted_channels:
-                if self._is_pending_with_backoff(dest_id): 
-                    continue
-                
-                # =====================================================================
-                # FUTILITY CIRCUIT BREAKER (TODO #15)
-                # =====================================================================
-                # Some channels have positive EV spreads but broken routing paths.
-                # Exponential backoff slows down retries, but doesn't stop them.
-                # After 10+ failures, the channel is likely a "Dead End" and further
-                # attempts waste gossip bandwidth and lock HTLCs.
-                #
-                # Hard Cap: If failed > 10 times, require 48h cooldown before retry
-                # =====================================================================
-                fail_count, last_fail = self.database.get_failure_count(dest_id)
-                if fail_count > 10:
-                    now = int(time.time())
-                    futility_cooldown = 172800  # 48 hours in seconds
-                    if (now - last_fail) < futility_cooldown:
-                        self.plugin.log(
-                            f"FUTILITY BREAKER: Skipping {dest_id[:12]}... - {fail_count} consecutive failures, "
-                            f"cooldown {(futility_cooldown - (now - last_fail)) // 3600}h remaining",
-                            level='debug'
-                        )
-                        continue
-                    else:
-                        # Cooldown expired - allow retry but log it
-                        self.plugin.log(
-                            f"FUTILITY BREAKER: {dest_id[:12]}... cooldown expired after {fail_count} failures, allowing retry",
-                            level='info'
-                        )
-                
-                # CONGESTION PROTECTION: Skip congested channels as rebalance destinations
-                # Rebalancing into a slot-congested channel can worsen HTLC contention
-                dest_state = self.database.get_channel_state(dest_id)
-                if dest_state and dest_state.get("state") == "congested":
-                    self.plugin.log(
-                        f"CONGESTION GUARD: Skipping {dest_id[:12]}... as rebalance target (HTLC slots stressed)",
-                        level='info'
-                    )
-                    continue
-                
-                last_rebalance = self.database.get_last_rebalance_time(dest_id)
-                if last_rebalance:
-                    cooldown = self.config.rebalance_cooldown_hours * 3600
-                    if int(time.time()) - last_rebalance < cooldown: 
-                        continue
-                
-                candidate = self._analyze_rebalance_ev(
-                    dest_id, dest_info, dest_ratio, source_channels, peer_status
-                )
-                if candidate:
-                    candidates.append(candidate)
-                    
-                    # Stop if we have enough candidates to fill available slots
-                    if len(candidates) >= available_slots:
-                        break
-            
+            ready_destinations = [
+                (dest_id, dest_info, dest_ratio)
+                for dest_id, dest_info, dest_ratio in depleted_channels
+                if self._destination_ready(dest_id)
+            ]
+            candidates = self._plan_rebalance_candidates(
+                ready_destinations, source_channels, peer_status, available_slots
+            )
+
             # Sort by priority
             def sort_key(c):
-                dest_state = self.database.get_channel_state(c.to_channel)
+                dest_state = self._reads.get_channel_state(c.to_channel)
                 flow_state = dest_state.get("state", "balanced") if dest_state else "balanced"
                 priority = 2 if flow_state == "source" else 1
                 return (priority, c.expected_profit_sats)
@@ -1394,8 +1431,9 @@ class EVRebalancer:
             return candidates[:available_slots]
         
         finally:
-            # Clear ephemeral fee cache at end of run
+            # Clear ephemeral fee cache and cycle lookups at end of run
             self._fee_cache = {}
+            self._cycle_context = None
             
             # Garbage Collection: Prune stale source failure counts (TODO #18)
             # BUG FIX: Use try/except to check if 'channels' exists (may not if early exception)
@@ -1406,6 +1444,78 @@ class EVRebalancer:
             except (NameError, Exception):
                 pass  # Don't fail the main method for GC errors
 
+    @timed_stage("db_prefetch")
+    def _load_cycle_context(self) -> None:
+        """Preload per-channel/per-peer lookups for this cycle (N+1 -> grouped queries)."""
+        try:
+            ctx = RebalanceCycleContext.load(self.database)
+        except Exception as e:
+            self.plugin.log(f"Rebalance cycle context unavailable, using per-row lookups: {e}",
+                            level='warn')
+            self._cycle_context = None
+            return
+        self._cycle_context = ctx
+        self.last_cycle_context_status = ctx.get_status()
+        self.plugin.log(
+            f"Rebalance cycle context loaded in {ctx.load_seconds * 1000:.1f}ms "
+            f"({self.last_cycle_context_status['channel_states']} channels, "
+            f"{self.last_cycle_context_status['peer_uptimes']} peers)",
+            level='debug'
+        )
+
+    def _destination_ready(self, dest_id: str) -> bool:
+        """
+        Destination checks that do not depend on EV: pending backoff,
+        futility breaker, congestion guard and rebalance cooldown.
+        """
+        if self._is_pending_with_backoff(dest_id):
+            return False
+        
+        # =====================================================================
+        # FUTILITY CIRCUIT BREAKER (TODO #15)
+        # =====================================================================
+        # Some channels have positive EV spreads but broken routing paths.
+        # Exponential backoff slows down retries, but doesn't stop them.
+        # After 10+ failures, the channel is likely a "Dead End" and further
+        # attempts waste gossip bandwidth and lock HTLCs.
+        #
+        # Hard Cap: If failed > 10 times, require 48h cooldown before retry
+        # =====================================================================
+        fail_count, last_fail = self._reads.get_failure_count(dest_id)
+        if fail_count > 10:
+            now = int(time.time())
+            futility_cooldown = 172800  # 48 hours in seconds
+            if (now - last_fail) < futility_cooldown:
+                self.plugin.log(
+                    f"FUTILITY BREAKER: Skipping {dest_id[:12]}... - {fail_count} consecutive failures, "
+                    f"cooldown {(futility_cooldown - (now - last_fail)) // 3600}h remaining",
+                    level='debug'
+                )
+                return False
+            else:
+                # Cooldown expired - allow retry but log it
+                self.plugin.log(
+                    f"FUTILITY BREAKER: {dest_id[:12]}... cooldown expired after {fail_count} failures, allowing retry",
+                    level='info'
+                )
+        
+        # CONGESTION PROTECTION: Skip congested channels as rebalance destinations
+        # Rebalancing into a slot-congested channel can worsen HTLC contention
+        dest_state = self._reads.get_channel_state(dest_id)
+        if dest_state and dest_state.get("state") == "congested":
+            self.plugin.log(
+                f"CONGESTION GUARD: Skipping {dest_id[:12]}... as rebalance target (HTLC slots stressed)",
+                level='info'
+            )
+            return False
+        
+        last_rebalance = self._reads.get_last_rebalance_time(dest_id)
+        if last_rebalance:
+            cooldown = self.config.rebalance_cooldown_hours * 3600
+            if int(time.time()) - last_rebalance < cooldown: 
+                return False
+        return True
+
     def _analyze_rebalance_ev(self, dest_channel: str, dest_info: Dict[str, Any],
                               dest_ratio: float,
                               sources: List[Tuple[str, Dict[str, Any], float]],
@@ -1416,6 +1526,9 @@ class EVRebalancer:
         This method now identifies ALL profitable source channels and includes them
         in the candidate. EV calculations are based on the primary (best) source,
         but additional sources serve as fallbacks for Sling's pathfinding.
+
+        Single-destination (greedy) path; find_rebalance_candidates plans all
+        destinations at once via _plan_rebalance_candidates.
         
         Args:
             dest_channel: Destination channel SCID
@@ -1424,7 +1537,30 @@ class EVRebalancer:
             sources: List of potential source channels
             peer_status: Pre-fetched peer connection status (optimization)
         """
-        dest_state = self.database.get_channel_state(dest_channel)
+        plan = self._prepare_destination(dest_channel, dest_info, dest_ratio)
+        if plan is None:
+            return None
+
+        # Get ALL profitable source candidates (sorted by score, best first)
+        source_candidates = self._select_source_candidates(
+            sources, plan.rebalance_amount, dest_channel, plan.outbound_fee_ppm,
+            plan.inbound_fee_ppm, peer_status=peer_status, is_hive_destination=plan.is_hive
+        )
+        
+        if not source_candidates: 
+            return None
+
+        return self._build_candidate(plan, source_candidates)
+
+    def _prepare_destination(self, dest_channel: str, dest_info: Dict[str, Any],
+                             dest_ratio: float) -> Optional[DestinationPlan]:
+        """
+        Destination checks, sizing and fee estimates (independent of the source).
+
+        Returns:
+            DestinationPlan, or None if the channel should not be filled
+        """
+        dest_state = self._reads.get_channel_state(dest_channel)
         dest_flow_state = dest_state.get("state", "unknown") if dest_state else "unknown"
         
         if dest_flow_state == "sink": 
@@ -1434,7 +1570,7 @@ class EVRebalancer:
         # Peers with low uptime (high disconnect rate) are unreliable rebalance targets
         dest_peer_id = dest_info.get("peer_id", "")
         if dest_peer_id:
-            uptime_pct = self.database.get_peer_uptime_percent(dest_peer_id, 86400)  # 24h window
+            uptime_pct = self._reads.get_peer_uptime_percent(dest_peer_id, 86400)  # 24h window
             if uptime_pct < 90.0:
                 self.plugin.log(
                     f"Skipping rebalance candidate {dest_peer_id}: unstable connection "
@@ -1671,100 +1807,14 @@ class EVRebalancer:
                 if policy.strategy == FeeStrategy.HIVE:
                     is_hive_destination = True
 
-        # Get ALL profitable source candidates (sorted by score, best first)
-        source_candidates = self._select_source_candidates(
-            sources, rebalance_amount, dest_channel, outbound_fee_ppm, inbound_fee_ppm,
-            peer_status=peer_status, is_hive_destination=is_hive_destination
-        )
-        
-        if not source_candidates: 
-            return None
-        
-        # Extract just the SCIDs for the candidate list
-        source_scids = [cid for cid, _, _, _ in source_candidates]
-        
-        # Use the PRIMARY (best) source for EV calculations
-        primary_source_id, primary_source_info, primary_score, primary_opp_cost = source_candidates[0]
-        
-        source_fee_ppm = primary_source_info.get("fee_ppm", 0)
-        source_capacity = primary_source_info.get("capacity", 1)
-        source_turnover_rate = self._calculate_turnover_rate(primary_source_id, source_capacity)
-        
-        # Use the primary source's opportunity cost for spread calculation
-        weighted_opp_cost = primary_opp_cost
-        spread_ppm = outbound_fee_ppm - inbound_fee_ppm - weighted_opp_cost
-        
-        # Allow slightly negative spread up to configured tolerance.
-        # A depleted channel earns nothing — small loss on rebalance is worth it.
-        tolerance_ppm = int((self.config.hive_rebalance_tolerance * 1_000_000) / max(amount_needed, 1))
-        if spread_ppm < -tolerance_ppm:
-            return None
-
-        # When spread is negative (within tolerance), budget is the tolerance amount
-        # we're willing to spend. When positive, budget is the spread itself.
-        effective_spread_ppm = max(1, spread_ppm) if spread_ppm > 0 else tolerance_ppm
-        raw_budget_msat = (effective_spread_ppm * amount_msat) // 1_000_000
-        # ZERO-TOLERANCE: Avoid a zero-sats budget due to integer truncation.
-        # We clamp to at least 1 sat (1000 msat). This is conservative: it makes EV slightly worse,
-        # and ensures execution can enforce a non-zero fee cap.
-        max_budget_msat = max(1000, raw_budget_msat)
-        # Use ceiling sats for conservative accounting.
-        max_budget_sats = (max_budget_msat + 999) // 1000
-        
-        # MAJOR-13 DOCUMENTATION: Modified Kelly Criterion for Per-Trade Sizing
-        #
-        # This is NOT classical Kelly for portfolio allocation. Instead, we apply
-        # Kelly scaling to each individual rebalance "bet" to size the maximum fee
-        # we're willing to pay based on:
-        #   - p: Success probability (peer reputation score, 0-1)
-        #   - b: Odds offered (outbound_fee_ppm / cost_ppm ratio)
-        #
-        # Kelly formula: f* = p - (1-p)/b
-        #   - If f* > 0: We have positive EV, scale budget by f* * kelly_fraction
-        #   - If f* <= 0: Negative EV, reject this rebalance
-        #
-        # The kelly_fraction (default 0.5 = "Half Kelly") reduces volatility drag.
-        # Full Kelly (1.0) maximizes theoretical growth but suffers from high variance.
-        #
-        # Note: This applies to max_budget_sats (the fee cap for this trade), not
-        # total routing capital. For daily budget management, see reserve_budget().
-        if self.config.enable_kelly:
-            reputation = self.database.get_peer_reputation(dest_info.get("peer_id", ""))
-            p = reputation.get('score', 0.5)  # Success probability
-            cost_ppm = inbound_fee_ppm + weighted_opp_cost
-            b = outbound_fee_ppm / cost_ppm if cost_ppm > 0 else float('inf')  # Odds
-            kelly_f = p - (1 - p) / b if b > 0 else -1.0  # Raw Kelly fraction
-            kelly_safe = min(kelly_f * self.config.kelly_fraction, 1.0)
-
-            if kelly_safe <= 0:
-                return None  # Negative EV, reject
-            max_budget_sats = int(max_budget_sats * kelly_safe)
-            max_budget_msat = max_budget_sats * 1000
-
-        if amount_msat > 0:
-            # ZERO-TOLERANCE: Derive max routing fee from the sats budget for this chunk.
-            # Our EV math subtracts max_budget_sats as a worst-case routing cost, so we must
-            # ensure execution cannot exceed that budget.
-            budget_ppm = (max_budget_msat * 1_000_000) // amount_msat if amount_msat > 0 else 0
-
-            # Optional heuristic upper bound, but ALWAYS clamp to the sats-budget-derived ppm.
-            heuristic_ppm = inbound_fee_ppm + (spread_ppm // 2)
-            max_fee_ppm = max(1, min(heuristic_ppm, budget_ppm)) if budget_ppm > 0 else 0
-        else:
-            max_fee_ppm = 0
-            
-        if max_fee_ppm <= 0: 
-            return None
-        
         dest_turnover_rate = self._calculate_turnover_rate(dest_channel, capacity)
         cooldown_days = self.config.rebalance_cooldown_hours / 24.0
         expected_utilization = max(min(dest_turnover_rate * cooldown_days, 1.0), 0.05)
-        
-        expected_income = (rebalance_amount * expected_utilization * outbound_fee_ppm) // 1_000_000
-        turnover_weight = min(1.0, source_turnover_rate * 7)
-        expected_source_loss = (rebalance_amount * expected_utilization * source_fee_ppm * turnover_weight) // 1_000_000
-        expected_profit = expected_income - max_budget_sats - expected_source_loss
-        
+
+        reputation = 0.5
+        if self.config.enable_kelly:
+            reputation = self.database.get_peer_reputation(dest_info.get("peer_id", "")).get('score', 0.5)
+
         # Strategic Rebalance Exemption: Dynamic threshold based on destination policy
         # PPM-BASED PROFIT GATE: When rebalance_min_profit_ppm > 0, the threshold
         # scales linearly with rebalance_amount, decoupling acceptance from chunk size.
@@ -1788,25 +1838,64 @@ class EVRebalancer:
         # A depleted channel earns nothing — small rebalance loss is worth it.
         profit_threshold = max(profit_threshold, -(self.config.hive_rebalance_tolerance))
 
-        is_hive_transfer = False
-        if self.policy_manager:
-            dest_peer_id = dest_info.get("peer_id", "")
-            if dest_peer_id:
-                policy = self.policy_manager.get_policy(dest_peer_id)
-                if policy.strategy == FeeStrategy.HIVE:
-                    is_hive_transfer = True
+        return DestinationPlan(
+            channel_id=dest_channel,
+            info=dest_info,
+            ratio=dest_ratio,
+            flow_state=dest_flow_state,
+            bleeder_status=dest_bleeder_status,
+            capacity=capacity,
+            amount_needed=amount_needed,
+            rebalance_amount=rebalance_amount,
+            outbound_fee_ppm=outbound_fee_ppm,
+            inbound_fee_ppm=inbound_fee_ppm,
+            is_hive=is_hive_destination,
+            turnover_rate=dest_turnover_rate,
+            utilization=expected_utilization,
+            reputation=reputation,
+            profit_threshold=profit_threshold
+        )
+
+    def _build_candidate(self, plan: DestinationPlan,
+                         source_candidates: List[Tuple[str, Dict[str, Any], float, int]]
+                         ) -> Optional[RebalanceCandidate]:
+        """
+        Final EV check and RebalanceCandidate for a destination, using the
+        first entry of `source_candidates` as the primary source.
+        """
+        dest_channel = plan.channel_id
+
+        # Extract just the SCIDs for the candidate list
+        source_scids = [cid for cid, _, _, _ in source_candidates]
+        
+        # Use the PRIMARY (best) source for EV calculations
+        primary_source_id, primary_source_info, primary_score, primary_opp_cost = source_candidates[0]
+        
+        source_fee_ppm = primary_source_info.get("fee_ppm", 0)
+        source_capacity = primary_source_info.get("capacity", 1)
+        source_turnover_rate = self._calculate_turnover_rate(primary_source_id, source_capacity)
+
+        # Spread, budget (incl. Modified Kelly sizing), fee cap and expected profit
+        # are shared with the planner's EV matrix; see rebalance_planner.evaluate_pair.
+        pair = evaluate_pair(
+            plan, primary_opp_cost, source_fee_ppm, source_turnover_rate,
+            EVParams.from_config(self.config)
+        )
+        if pair is None:
+            return None
+        expected_profit = pair.expected_profit
 
         # Check Profit against Dynamic Threshold
-        if expected_profit < profit_threshold:
+        if expected_profit < plan.profit_threshold:
             self.plugin.log(
-                f"REBALANCE SKIPPED: Profit {expected_profit} < Threshold {profit_threshold} "
+                f"REBALANCE SKIPPED: Profit {expected_profit} < Threshold {plan.profit_threshold} "
                 f"(tolerance={self.config.hive_rebalance_tolerance})",
                 level='debug'
             )
             return None
         
         # Log Success (Strategic override)
-        if is_hive_transfer and expected_profit < 0:
+        if plan.is_hive and expected_profit < 0:
             self.plugin.log(
                 f"STRATEGIC EXEMPTION: Allowing negative EV rebalance to Hive Peer {dest_channel}. "
                 f"Cost: {abs(expected_profit)} sats (Tolerance: {self.config.hive_rebalance_tolerance})",
@@ -1817,31 +1906,31 @@ class EVRebalancer:
             source_candidates=source_scids,
             to_channel=dest_channel,
             primary_source_peer_id=primary_source_info.get("peer_id", ""),
-            to_peer_id=dest_info.get("peer_id", ""),
-            amount_sats=rebalance_amount,
-            amount_msat=amount_msat,
-            outbound_fee_ppm=outbound_fee_ppm,
-            inbound_fee_ppm=inbound_fee_ppm,
+            to_peer_id=plan.info.get("peer_id", ""),
+            amount_sats=plan.rebalance_amount,
+            amount_msat=plan.amount_msat,
+            outbound_fee_ppm=plan.outbound_fee_ppm,
+            inbound_fee_ppm=plan.inbound_fee_ppm,
             source_fee_ppm=source_fee_ppm,
-            weighted_opp_cost_ppm=weighted_opp_cost,
-            spread_ppm=spread_ppm,
-            max_budget_sats=max_budget_sats,
-            max_budget_msat=max_budget_msat,
-            max_fee_ppm=max_fee_ppm,
+            weighted_opp_cost_ppm=primary_opp_cost,
+            spread_ppm=pair.spread_ppm,
+            max_budget_sats=pair.max_budget_sats,
+            max_budget_msat=pair.max_budget_msat,
+            max_fee_ppm=pair.max_fee_ppm,
             expected_profit_sats=expected_profit,
-            liquidity_ratio=dest_ratio,
-            dest_flow_state=dest_flow_state,
-            dest_turnover_rate=dest_turnover_rate,
+            liquidity_ratio=plan.ratio,
+            dest_flow_state=plan.flow_state,
+            dest_turnover_rate=plan.turnover_rate,
             source_turnover_rate=source_turnover_rate,
             reason_code=RebalanceReasonCode.EV_POSITIVE.value,
-            bleeder_status=dest_bleeder_status
+            bleeder_status=plan.bleeder_status
         )
 
     def _calculate_turnover_rate(self, channel_id: str, capacity: int) -> float:
         if capacity <= 0: 
             return 0.0
         try:
-            state = self.database.get_channel_state(channel_id)
+            state = self._reads.get_channel_state(channel_id)
             if not state: 
                 return 0.05
             volume = (state.get("sats_in", 0) + state.get("sats_out", 0)) / max(self.config.flow_window_days, 1)
@@ -1890,7 +1979,7 @@ class EVRebalancer:
         # Historical data accounts for actual multi-hop routes, not just last hop.
         # =====================================================================
 
-        hist_data = self.database.get_historical_inbound_fee_ppm(peer_id)
+        hist_data = self._reads.get_historical_inbound_fee_ppm(peer_id)
         last_hop = self._get_last_hop_fee(peer_id)
 
         if hist_data:
@@ -1960,13 +2049,28 @@ class EVRebalancer:
         )
         return 1000
 
+    @timed_stage("graph")
+    def _refresh_channel_graph(self) -> None:
+        """Refresh the local channel graph if its timer is due."""
+        try:
+            our_id = self._get_our_node_id()
+            if our_id:
+                self.channel_graph.set_our_node_id(our_id)
+            self.channel_graph.refresh()
+        except Exception as e:
+            self.plugin.log(f"Channel graph refresh failed: {e}", level='debug')
+
     def _get_last_hop_fee(self, peer_id: str) -> Optional[int]:
         """
         Get the fee for the last hop from a peer to us.
-        
-        Uses memoization via self._fee_cache to avoid repeated listchannels
-        RPC calls within a single find_rebalance_candidates run.
+
+        Served from the local channel graph table. Until the graph is loaded,
+        falls back to listchannels, memoized via self._fee_cache for the
+        current find_rebalance_candidates run.
         """
+        if self.channel_graph.ready:
+            return self.channel_graph.last_hop_fee(peer_id)
+
         # Check cache first (memoization for this run)
         if hasattr(self, '_fee_cache') and peer_id in self._fee_cache:
             return self._fee_cache[peer_id]
@@ -1993,6 +2097,9 @@ class EVRebalancer:
     def _get_route_fee_estimate(self, peer_id: str, amount_msat: int) -> Optional[int]:
         if amount_msat <= 0:
             return None
+        if self.channel_graph.ready:
+            # Local Dijkstra instead of a getroute round-trip per peer
+            return self.channel_graph.route_fee_ppm(peer_id, amount_msat)
         try:
             route = self.plugin.rpc.getroute(id=peer_id, amount_msat=amount_msat, riskfactor=10, maxhops=6)
             if route.get("route"):
@@ -2006,7 +2113,7 @@ class EVRebalancer:
 
     def _get_historical_inbound_fee(self, peer_id: str) -> Optional[int]:
         try:
-            hist = self.database.get_rebalance_history_by_peer(peer_id)
+            hist = self._reads.get_rebalance_history_by_peer(peer_id)
             if not hist: 
                 return None
             total_ppm, count = 0, 0
@@ -2050,28 +2157,113 @@ class EVRebalancer:
             List of (channel_id, info, score, weighted_opp_cost) tuples,
             sorted by score (highest first). Empty list if no profitable sources.
         """
+        options, base_rejections = self._prepare_source_options(sources, peer_status)
+
         candidates = []
+        params = EVParams.from_config(self.config)
+
+        # =================================================================
+        # PHASE 6: Rejection Diagnostics
+        # =================================================================
+        # Track why sources are rejected to help diagnose "0 candidates" cases
+        rejections = dict(base_rejections)
+        rejections.update({
+            'insufficient_balance': 0,
+            'negative_spread': 0,
+            'below_profit_threshold': 0
+        })
+        best_rejected_spread = None  # Track closest-to-profitable rejection
+
+        for opt in options:
+            # Skip if insufficient balance
+            if opt.spendable_sats < amount_needed:
+                rejections['insufficient_balance'] += 1
+                continue
+
+            # Calculate spread: what we earn minus what it costs
+            spread_ppm = dest_outbound_fee_ppm - dest_inbound_fee_ppm - opt.opp_cost_ppm
+
+            # Allow slightly negative spread to keep channels balanced and earning.
+            # A depleted channel earns nothing — small loss on rebalance is worth it.
+            tolerance_ppm = int((self.config.hive_rebalance_tolerance * 1_000_000) / max(amount_needed, 1))
+            if spread_ppm < -tolerance_ppm:
+                rejections['negative_spread'] += 1
+                # Track the best rejected spread for diagnostics
+                if best_rejected_spread is None or spread_ppm > best_rejected_spread['spread']:
+                    best_rejected_spread = {
+                        'channel': opt.channel_id,
+                        'spread': spread_ppm,
+                        'dest_fee': dest_outbound_fee_ppm,
+                        'inbound_fee': dest_inbound_fee_ppm,
+                        'opp_cost': opt.opp_cost_ppm,
+                        'flow_state': opt.flow_state,
+                        'is_hive': is_hive_destination
+                    }
+                continue
+
+            # Check minimum profit threshold
+            # PPM-BASED PROFIT GATE: Scale threshold with amount to decouple from chunk size
+            if not source_prefilter(spread_ppm, amount_needed, params):
+                rejections['below_profit_threshold'] += 1
+                continue
+
+            candidates.append((opt.channel_id, opt.info, opt.score, opt.opp_cost_ppm))
+
+        # Sort by score (highest first) so Sling tries most profitable sources first
+        candidates.sort(key=lambda x: x[2], reverse=True)
+
+        # =================================================================
+        # PHASE 6: Log Rejection Summary for Diagnostics
+        # =================================================================
+        total_rejected = sum(rejections.values())
+        if total_rejected > 0 and not candidates:
+            # No candidates found - log detailed breakdown
+            non_zero = {k: v for k, v in rejections.items() if v > 0}
+            self.plugin.log(
+                f"SOURCE REJECTION BREAKDOWN for {dest_channel[:12]}...: "
+                f"Evaluated {len(sources)} sources, {total_rejected} rejected: {non_zero}",
+                level='info'
+            )
+
+            # Log the "near miss" - closest to profitable
+            if best_rejected_spread:
+                b = best_rejected_spread
+                self.plugin.log(
+                    f"NEAR MISS: {b['channel'][:12]}... had spread={b['spread']} PPM "
+                    f"(need >0). Components: dest_fee={b['dest_fee']}, "
+                    f"inbound_cost={b['inbound_fee']}, opp_cost={b['opp_cost']} "
+                    f"(flow={b['flow_state']})",
+                    level='info'
+                )
+
+        return candidates
+
+    def _prepare_source_options(
+        self,
+        sources: List[Tuple[str, Dict[str, Any], float]],
+        peer_status: Optional[Dict] = None
+    ) -> Tuple[List[SourceOption], Dict[str, int]]:
+        """
+        Apply the destination-independent source checks and compute each
+        source's flow-aware opportunity cost and ordering score once.
+
+        Returns:
+            Tuple of (options, rejection counts)
+        """
+        options: List[SourceOption] = []
         # Use provided peer_status or fetch if not provided (fallback for direct calls)
         peers = peer_status if peer_status is not None else self._get_peer_connection_status()
 
         # Exclude sources with active jobs
         active_channels = set(self.job_manager.active_channels)
 
-        # =================================================================
-        # PHASE 6: Rejection Diagnostics
-        # =================================================================
-        # Track why sources are rejected to help diagnose "0 candidates" cases
         rejections = {
             'active_job': 0,
             'policy_blocked': 0,
-            'insufficient_balance': 0,
             'disconnected': 0,
             'unstable_uptime': 0,
-            'source_protected': 0,
-            'negative_spread': 0,
-            'below_profit_threshold': 0
+            'source_protected': 0
         }
-        best_rejected_spread = None  # Track closest-to-profitable rejection
 
         for cid, info, ratio in sources:
             # Skip if this source has an active job
@@ -2088,11 +2280,6 @@ class EVRebalancer:
                     rejections['policy_blocked'] += 1
                     continue
 
-            # Skip if insufficient balance
-            if info.get("spendable_sats", 0) < amount_needed:
-                rejections['insufficient_balance'] += 1
-                continue
-
             # Skip disconnected peers
             if pid and pid in peers and not peers[pid].get("connected"):
                 rejections['disconnected'] += 1
@@ -2101,7 +2288,7 @@ class EVRebalancer:
             # FLAP PROTECTION: Skip unstable source peers
             # Peers with low uptime (high disconnect rate) are unreliable rebalance sources
             if pid:
-                uptime_pct = self.database.get_peer_uptime_percent(pid, 86400)  # 24h window
+                uptime_pct = self._reads.get_peer_uptime_percent(pid, 86400)  # 24h window
                 if uptime_pct < 90.0:
                     rejections['unstable_uptime'] += 1
                     self.plugin.log(
@@ -2111,13 +2298,17 @@ class EVRebalancer:
                     )
                     continue
 
+            # Get flow state FIRST - needed for source protection and
+            # flow-aware opportunity cost
+            state = self._reads.get_channel_state(cid)
+            flow_state = state.get("state", "balanced") if state else "balanced"
+
             # SOURCE PROTECTION (Anti-Cannibalization)
             # Prevent draining our best source channels unless they are overflowing.
             # A "Source" is meant to sell INBOUND liquidity. Rebalancing OUT destroys that value.
             #
             # RELAXED MODE: Only allow if local balance > 80% (outbound_ratio > 0.8)
-            state = self.database.get_channel_state(cid)
-            if state and state.get("state") == "source":
+            if flow_state == "source":
                 if ratio < 0.80:
                     rejections['source_protected'] += 1
                     self.plugin.log(
@@ -2132,10 +2323,6 @@ class EVRebalancer:
             source_capacity = info.get("capacity", 1)
             source_turnover_rate = self._calculate_turnover_rate(cid, source_capacity)
 
-            # Get flow state FIRST - needed for flow-aware opportunity cost
-            state = self.database.get_channel_state(cid)
-            flow_state = state.get("state", "balanced") if state else "balanced"
-
             # =================================================================
             # FLOW-AWARE OPPORTUNITY COST (Phase 6 Enhancement)
             # =================================================================
@@ -2178,41 +2365,6 @@ class EVRebalancer:
             turnover_weight = base_turnover_weight * flow_multiplier
             weighted_opp_cost = int(source_fee_ppm * turnover_weight)
 
-            # Calculate spread: what we earn minus what it costs
-            spread_ppm = dest_outbound_fee_ppm - dest_inbound_fee_ppm - weighted_opp_cost
-
-            # Allow slightly negative spread to keep channels balanced and earning.
-            # A depleted channel earns nothing — small loss on rebalance is worth it.
-            tolerance_ppm = int((self.config.hive_rebalance_tolerance * 1_000_000) / max(amount_needed, 1))
-            min_spread = -tolerance_ppm
-
-            # Only include sources meeting spread threshold
-            if spread_ppm < min_spread:
-                rejections['negative_spread'] += 1
-                # Track the best rejected spread for diagnostics
-                if best_rejected_spread is None or spread_ppm > best_rejected_spread['spread']:
-                    best_rejected_spread = {
-                        'channel': cid,
-                        'spread': spread_ppm,
-                        'dest_fee': dest_outbound_fee_ppm,
-                        'inbound_fee': dest_inbound_fee_ppm,
-                        'opp_cost': weighted_opp_cost,
-                        'flow_state': flow_state,
-                        'is_hive': is_hive_destination
-                    }
-                continue
-
-            # Check minimum profit threshold
-            # PPM-BASED PROFIT GATE: Scale threshold with amount to decouple from chunk size
-            expected_profit_estimate = (spread_ppm * amount_needed) // 1_000_000
-            if self.config.rebalance_min_profit_ppm > 0:
-                min_profit_threshold = (amount_needed * self.config.rebalance_min_profit_ppm) // 1_000_000
-            else:
-                min_profit_threshold = self.config.rebalance_min_profit
-            if expected_profit_estimate < min_profit_threshold:
-                rejections['below_profit_threshold'] += 1
-                continue
-
             # Calculate score for sorting (higher is better)
             score = (ratio * 50) - (source_fee_ppm / 10)
 
@@ -2236,36 +2388,99 @@ class EVRebalancer:
                     f"Applying reliability penalty to {cid}: -{penalty:.1f} (fails: {fails:.1f})",
                     level='debug'
                 )
-            
-            candidates.append((cid, info, score, weighted_opp_cost))
 
-        # Sort by score (highest first) so Sling tries most profitable sources first
-        candidates.sort(key=lambda x: x[2], reverse=True)
+            options.append(SourceOption(
+                channel_id=cid,
+                info=info,
+                ratio=ratio,
+                flow_state=flow_state,
+                fee_ppm=info.get("fee_ppm", 0),
+                turnover_rate=source_turnover_rate,
+                opp_cost_ppm=weighted_opp_cost,
+                score=score,
+                spendable_sats=info.get("spendable_sats", 0)
+            ))
+
+        return options, rejections
+
+    def _plan_rebalance_candidates(
+        self,
+        destinations: List[Tuple[str, Dict[str, Any], float]],
+        sources: List[Tuple[str, Dict[str, Any], float]],
+        peer_status: Optional[Dict],
+        slots: int
+    ) -> List[RebalanceCandidate]:
+        """
+        Plan rebalances for all ready destinations at once.
 
-        # =================================================================
-        # PHASE 6: Log Rejection Summary for Diagnostics
-        # =================================================================
-        total_rejected = sum(rejections.values())
-        if total_rejected > 0 and not candidates:
-            # No candidates found - log detailed breakdown
-            non_zero = {k: v for k, v in rejections.items() if v > 0}
+        Every destination and source is prepared once, the destination x source
+        EV matrix is built in one pass and sources are assigned with a
+        capacity-constrained min-cost flow (see rebalance_planner). Each
+        candidate lists its assigned primary source first, followed by the
+        destination's other feasible sources by score as Sling fallbacks.
+
+        Args:
+            destinations: (channel_id, info, outbound_ratio) of depleted channels
+                that passed _destination_ready()
+            sources: (channel_id, info, outbound_ratio) of source channels
+            peer_status: Pre-fetched peer connection status
+            slots: Maximum number of candidates to return
+
+        Returns:
+            List of RebalanceCandidate (unsorted)
+        """
+        if not destinations or not sources or slots <= 0:
+            return []
+
+        plans = []
+        with stage("prepare"):
+            for dest_id, dest_info, dest_ratio in destinations:
+                begin_channel(dest_id)
+                plan = self._prepare_destination(dest_id, dest_info, dest_ratio)
+                if plan is not None:
+                    plans.append(plan)
+            end_channel()
+        if not plans:
+            return []
+
+        with stage("prepare"):
+            options, _ = self._prepare_source_options(sources, peer_status)
+        if not options:
             self.plugin.log(
-                f"SOURCE REJECTION BREAKDOWN for {dest_channel[:12]}...: "
-                f"Evaluated {len(sources)} sources, {total_rejected} rejected: {non_zero}",
+                f"Rebalance planner: no usable sources for {len(plans)} destinations",
                 level='info'
             )
+            return []
 
-            # Log the "near miss" - closest to profitable
-            if best_rejected_spread:
-                b = best_rejected_spread
-                self.plugin.log(
-                    f"NEAR MISS: {b['channel'][:12]}... had spread={b['spread']} PPM "
-                    f"(need >0). Components: dest_fee={b['dest_fee']}, "
-                    f"inbound_cost={b['inbound_fee']}, opp_cost={b['opp_cost']} "
-                    f"(flow={b['flow_state']})",
-                    level='info'
-                )
+        with stage("planning"):
+            params = EVParams.from_config(self.config)
+            profit, feasible = ev_matrix(plans, options, params)
 
+            # A source can fund one chunk per spendable chunk-size of balance
+            # (pairs it cannot fund at all are already infeasible in the matrix)
+            chunk = max(1, self.config.sling_chunk_size_sats)
+            capacities = [max(opt.spendable_sats // chunk, 1) for opt in options]
+            assignment = assign_sources(profit, feasible, capacities, slots)
+
+        by_score = sorted(range(len(options)), key=lambda s: options[s].score, reverse=True)
+        candidates = []
+        for d, primary in assignment.items():
+            plan = plans[d]
+            ordered = [primary] + [s for s in by_score if s != primary and feasible[d][s]]
+            source_candidates = [
+                (options[s].channel_id, options[s].info, options[s].score, options[s].opp_cost_ppm)
+                for s in ordered
+            ]
+            candidate = self._build_candidate(plan, source_candidates)
+            if candidate:
+                candidates.append(candidate)
+
+        total_profit = sum(c.expected_profit_sats for c in candidates)
+        self.plugin.log(
+            f"Rebalance planner: {len(plans)} destinations x {len(options)} sources, "
+            f"{len(candidates)} assigned (expected profit {total_profit} sats)",
+            level='debug'
+        )
         return candidates
 
     def _get_peer_connection_status(self) -> Dict:
@@ -2277,58 +2492,24 @@ class EVRebalancer:
             pass
         return status
 
-    def _get_channels_with_balances(self) -> Dict[str, Dict[str, Any]]:
-        """Get all channels with their current balances and fee info."""
-        channels = {}
+    def _get_channel_model(self) -> Optional[ChannelModel]:
+        """
+        Snapshot all active channels (balances, fees, HTLCs, peer
+        connectivity) from the channel state model, or from a single
+        listpeerchannels call when the model is not available.
+        """
         try:
-            listfunds = self.plugin.rpc.listfunds()
-            listpeers = self.plugin.rpc.listpeers()
-            
-            # Build peer info map
-            peer_info = {}
-            for peer in listpeers.get("peers", []):
-                peer_id = peer.get("id")
-                for ch in peer.get("channels", []):
-                    scid = ch.get("short_channel_id")
-                    if scid and ch.get("state") == "CHANNELD_NORMAL":
-                        peer_info[scid] = {
-                            "peer_id": peer_id,
-                            "fee_ppm": ch.get("fee_proportional_millionths", 0),
-                            "base_fee_msat": ch.get("fee_base_msat", 0),
-                            "htlcs": len(ch.get("htlcs", []))
-                        }
-            
-            # Get balances from listfunds
-            for channel in listfunds.get("channels", []):
-                if channel.get("state") != "CHANNELD_NORMAL":
-                    continue
-                    
-                scid = channel.get("short_channel_id", "")
-                if not scid:
-                    continue
-                
-                our_amount_msat = channel.get("our_amount_msat", 0)
-                if isinstance(our_amount_msat, str):
-                    our_amount_msat = int(our_amount_msat.replace("msat", ""))
-                
-                amount_msat = channel.get("amount_msat", 0)
-                if isinstance(amount_msat, str):
-                    amount_msat = int(amount_msat.replace("msat", ""))
-                
-                info = peer_info.get(scid, {})
-                channels[scid] = {
-                    "capacity": amount_msat // 1000,
-                    "spendable_sats": our_amount_msat // 1000,
-                    "peer_id": info.get("peer_id", channel.get("peer_id", "")),
-                    "fee_ppm": info.get("fee_ppm", 0),
-                    "base_fee_msat": info.get("base_fee_msat", 0),
-                    "htlcs": info.get("htlcs", 0)
-                }
-                
+            if self._channel_state is not None and self._channel_state.ready:
+                return self._channel_state.channel_model()
+            return ChannelModel.fetch(self.plugin)
         except Exception as e:
             self.plugin.log(f"Error getting channel balances: {e}", level='error')
-        
-        return channels
+            return None
+
+    def _get_channels_with_balances(self) -> Dict[str, Dict[str, Any]]:
+        """Get all channels with their current balances and fee info."""
+        model = self._get_channel_model()
+        return model.info_map() if model else {}
 
     def execute_rebalance(self, candidate: RebalanceCandidate, **kwargs) -> Dict[str, Any]:
         """
@@ -2747,7 +2928,7 @@ class EVRebalancer:
         if pending_time == 0: 
             return False
         
-        failure_count, _ = self.database.get_failure_count(channel_id)
+        failure_count, _ = self._reads.get_failure_count(channel_id)
         base_cooldown = 600
         cooldown = base_cooldown * (2 ** min(failure_count, 4))
         
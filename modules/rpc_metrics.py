@@ -0,0 +1,262 @@
+"""
+RPC Metrics module for cl-revenue-ops
+
+Per-method and per-group instrumentation of the RPC broker.
+
+Every call through ThreadSafeRpcProxy.call is recorded with its latency
+and outcome (ok, rpc_error, timeout, breaker_open, exception). The broker
+adds the time spent waiting for its call lock and the serialized size of
+each response, and counts its own restarts.
+
+Latencies go into fixed-bucket histograms (LATENCY_BUCKETS_MS), so memory
+is bounded per method and group histograms are the sum of their methods'
+buckets. Percentiles are interpolated within a bucket, which is accurate to
+the bucket width: plenty to tell a 20ms listpeerchannels from a 4s
+listchannels.
+"""
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .openmetrics import MetricFamily
+
+
+# Upper bounds (ms). Calls slower than the last bound land in an overflow bucket.
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 15000, 30000, 60000,
+)
+
+OUTCOMES = ("ok", "rpc_error", "timeout", "breaker_open", "exception")
+
+MAX_RESTART_HISTORY = 20
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (milliseconds)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0-100), interpolating within the bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+                upper = min(upper, self.max_ms)
+                if upper <= lower:
+                    return round(upper, 1)
+                return round(lower + (upper - lower) * (rank - seen) / n, 1)
+            seen += n
+        return round(self.max_ms, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "total_ms": round(self.total_ms, 1),
+        }
+
+
+class _MethodStats:
+    """Counters for one RPC method."""
+
+    def __init__(self, group: str):
+        self.group = group
+        self.outcomes = {outcome: 0 for outcome in OUTCOMES}
+        self.latency = LatencyHistogram()
+        self.lock_wait = LatencyHistogram()
+        self.responses = 0
+        self.response_bytes = 0
+        self.max_response_bytes = 0
+
+    @property
+    def calls(self) -> int:
+        return sum(self.outcomes.values())
+
+    @property
+    def errors(self) -> int:
+        return self.calls - self.outcomes["ok"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "group": self.group,
+            "calls": self.calls,
+            "errors": self.errors,
+            "outcomes": {k: v for k, v in self.outcomes.items() if v},
+            "latency": self.latency.to_dict(),
+            "lock_wait": self.lock_wait.to_dict(),
+            "response_bytes": {
+                "total": self.response_bytes,
+                "mean": self.response_bytes // self.responses if self.responses else 0,
+                "max": self.max_response_bytes,
+            },
+        }
+
+
+class RpcMetrics:
+    """Thread-safe collector shared by the RPC broker and the RPC proxy."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queued = 0    # calls waiting for the broker lock (live, never reset)
+        self._reset_locked()
+
+    def _reset_locked(self) -> None:
+        self._methods: Dict[str, _MethodStats] = {}
+        self._restarts: List[Dict[str, Any]] = []
+        self._restart_count = 0
+        self._since = self._clock()
+
+    def _stats(self, method: str, group: Optional[str] = None) -> _MethodStats:
+        stats = self._methods.get(method)
+        if stats is None:
+            stats = self._methods[method] = _MethodStats(group or "general")
+        elif group:
+            stats.group = group
+        return stats
+
+    # =========================================================================
+    # Recording
+    # =========================================================================
+
+    def record_call(self, method: str, group: str, seconds: Optional[float],
+                    outcome: str = "ok") -> None:
+        """One proxy call. seconds is None for calls rejected without a request."""
+        with self._lock:
+            stats = self._stats(method, group)
+            stats.outcomes[outcome] += 1
+            if seconds is not None:
+                stats.latency.observe(seconds * 1000.0)
+
+    def record_queued(self) -> None:
+        """A call started waiting for the broker lock; record_lock_wait ends the wait."""
+        with self._lock:
+            self._queued += 1
+
+    def record_lock_wait(self, method: str, seconds: float) -> None:
+        with self._lock:
+            self._queued = max(0, self._queued - 1)
+            self._stats(method).lock_wait.observe(seconds * 1000.0)
+
+    def record_response(self, method: str, size_bytes: int) -> None:
+        with self._lock:
+            stats = self._stats(method)
+            stats.responses += 1
+            stats.response_bytes += size_bytes
+            if size_bytes > stats.max_response_bytes:
+                stats.max_response_bytes = size_bytes
+
+    def record_restart(self, reason: str) -> None:
+        with self._lock:
+            self._restart_count += 1
+            self._restarts.append({"ts": int(self._clock()), "reason": reason})
+            del self._restarts[:-MAX_RESTART_HISTORY]
+
+    # =========================================================================
+    # Reporting
+    # =========================================================================
+
+    def snapshot(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Per-method and per-group stats, slowest (by total time) first.
+
+        With reset=True the counters restart from zero after the snapshot.
+        """
+        with self._lock:
+            groups: Dict[str, Dict[str, Any]] = {}
+            for stats in self._methods.values():
+                agg = groups.setdefault(stats.group, {
+                    "calls": 0, "errors": 0, "response_bytes": 0,
+                    "latency": LatencyHistogram(), "lock_wait": LatencyHistogram(),
+                })
+                agg["calls"] += stats.calls
+                agg["errors"] += stats.errors
+                agg["response_bytes"] += stats.response_bytes
+                agg["latency"].merge(stats.latency)
+                agg["lock_wait"].merge(stats.lock_wait)
+
+            methods = sorted(self._methods.items(),
+                             key=lambda item: item[1].latency.total_ms, reverse=True)
+            now = self._clock()
+            result = {
+                "since": int(self._since),
+                "window_seconds": int(now - self._since),
+                "calls": sum(s.calls for s in self._methods.values()),
+                "errors": sum(s.errors for s in self._methods.values()),
+                "broker_restarts": self._restart_count,
+                "queued": self._queued,
+                "recent_restarts": list(self._restarts),
+                "groups": {
+                    name: {
+                        "calls": agg["calls"],
+                        "errors": agg["errors"],
+                        "response_bytes": agg["response_bytes"],
+                        "latency": agg["latency"].to_dict(),
+                        "lock_wait": agg["lock_wait"].to_dict(),
+                    }
+                    for name, agg in sorted(groups.items())
+                },
+                "methods": {name: stats.to_dict() for name, stats in methods},
+            }
+            if reset:
+                self._reset_locked()
+            return result
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """OpenMetrics families straight from the histogram buckets."""
+        buckets = [ms / 1000.0 for ms in LATENCY_BUCKETS_MS]
+        latency = MetricFamily("revenue_ops_rpc_latency_seconds", "histogram",
+                               "RPC latency through the broker", ("method", "group"), buckets)
+        lock_wait = MetricFamily("revenue_ops_rpc_lock_wait_seconds", "histogram",
+                                 "Time RPC calls waited for the broker", ("method",), buckets)
+        calls = MetricFamily("revenue_ops_rpc_calls", "counter",
+                             "RPC calls by outcome", ("method", "outcome"))
+        response_bytes = MetricFamily("revenue_ops_rpc_response_bytes", "counter",
+                                      "Serialized size of RPC responses", ("method",))
+        restarts = MetricFamily("revenue_ops_rpc_broker_restarts", "counter",
+                                "RPC broker subprocess restarts")
+        queued = MetricFamily("revenue_ops_rpc_queued_calls", "gauge",
+                              "RPC calls waiting for the broker right now")
+        with self._lock:
+            for method, stats in self._methods.items():
+                latency.set_histogram(stats.latency.counts, stats.latency.total_ms / 1000.0,
+                                      method=method, group=stats.group)
+                lock_wait.set_histogram(stats.lock_wait.counts, stats.lock_wait.total_ms / 1000.0,
+                                        method=method)
+                for outcome, n in stats.outcomes.items():
+                    if n:
+                        calls.set(n, method=method, outcome=outcome)
+                if stats.responses:
+                    response_bytes.set(stats.response_bytes, method=method)
+            restarts.set(self._restart_count)
+            queued.set(self._queued)
+        return [latency, lock_wait, calls, response_bytes, restarts, queued]
@@ -0,0 +1,346 @@
+"""
+Task Scheduler module for cl-revenue-ops
+
+Single dispatcher for the plugin's periodic work.
+
+Flow analysis, fee adjustment, rebalance checks, job monitoring and the
+snapshot jobs used to run in their own daemon threads, each sleeping with
+its own jitter. They competed blindly for the single RPC broker and SQLite
+writer, and database maintenance (including VACUUM) ran inline in the flow
+loop. The Scheduler owns all of them:
+
+- priority:    among due tasks the lowest priority value starts first
+- after:       a task waits while any task it runs after is running or due,
+               and until each of them has completed once (fee after flow)
+- conflicts:   a task is deferred while a conflicting task is running
+               (rebalance waits for a fee cycle holding the broker)
+- concurrency: per-task limit on simultaneous runs, plus a global worker cap
+- idle_only:   maintenance runs only when no regular task is running or due
+               soon (light pollers set blocks_idle=False); max_delay bounds
+               how long it can be deferred
+- history:     every run is recorded with its lateness (start - due time)
+"""
+
+import heapq
+import queue
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Type, Union
+
+from .openmetrics import MetricFamily
+
+
+# Idle windows: no regular task running and none due within this many seconds
+IDLE_WINDOW_SECONDS = 120
+
+# Dispatcher wakes at least this often (shutdown checks, newly due tasks)
+MAX_DISPATCH_WAIT = 1.0
+
+HISTORY_SIZE = 100
+
+
+@dataclass
+class Task:
+    """A unit of periodic (or one-shot) work owned by the Scheduler."""
+    name: str
+    func: Callable[[], Any]
+    interval: Union[float, Callable[[], float]]  # seconds, or re-evaluated per run
+    priority: int = 50                 # lower runs first
+    initial_delay: float = 0.0
+    jitter: float = 0.0                # +/- fraction of the interval
+    after: Tuple[str, ...] = ()
+    conflicts: Tuple[str, ...] = ()
+    max_concurrent: int = 1
+    idle_only: bool = False
+    max_delay: Optional[float] = None  # idle_only: run anyway once this late
+    one_shot: bool = False
+    blocks_idle: bool = True           # False for light, frequent pollers
+    enabled: Callable[[], bool] = lambda: True
+
+    # Runtime state
+    next_run: float = 0.0
+    running: int = 0
+    runs: int = 0
+    failures: int = 0
+    completed_once: bool = False
+    last_started: float = 0.0
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+    total_lateness: float = 0.0
+    max_lateness: float = 0.0
+    last_error: Optional[str] = None
+    last_interval: Optional[float] = None
+    done: bool = False
+
+    def interval_seconds(self) -> float:
+        return float(self.interval() if callable(self.interval) else self.interval)
+
+    def jittered_interval(self) -> float:
+        base = self.interval_seconds()
+        self.last_interval = base
+        if not self.jitter:
+            return base
+        spread = int(base * self.jitter)
+        return base + random.randint(-spread, spread)
+
+
+class Scheduler:
+    """
+    Priority scheduler for the plugin's background tasks.
+
+    Call add() for each task, then start(); the dispatcher thread runs until
+    shutdown_event is set. Runs execute on a fixed pool of max_workers
+    long-lived worker threads, so per-thread resources (the thread-local
+    database connection) are reused across runs; on_worker_exit is called
+    on each worker as it stops. Tests supply an executor to run tasks inline.
+    """
+
+    def __init__(self, plugin, shutdown_event: threading.Event,
+                 max_workers: int = 3,
+                 degraded_errors: Tuple[Type[BaseException], ...] = (),
+                 executor: Optional[Callable[[Callable[[], None]], None]] = None,
+                 clock: Callable[[], float] = time.time,
+                 on_worker_exit: Optional[Callable[[], None]] = None):
+        self.plugin = plugin
+        self.shutdown_event = shutdown_event
+        self.max_workers = max_workers
+        self.degraded_errors = degraded_errors
+        self._pooled = executor is None
+        self._executor = executor or self._submit
+        self._clock = clock
+        self._on_worker_exit = on_worker_exit
+        self._queue: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._tasks: Dict[str, Task] = {}
+        self._history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+        self._running_total = 0
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+
+    def add(self, task: Task) -> Task:
+        with self._lock:
+            task.next_run = self._clock() + task.initial_delay
+            self._tasks[task.name] = task
+            self._wakeup.notify()
+        return task
+
+    def get(self, name: str) -> Optional[Task]:
+        return self._tasks.get(name)
+
+    def start(self) -> None:
+        self.started_at = self._clock()
+        if self._pooled:
+            for i in range(self.max_workers):
+                worker = threading.Thread(target=self._worker_loop, daemon=True,
+                                          name=f"scheduler-worker-{i}")
+                worker.start()
+                self._workers.append(worker)
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True, name="scheduler")
+        self._thread.start()
+
+    def wake(self) -> None:
+        with self._lock:
+            self._wakeup.notify()
+
+    def _submit(self, fn: Callable[[], None]) -> None:
+        # The dispatcher launches at most max_workers runs at a time, so a
+        # run never waits long for a free worker
+        self._queue.put(fn)
+
+    def _worker_loop(self) -> None:
+        try:
+            while not self.shutdown_event.is_set():
+                try:
+                    fn = self._queue.get(timeout=MAX_DISPATCH_WAIT)
+                except queue.Empty:
+                    continue
+                fn()
+        finally:
+            if self._on_worker_exit is not None:
+                try:
+                    self._on_worker_exit()
+                except Exception as e:
+                    self.plugin.log(f"Scheduler worker cleanup failed: {e}", level='debug')
+
+    # =========================================================================
+    # Dispatch
+    # =========================================================================
+
+    def _dispatch_loop(self) -> None:
+        while not self.shutdown_event.is_set():
+            wait = self.tick()
+            with self._lock:
+                self._wakeup.wait(min(wait, MAX_DISPATCH_WAIT))
+
+    def _is_due_soon(self, task: Task, now: float, window: float) -> bool:
+        return (not task.done and not task.idle_only and task.blocks_idle
+                and task.enabled() and task.next_run <= now + window)
+
+    def _runnable(self, task: Task, now: float) -> bool:
+        if task.running >= task.max_concurrent:
+            return False
+        for name in task.conflicts:
+            other = self._tasks.get(name)
+            if other is not None and other.running:
+                return False
+        for name in task.after:
+            other = self._tasks.get(name)
+            if other is None or other.done or not other.enabled():
+                continue
+            if other.running or not other.completed_once or other.next_run <= now:
+                return False
+        if task.idle_only:
+            overdue = task.max_delay is not None and now - task.next_run >= task.max_delay
+            if not overdue:
+                busy = any(t.running and t.blocks_idle and not t.idle_only
+                           for t in self._tasks.values())
+                soon = any(self._is_due_soon(t, now, IDLE_WINDOW_SECONDS)
+                           for t in self._tasks.values() if t is not task)
+                if busy or soon:
+                    return False
+        return True
+
+    def tick(self, now: Optional[float] = None) -> float:
+        """
+        Start every due task that may run now, highest priority first.
+
+        Returns the seconds until the next task is due (for the dispatcher).
+        """
+        now = self._clock() if now is None else now
+        with self._lock:
+            due = [
+                (t.priority, t.next_run, t.name) for t in self._tasks.values()
+                if not t.done and t.next_run <= now
+            ]
+            heapq.heapify(due)
+            while due and self._running_total < self.max_workers:
+                _, _, name = heapq.heappop(due)
+                task = self._tasks[name]
+                if not task.enabled():
+                    task.next_run = now + task.jittered_interval()
+                    continue
+                if self._runnable(task, now):
+                    self._launch(task, now)
+
+            pending = [t.next_run for t in self._tasks.values() if not t.done]
+        if not pending:
+            return MAX_DISPATCH_WAIT
+        return max(0.0, min(pending) - now)
+
+    def _launch(self, task: Task, now: float) -> None:
+        due_at = task.next_run
+        lateness = max(0.0, now - due_at)
+        task.running += 1
+        task.last_started = now
+        task.total_lateness += lateness
+        task.max_lateness = max(task.max_lateness, lateness)
+        self._running_total += 1
+        if task.max_concurrent > 1:
+            # Fixed rate: the next run may overlap this one
+            task.next_run = now + task.jittered_interval()
+        else:
+            # Rescheduled on completion (fixed delay, as the old loops slept)
+            task.next_run = float('inf')
+        self._executor(lambda: self._run(task, due_at, now, lateness))
+
+    def _run(self, task: Task, due_at: float, started: float, lateness: float) -> None:
+        status, error = "ok", None
+        try:
+            task.func()
+        except self.degraded_errors as e:
+            status, error = "degraded", str(e)
+            self.plugin.log(f"RPC degraded in {task.name}: {e}. Skipping this cycle.", level='warn')
+        except Exception as e:
+            status, error = "error", str(e)
+            self.plugin.log(f"Error in {task.name}: {e}", level='error')
+        finished = self._clock()
+        duration = max(0.0, finished - started)
+
+        with self._lock:
+            task.running -= 1
+            self._running_total -= 1
+            task.runs += 1
+            task.last_duration = duration
+            task.total_duration += duration
+            task.completed_once = True
+            if status != "ok":
+                task.failures += 1
+                task.last_error = error
+            if task.one_shot:
+                task.done = True
+            elif task.max_concurrent == 1:
+                task.next_run = finished + task.jittered_interval()
+            self._history.append({
+                "task": task.name,
+                "due_at": int(due_at),
+                "started_at": int(started),
+                "lateness_s": round(lateness, 1),
+                "duration_s": round(duration, 2),
+                "status": status,
+                "error": error,
+            })
+            self._wakeup.notify()
+
+    # =========================================================================
+    # Status
+    # =========================================================================
+
+    def get_status(self, history_limit: int = 20) -> Dict[str, Any]:
+        now = self._clock()
+        with self._lock:
+            tasks = {}
+            for t in sorted(self._tasks.values(), key=lambda t: t.priority):
+                tasks[t.name] = {
+                    "priority": t.priority,
+                    "enabled": t.enabled(),
+                    "interval_s": (round(t.last_interval) if t.last_interval is not None
+                                   else None),
+                    "running": t.running,
+                    "runs": t.runs,
+                    "failures": t.failures,
+                    "next_run_in_s": (None if t.done or t.next_run == float('inf')
+                                      else round(t.next_run - now)),
+                    "last_started": int(t.last_started),
+                    "last_duration_s": round(t.last_duration, 2),
+                    "avg_duration_s": round(t.total_duration / t.runs, 2) if t.runs else 0.0,
+                    "avg_lateness_s": round(t.total_lateness / t.runs, 1) if t.runs else 0.0,
+                    "max_lateness_s": round(t.max_lateness, 1),
+                    "last_error": t.last_error,
+                }
+            return {
+                "uptime_s": round(now - self.started_at) if self.started_at else 0,
+                "running": self._running_total,
+                "max_workers": self.max_workers,
+                "tasks": tasks,
+                "recent_runs": list(self._history)[-history_limit:][::-1],
+            }
+
+    def collect_metrics(self) -> List[MetricFamily]:
+        """Queue depth and per-task run counters for the exporter."""
+        now = self._clock()
+        running = MetricFamily("revenue_ops_scheduler_running_tasks", "gauge",
+                               "Task runs in progress")
+        waiting = MetricFamily("revenue_ops_scheduler_waiting_tasks", "gauge",
+                               "Tasks due but not yet started")
+        runs = MetricFamily("revenue_ops_task_runs", "counter", "Completed task runs", ("task",))
+        failures = MetricFamily("revenue_ops_task_failures", "counter",
+                                "Task runs that raised", ("task",))
+        duration = MetricFamily("revenue_ops_task_duration_seconds", "counter",
+                                "Time spent in task runs", ("task",))
+        lateness = MetricFamily("revenue_ops_task_lateness_seconds", "counter",
+                                "Summed start delay past the due time", ("task",))
+        with self._lock:
+            running.set(self._running_total)
+            waiting.set(sum(1 for t in self._tasks.values()
+                            if not t.running and not t.done and t.next_run <= now))
+            for t in self._tasks.values():
+                runs.set(t.runs, task=t.name)
+                failures.set(t.failures, task=t.name)
+                duration.set(round(t.total_duration, 3), task=t.name)
+                lateness.set(round(t.total_lateness, 3), task=t.name)
+        return [running, waiting, runs, failures, duration, lateness]
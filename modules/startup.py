@@ -0,0 +1,134 @@
+"""
+Startup module for cl-revenue-ops
+
+Phase timing and readiness flags for plugin startup.
+
+init() used to run everything before returning to lightningd: dependency
+checks, the listforwards hydration, a per-peer connection snapshot and a
+hive discovery loop that could sleep for ten seconds. On a large node that
+delayed plugin readiness by minutes. init() now only does what notifications
+and RPC methods need (config, RPC broker, database schema) and hands the
+rest to one-shot scheduler tasks.
+
+StartupTracker records how long each phase took, in init() or in the
+background, and which pieces of deferred state are ready:
+
+- dependencies:      plugin list checked (config.sling_available is final)
+- forwards:          forwards table hydrated from listforwards
+- portfolio_stats:   online portfolio statistics seeded
+- channel_state:     channel state model seeded
+- peer_snapshot:     connection baseline recorded for connected peers
+- hive:              hive availability discovered
+- warm_state:        warm-restart snapshot restored, Kalman filters preloaded
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+READINESS_FLAGS = (
+    "dependencies", "forwards", "portfolio_stats",
+    "channel_state", "peer_snapshot", "hive", "warm_state",
+)
+
+
+class StartupTracker:
+    """Per-phase startup timings and readiness flags."""
+
+    def __init__(self, plugin, flags=READINESS_FLAGS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.plugin = plugin
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.started = clock()
+        self._last_checkpoint = self.started
+        self.init_seconds: Optional[float] = None
+        self._phases: List[Dict[str, Any]] = []
+        self._ready: Dict[str, threading.Event] = {flag: threading.Event() for flag in flags}
+        self._ready_after: Dict[str, float] = {}
+
+    def _record(self, name: str, seconds: float, background: bool, status: str = "ok") -> None:
+        with self._lock:
+            self._phases.append({
+                "phase": name,
+                "ms": round(seconds * 1000, 1),
+                "background": background,
+                "status": status,
+            })
+
+    def checkpoint(self, name: str) -> None:
+        """End an init() phase: records the time since the previous checkpoint."""
+        now = self._clock()
+        self._record(name, now - self._last_checkpoint, background=False)
+        self._last_checkpoint = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a deferred startup phase (recorded even when it raises)."""
+        start = self._clock()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            elapsed = self._clock() - start
+            self._record(name, elapsed, background=True, status=status)
+            self.plugin.log(f"Startup: {name} finished in {elapsed * 1000:.0f}ms")
+
+    def init_done(self) -> None:
+        """Mark the end of init() and log the synchronous phase breakdown."""
+        self.init_seconds = self._clock() - self.started
+        with self._lock:
+            parts = [f"{p['phase']}={p['ms']:.0f}ms" for p in self._phases if not p["background"]]
+        self.plugin.log(
+            f"Startup: init returned in {self.init_seconds * 1000:.0f}ms "
+            f"({', '.join(parts)}); deferred: "
+            f"{', '.join(f for f in self._ready if not self.is_ready(f)) or 'none'}"
+        )
+
+    # =========================================================================
+    # Readiness
+    # =========================================================================
+
+    def mark_ready(self, flag: str) -> None:
+        event = self._ready[flag]
+        if event.is_set():
+            return
+        with self._lock:
+            self._ready_after[flag] = self._clock() - self.started
+        event.set()
+        if self.all_ready():
+            self.plugin.log(
+                f"Startup: all deferred state ready after "
+                f"{self._ready_after[flag]:.1f}s"
+            )
+
+    def is_ready(self, flag: str) -> bool:
+        return self._ready[flag].is_set()
+
+    def wait(self, flag: str, timeout: Optional[float] = None) -> bool:
+        return self._ready[flag].wait(timeout)
+
+    def all_ready(self) -> bool:
+        return all(event.is_set() for event in self._ready.values())
+
+    def get_status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ready": self.all_ready(),
+                "init_ms": (round(self.init_seconds * 1000, 1)
+                            if self.init_seconds is not None else None),
+                "readiness": {
+                    flag: {
+                        "ready": event.is_set(),
+                        "after_s": (round(self._ready_after[flag], 2)
+                                    if flag in self._ready_after else None),
+                    }
+                    for flag, event in self._ready.items()
+                },
+                "phases": [dict(p) for p in self._phases],
+            }
@@ -0,0 +1,157 @@
+"""
+Warm State module for cl-revenue-ops
+
+Versioned snapshot of in-memory state for warm restarts.
+
+After a restart every cache starts cold: fee controller states are parsed
+from their JSON rows one channel at a time on first use, Kalman filters
+load on first access, the SCID -> peer index and the hive profile cache are
+empty. The first fee cycle after a restart paid for all of that.
+
+WarmStateStore writes the registered sections to the warm_state table on
+clean shutdown and periodically, and bulk-loads them at startup. Each
+section supplies an exporter and a restorer; restorers get the snapshot
+time and apply their own validity checks (e.g. skip controller states
+whose database row is newer than the snapshot).
+
+The snapshot as a whole is rejected when:
+- its format_version is not WARM_STATE_VERSION
+- it was written by a different plugin version (state layouts may differ)
+- it is older than MAX_WARM_STATE_AGE, or dated in the future
+- the payload does not parse
+"""
+
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+WARM_STATE_VERSION = 1
+
+# Older snapshots are ignored (controller states reload from the database)
+MAX_WARM_STATE_AGE = 7 * 86400
+
+# Tolerated clock skew for snapshots dated in the future
+MAX_CLOCK_SKEW = 300
+
+
+class WarmStateStore:
+    """Saves and restores registered in-memory state sections."""
+
+    def __init__(self, plugin, database, plugin_version: str,
+                 clock: Callable[[], float] = time.time):
+        self.plugin = plugin
+        self.database = database
+        self.plugin_version = plugin_version
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sections: List[Tuple[str, Callable[[], Any], Callable[[Any, int], int]]] = []
+        self.last_save: Optional[Dict[str, Any]] = None
+        self.last_load: Optional[Dict[str, Any]] = None
+
+    def register(self, name: str, export: Callable[[], Any],
+                 restore: Callable[[Any, int], int]) -> None:
+        """
+        Add a section.
+
+        export():                   JSON-serializable state
+        restore(data, created_at):  applies it, returns entries restored
+        """
+        self._sections.append((name, export, restore))
+
+    # =========================================================================
+    # Save
+    # =========================================================================
+
+    def save(self, reason: str = "periodic") -> Dict[str, Any]:
+        """Snapshot every section (a failing section is left out)."""
+        with self._lock:
+            start = self._clock()
+            created_at = int(start)
+            payload: Dict[str, Any] = {}
+            errors: Dict[str, str] = {}
+            for name, export, _ in self._sections:
+                try:
+                    payload[name] = export()
+                except Exception as e:
+                    errors[name] = str(e)
+                    self.plugin.log(f"Warm state: could not export {name}: {e}", level='warn')
+
+            blob = json.dumps(payload, separators=(",", ":"))
+            self.database.save_warm_state(WARM_STATE_VERSION, self.plugin_version, created_at, blob)
+            self.last_save = {
+                "reason": reason,
+                "created_at": created_at,
+                "bytes": len(blob),
+                "ms": round((self._clock() - start) * 1000, 1),
+                "sections": sorted(payload),
+                "errors": errors,
+            }
+            self.plugin.log(
+                f"Warm state saved ({reason}): {len(blob) // 1024} KiB, "
+                f"{len(payload)} sections in {self.last_save['ms']:.0f}ms",
+                level='debug' if reason == "periodic" else 'info'
+            )
+            return self.last_save
+
+    # =========================================================================
+    # Load
+    # =========================================================================
+
+    def _reject(self, reason: str) -> Dict[str, Any]:
+        self.last_load = {"loaded": False, "reason": reason}
+        self.plugin.log(f"Warm state not used: {reason}. Starting cold.")
+        return self.last_load
+
+    def load(self) -> Dict[str, Any]:
+        """Restore every section from the stored snapshot, if it is valid."""
+        start = self._clock()
+        row = self.database.get_warm_state()
+        if row is None:
+            return self._reject("no snapshot")
+        if row["format_version"] != WARM_STATE_VERSION:
+            return self._reject(f"format version {row['format_version']}")
+        if row["plugin_version"] != self.plugin_version:
+            return self._reject(f"written by plugin version {row['plugin_version']}")
+        created_at = int(row["created_at"])
+        age = int(start) - created_at
+        if age > MAX_WARM_STATE_AGE or age < -MAX_CLOCK_SKEW:
+            return self._reject(f"snapshot age {age}s")
+        try:
+            payload = json.loads(row["payload"])
+        except ValueError as e:
+            return self._reject(f"corrupt payload ({e})")
+
+        restored: Dict[str, int] = {}
+        errors: Dict[str, str] = {}
+        for name, _, restore in self._sections:
+            if name not in payload:
+                continue
+            try:
+                restored[name] = restore(payload[name], created_at)
+            except Exception as e:
+                errors[name] = str(e)
+                self.plugin.log(f"Warm state: could not restore {name}: {e}", level='warn')
+
+        self.last_load = {
+            "loaded": True,
+            "created_at": created_at,
+            "age_s": age,
+            "ms": round((self._clock() - start) * 1000, 1),
+            "restored": restored,
+            "errors": errors,
+        }
+        self.plugin.log(
+            f"Warm state restored from {age}s ago in {self.last_load['ms']:.0f}ms: "
+            + ", ".join(f"{name}={count}" for name, count in restored.items())
+        )
+        return self.last_load
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "format_version": WARM_STATE_VERSION,
+            "sections": [name for name, _, _ in self._sections],
+            "last_save": self.last_save,
+            "last_load": self.last_load,
+        }
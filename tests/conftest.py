@@ -32,6 +32,34 @@ def temp_db_path():
         os.unlink(path)
 
 
+class FakeClock:
+    """Callable clock for code that takes `clock=`; tests move it by hand."""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def database(temp_db_path):
+    """A real, initialized Database on temp_db_path (plugin logging mocked)."""
+    from modules.database import Database
+    db = Database(temp_db_path, MagicMock())
+    db.initialize()
+    return db
+
+
+@pytest.fixture
+def clock():
+    """A FakeClock shared by the scheduler, startup and profiler tests."""
+    return FakeClock()
+
+
 @pytest.fixture
 def mock_plugin():
     """Create a mock plugin with basic functionality."""
@@ -0,0 +1,122 @@
+"""
+Tests for adaptive cycle intervals and scheduled fee observation windows.
+"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.adaptive_intervals import (
+    MAX_FACTOR, MIN_DUE_GAP_SECONDS, MIN_FACTOR, AdaptiveIntervals
+)
+from modules.config import Config
+from modules.fee_controller import HillClimbState, PIDFeeController
+
+
+@pytest.fixture
+def config():
+    config = Config()
+    config.enable_adaptive_intervals = True
+    return config
+
+
+def _seeded(config, clock, intensity=0.0):
+    adaptive = AdaptiveIntervals(config, mempool_intensity=lambda: intensity, clock=clock)
+    # 240 forwards of 1M sats over the last day: 10/hour baseline
+    adaptive.seed(240, 240 * 1_000_000_000, 86400)
+    return adaptive
+
+
+class TestAdaptiveIntervals:
+
+    def test_disabled_uses_configured_interval(self, config, clock):
+        config.enable_adaptive_intervals = False
+        adaptive = _seeded(config, clock)
+        for _ in range(100):
+            adaptive.record_forward(1_000_000)
+        assert adaptive.interval("fee", 1800) == 1800
+        assert adaptive.get_status()["intervals"]["fee"]["factor"] == 1.0
+
+    def test_steady_state_keeps_interval(self, config, clock):
+        adaptive = _seeded(config, clock)
+        assert adaptive.activity() == pytest.approx(1.0)
+        assert adaptive.interval("flow", 3600) == 3600
+
+    def test_surge_shortens_interval(self, config, clock):
+        adaptive = _seeded(config, clock)
+        for _ in range(40):               # ~4 hours worth in a few minutes
+            clock.now += 5
+            adaptive.record_forward(1_000_000_000)
+        interval = adaptive.interval("rebalance", 900)
+        assert int(900 * MIN_FACTOR) <= interval < 900 // 2
+
+    def test_quiet_node_stretches_interval(self, config, clock):
+        adaptive = _seeded(config, clock)
+        clock.now += 4 * 3600              # nothing routed for four hours
+        assert adaptive.interval("flow", 3600) == int(3600 * MAX_FACTOR)
+        status = adaptive.get_status()
+        assert status["intervals"]["flow"]["max_s"] == int(3600 * MAX_FACTOR)
+        assert status["signals"]["forwards_per_hour"] < 1
+
+    def test_cold_start_is_neutral(self, config, clock):
+        adaptive = AdaptiveIntervals(config, clock=clock)
+        for _ in range(5):
+            adaptive.record_forward(1_000_000)
+        assert adaptive.activity() == 1.0
+        assert adaptive.interval("fee", 1800) == 1800
+
+    def test_mempool_intensity_only_speeds_fee_cycle(self, config, clock):
+        adaptive = _seeded(config, clock, intensity=1.0)
+        assert adaptive.interval("fee", 1800) == 900
+        assert adaptive.interval("rebalance", 900) == 900
+
+    def test_due_work_brings_cycle_forward(self, config, clock):
+        adaptive = _seeded(config, clock)
+        assert adaptive.interval("fee", 1800, due_in=600) == 600
+        assert adaptive.interval("fee", 1800, due_in=10) == MIN_DUE_GAP_SECONDS
+        assert adaptive.interval("fee", 1800, due_in=7200) == 1800
+        assert adaptive.get_status()["intervals"]["fee"]["due_scheduled"] == 2
+
+
+class TestObservationSchedule:
+
+    @pytest.fixture
+    def controller(self, mock_plugin, mock_database, config):
+        controller = PIDFeeController(mock_plugin, config, mock_database, MagicMock())
+        mock_database.get_all_channel_states.return_value = [
+            {"channel_id": "100x1x0", "peer_id": "peerA", "state": "balanced"},
+        ]
+        mock_database.get_forward_count_since.return_value = 0
+        controller._get_channels_info = MagicMock(return_value={
+            "100x1x0": {"peer_id": "peerA", "capacity": 1_000_000,
+                        "fee_proportional_millionths": 100},
+        })
+        controller._get_dynamic_chain_costs = MagicMock(return_value=None)
+        state = HillClimbState(last_update=int(time.time()) - 600)
+        controller._get_hill_climb_state = MagicMock(return_value=state)
+        controller._adjust_channel_fee = MagicMock(return_value=None)
+        return controller
+
+    def test_waiting_channel_skipped_until_due(self, controller):
+        controller.adjust_all_fees()
+        due = controller.next_observation_due()
+        assert due == pytest.approx(time.time() + 3000, abs=5)
+
+        controller.adjust_all_fees()
+        assert controller._adjust_channel_fee.call_count == 1
+
+    def test_forwards_close_window_early(self, controller):
+        controller.adjust_all_fees()
+        for _ in range(controller.MIN_FORWARDS_FOR_SIGNAL):
+            controller.note_forward("100x1x0")
+        assert controller.next_observation_due() is None
+
+        controller.adjust_all_fees()
+        assert controller._adjust_channel_fee.call_count == 2
+
+    def test_full_scan_without_adaptive_mode(self, controller, config):
+        config.enable_adaptive_intervals = False
+        controller.adjust_all_fees()
+        controller.adjust_all_fees()
+        assert controller._adjust_channel_fee.call_count == 2
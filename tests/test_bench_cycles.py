@@ -0,0 +1,57 @@
+"""
+Smoke test for the synthetic node and the cycle benchmark.
+
+Keeps benchmarks/synthetic_node.py and benchmarks/bench_cycles.py in step
+with the module APIs they drive: a tiny node is populated and each cycle
+runs once through the fake RPC layer.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "benchmarks"))
+
+import bench_cycles  # noqa: E402
+from synthetic_node import FakeRpc, SyntheticNode  # noqa: E402
+
+CYCLE_FIELDS = {"cold_ms", "warm_ms", "queries", "warm_queries", "rpc_calls", "rpc",
+                "sleep_ms", "peak_rss_mb"}
+
+
+class TestSyntheticNode:
+
+    def test_populate_writes_histories(self, database):
+        node = SyntheticNode(channels=6, forwards=300, fee_history=3, history_days=5, seed=1)
+        counts = node.populate(database)
+        assert counts["forwards"] == 300
+        assert database.get_lifetime_stats()["total_forwards"] == 300
+        assert len(node.channels) == 6
+
+        rpc = FakeRpc(node)
+        listed = rpc.listpeerchannels()["channels"]
+        assert {c["short_channel_id"] for c in listed} == {c["short_channel_id"] for c in node.channels}
+        assert rpc.counts["listpeerchannels"] == 1
+
+
+class TestBenchCycles:
+
+    def test_baseline_file(self, tmp_path, monkeypatch):
+        output = tmp_path / "baseline.json"
+        monkeypatch.setattr(sys, "argv", [
+            "bench_cycles.py", "--channels", "6", "--forwards", "300", "--fee-history", "3",
+            "--repeat", "1", "--output", str(output),
+        ])
+        bench_cycles.main()
+
+        report = json.loads(output.read_text())
+        assert set(report["meta"]) == {"commit", "timestamp", "python", "platform", "node",
+                                       "populate", "repeat"}
+        assert report["meta"]["node"]["channels"] == 6
+        assert set(report["results"]) == set(bench_cycles.CYCLES)
+        for name, result in report["results"].items():
+            assert set(result) == CYCLE_FIELDS, name
+            assert result["queries"] > 0, name
+
+        assert bench_cycles.compare(report, report, fail_over=0.25) == 0
@@ -0,0 +1,115 @@
+"""
+Tests for the local channel graph (last-hop table and route estimation).
+"""
+
+import pytest
+
+from modules.channel_graph import ChannelGraph, _scid_to_int
+
+
+US = "02" + "0" * 64
+A = "02" + "a" * 64
+B = "02" + "b" * 64
+C = "02" + "c" * 64
+P = "03" + "d" * 64
+
+
+def _edge(scid, direction, source, destination, base=1000, ppm=100,
+          htlc_max=10 ** 10, active=True):
+    return {
+        "short_channel_id": scid,
+        "direction": direction,
+        "source": source,
+        "destination": destination,
+        "base_fee_millisatoshi": base,
+        "fee_per_millionth": ppm,
+        "htlc_maximum_msat": htlc_max,
+        "active": active,
+    }
+
+
+@pytest.fixture
+def graph_edges():
+    """
+    US -- A -- P -- US          (cheap detour via A)
+    US -- B -- C -- P           (longer, more expensive detour)
+    US -- P direct              (must not count as a rebalance route)
+    """
+    return [
+        _edge("100x1x0", 0, US, A, base=0, ppm=0),
+        _edge("100x1x0", 1, A, US, base=0, ppm=50),
+        _edge("101x1x0", 0, A, P, base=1000, ppm=200),
+        _edge("101x1x0", 1, P, A, base=0, ppm=10),
+        _edge("102x1x0", 0, US, B, base=0, ppm=0),
+        _edge("103x1x0", 0, B, C, base=0, ppm=300),
+        _edge("104x1x0", 0, C, P, base=0, ppm=300),
+        _edge("105x1x0", 0, US, P, base=0, ppm=0),
+        _edge("105x1x0", 1, P, US, base=2000, ppm=400),
+    ]
+
+
+@pytest.fixture
+def graph(mock_plugin, graph_edges):
+    mock_plugin.rpc.listchannels.return_value = {"channels": graph_edges}
+    g = ChannelGraph(mock_plugin, our_node_id=US)
+    assert g.refresh(force_full=True)
+    return g
+
+
+class TestChannelGraph:
+
+    def test_scid_encoding(self):
+        assert _scid_to_int("1x2x3") == (1 << 40) | (2 << 16) | 3
+        assert _scid_to_int("garbage") is None
+
+    def test_last_hop_table(self, graph):
+        # ppm + base_fee // 1000
+        assert graph.last_hop_fee(P) == 402
+        assert graph.last_hop_fee(A) == 50
+        assert graph.last_hop_fee(C) is None
+        assert graph.last_hop_fee("02" + "f" * 64) is None
+
+    def test_route_excludes_direct_channel(self, graph):
+        amount = 100_000_000
+        # US -> A (free) -> P: A charges 1000 msat + 200 ppm = 21000 msat = 210 ppm
+        # plus P's last hop of 402
+        assert graph.route_fee_ppm(P, amount) == 210 + 402
+
+    def test_route_respects_htlc_max_and_active(self, mock_plugin, graph_edges):
+        graph_edges[2] = _edge("101x1x0", 0, A, P, base=1000, ppm=200, active=False)
+        mock_plugin.rpc.listchannels.return_value = {"channels": graph_edges}
+        g = ChannelGraph(mock_plugin, our_node_id=US)
+        g.refresh(force_full=True)
+        # Falls back to US -> B -> C -> P: B 300 ppm, C 300 ppm
+        assert g.route_fee_ppm(P, 100_000_000) == 600 + 402
+        assert g.route_fee_ppm(P, 100_000_000, max_hops=2) is None
+
+    def test_inbound_refresh_updates_fees(self, graph, mock_plugin):
+        mock_plugin.rpc.listchannels.reset_mock()
+        mock_plugin.rpc.listchannels.return_value = {
+            "channels": [_edge("105x1x0", 1, P, US, base=0, ppm=900)]
+        }
+        graph._last_inbound_refresh = 0
+        assert graph.refresh()
+        mock_plugin.rpc.listchannels.assert_called_once_with(destination=US)
+        assert graph.last_hop_fee(P) == 900
+        assert graph.get_status()["inbound_refreshes"] == 1
+
+    def test_refresh_not_due(self, graph, mock_plugin):
+        mock_plugin.rpc.listchannels.reset_mock()
+        assert not graph.refresh()
+        mock_plugin.rpc.listchannels.assert_not_called()
+
+    def test_inbound_refresh_unsupported(self, graph, mock_plugin):
+        mock_plugin.rpc.listchannels.side_effect = Exception("unknown parameter")
+        graph._last_inbound_refresh = 0
+        assert not graph.refresh()
+        assert graph.get_status()["inbound_refresh_supported"] is False
+        # Existing data keeps serving lookups
+        assert graph.last_hop_fee(P) == 402
+
+    def test_not_ready_before_load(self, mock_plugin):
+        g = ChannelGraph(mock_plugin, our_node_id=US)
+        assert not g.ready
+        assert g.last_hop_fee(P) is None
+        assert g.route_fee_ppm(P) is None
@@ -0,0 +1,86 @@
+"""
+Tests for the listpeerchannels-based channel model used by the rebalancer.
+"""
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.channel_model import ChannelModel
+from modules.config import Config
+from modules.rebalancer import EVRebalancer
+
+
+A = "02" + "a" * 64
+B = "02" + "b" * 64
+
+
+def _channel(scid, peer, to_us, total, state="CHANNELD_NORMAL", connected=True, **extra):
+    ch = {
+        "peer_id": peer,
+        "peer_connected": connected,
+        "state": state,
+        "short_channel_id": scid,
+        "to_us_msat": to_us,
+        "total_msat": total,
+        "spendable_msat": max(0, to_us - 10_000_000),
+        "receivable_msat": total - to_us,
+        "htlcs": [],
+    }
+    ch.update(extra)
+    return ch
+
+
+@pytest.fixture
+def listpeerchannels():
+    return {"channels": [
+        _channel("100x1x0", A, 800_000_000, 1_000_000_000,
+                 updates={"local": {"fee_proportional_millionths": 250, "fee_base_msat": 1000}},
+                 htlcs=[{"id": 1}, {"id": 2}]),
+        _channel("101x1x0", A, 50_000_000, 2_000_000_000, connected=True,
+                 fee_proportional_millionths=40, fee_base_msat=0,
+                 to_us_msat="50000000msat", total_msat="2000000000msat"),
+        _channel("102x1x0", B, 0, 1_000_000_000, connected=False,
+                 updates={"local": {"fee_proportional_millionths": 0, "fee_base_msat": 0}},
+                 fee_proportional_millionths=999),
+        _channel("103x1x0", B, 500_000_000, 1_000_000_000, state="CHANNELD_AWAITING_LOCKIN"),
+        _channel(None, B, 500_000_000, 1_000_000_000),
+    ]}
+
+
+class TestChannelModel:
+
+    def test_parses_balances_fees_and_htlcs(self, listpeerchannels):
+        model = ChannelModel.from_listpeerchannels(listpeerchannels)
+        assert sorted(model.channels) == ["100x1x0", "101x1x0", "102x1x0"]
+
+        ch = model.get("100:1:0")
+        assert (ch.capacity_sats, ch.local_sats, ch.spendable_sats) == (1_000_000, 800_000, 790_000)
+        assert (ch.fee_ppm, ch.base_fee_msat, ch.htlcs) == (250, 1000, 2)
+        assert ch.outbound_ratio == pytest.approx(0.8)
+
+        legacy = model.get("101x1x0")
+        assert (legacy.capacity_sats, legacy.local_sats, legacy.fee_ppm) == (2_000_000, 50_000, 40)
+
+        # updates.local wins over top-level even when zero
+        assert model.get("102x1x0").fee_ppm == 0
+
+    def test_info_map_keeps_legacy_shape(self, listpeerchannels):
+        info = ChannelModel.from_listpeerchannels(listpeerchannels).info_map()["100x1x0"]
+        assert info["spendable_sats"] == 800_000   # local balance, as with listfunds
+        assert info["capacity"] == 1_000_000
+        assert info["peer_id"] == A
+
+    def test_peer_status(self, listpeerchannels):
+        status = ChannelModel.from_listpeerchannels(listpeerchannels).peer_status()
+        assert status == {A: {"connected": True}, B: {"connected": False}}
+
+    def test_rebalancer_uses_single_rpc(self, mock_plugin, mock_database, listpeerchannels):
+        mock_plugin.rpc.listpeerchannels.return_value = listpeerchannels
+        rebalancer = EVRebalancer(mock_plugin, Config(), mock_database, MagicMock())
+
+        channels = rebalancer._get_channels_with_balances()
+
+        assert sorted(channels) == ["100x1x0", "101x1x0", "102x1x0"]
+        mock_plugin.rpc.listpeerchannels.assert_called_once_with()
+        mock_plugin.rpc.listpeers.assert_not_called()
+        mock_plugin.rpc.listfunds.assert_not_called()
@@ -0,0 +1,154 @@
+"""
+Tests for the event-driven channel state model.
+"""
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.channel_state_model import ChannelStateModel, list_peer_channels
+
+
+def _row(scid, peer, to_us, total=10_000_000_000, channel_id=None,
+         state="CHANNELD_NORMAL", connected=True):
+    return {
+        "short_channel_id": scid, "channel_id": channel_id or f"cid-{scid}",
+        "peer_id": peer, "state": state, "peer_connected": connected,
+        "to_us_msat": to_us, "total_msat": total,
+        "spendable_msat": to_us, "receivable_msat": total - to_us,
+        "updates": {"local": {"fee_base_msat": 0, "fee_proportional_millionths": 100}},
+    }
+
+
+@pytest.fixture
+def plugin():
+    plugin = MagicMock()
+    plugin.rpc.listpeerchannels.return_value = {"channels": [
+        _row("100x1x0", "peerA", 4_000_000_000),
+        _row("200x1x0", "peerB", 6_000_000_000),
+    ]}
+    return plugin
+
+
+@pytest.fixture
+def model(plugin):
+    model = ChannelStateModel(plugin)
+    assert model.seed() is None
+    plugin.rpc.listpeerchannels.reset_mock()
+    return model
+
+
+class TestEvents:
+
+    def test_forward_moves_balance_without_rpc(self, model, plugin):
+        model.on_forward_event({
+            "status": "settled", "in_channel": "100:1:0", "out_channel": "200x1x0",
+            "in_msat": 1_001_000, "out_msat": 1_000_000,
+        })
+        model.on_forward_event({
+            "status": "failed", "in_channel": "100x1x0", "out_channel": "200x1x0",
+            "in_msat": 5_000_000, "out_msat": 5_000_000,
+        })
+
+        assert model.local_balance_msat("100x1x0") == 4_001_001_000
+        assert model.local_balance_msat("200x1x0") == 5_999_000_000
+        view = model.channel_model().get("200x1x0")
+        assert view.receivable_sats == 4_001_000
+        assert model.events_applied == 1
+        plugin.rpc.listpeerchannels.assert_not_called()
+
+    def test_coin_movement_skips_routed_legs(self, model):
+        model.on_coin_movement({
+            "type": "channel_mvt", "account_id": "cid-100x1x0",
+            "credit_msat": 0, "debit_msat": 2_000_000, "tags": ["routed"],
+        })
+        model.on_coin_movement({
+            "type": "channel_mvt", "account_id": "cid-100x1x0",
+            "credit_msat": 0, "debit_msat": 3_000_000,
+            "primary_tag": "invoice", "extra_tags": [],
+        })
+        model.on_coin_movement({
+            "type": "chain_mvt", "account_id": "wallet", "credit_msat": 9_000_000,
+        })
+        assert model.local_balance_msat("100x1x0") == 3_997_000_000
+
+    def test_balance_snapshot_overrides(self, model):
+        model.on_balance_snapshot({"accounts": [
+            {"account_id": "wallet", "balance_msat": 1},
+            {"account_id": "cid-200x1x0", "balance_msat": 7_000_000_000},
+        ]})
+        assert model.local_balance_msat("200x1x0") == 7_000_000_000
+
+    def test_connectivity_and_state(self, model):
+        model.set_peer_connected("peerA", False)
+        model.on_channel_state_changed({
+            "channel_id": "cid-200x1x0", "new_state": "CHANNELD_SHUTTING_DOWN",
+        })
+        snapshot = model.channel_model()
+        assert set(snapshot.channels) == {"100x1x0"}
+        assert snapshot.peer_status() == {"peerA": {"connected": False}}
+
+    def test_new_channel_fetched_on_next_read(self, model, plugin):
+        model.on_channel_state_changed({
+            "peer_id": "peerC", "channel_id": "cid-300x1x0",
+            "old_state": "CHANNELD_AWAITING_LOCKIN", "new_state": "CHANNELD_NORMAL",
+        })
+        plugin.rpc.listpeerchannels.return_value = {"channels": [
+            _row("300x1x0", "peerC", 0),
+        ]}
+
+        assert model.peer_for("300x1x0") is None
+        rows = model.listpeerchannels()["channels"]
+
+        plugin.rpc.listpeerchannels.assert_called_once_with(id="peerC")
+        assert {r["short_channel_id"] for r in rows} == {"100x1x0", "200x1x0", "300x1x0"}
+        assert model.peer_for("300x1x0") == "peerC"
+
+    def test_fee_update(self, model):
+        model.note_fee_update("100x1x0", 1000, 250)
+        view = model.channel_model().get("100x1x0")
+        assert (view.base_fee_msat, view.fee_ppm) == (1000, 250)
+
+
+class TestReconcile:
+
+    def test_reports_and_corrects_drift(self, model, plugin):
+        model.on_forward_event({
+            "status": "settled", "in_channel": "100x1x0", "out_channel": "200x1x0",
+            "in_msat": 10_000_000, "out_msat": 10_000_000,
+        })
+        plugin.rpc.listpeerchannels.return_value = {"channels": [
+            _row("100x1x0", "peerA", 4_010_000_000),
+            _row("200x1x0", "peerB", 5_000_000_000, connected=False),
+            _row("400x1x0", "peerD", 1_000_000_000),
+        ]}
+
+        report = model.reconcile()
+
+        assert report["events_since_reconcile"] == 1
+        assert report["drifted_channels"] == 1
+        assert report["largest_drifts"] == [{"scid": "200x1x0", "drift_msat": -990_000_000}]
+        assert report["connectivity_mismatches"] == 1
+        assert report["missing_channels"] == ["400x1x0"]
+        assert report["stale_channels"] == []
+        assert ChannelStateModel.has_discrepancies(report)
+        assert model.local_balance_msat("200x1x0") == 5_000_000_000
+        assert model.get_status()["last_reconcile"] is report
+
+    def test_clean_reconcile(self, model):
+        report = model.reconcile()
+        assert not ChannelStateModel.has_discrepancies(report)
+        assert model.reconcile_count == 1
+
+    def test_failed_seed_falls_back_to_rpc(self, plugin):
+        plugin.rpc.listpeerchannels.side_effect = [Exception("down"), {"channels": []}]
+        model = ChannelStateModel(plugin)
+        with pytest.raises(Exception):
+            model.seed()
+        assert not model.ready
+        assert list_peer_channels(plugin, model) == {"channels": []}
+        assert plugin.rpc.listpeerchannels.call_count == 2
+
+    def test_readers_return_copies(self, model):
+        rows = model.listpeerchannels()["channels"]
+        rows[0]["active_htlcs"] = 3
+        assert "active_htlcs" not in model.listpeerchannels()["channels"][0]
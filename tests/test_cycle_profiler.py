@@ -0,0 +1,118 @@
+"""
+Tests for the per-stage cycle profiler.
+"""
+
+import pstats
+
+import pytest
+
+from modules import cycle_profiler
+from modules.cycle_profiler import CycleProfiler
+
+
+@pytest.fixture
+def profiler(clock):
+    return CycleProfiler(history=3, clock=clock)
+
+
+class TestStages:
+
+    def test_nested_stage_time_is_exclusive(self, profiler, clock):
+        with profiler.cycle("fee"):
+            with profiler.stage("bounds"):
+                clock.tick(0.010)
+                with profiler.stage("rpc"):
+                    clock.tick(0.030)
+            clock.tick(0.005)
+
+        summary = profiler.get_report("fee")["last_cycle"]
+        assert summary["total_ms"] == 45.0
+        assert summary["stages"]["rpc"] == {"ms": 30.0, "calls": 1}
+        assert summary["stages"]["bounds"]["ms"] == 10.0
+        assert summary["other_ms"] == 5.0
+        assert list(summary["stages"]) == ["rpc", "bounds"]   # slowest first
+
+    def test_stage_outside_cycle_is_noop(self, profiler, clock):
+        with profiler.stage("rpc"):
+            clock.tick(1.0)
+        profiler.begin_channel("100x1x0")
+        assert profiler.get_report("fee")["cycles_recorded"] == 0
+
+    def test_per_channel_percentiles(self, profiler, clock):
+        with profiler.cycle("fee"):
+            for i, cost in enumerate([0.001, 0.002, 0.050]):
+                profiler.begin_channel(f"100x{i}x0")
+                with profiler.stage("thompson"):
+                    clock.tick(cost)
+            profiler.end_channel()
+            clock.tick(0.5)   # after the loop: not charged to the last channel
+
+        summary = profiler.get_report("fee")["last_cycle"]
+        assert summary["channels"] == 3
+        assert summary["per_channel"]["total"]["max_ms"] == 50.0
+        assert summary["per_channel"]["stages"]["thompson"]["p50_ms"] == 2.0
+        assert summary["slowest_channels"][0] == {"channel_id": "100x2x0", "ms": 50.0}
+
+    def test_nested_cycle_is_folded_in(self, profiler, clock):
+        with profiler.cycle("fee"):
+            with profiler.cycle("flow"):
+                clock.tick(0.1)
+        assert profiler.get_report("fee")["cycles_recorded"] == 1
+        assert profiler.get_report("flow")["cycles_recorded"] == 0
+
+
+class TestRingBuffer:
+
+    def test_keeps_last_cycles(self, profiler, clock):
+        for i in range(5):
+            with profiler.cycle("rebalance"):
+                with profiler.stage("planning"):
+                    clock.tick(0.001 * (i + 1))
+        report = profiler.get_report("rebalance")
+        assert report["cycles_recorded"] == 3
+        assert [c["total_ms"] for c in report["recent"]] == [3.0, 4.0, 5.0]
+        assert report["mean_stage_ms"]["planning"] == 4.0
+
+
+class TestPstats:
+
+    def test_dump_of_one_cycle(self, tmp_path):
+        profiler = CycleProfiler()
+        path = str(tmp_path / "fee.pstats")
+        profiler.request_pstats("fee", path)
+        assert profiler.get_report("fee")["pstats"]["pending"]
+
+        with profiler.cycle("fee"):
+            sum(range(1000))
+
+        report = profiler.get_report("fee")["pstats"]
+        assert not report["pending"]
+        assert report["last"]["path"] == path and report["last"]["error"] is None
+        assert pstats.Stats(path).total_calls > 0
+
+        # Only the requested cycle is profiled
+        with profiler.cycle("fee"):
+            pass
+        assert profiler.get_report("fee")["pstats"]["last"]["path"] == path
+
+
+class TestDecorators:
+
+    def test_profiled_cycle_and_timed_stage(self, monkeypatch, clock):
+        shared = CycleProfiler(clock=clock)
+        monkeypatch.setattr(cycle_profiler, "profiler", shared)
+
+        @cycle_profiler.timed_stage("persist")
+        def save():
+            clock.tick(0.02)
+
+        @cycle_profiler.profiled_cycle("flow")
+        def run():
+            cycle_profiler.begin_channel("100x1x0")
+            save()
+            return "done"
+
+        assert run() == "done"
+        save()   # outside a cycle
+        summary = shared.get_report("flow")["last_cycle"]
+        assert summary["stages"]["persist"] == {"ms": 20.0, "calls": 1}
@@ -0,0 +1,151 @@
+"""
+Tests for chunked pruning, incremental vacuum and WAL checkpoints.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.database import Database
+
+DAY = 86400
+
+
+@pytest.fixture
+def database(database):
+    database.PRUNE_CHUNK_ROWS = 50
+    database.PRUNE_YIELD_SECONDS = 0
+    return database
+
+
+def _fill(db, count, age_days, out_channel="2x2x2", same_second=False):
+    ts = int(time.time()) - age_days * DAY
+    rows = [
+        ("1x1x1", out_channel, 2000, 1000, 1000 + i, ts if same_second else ts + i, ts + i, 0.5)
+        for i in range(count)
+    ]
+    conn = db._get_connection()
+    conn.executemany("""
+        INSERT INTO forwards
+        (in_channel, out_channel, in_msat, out_msat, fee_msat, timestamp, resolved_time,
+         resolution_time)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, rows)
+    return sum(r[4] for r in rows)
+
+
+def _daily_fees(db):
+    return db._get_connection().execute(
+        "SELECT COALESCE(SUM(total_fee_msat), 0) AS fee, COALESCE(SUM(forward_count), 0) AS n "
+        "FROM daily_forwarding_stats"
+    ).fetchone()
+
+
+class TestChunkedPrune:
+
+    def test_prunes_in_chunks_and_preserves_revenue(self, database):
+        old_fees = _fill(database, 260, age_days=20)
+        _fill(database, 10, age_days=1)
+
+        result = database.cleanup_old_data(days_to_keep=8)
+
+        assert result["complete"]
+        assert result["rows_pruned"]["forwards"] == 260
+        assert result["preserved_revenue_msat"] == old_fees
+        daily = _daily_fees(database)
+        assert (daily["fee"], daily["n"]) == (old_fees, 260)
+        assert database.get_forward_count_since("2x2x2", 0) == 10
+        assert database.maintenance_stats["rows_pruned"]["forwards"] == 260
+
+    def test_rows_sharing_a_second_are_pruned_together(self, database):
+        _fill(database, 120, age_days=20, same_second=True)
+        result = database.cleanup_old_data(days_to_keep=8)
+        assert result["rows_pruned"]["forwards"] == 120
+        assert _daily_fees(database)["n"] == 120
+
+    def test_time_budget_defers_the_rest(self, database):
+        _fill(database, 100, age_days=20)
+        result = database.cleanup_old_data(days_to_keep=8, max_seconds=0)
+        assert not result["complete"]
+        assert result["rows_pruned"] == {}
+
+        result = database.cleanup_old_data(days_to_keep=8)
+        assert result["complete"]
+        assert result["rows_pruned"]["forwards"] == 100
+
+    def test_other_tables_use_their_retention(self, database):
+        conn = database._get_connection()
+        now = int(time.time())
+        conn.executemany(
+            "INSERT INTO peer_connection_history (peer_id, event_type, timestamp) VALUES (?, ?, ?)",
+            [("02" + "a" * 64, "connected", now - 30 * DAY)] * 120 + [("02" + "b" * 64, "connected", now)]
+        )
+        result = database.cleanup_old_data(days_to_keep=8)
+        assert result["rows_pruned"]["peer_connection_history"] == 120
+        assert conn.execute("SELECT COUNT(*) FROM peer_connection_history").fetchone()[0] == 1
+
+
+class TestReclaimSpace:
+
+    def test_new_database_uses_incremental_vacuum(self, database):
+        conn = database._get_connection()
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        _fill(database, 3000, age_days=20)
+        database.cleanup_old_data(days_to_keep=8)
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        assert free > 0
+
+        database.VACUUM_STEP_PAGES = 5
+        result = database.reclaim_space()
+
+        assert result["pages_freed"] == free
+        assert result["freelist_pages"] == 0
+        assert database.maintenance_stats["pages_freed"] == free
+
+    def test_legacy_file_converted_on_request(self, temp_db_path):
+        conn = sqlite3.connect(temp_db_path)
+        conn.execute("CREATE TABLE filler (x TEXT)")
+        conn.executemany("INSERT INTO filler VALUES (?)", [("x" * 500,)] * 2000)
+        conn.commit()
+        conn.execute("DELETE FROM filler")
+        conn.commit()
+        conn.close()
+
+        db = Database(temp_db_path, MagicMock())
+        db.initialize()
+        conn = db._get_connection()
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        assert free > 0
+
+        # Maintenance never runs the full VACUUM on its own
+        result = db.reclaim_space()
+        assert result["pages_freed"] == 0
+        assert result["freelist_pages"] == free
+
+        assert db.convert_auto_vacuum()
+        # freelist_count reads page 1 again; auto_vacuum alone reports the
+        # reader's cached header
+        assert conn.execute("PRAGMA freelist_count").fetchone()[0] == 0
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        assert not db.convert_auto_vacuum()
+
+    def test_nothing_to_reclaim(self, database):
+        assert database.reclaim_space()["pages_freed"] == 0
+
+
+class TestMaintenanceMetrics:
+
+    def test_checkpoint_and_metrics(self, database):
+        _fill(database, 60, age_days=20)
+        database.cleanup_old_data(days_to_keep=8)
+        database.reclaim_space()
+        checkpoint = database.checkpoint_wal()
+        assert checkpoint["complete"]
+
+        families = {f.name: f for f in database.collect_metrics()}
+        assert families["revenue_ops_db_pruned_rows"].get(table="forwards") == 60
+        assert families["revenue_ops_db_wal_checkpoints"].get(result="complete") == 1
+        assert families["revenue_ops_db_freelist_pages"].get() == 0
@@ -0,0 +1,147 @@
+"""
+Tests for the single database writer and the per-thread read connections.
+"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from modules.db_writer import (
+    BATCH, BEGIN, EXCLUSIVE, READ, DatabaseWriter, _Op, statement_kind,
+)
+
+
+@pytest.fixture
+def database(database):
+    database._get_connection().execute("CREATE TABLE t (k INTEGER PRIMARY KEY, v TEXT)")
+    return database
+
+
+class TestStatementKind:
+
+    @pytest.mark.parametrize("sql, kind", [
+        ("SELECT 1", READ),
+        ("  -- comment\n  select * from t", READ),
+        ("WITH x AS (SELECT 1) SELECT * FROM x", READ),
+        ("WITH x AS (SELECT 1) INSERT INTO t SELECT * FROM x", BATCH),
+        ("PRAGMA freelist_count", READ),
+        ("PRAGMA table_info(forwards)", READ),
+        ("PRAGMA journal_mode=WAL;", EXCLUSIVE),
+        ("PRAGMA wal_checkpoint(PASSIVE)", EXCLUSIVE),
+        ("INSERT OR IGNORE INTO t VALUES (1, 'a')", BATCH),
+        ("UPDATE t SET v = 'b'", BATCH),
+        ("DELETE FROM t", BATCH),
+        ("BEGIN IMMEDIATE", BEGIN),
+        ("CREATE TABLE x (a)", EXCLUSIVE),
+        ("VACUUM", EXCLUSIVE),
+    ])
+    def test_classification(self, sql, kind):
+        assert statement_kind(sql) == kind
+
+
+class TestWrites:
+
+    def test_write_then_read_on_same_thread(self, database):
+        conn = database._get_connection()
+        changes = conn.total_changes
+        cursor = conn.execute("INSERT INTO t (v) VALUES ('a')")
+        assert cursor.rowcount == 1 and cursor.lastrowid == 1
+        assert conn.execute("SELECT v FROM t").fetchone()["v"] == "a"
+        assert conn.total_changes == changes + 1
+
+    def test_reader_is_query_only(self, database):
+        with pytest.raises(sqlite3.OperationalError):
+            database._get_connection().reader.execute("INSERT INTO t (v) VALUES ('a')")
+
+    def test_concurrent_writes_are_group_committed(self, database):
+        database.writer.MAX_BATCH = 64
+        failed = database.writer.failed
+
+        def write(i):
+            database._get_connection().execute("INSERT INTO t (k, v) VALUES (?, 'x')", (i,))
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(200)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        conn = database._get_connection()
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 200
+        status = database.writer.get_status()
+        assert status["failed"] == failed
+        assert status["queue_depth"] == 0
+
+    def test_failing_write_does_not_spoil_its_batch(self, temp_db_path):
+        conn = sqlite3.connect(temp_db_path, isolation_level=None)
+        conn.execute("CREATE TABLE t (k INTEGER PRIMARY KEY)")
+        conn.close()
+        writer = DatabaseWriter(lambda: sqlite3.connect(temp_db_path, isolation_level=None))
+        ops = [_Op("execute", "INSERT INTO t VALUES (?)", (k,), BATCH) for k in (1, 1, 2)]
+        writer._run_batch(writer._connect(), ops)
+
+        assert ops[0].error is None and ops[2].error is None
+        assert isinstance(ops[1].error, sqlite3.IntegrityError)
+        check = sqlite3.connect(temp_db_path)
+        assert [r[0] for r in check.execute("SELECT k FROM t ORDER BY k")] == [1, 2]
+        check.close()
+
+
+class TestTransactions:
+
+    def test_transaction_sees_its_own_writes(self, database):
+        conn = database._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        assert conn.in_transaction
+        conn.execute("INSERT INTO t (v) VALUES ('a')")
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+        # Not visible to other threads until committed
+        seen = []
+        other = threading.Thread(target=lambda: seen.append(
+            database._get_connection().execute("SELECT COUNT(*) FROM t").fetchone()[0]))
+        other.start()
+        other.join()
+        assert seen == [0]
+        conn.execute("COMMIT")
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+
+    def test_rollback(self, database):
+        conn = database._get_connection()
+        conn.execute("BEGIN")
+        conn.execute("INSERT INTO t (v) VALUES ('a')")
+        conn.rollback()
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    def test_idle_transaction_is_rolled_back(self, database):
+        database.writer.SESSION_TIMEOUT = 0.05
+        conn = database._get_connection()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO t (v) VALUES ('a')")
+        time.sleep(0.2)
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("COMMIT")
+        assert not conn.in_transaction
+        # The writer serves other threads again
+        conn.execute("INSERT INTO t (v) VALUES ('b')")
+        assert [r["v"] for r in conn.execute("SELECT v FROM t")] == ["b"]
+        assert database.writer.get_status()["aborted_sessions"] == 1
+
+
+class TestLifecycle:
+
+    def test_writer_restarts_after_stop(self, database):
+        conn = database._get_connection()
+        database.writer.stop()
+        assert not database.writer.get_status()["running"]
+        conn.execute("INSERT INTO t (v) VALUES ('a')")
+        assert database.writer.get_status()["running"]
+
+    def test_metrics(self, database):
+        database._get_connection().execute("INSERT INTO t (v) VALUES ('a')")
+        families = {f.name: f for f in database.writer.collect_metrics()}
+        assert families["revenue_ops_db_write_ops"].get(outcome="ok") >= 2
+        assert families["revenue_ops_db_write_queue_depth"].get() == 0
@@ -0,0 +1,48 @@
+"""
+Smoke test for the fee-controller backtester (benchmarks/fee_backtest.py).
+
+Runs a few simulated cycles on a tiny synthetic node so changes to the fee
+controller or the generator APIs break here rather than in the next
+backtest.
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "benchmarks"))
+
+import fee_backtest  # noqa: E402
+from synthetic_node import SyntheticNode  # noqa: E402
+
+
+class TestDemandModel:
+
+    def test_revenue_peaks_at_unit_elasticity(self):
+        channel = fee_backtest.ChannelDemand("1x1x1", rate_per_hour=10.0, ref_fee_ppm=500,
+                                             elasticity=-2.0, amount_msat=1_000_000)
+        best = channel.optimal_fee(1, 5000)
+        assert best == 250
+        assert channel.expected_revenue_msat(best, 1.0) > channel.expected_revenue_msat(500, 1.0)
+
+
+class TestBacktester:
+
+    def test_runs_simulated_cycles(self, tmp_path):
+        node = SyntheticNode(channels=4, forwards=0, seed=7)
+        demand = fee_backtest.synthetic_demand(node, 500.0, random.Random(7))
+        real_time = time.time
+
+        result = fee_backtest.Backtester(node, demand, str(tmp_path), seed=7).run(
+            days=0.25, cycle_minutes=60)
+
+        # The simulated clock is uninstalled again
+        assert time.time is real_time
+        assert result["cycles"] == 6
+        assert result["revenue"]["sats"] > 0
+        assert result["revenue"]["optimal_expected_sats"] > 0
+        assert result["convergence"]["channels"] == 4
+        assert len(result["cpu"]["per_cycle_ms"]) == 4
+        assert set(result["channels"]) == set(demand)
@@ -0,0 +1,155 @@
+"""
+Tests for the cold-tier forward archive and the cross-tier history queries.
+"""
+
+import calendar
+import os
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.database import Database
+from modules.forward_archive import ForwardArchive, month_end, month_of
+
+DAY = 86400
+
+
+def _ts(year, month, day, hour=12):
+    return calendar.timegm((year, month, day, hour, 0, 0))
+
+
+def _insert(db, rows):
+    """rows: (out_channel, fee_msat, timestamp)"""
+    db._get_connection().executemany("""
+        INSERT INTO forwards
+        (in_channel, out_channel, in_msat, out_msat, fee_msat, timestamp, resolved_time)
+        VALUES ('1x1x1', ?, 2000000, 1000000, ?, ?, ?)
+    """, [(out, fee, ts, ts + 1) for out, fee, ts in rows])
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ForwardArchive(str(tmp_path / "archive"))
+
+
+@pytest.fixture
+def database(database, archive):
+    database.PRUNE_CHUNK_ROWS = 4
+    database.PRUNE_YIELD_SECONDS = 0
+    database.set_forward_archive(archive)
+    return database
+
+
+class TestMonths:
+
+    def test_month_boundaries(self):
+        assert month_of(_ts(2025, 12, 31, 23)) == (2025, 12)
+        assert month_end(2025, 12) == _ts(2026, 1, 1, 0)
+        assert month_end(2026, 2) == _ts(2026, 3, 1, 0)
+
+
+class TestArchivePrune:
+
+    def test_pruned_forwards_move_into_month_files(self, database, archive):
+        rows = [("2x2x2", 100 + i, _ts(2026, 1, 20 + i)) for i in range(10)]  # Jan 20 - Jan 29
+        rows += [("3x3x3", 7, _ts(2026, 2, d)) for d in range(1, 6)]
+        recent = int(time.time()) - DAY
+        rows += [("2x2x2", 1, recent)]
+        _insert(database, rows)
+
+        result = database.cleanup_old_data(days_to_keep=8)
+
+        assert result["complete"]
+        assert result["rows_pruned"]["forwards"] == 15
+        assert archive.months() == [(2026, 1), (2026, 2)]
+        assert archive.rows_archived == 15
+        conn = archive.connect(2026, 1)
+        try:
+            assert conn.execute("SELECT COUNT(*) FROM forwards").fetchone()[0] == 10
+        finally:
+            conn.close()
+        # Still aggregated for the lifetime totals
+        daily = database._get_connection().execute(
+            "SELECT SUM(forward_count) FROM daily_forwarding_stats").fetchone()[0]
+        assert daily == 15
+        assert database.get_forward_count_since("2x2x2", 0) == 1
+
+    def test_repeated_copy_adds_nothing(self, database, archive):
+        _insert(database, [("2x2x2", 5, _ts(2026, 1, 3))])
+        conn = database._get_connection()
+        schema, _ = archive.attach(conn, _ts(2026, 1, 3))
+        conn.execute(f"INSERT INTO {schema}.forwards SELECT timestamp, out_scid, in_scid, in_msat, "
+                     "out_msat, fee_msat, resolved_time, resolution_time FROM forwards_compact")
+        archive.detach(conn)
+
+        database.cleanup_old_data(days_to_keep=8)
+
+        assert archive.rows_archived == 0
+        history = database.get_forward_history(0, group_by="month")
+        assert history["totals"]["forwards"] == 1
+
+    def test_without_archive_rows_are_dropped(self, temp_db_path, tmp_path):
+        db = Database(temp_db_path, MagicMock())
+        db.initialize()
+        _insert(db, [("2x2x2", 5, _ts(2026, 1, 3))])
+        db.cleanup_old_data(days_to_keep=8)
+        assert db.get_forward_history(0)["totals"]["forwards"] == 0
+
+
+class TestForwardHistory:
+
+    @pytest.fixture
+    def populated(self, database):
+        old = [("2x2x2", 10, _ts(2026, 1, 5)), ("2x2x2", 20, _ts(2026, 1, 5, 18)),
+               ("3x3x3", 30, _ts(2026, 2, 10))]
+        now = int(time.time())
+        recent = [("2x2x2", 40, now - DAY), ("3x3x3", 50, now - 2 * DAY)]
+        _insert(database, old + recent)
+        database.cleanup_old_data(days_to_keep=8)
+        return now
+
+    def test_fans_out_across_tiers(self, database, populated):
+        history = database.get_forward_history(_ts(2026, 1, 1), group_by="channel")
+        assert history["totals"]["forwards"] == 5
+        assert history["totals"]["fee_msat"] == 150
+        by_channel = {b["key"]: b["fee_msat"] for b in history["buckets"]}
+        assert by_channel == {"2x2x2": 70, "3x3x3": 80}
+        assert history["tiers"] == {"2026-01": 2, "2026-02": 1, "hot": 2}
+
+    def test_day_buckets_merge_and_window_skips_months(self, database, populated):
+        history = database.get_forward_history(_ts(2026, 2, 1), group_by="day")
+        assert "2026-01" not in history["tiers"]
+        assert history["buckets"][0] == {
+            "key": _ts(2026, 2, 10, 0), "forwards": 1, "in_msat": 2000000,
+            "out_msat": 1000000, "fee_msat": 30,
+        }
+        january = database.get_forward_history(_ts(2026, 1, 1), _ts(2026, 2, 1))
+        assert [(b["key"], b["forwards"]) for b in january["buckets"]] == [(_ts(2026, 1, 5, 0), 2)]
+
+    def test_channel_filter(self, database, populated):
+        history = database.get_forward_history(0, channel_id="3x3x3", group_by="month")
+        assert history["totals"]["fee_msat"] == 80
+        assert database.get_forward_history(0, channel_id="bogus")["totals"]["forwards"] == 0
+
+    def test_iter_forwards_oldest_first(self, database, populated):
+        rows = list(database.iter_forwards(0))
+        assert [r["fee_msat"] for r in rows] == [10, 20, 30, 50, 40]
+        assert rows[0]["out_channel"] == "2x2x2" and rows[0]["in_channel"] == "1x1x1"
+
+    def test_portfolio_seed_reads_archive(self, database, populated):
+        rows = database.get_forwards_since(_ts(2026, 2, 1))
+        assert [(r["out_channel"], r["fee_msat"]) for r in rows] == \
+            [("3x3x3", 30), ("3x3x3", 50), ("2x2x2", 40)]
+        assert rows[0]["received_time"] == _ts(2026, 2, 10)
+        assert database.get_oldest_forward_timestamp() == _ts(2026, 1, 5)
+
+    def test_invalid_group(self, database):
+        with pytest.raises(ValueError):
+            database.get_forward_history(0, group_by="week")
+
+    def test_status(self, database, archive, populated):
+        status = archive.get_status()
+        assert (status["months"], status["oldest"], status["newest"]) == (2, "2026-01", "2026-02")
+        assert status["bytes"] == sum(
+            os.path.getsize(archive.path(y, m)) for y, m in archive.months())
@@ -0,0 +1,152 @@
+"""
+Tests for the compact forwards layout and the legacy-table migration.
+"""
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.database import Database, _scid_encode_sql, int_to_scid, scid_to_int
+
+LEGACY_FORWARDS_SQL = """
+    CREATE TABLE forwards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        in_channel TEXT NOT NULL,
+        out_channel TEXT NOT NULL,
+        in_msat INTEGER NOT NULL,
+        out_msat INTEGER NOT NULL,
+        fee_msat INTEGER NOT NULL,
+        resolution_time REAL DEFAULT 0,
+        timestamp INTEGER NOT NULL,
+        resolved_time INTEGER DEFAULT 0
+    )
+"""
+
+
+def _record(db, in_ch, out_ch, fee, ts):
+    return db.record_forward(in_ch, out_ch, 1_000_000 + fee, 1_000_000, fee, ts, ts + 2, 1.5)
+
+
+def _snapshot(db, since):
+    return {
+        "volume": db.get_volume_since("2x2x2", since),
+        "count": db.get_forward_count_since("2x2x2", since),
+        "channel": db.get_channel_forwards("1x1x1", since),
+        "since": sorted((f["out_channel"], f["fee_msat"]) for f in db.get_forwards_since(since)),
+        "last": db.get_last_forward_time("2x2x2"),
+        "lifetime": db.get_lifetime_stats()["total_forwards"],
+    }
+
+
+@pytest.fixture
+def legacy_database(temp_db_path):
+    conn = Database(temp_db_path, MagicMock())._get_connection()
+    conn.execute(LEGACY_FORWARDS_SQL)
+    conn.close()
+    db = Database(temp_db_path, MagicMock())
+    db.initialize()
+    return db
+
+
+class TestScidEncoding:
+
+    def test_round_trip(self):
+        for scid in ("812345x1234x0", "1x1x1", "8388607x16777215x65535"):
+            assert int_to_scid(scid_to_int(scid)) == scid
+        assert scid_to_int("812345:1234:0") == scid_to_int("812345x1234x0")
+
+    def test_order_matches_block_height(self):
+        assert scid_to_int("800000x9999x1") < scid_to_int("800001x1x0")
+
+    def test_invalid(self):
+        for value in (None, "", "abc", "1x2", "1x2x3x4", "8388608x0x0", "-1x0x0"):
+            assert scid_to_int(value) is None
+
+    def test_sql_encoder_matches_python(self, database):
+        conn = database._get_connection()
+        values = ("812345x1234x0", "812345:1234:0", "8388607x16777215x65535", "1x16777216x0",
+                  "8388608x0x0", "1x1x65536", "1x1x1x1", "1xax1", "1x1x1a", "x1x1", "1x2",
+                  "123456789x1x1", "-1x0x0")
+        for value in values:
+            encoded = conn.execute(f"SELECT {_scid_encode_sql(':v')}", {"v": value}).fetchone()[0]
+            assert encoded == scid_to_int(value), value
+        assert conn.execute(f"SELECT {_scid_encode_sql(':v')}", {"v": ""}).fetchone()[0] == 0
+
+
+class TestCompactLayout:
+
+    def test_fresh_database_is_compact(self, database):
+        assert database.forwards_compact
+        assert not database.forwards_migration_pending
+        assert database.migrate_forwards_compact() == {"migrated": False, "reason": "not needed"}
+
+    def test_view_decodes_and_dedups(self, database):
+        assert _record(database, "1x1x1", "2x2x2", 50, 1000)
+        assert not _record(database, "1:1:1", "2:2:2", 50, 1000)
+        rows = database._get_connection().execute("SELECT * FROM forwards").fetchall()
+        assert len(rows) == 1
+        assert (rows[0]["in_channel"], rows[0]["out_channel"]) == ("1x1x1", "2x2x2")
+        assert rows[0]["id"] is None
+
+    def test_insert_through_view(self, database):
+        database._get_connection().execute("""
+            INSERT INTO forwards (in_channel, out_channel, in_msat, out_msat, fee_msat, timestamp)
+            VALUES ('1x1x1', '2x2x2', 1010000, 1000000, 10000, 1000)
+        """)
+        assert database.get_volume_since("2x2x2", 0) == 1000
+        assert database.get_forward_count_since("1x1x1", 0) == 0
+        assert database.get_forward_count_since("2x2x2", 0) == 1
+
+    def test_invalid_channel_matches_nothing(self, database):
+        _record(database, "1x1x1", "2x2x2", 50, 1000)
+        assert database.get_volume_since("not-a-scid", 0) == 0
+
+
+class TestLegacyMigration:
+
+    def test_legacy_table_kept_until_migrated(self, legacy_database):
+        assert legacy_database.forwards_migration_pending
+        assert not legacy_database.forwards_compact
+        _record(legacy_database, "1x1x1", "2x2x2", 50, 1000)
+        assert legacy_database.get_volume_since("2x2x2", 0) == 1000
+
+    def test_migration_preserves_query_results(self, legacy_database):
+        for i in range(25):
+            _record(legacy_database, "1x1x1", "2x2x2", 10 + i, 1000 + i * 60)
+            _record(legacy_database, "3x3x3", "1x1x1", 5, 1000 + i * 60)
+        before = _snapshot(legacy_database, 1500)
+
+        result = legacy_database.migrate_forwards_compact(batch_size=7)
+
+        assert result["migrated"]
+        assert result["copied"] == result["legacy_rows"] == 50
+        assert legacy_database.forwards_compact
+        assert not legacy_database.forwards_migration_pending
+        assert _snapshot(legacy_database, 1500) == before
+        kind = legacy_database._get_connection().execute(
+            "SELECT type FROM sqlite_master WHERE name = 'forwards'").fetchone()["type"]
+        assert kind == "view"
+
+    def test_reopen_after_migration(self, legacy_database, temp_db_path):
+        _record(legacy_database, "1x1x1", "2x2x2", 50, 1000)
+        legacy_database.migrate_forwards_compact()
+        legacy_database.close_all_connections()
+        reopened = Database(temp_db_path, MagicMock())
+        reopened.initialize()
+        assert reopened.forwards_compact
+        assert not _record(reopened, "1x1x1", "2x2x2", 50, 1000)
+        assert reopened.get_forward_count_since("2x2x2", 0) == 1
+
+    def test_unencodable_rows_are_kept_aside(self, legacy_database):
+        _record(legacy_database, "1x1x1", "2x2x2", 50, 1000)
+        conn = legacy_database._get_connection()
+        conn.executemany("""
+            INSERT INTO forwards (in_channel, out_channel, in_msat, out_msat, fee_msat, timestamp)
+            VALUES ('1x1x1', ?, 2000, 1000, 7, 1000)
+        """, [("bogus-a",), ("bogus-b",), ("1x16777216x0",)])
+
+        result = legacy_database.migrate_forwards_compact(batch_size=2)
+
+        assert (result["copied"], result["rejected"], result["duplicates"]) == (1, 3, 0)
+        kept = conn.execute("SELECT out_channel FROM forwards_unencodable ORDER BY id").fetchall()
+        assert [r["out_channel"] for r in kept] == ["bogus-a", "bogus-b", "1x16777216x0"]
+        assert legacy_database.get_forward_count_since("2x2x2", 0) == 1
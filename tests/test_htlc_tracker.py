@@ -0,0 +1,104 @@
+"""
+Tests for the in-flight HTLC tracker.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from modules.htlc_tracker import SYNC_GRACE_SECONDS, HtlcTracker
+
+
+def _accept(tracker, in_scid, htlc_id, out_scid="2x2x2", amount=10_000):
+    tracker.on_htlc_accepted(
+        {"short_channel_id": in_scid, "id": htlc_id, "amount_msat": amount},
+        {"short_channel_id": out_scid, "forward_msat": amount - 100},
+    )
+
+
+def _forward(in_scid, htlc_id, status="settled", out_scid="2x2x2", amount=10_000):
+    return {"status": status, "in_channel": in_scid, "in_htlc_id": htlc_id,
+            "out_channel": out_scid, "in_msat": amount, "out_msat": amount - 100}
+
+
+class TestHtlcTracker:
+
+    @pytest.fixture
+    def clock(self):
+        return [1000.0]
+
+    @pytest.fixture
+    def tracker(self, clock):
+        config = SimpleNamespace(htlc_congestion_threshold=0.8)
+        return HtlcTracker(config, clock=lambda: clock[0])
+
+    def test_accept_counts_both_channels(self, tracker):
+        _accept(tracker, "1x1x1", 7)
+        assert tracker.active_htlcs("1x1x1") == 1
+        assert tracker.active_htlcs("2x2x2") == 1
+        assert tracker.inflight_msat("1x1x1") == 10_000
+        assert tracker.inflight_msat("2x2x2") == 9_900
+
+    def test_resolution_releases_slots(self, tracker):
+        _accept(tracker, "1x1x1", 7)
+        tracker.on_forward_event(_forward("1x1x1", 7, status="offered"))
+        assert tracker.active_htlcs("1x1x1") == 1
+        tracker.on_forward_event(_forward("1x1x1", 7, status="failed"))
+        assert tracker.active_htlcs("1x1x1") == 0
+        assert tracker.active_htlcs("2x2x2") == 0
+        assert tracker.inflight_msat("2x2x2") == 0
+
+    def test_final_hop_not_tracked(self, tracker):
+        tracker.on_htlc_accepted({"short_channel_id": "1x1x1", "id": 1, "amount_msat": 5}, {})
+        assert tracker.active_htlcs("1x1x1") == 0
+
+    def test_replayed_accept_counted_once(self, tracker):
+        _accept(tracker, "1x1x1", 7)
+        _accept(tracker, "1x1x1", 7)
+        assert tracker.active_htlcs("1x1x1") == 1
+
+    def test_congestion_follows_slot_usage(self, tracker):
+        tracker.sync([{"short_channel_id": "1x1x1", "max_accepted_htlcs": 5, "htlcs": []}])
+        for i in range(4):
+            _accept(tracker, "1x1x1", i)
+        assert tracker.slot_pressure("1x1x1") == pytest.approx(0.8)
+        assert not tracker.is_congested("1x1x1")
+        _accept(tracker, "1x1x1", 4)
+        assert tracker.is_congested("1x1x1")
+        tracker.on_forward_event(_forward("1x1x1", 4))
+        assert not tracker.is_congested("1x1x1")
+
+    def test_sync_replaces_counts_and_drops_stale(self, tracker, clock):
+        _accept(tracker, "1x1x1", 7)
+        clock[0] += SYNC_GRACE_SECONDS + 1
+        tracker.sync([
+            {"short_channel_id": "1x1x1", "htlcs": [
+                {"direction": "in", "id": 8, "amount_msat": 3000}]},
+        ])
+        # HTLC 7 resolved without a notification; 8 predates tracking
+        assert tracker.active_htlcs("1x1x1") == 1
+        assert tracker.active_htlcs("2x2x2") == 0
+        assert tracker.get_status()["inflight_htlcs"] == 0
+
+    def test_sync_keeps_recent_accepts(self, tracker):
+        tracker.sync([{"short_channel_id": "3x3x3", "htlcs": []}])
+        _accept(tracker, "1x1x1", 7)
+        tracker.sync([{"short_channel_id": "1x1x1", "htlcs": []}])
+        assert tracker.active_htlcs("1x1x1") == 1
+        assert tracker.active_htlcs("2x2x2") == 1
+
+    def test_unmatched_resolution_uses_event(self, tracker):
+        tracker.sync([
+            {"short_channel_id": "1x1x1", "htlcs": [{"direction": "in", "id": 8}]},
+            {"short_channel_id": "2x2x2", "htlcs": [{"direction": "out", "id": 3}]},
+        ])
+        tracker.on_forward_event(_forward("1x1x1", 8))
+        assert tracker.active_htlcs("1x1x1") == 0
+        assert tracker.active_htlcs("2x2x2") == 0
+        assert tracker.get_status()["unmatched_resolutions"] == 1
+
+    def test_colon_scids_normalized(self, tracker):
+        _accept(tracker, "1:1:1", 7, out_scid="2:2:2")
+        assert tracker.active_htlcs("1x1x1") == 1
+        tracker.on_forward_event(_forward("1:1:1", 7))
+        assert tracker.active_htlcs("2x2x2") == 0
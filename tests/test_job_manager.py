@@ -0,0 +1,90 @@
+"""
+Tests for the sling JobManager monitor (one snapshot per pass).
+"""
+
+import time
+
+import pytest
+
+from modules.config import Config
+from modules.rebalancer import ActiveJob, JobManager, JobStatus, RebalanceCandidate
+
+
+def _candidate(to_channel, max_budget_msat=10_000_000):
+    return RebalanceCandidate(
+        source_candidates=["900x1x0"], to_channel=to_channel,
+        primary_source_peer_id="src", to_peer_id="dst",
+        amount_sats=500_000, amount_msat=500_000_000,
+        outbound_fee_ppm=1000, inbound_fee_ppm=100, source_fee_ppm=50,
+        weighted_opp_cost_ppm=50, spread_ppm=850,
+        max_budget_sats=max_budget_msat // 1000, max_budget_msat=max_budget_msat,
+        max_fee_ppm=500, expected_profit_sats=100, liquidity_ratio=0.05,
+        dest_flow_state="balanced", dest_turnover_rate=0.1, source_turnover_rate=0.1,
+    )
+
+
+def _track(manager, scid, initial_sats, started=None, max_budget_msat=10_000_000):
+    manager._active_jobs[scid] = ActiveJob(
+        scid=scid, scid_normalized=scid, source_candidates=["900x1x0"],
+        start_time=started or int(time.time()),
+        candidate=_candidate(scid, max_budget_msat), rebalance_id=1,
+        target_amount_sats=500_000, initial_local_sats=initial_sats,
+        max_fee_ppm=500, status=JobStatus.RUNNING,
+    )
+
+
+@pytest.fixture
+def manager(mock_plugin, mock_database):
+    config = Config()
+    config.sling_job_timeout_seconds = 3600
+    return JobManager(mock_plugin, config, mock_database)
+
+
+class TestMonitorJobs:
+
+    def test_single_snapshot_per_pass(self, manager, mock_plugin):
+        for i in range(5):
+            _track(manager, f"{100 + i}x1x0", initial_sats=1_000)
+        mock_plugin.rpc.listfunds.return_value = {"channels": [
+            {"short_channel_id": "100x1x0", "our_amount_msat": 501_000_000},
+            {"short_channel_id": "101x1x0", "our_amount_msat": "1000000msat"},
+        ]}
+        mock_plugin.rpc.call.return_value = {"jobs": [
+            {"scid": "102x1x0", "fee_total_msat": 20_000_000},
+            {"scid": "103x1x0", "status": "error", "last_error": "no route"},
+        ]}
+
+        summary = manager.monitor_jobs()
+
+        assert mock_plugin.rpc.listfunds.call_count == 1
+        stats_calls = [c for c in mock_plugin.rpc.call.call_args_list if c.args[0] == "sling-stats"]
+        assert len(stats_calls) == 1
+        assert summary == {
+            "checked": 5, "completed": 1, "failed": 2,
+            "timed_out": 0, "still_running": 2,
+        }
+        assert manager.active_channels == ["101x1x0", "104x1x0"]
+
+    def test_timeout_uses_snapshot_balance(self, manager, mock_plugin, mock_database):
+        _track(manager, "100x1x0", initial_sats=1_000, started=int(time.time()) - 7200)
+        mock_plugin.rpc.listfunds.return_value = {"channels": [
+            {"short_channel_id": "100x1x0", "our_amount_msat": 2_000_000},
+        ]}
+        mock_plugin.rpc.call.return_value = {"jobs": []}
+
+        summary = manager.monitor_jobs()
+
+        assert summary["timed_out"] == 1
+        assert mock_plugin.rpc.listfunds.call_count == 1
+        assert mock_database.update_rebalance_result.call_args.args[1] == "partial"
+        assert manager.active_job_count == 0
+
+    def test_balance_error_is_not_success(self, manager, mock_plugin):
+        _track(manager, "100x1x0", initial_sats=1_000)
+        mock_plugin.rpc.listfunds.side_effect = Exception("rpc down")
+        mock_plugin.rpc.call.return_value = {"jobs": []}
+
+        summary = manager.monitor_jobs()
+
+        assert summary["still_running"] == 1
+        assert manager.active_job_count == 1
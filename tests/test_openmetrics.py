@@ -0,0 +1,146 @@
+"""
+Tests for the OpenMetrics exporter.
+"""
+
+import os
+import urllib.request
+
+import pytest
+
+from modules.openmetrics import (
+    MetricFamily, MetricsRegistry, MetricsServer, OPENMETRICS_CONTENT_TYPE, write_textfile,
+)
+from modules.rpc_metrics import RpcMetrics
+from modules.scheduler import Scheduler, Task
+
+
+class TestMetricFamily:
+
+    def test_counter_total_suffix(self):
+        family = MetricFamily("x_calls", "counter", "Calls", ("method",))
+        family.inc(method="getinfo")
+        family.inc(2, method="getinfo")
+        out = []
+        family.render(out, openmetrics=True)
+        assert out == [
+            "# TYPE x_calls counter",
+            "# HELP x_calls Calls",
+            'x_calls_total{method="getinfo"} 3',
+        ]
+
+    def test_prometheus_counter_type_uses_sample_name(self):
+        family = MetricFamily("x_calls", "counter", "Calls")
+        family.inc()
+        out = []
+        family.render(out, openmetrics=False)
+        assert out[0] == "# TYPE x_calls_total counter"
+
+    def test_histogram_buckets_are_cumulative(self):
+        family = MetricFamily("x_seconds", "histogram", "Durations", buckets=(1, 5))
+        for value in (0.5, 2, 3, 10):
+            family.observe(value)
+        out = []
+        family.render(out)
+        assert 'x_seconds_bucket{le="1"} 1' in out
+        assert 'x_seconds_bucket{le="5"} 3' in out
+        assert 'x_seconds_bucket{le="+Inf"} 4' in out
+        assert "x_seconds_count 4" in out
+        assert "x_seconds_sum 15.5" in out
+
+    def test_replace_drops_missing_labels(self):
+        family = MetricFamily("x_ratio", "gauge", "Ratio", ("channel",))
+        family.set(0.5, channel="1x1x1")
+        family.replace({("2x2x2",): -0.25})
+        assert family.get(channel="1x1x1") is None
+        assert family.get(channel="2x2x2") == -0.25
+
+    def test_label_escaping_and_mismatch(self):
+        family = MetricFamily("x", "gauge", "X", ("name",))
+        family.set(1, name='a"b\\c')
+        out = []
+        family.render(out)
+        assert out[-1] == 'x{name="a\\"b\\\\c"} 1'
+        with pytest.raises(ValueError):
+            family.set(1, other="y")
+
+    def test_empty_family_not_rendered(self):
+        out = []
+        MetricFamily("x", "gauge", "X").render(out)
+        assert out == []
+
+
+class TestRegistry:
+
+    def test_declare_is_idempotent(self):
+        registry = MetricsRegistry()
+        assert registry.counter("x", "X") is registry.counter("x", "X")
+
+    def test_failing_collector_is_counted(self):
+        registry = MetricsRegistry()
+        registry.gauge("x", "X").set(1)
+        errors = []
+
+        def broken():
+            raise RuntimeError("boom")
+
+        registry.register_collector("broken", broken)
+        text = registry.render(on_error=errors.append)
+        assert "x 1" in text
+        assert "revenue_ops_metrics_collector_errors 1" in text
+        assert text.endswith("# EOF\n")
+        assert errors and "boom" in errors[0]
+
+    def test_rpc_metrics_collector(self):
+        registry = MetricsRegistry()
+        rpc = RpcMetrics()
+        rpc.record_queued()
+        rpc.record_call("listpeerchannels", "core", 0.02, "ok")
+        registry.register_collector("rpc", rpc.collect_metrics)
+        text = registry.render()
+        assert 'revenue_ops_rpc_calls_total{method="listpeerchannels",outcome="ok"} 1' in text
+        assert 'revenue_ops_rpc_latency_seconds_count{method="listpeerchannels",group="core"} 1' \
+            in text
+        assert "revenue_ops_rpc_queued_calls 1" in text
+
+    def test_scheduler_collector(self, mock_plugin):
+        import threading
+        now = [1000.0]
+        scheduler = Scheduler(mock_plugin, threading.Event(), clock=lambda: now[0],
+                              executor=lambda fn: fn())
+        scheduler.add(Task("a", lambda: None, 60))
+        scheduler.tick()
+        families = {f.name: f for f in scheduler.collect_metrics()}
+        assert families["revenue_ops_task_runs"].get(task="a") == 1
+        assert families["revenue_ops_scheduler_waiting_tasks"].get() == 0
+
+
+class TestExporters:
+
+    def test_textfile_written_atomically(self, tmp_path):
+        registry = MetricsRegistry()
+        registry.gauge("x", "X").set(2)
+        path = str(tmp_path / "revenue_ops.prom")
+        write_textfile(path, registry)
+        with open(path) as f:
+            text = f.read()
+        assert "x 2" in text
+        assert "# EOF" not in text
+        assert os.listdir(tmp_path) == ["revenue_ops.prom"]
+
+    def test_http_server(self):
+        registry = MetricsRegistry()
+        registry.counter("x_events", "Events").inc()
+        server = MetricsServer(0, registry)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.port}/metrics"
+            request = urllib.request.Request(
+                url, headers={"Accept": "application/openmetrics-text"})
+            with urllib.request.urlopen(request, timeout=5) as response:
+                assert response.headers["Content-Type"] == OPENMETRICS_CONTENT_TYPE
+                body = response.read().decode()
+            assert "x_events_total 1" in body
+            assert body.endswith("# EOF\n")
+            assert server.scrapes == 1
+        finally:
+            server.stop()
@@ -487,6 +487,422 @@ class TestPortfolioOptimizer:
         assert priority == "low"
 
 
+
+class TestArrayEngine:
+    """Tests for the array-backed covariance and QP engine."""
+
+    @pytest.fixture(params=["numpy", "pure"])
+    def engine(self, request, monkeypatch):
+        import modules.portfolio_optimizer as po
+
+        if request.param == "numpy":
+            if po.np is None:
+                pytest.skip("numpy not installed")
+        else:
+            monkeypatch.setattr(po, "np", None)
+        return po
+
+    @staticmethod
+    def _random_node(n_channels, seed=7):
+        import random
+
+        rnd = random.Random(seed)
+        now = int(time.time())
+        channels = [
+            {
+                "short_channel_id": f"{100 + i}x1x0",
+                "peer_id": f"02{i:064x}",
+                "total_msat": 2_000_000_000,
+                "to_us_msat": rnd.randint(1, 2_000_000) * 1000,
+            }
+            for i in range(n_channels)
+        ]
+        forwards = [
+            {
+                "out_channel": f"{100 + i}x1x0",
+                "received_time": now - rnd.randint(0, 14 * 86400 - 1),
+                "fee_msat": rnd.randint(0, 5000),
+                "out_msat": rnd.randint(1, 10 ** 9),
+            }
+            for i in range(n_channels)
+            for _ in range(60)
+        ]
+        return channels, forwards
+
+    def test_projection_is_exact(self, engine):
+        projected = engine._project_capped_simplex([0.5, 0.3, 0.2, 0.0])
+        expected = [0.40, 0.3 + 1 / 30, 0.2 + 1 / 30, 1 / 30]
+        for got, want in zip(projected, expected):
+            assert abs(got - want) < 1e-12
+
+    def test_projection_respects_bounds(self, engine):
+        projected = engine._project_capped_simplex([5.0, -3.0, 0.1, 0.1, 0.1, 2.0])
+        assert abs(sum(projected) - 1.0) < 1e-12
+        for w in projected:
+            assert engine.MIN_SINGLE_ALLOCATION - 1e-12 <= w
+            assert w <= engine.MAX_SINGLE_ALLOCATION + 1e-12
+
+    def test_projection_relaxes_infeasible_cap(self, engine):
+        # Two channels cannot both stay under a 40% cap
+        projected = engine._project_capped_simplex([0.9, 0.1])
+        assert [round(w, 12) for w in projected] == [0.5, 0.5]
+
+    def test_pairwise_covariance_matches_reference(self, engine):
+        channels, forwards = self._random_node(12)
+        optimizer = engine.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        cov = optimizer.calculate_covariance_matrix(channels, forwards)
+
+        # Reference: direct pairwise-complete computation on bucketed series
+        # Closed, epoch-aligned buckets
+        interval = engine.OBSERVATION_INTERVAL_HOURS * 3600
+        window_end = (int(time.time()) // interval) * interval
+        window_start = window_end - engine.PORTFOLIO_WINDOW_DAYS * 86400
+        series = {ch["short_channel_id"]: {} for ch in channels}
+        for fwd in forwards:
+            if not window_start <= fwd["received_time"] < window_end:
+                continue
+            b = (fwd["received_time"] - window_start) // interval
+            s = series[fwd["out_channel"]]
+            s[b] = s.get(b, 0.0) + fwd["fee_msat"] / 1000 / engine.OBSERVATION_INTERVAL_HOURS
+
+        for a in series:
+            for b in series:
+                common = sorted(set(series[a]) & set(series[b]))
+                if len(common) < engine.MIN_COMMON_BUCKETS:
+                    assert cov[(a, b)] == 0.0
+                    continue
+                va = [series[a][t] for t in common]
+                vb = [series[b][t] for t in common]
+                ma, mb = sum(va) / len(va), sum(vb) / len(vb)
+                ref = sum((x - ma) * (y - mb) for x, y in zip(va, vb)) / (len(va) - 1)
+                sa = math.sqrt(sum((x - ma) ** 2 for x in va) / (len(va) - 1))
+                sb = math.sqrt(sum((y - mb) ** 2 for y in vb) / (len(vb) - 1))
+                if a != b and abs(ref / (sa * sb)) < engine.CORRELATION_FLOOR:
+                    # Insignificant pairs are not stored
+                    assert cov[(a, b)] == 0.0
+                    continue
+                assert abs(cov[(a, b)] - ref) < 1e-9 * max(1.0, abs(ref))
+
+    def test_optimizer_beats_equal_weights(self, engine):
+        channels, forwards = self._random_node(15)
+        optimizer = engine.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        optimizer.collect_channel_statistics(channels, forwards)
+        optimizer.calculate_covariance_matrix(channels, forwards)
+        weights, _ = optimizer.optimize_allocation(risk_aversion=1.0)
+
+        scids = list(optimizer._channel_stats)
+        returns = [optimizer._channel_stats[s].expected_return for s in scids]
+        cov = optimizer._build_optimizer_covariance(scids).to_dense()
+
+        def objective(w):
+            ret = sum(wi * ri for wi, ri in zip(w, returns))
+            var = sum(
+                w[i] * w[j] * cov[i][j]
+                for i in range(len(w)) for j in range(len(w))
+            )
+            return ret - var
+
+        optimal = [weights[s] for s in scids]
+        equal = [1.0 / len(scids)] * len(scids)
+        assert abs(sum(optimal) - 1.0) < 1e-9
+        assert objective(optimal) >= objective(equal) - 1e-9
+
+    def test_sparse_pairs_keep_only_significant(self, engine, monkeypatch):
+        channels, forwards = self._random_node(20)
+        scids = [ch["short_channel_id"] for ch in channels]
+        now = int(time.time())
+        values, observed = engine._build_revenue_matrix(
+            scids, forwards, now - engine.PORTFOLIO_WINDOW_DAYS * 86400, now
+        )
+        dense_cov, dense_corr = engine._pairwise_statistics(values, observed)
+
+        # Force several row blocks
+        monkeypatch.setattr(engine, "_PAIRWISE_BLOCK_ELEMENTS", 50)
+        pairs = engine._sparse_pairwise_statistics(values, observed)
+
+        expected = [
+            (i, j) for i in range(20) for j in range(i + 1, 20)
+            if abs(dense_corr[i][j]) >= engine.CORRELATION_FLOOR
+        ]
+        assert [(int(i), int(j)) for i, j in zip(pairs.rows, pairs.cols)] == expected
+        assert pairs.nnz < 20 * 19 // 2
+        for i in range(20):
+            assert abs(pairs.covariance(i, i) - dense_cov[i][i]) < 1e-9
+            for j in range(20):
+                if (min(i, j), max(i, j)) in expected:
+                    assert abs(pairs.correlation(i, j) - dense_corr[i][j]) < 1e-9
+
+    def test_sparse_matvec_matches_dense(self, engine):
+        channels, forwards = self._random_node(12)
+        optimizer = engine.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        optimizer.collect_channel_statistics(channels, forwards)
+        optimizer.calculate_covariance_matrix(channels, forwards)
+
+        # Reversed order exercises the reindexing path
+        scids = list(reversed(list(optimizer._channel_stats)))
+        sparse = optimizer._build_optimizer_covariance(scids)
+        dense = sparse.to_dense()
+        vector = [0.01 * (k + 1) for k in range(len(scids))]
+
+        got = [float(v) for v in sparse.matvec(vector)]
+        want = [sum(m * x for m, x in zip(row, vector)) for row in dense]
+        assert all(abs(g - w) < 1e-9 for g, w in zip(got, want))
+        for a, scid_a in enumerate(scids):
+            for b, scid_b in enumerate(scids):
+                if a != b:
+                    assert dense[a][b] == optimizer._covariance_matrix[(scid_a, scid_b)]
+
+    def test_engines_agree(self, monkeypatch):
+        import modules.portfolio_optimizer as po
+
+        if po.np is None:
+            pytest.skip("numpy not installed")
+
+        channels, forwards = self._random_node(10)
+        fast = po.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        fast_result = fast.analyze_portfolio(channels, forwards)
+
+        monkeypatch.setattr(po, "np", None)
+        slow = po.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        slow_result = slow.analyze_portfolio(channels, forwards)
+
+        for scid, pct in fast_result["optimal_allocations"].items():
+            assert abs(pct - slow_result["optimal_allocations"][scid]) < 0.01
+        assert (
+            [(c["channel_a"], c["channel_b"]) for c in fast_result["correlations"]]
+            == [(c["channel_a"], c["channel_b"]) for c in slow_result["correlations"]]
+        )
+
+class TestOnlinePortfolioStats:
+    """Tests for the incrementally maintained portfolio statistics."""
+
+    INTERVAL = 4 * 3600
+
+    @pytest.fixture(params=["numpy", "pure"])
+    def engine(self, request, monkeypatch):
+        import modules.portfolio_optimizer as po
+
+        if request.param == "numpy":
+            if po.np is None:
+                pytest.skip("numpy not installed")
+        else:
+            monkeypatch.setattr(po, "np", None)
+        return po
+
+    def _node(self, n_channels, now, seed=11):
+        import random
+
+        rnd = random.Random(seed)
+        channels = [
+            {
+                "short_channel_id": f"{200 + i}x1x0",
+                "peer_id": f"03{i:064x}",
+                "total_msat": 1_000_000_000,
+                "to_us_msat": 500_000_000,
+            }
+            for i in range(n_channels)
+        ]
+        forwards = [
+            {
+                "out_channel": f"{200 + i}x1x0",
+                "received_time": now - rnd.randint(1, 14 * 86400 - 1),
+                "fee_msat": rnd.randint(0, 5000),
+                "out_msat": rnd.randint(1, 10 ** 9),
+            }
+            for i in range(n_channels)
+            for _ in range(50)
+        ]
+        return channels, forwards
+
+    def _aligned_now(self):
+        return (int(time.time()) // self.INTERVAL) * self.INTERVAL
+
+    @pytest.mark.parametrize("offset", [0, INTERVAL // 3])
+    def test_online_matches_batch_statistics(self, engine, offset):
+        # Off a bucket boundary the open bucket holds forwards that neither
+        # path may count
+        now = self._aligned_now() + offset
+        channels, forwards = self._node(8, now)
+        scids = [ch["short_channel_id"] for ch in channels]
+
+        stats = engine.OnlinePortfolioStats()
+        stats.seed(forwards, now=now)
+        online = engine.PortfolioOptimizer(database=MagicMock(), plugin=None, online_stats=stats)
+        batch = engine.PortfolioOptimizer(database=MagicMock(), plugin=None)
+        with patch("modules.portfolio_optimizer.time.time", return_value=now):
+            online_result = online.analyze_portfolio(channels)
+            batch_result = batch.analyze_portfolio(channels, forwards)
+
+        for i, a in enumerate(scids):
+            for j, b in enumerate(scids):
+                ref = batch._covariance_matrix[(a, b)]
+                assert abs(online._covariance_matrix[(a, b)] - ref) < 1e-9 * max(1.0, abs(ref))
+        for scid in scids:
+            got, want = online._channel_stats[scid], batch._channel_stats[scid]
+            assert got.observation_count == want.observation_count
+            assert got.avg_forward_size == want.avg_forward_size
+            assert got.role == want.role
+            for field in ("expected_return", "variance", "forward_frequency", "data_quality"):
+                assert getattr(got, field) == pytest.approx(getattr(want, field), rel=1e-9), field
+        assert online_result["summary"] == pytest.approx(batch_result["summary"], rel=1e-6)
+        assert online_result["optimal_allocations"] == batch_result["optimal_allocations"]
+
+    def test_sparse_pairs_from_moments_match_dense(self, engine, monkeypatch):
+        now = self._aligned_now()
+        channels, forwards = self._node(8, now)
+        scids = [ch["short_channel_id"] for ch in channels]
+        stats = engine.OnlinePortfolioStats()
+        stats.seed(forwards, now=now)
+        stats.advance(now)
+        live = len(stats._scids)
+        if engine.np is not None:
+            moments = [m[:live, :live] for m in (stats._n, stats._c, stats._m2)]
+        else:
+            moments = [[row[:live] for row in m[:live]] for m in (stats._n, stats._c, stats._m2)]
+
+        dense = engine._SparsePairs.from_dense(*engine._moments_to_statistics(*moments))
+        # Row blocks of a few channels each
+        monkeypatch.setattr(engine, "_PAIRWISE_BLOCK_ELEMENTS", 3 * live)
+        sparse = engine._SparsePairs.from_moments(*moments)
+
+        assert sparse.nnz == dense.nnz > 0
+        assert list(sparse.rows) == list(dense.rows)
+        assert list(sparse.cols) == list(dense.cols)
+        for i in range(live):
+            for j in range(live):
+                assert abs(sparse.covariance(i, j) - dense.covariance(i, j)) < 1e-12
+                assert abs(sparse.correlation(i, j) - dense.correlation(i, j)) < 1e-12
+
+        # A channel the accumulator has never seen has no pairs
+        pairs = stats.snapshot(["9x9x9"] + scids, now=now)["pairs"]
+        assert pairs.n == len(scids) + 1
+        assert all(pairs.covariance(0, j) == 0.0 for j in range(pairs.n))
+
+    def test_forwards_during_seed_counted_once(self, engine):
+        now = self._aligned_now()
+        _, forwards = self._node(4, now)
+        stats = engine.OnlinePortfolioStats()
+        stats.begin_seed()
+        # forward_event delivers one forward the seed query also returns,
+        # and one that arrived after the query ran
+        dup = forwards[0]
+        stats.record_forward(dup["out_channel"], dup["fee_msat"], dup["out_msat"],
+                             dup["received_time"] + 0.25)
+        stats.record_forward("200x1x0", 5000, 10 ** 9, now - 60)
+        assert stats.get_status()["forwards_recorded"] == 0
+
+        stats.seed(forwards, now=now)
+
+        assert stats.get_status()["forwards_recorded"] == len(forwards) + 1
+        reference = engine.OnlinePortfolioStats()
+        reference.seed(forwards + [{"out_channel": "200x1x0", "fee_msat": 5000,
+                                    "out_msat": 10 ** 9, "received_time": now - 60}], now=now)
+        later = now + self.INTERVAL
+        got = stats.snapshot(["200x1x0"], now=later)["channels"]["200x1x0"]
+        want = reference.snapshot(["200x1x0"], now=later)["channels"]["200x1x0"]
+        assert got == want
+        # Buffering ends with the seed
+        stats.record_forward("201x1x0", 1000, 10 ** 6, now + 60)
+        assert stats.get_status()["forwards_recorded"] == len(forwards) + 2
+
+    def test_rates_use_covered_hours(self, engine):
+        now = self._aligned_now()
+        stats = engine.OnlinePortfolioStats()
+        since = now - 7 * 86400
+        stats.seed([{"out_channel": "1x1x0", "fee_msat": 1000, "out_msat": 10 ** 6,
+                     "received_time": since + 3600 * k} for k in range(1, 85)],
+                   now=now, since=since)
+        snapshot = stats.snapshot(["1x1x0"], now=now)
+        assert snapshot["window_hours"] == 14 * 24
+        assert snapshot["covered_hours"] == 7 * 24
+
+        optimizer = engine.PortfolioOptimizer(database=MagicMock(), plugin=None, online_stats=stats)
+        channel = {"short_channel_id": "1x1x0", "peer_id": "02" + "00" * 32,
+                   "total_msat": 10 ** 9, "to_us_msat": 5 * 10 ** 8}
+        with patch("modules.portfolio_optimizer.time.time", return_value=now):
+            result = optimizer.collect_online_statistics([channel])
+        assert result["1x1x0"].forward_frequency == pytest.approx(84 / (7 * 24))
+
+        # Data older than the window covers all of it
+        stats.seed([], now=now, since=now - 30 * 86400)
+        assert stats.snapshot(["1x1x0"], now=now)["covered_hours"] == 14 * 24
+
+    def test_verify_reports_no_drift(self, engine):
+        now = self._aligned_now()
+        _, forwards = self._node(6, now)
+        stats = engine.OnlinePortfolioStats()
+        stats.seed(forwards, now=now - 7 * 86400)
+        # Slide the window a week so old buckets are subtracted again
+        for fwd in forwards:
+            if fwd["received_time"] >= now - 7 * 86400:
+                stats.record_forward(
+                    fwd["out_channel"], fwd["fee_msat"], fwd["out_msat"], fwd["received_time"]
+                )
+        stats.advance(now)
+
+        report = stats.verify()
+        assert report["drift_ok"]
+        assert report["max_rel_drift"] < 1e-9
+
+    def test_late_forward_updates_closed_bucket(self, engine):
+        now = self._aligned_now()
+        stats = engine.OnlinePortfolioStats()
+        for k in range(1, 6):
+            stats.record_forward("1x1x0", 4000 * k, 10 ** 6, now - k * self.INTERVAL + 60)
+            stats.record_forward("2x1x0", 8000 * k, 10 ** 6, now - k * self.INTERVAL + 60)
+        stats.advance(now)
+        before = stats.snapshot(["1x1x0", "2x1x0"], now=now)["pairs"].covariance(0, 1)
+
+        # Arrives after its bucket already closed
+        stats.record_forward("1x1x0", 40000, 10 ** 6, now - 4 * self.INTERVAL + 120)
+        after = stats.snapshot(["1x1x0", "2x1x0"], now=now)["pairs"].covariance(0, 1)
+
+        assert after != before
+        assert stats.verify()["drift_ok"]
+
+    def test_window_expiry_drops_channel(self, engine):
+        now = self._aligned_now()
+        stats = engine.OnlinePortfolioStats(window_days=1)
+        for k in range(1, 5):
+            stats.record_forward("1x1x0", 1000 * k, 10 ** 6, now - k * self.INTERVAL)
+        stats.advance(now)
+        assert stats.snapshot(["1x1x0"], now=now)["channels"]["1x1x0"]["observation_count"] == 4
+
+        later = now + 2 * 86400
+        snapshot = stats.snapshot(["1x1x0"], now=later)
+        assert snapshot["channels"]["1x1x0"]["observation_count"] == 0
+        stats.verify()
+        assert stats.get_status()["tracked_channels"] == 0
+
+    def test_analyze_portfolio_reads_online_stats(self, engine):
+        now = self._aligned_now()
+        channels, forwards = self._node(6, now)
+        stats = engine.OnlinePortfolioStats()
+        stats.seed(forwards, now=now)
+
+        optimizer = engine.PortfolioOptimizer(
+            database=MagicMock(), plugin=None, online_stats=stats
+        )
+        with patch("modules.portfolio_optimizer.time.time", return_value=now):
+            result = optimizer.analyze_portfolio(channels)
+
+        assert len(result["optimal_allocations"]) == len(channels)
+        assert abs(sum(result["optimal_allocations"].values()) - 100.0) < 1.0
+
+    def test_get_forwards_since(self, database):
+        db = database
+        now = int(time.time())
+        assert db.get_oldest_forward_timestamp() is None
+        assert db.record_forward("1x1x0", "2x1x0", 1001000, 1000000, 1000, now - 100, now - 99)
+        assert not db.record_forward("1x1x0", "2x1x0", 1001000, 1000000, 1000, now - 100, now - 99)
+        db.record_forward("1x1x0", "3x1x0", 2002000, 2000000, 2000, now - 10 ** 6, now - 10 ** 6)
+
+        rows = db.get_forwards_since(now - 1000)
+        assert [(r["out_channel"], r["fee_msat"]) for r in rows] == [("2x1x0", 1000)]
+        assert rows[0]["received_time"] == now - 100
+        assert db.get_oldest_forward_timestamp() == now - 10 ** 6
+
+
 class TestConstants:
     """Test configuration constants."""
 
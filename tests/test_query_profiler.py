@@ -0,0 +1,127 @@
+"""
+Tests for the opt-in SQL statement profiler and revenue-db-stats data.
+"""
+
+import sqlite3
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.config import Config
+from modules.query_profiler import ProfiledCursor, normalize_sql
+
+SLOW_SQL = """
+    WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 300000)
+    SELECT COUNT(*) FROM c
+"""
+
+
+@pytest.fixture
+def config():
+    cfg = Config()
+    cfg.db_query_profile = True
+    cfg.db_slow_query_ms = 0
+    return cfg
+
+
+@pytest.fixture
+def database(database, config):
+    database.query_profiler.config = config
+    return database
+
+
+def _stat(database, sql):
+    key = normalize_sql(sql)
+    for s in database.query_profiler.get_stats(limit=1000)["statements"]:
+        if s["sql"] == key:
+            return s
+    return None
+
+
+class TestNormalize:
+
+    def test_literals_and_lists(self):
+        assert normalize_sql("SELECT *\n  FROM t WHERE a = 'x''y' AND b > 10 LIMIT 5;") == \
+            "SELECT * FROM t WHERE a = ? AND b > ? LIMIT ?"
+        assert normalize_sql("DELETE FROM t WHERE k IN (?, ?,?)") == \
+            normalize_sql("DELETE FROM t WHERE k IN (1, 2)") == "DELETE FROM t WHERE k IN (?...)"
+
+    def test_identifiers_keep_digits(self):
+        assert normalize_sql("SELECT v2 FROM t1") == "SELECT v2 FROM t1"
+
+
+class TestProfiling:
+
+    def test_disabled_returns_plain_cursor(self, database, config):
+        config.db_query_profile = False
+        cursor = database._get_connection().execute("SELECT 1")
+        assert isinstance(cursor, sqlite3.Cursor)
+        assert database.query_profiler.get_stats()["calls"] == 0
+
+    def test_reads_count_fetched_rows(self, database):
+        conn = database._get_connection()
+        conn.executemany("INSERT INTO config_overrides (key, value, updated_at) VALUES (?, ?, 0)",
+                         [(f"k{i}", "v") for i in range(5)])
+        cursor = conn.execute("SELECT key FROM config_overrides")
+        assert isinstance(cursor, ProfiledCursor)
+        assert len(list(cursor)) == 5
+        # A cursor dropped after fetchone is recorded too
+        assert conn.execute("SELECT value FROM config_overrides WHERE key = 'k1'").fetchone()[0] == "v"
+
+        assert _stat(database, "SELECT key FROM config_overrides")["rows"] == 5
+        one = _stat(database, "SELECT value FROM config_overrides WHERE key = 'k2'")
+        assert (one["calls"], one["rows"]) == (1, 1)
+        insert = _stat(database, "INSERT INTO config_overrides (key, value, updated_at) VALUES (?, ?, 0)")
+        assert (insert["calls"], insert["rows"]) == (1, 5)
+
+    def test_sorting_and_reset(self, database):
+        conn = database._get_connection()
+        for _ in range(3):
+            conn.execute("SELECT 1").fetchall()
+        conn.execute(SLOW_SQL).fetchall()
+
+        stats = database.query_profiler.get_stats(limit=1, sort="calls")
+        assert stats["statements"][0]["sql"] == "SELECT ?"
+        assert stats["statements"][0]["calls"] == 3
+        top = database.query_profiler.get_stats(limit=1, sort="total", reset=True)["statements"][0]
+        assert top["sql"].startswith("WITH RECURSIVE")
+        assert top["p95_ms"] == top["max_ms"] > 0
+        assert database.query_profiler.get_stats()["statements"] == []
+        with pytest.raises(ValueError):
+            database.query_profiler.get_stats(sort="median")
+
+
+class TestSlowQueries:
+
+    def test_slow_query_logged_once_with_plan(self, database, config):
+        config.db_slow_query_ms = 1
+        log = database.query_profiler._log = MagicMock()
+        conn = database._get_connection()
+        conn.execute(SLOW_SQL).fetchone()
+        conn.execute(SLOW_SQL).fetchone()
+
+        slow = database.query_profiler.get_stats()["slow_queries"]
+        assert len(slow) == 2
+        assert slow[0]["plan"] and slow[0]["sql"].startswith("WITH RECURSIVE")
+        assert log.call_count == 1
+        assert "Slow query" in log.call_args[0][0]
+
+    def test_plan_names_the_index(self, database):
+        lines = database._get_connection().explain(
+            "SELECT * FROM fee_changes WHERE channel_id = ? ORDER BY timestamp DESC", ("1x1x1",))
+        assert any("INDEX" in line for line in lines)
+
+
+class TestTableSizes:
+
+    def test_sizes_from_dbstat(self, database):
+        try:
+            sizes = database.get_table_sizes()
+        except sqlite3.OperationalError:
+            pytest.skip("SQLite built without dbstat")
+        page_size = database._get_connection().execute("PRAGMA page_size").fetchone()[0]
+        by_name = {t["name"]: t for t in sizes}
+        assert by_name["forwards_compact"]["type"] == "table"
+        assert by_name["idx_fee_changes_channel"]["table"] == "fee_changes"
+        assert all(t["bytes"] == t["pages"] * page_size for t in sizes)
+        assert [t["bytes"] for t in sizes] == sorted((t["bytes"] for t in sizes), reverse=True)
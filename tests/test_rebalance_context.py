@@ -0,0 +1,98 @@
+"""
+Tests for the per-cycle batched rebalance lookups.
+"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.rebalance_context import RebalanceCycleContext
+
+
+PEERS = ["02" + c * 64 for c in "abcde"]
+CHANNELS = [f"{100 + i}x1x0" for i in range(len(PEERS))]
+
+
+@pytest.fixture
+def db(database):
+    conn = database._get_connection()
+    now = int(time.time())
+
+    for i, (cid, pid) in enumerate(zip(CHANNELS, PEERS)):
+        database.update_channel_state(cid, pid, "balanced", 0.1 * i, 1000 * i, 500 * i, 1_000_000)
+
+    # Rebalance history: successes with fees for the first two peers
+    for k in range(6):
+        database.record_rebalance("999x1x0", CHANNELS[0], 100_000 + k, 500, 10,
+                                  status="success")
+    for k in range(3):
+        database.record_rebalance("999x1x0", CHANNELS[1], 200_000, 500, 10, status="success")
+    database.record_rebalance("999x1x0", CHANNELS[2], 50_000, 500, 10, status="failed")
+    rows = conn.execute("SELECT id FROM rebalance_history ORDER BY id").fetchall()
+    for n, row in enumerate(rows):
+        conn.execute(
+            "UPDATE rebalance_history SET actual_fee_sats = ?, timestamp = ? WHERE id = ?",
+            (10 + n * 7, now - 3600 * (n + 1), row["id"])
+        )
+
+    # Failures
+    database.increment_failure_count(CHANNELS[3])
+    database.increment_failure_count(CHANNELS[3])
+
+    # Connection history: prior-state, in-window flaps, window-only, none
+    events = [
+        (PEERS[0], "connected", now - 2 * 86400),
+        (PEERS[0], "disconnected", now - 43200),
+        (PEERS[0], "connected", now - 21600),
+        (PEERS[1], "snapshot", now - 7200),
+        (PEERS[1], "disconnected", now - 3600),
+        (PEERS[2], "disconnected", now - 90000),
+        (PEERS[3], "connected", now - 30),
+    ]
+    for pid, event, ts in events:
+        conn.execute(
+            "INSERT INTO peer_connection_history (peer_id, event_type, timestamp) VALUES (?, ?, ?)",
+            (pid, event, ts)
+        )
+    return database
+
+
+class TestRebalanceCycleContext:
+
+    def test_matches_per_row_lookups(self, db):
+        ctx = RebalanceCycleContext.load(db)
+        for cid in CHANNELS + ["555x1x0"]:
+            assert ctx.get_channel_state(cid) == db.get_channel_state(cid)
+            assert ctx.get_failure_count(cid) == db.get_failure_count(cid)
+            assert ctx.get_last_rebalance_time(cid) == db.get_last_rebalance_time(cid)
+        for pid in PEERS + ["03" + "f" * 64]:
+            assert ctx.get_peer_uptime_percent(pid, 86400) == pytest.approx(
+                db.get_peer_uptime_percent(pid, 86400), abs=0.01)
+            assert ctx.get_historical_inbound_fee_ppm(pid) == db.get_historical_inbound_fee_ppm(pid)
+            assert ctx.get_rebalance_history_by_peer(pid) == db.get_rebalance_history_by_peer(pid)
+            assert ctx.get_rebalance_history_by_peer(pid, 2) == db.get_rebalance_history_by_peer(pid, 2)
+
+    def test_fixture_covers_all_branches(self, db):
+        ctx = RebalanceCycleContext.load(db)
+        assert ctx.get_historical_inbound_fee_ppm(PEERS[0])["confidence"] == "medium"
+        assert ctx.get_historical_inbound_fee_ppm(PEERS[1])["confidence"] == "low"
+        assert ctx.get_historical_inbound_fee_ppm(PEERS[2]) is None
+        assert ctx.get_failure_count(CHANNELS[3])[0] == 2
+        assert 0.0 < ctx.get_peer_uptime_percent(PEERS[0], 86400) < 100.0
+        assert ctx.get_peer_uptime_percent(PEERS[2], 86400) == 0.0
+        assert ctx.get_peer_uptime_percent(PEERS[4], 86400) == 100.0
+
+    def test_other_windows_fall_through(self, db):
+        ctx = RebalanceCycleContext.load(db)
+        assert ctx.get_peer_uptime_percent(PEERS[0], 3 * 86400) == pytest.approx(
+            db.get_peer_uptime_percent(PEERS[0], 3 * 86400), abs=0.01)
+        assert ctx.get_historical_inbound_fee_ppm(PEERS[0], window_days=1) == \
+            db.get_historical_inbound_fee_ppm(PEERS[0], window_days=1)
+
+    def test_load_uses_batch_queries(self, db):
+        db.get_channel_state = MagicMock(side_effect=AssertionError("per-row lookup"))
+        ctx = RebalanceCycleContext.load(db)
+        status = ctx.get_status()
+        assert status["channel_states"] == len(CHANNELS)
+        assert status["peer_uptimes"] == 4
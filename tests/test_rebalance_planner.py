@@ -0,0 +1,235 @@
+"""
+Tests for the rebalance planner (EV matrix and source assignment).
+"""
+
+import itertools
+import random
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules import rebalance_planner
+from modules.rebalance_planner import (
+    DestinationPlan, EVParams, SourceOption, assign_sources, ev_matrix,
+    evaluate_pair, source_prefilter
+)
+from modules.config import Config
+from modules.rebalancer import EVRebalancer
+
+
+def _dest(i, out_fee, in_fee, amount=500_000, needed=1_000_000,
+          utilization=0.5, reputation=0.7, threshold=10):
+    return DestinationPlan(
+        channel_id=f"{100 + i}x1x0", info={"peer_id": f"peer{i}"}, ratio=0.1,
+        flow_state="balanced", bleeder_status="none", capacity=5_000_000,
+        amount_needed=needed, rebalance_amount=amount,
+        outbound_fee_ppm=out_fee, inbound_fee_ppm=in_fee, is_hive=False,
+        turnover_rate=0.1, utilization=utilization, reputation=reputation,
+        profit_threshold=threshold,
+    )
+
+
+def _src(i, fee, opp, spendable=2_000_000, turnover=0.02, score=0.0):
+    return SourceOption(
+        channel_id=f"{900 + i}x1x0", info={"peer_id": f"src{i}", "fee_ppm": fee},
+        ratio=0.9, flow_state="balanced", fee_ppm=fee, turnover_rate=turnover,
+        opp_cost_ppm=opp, score=score, spendable_sats=spendable,
+    )
+
+
+def _random_instance(rng, n_dest, n_src):
+    dests = [
+        _dest(i, rng.randint(0, 3000), rng.randint(0, 1500),
+              amount=rng.choice([100_000, 500_000, 1_000_000]),
+              needed=rng.randint(50_000, 3_000_000),
+              utilization=rng.uniform(0.05, 1.0),
+              reputation=rng.uniform(0.0, 1.0),
+              threshold=rng.choice([-50, 0, 10, 100]))
+        for i in range(n_dest)
+    ]
+    sources = [
+        _src(s, rng.randint(0, 2000), rng.randint(0, 2000),
+             spendable=rng.randint(0, 3_000_000),
+             turnover=rng.uniform(0.0001, 0.5), score=rng.uniform(-50, 150))
+        for s in range(n_src)
+    ]
+    return dests, sources
+
+
+def _reference_matrix(dests, sources, params):
+    """Per-pair path: the checks the greedy rebalancer applies one by one."""
+    profit, feasible = {}, set()
+    for d, dest in enumerate(dests):
+        for s, src in enumerate(sources):
+            if src.spendable_sats < dest.rebalance_amount:
+                continue
+            spread = dest.outbound_fee_ppm - dest.inbound_fee_ppm - src.opp_cost_ppm
+            if not source_prefilter(spread, dest.rebalance_amount, params):
+                continue
+            pair = evaluate_pair(dest, src.opp_cost_ppm, src.fee_ppm, src.turnover_rate, params)
+            if pair is None or pair.expected_profit < dest.profit_threshold:
+                continue
+            profit[(d, s)] = pair.expected_profit
+            feasible.add((d, s))
+    return profit, feasible
+
+
+class TestEVMatrix:
+
+    @pytest.mark.parametrize("kelly", [False, True])
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_matches_per_pair_path(self, monkeypatch, kelly, use_numpy):
+        if use_numpy and rebalance_planner.np is None:
+            pytest.skip("numpy not installed")
+        if not use_numpy:
+            monkeypatch.setattr(rebalance_planner, "np", None)
+        params = EVParams(
+            hive_rebalance_tolerance=100, enable_kelly=kelly, kelly_fraction=0.5,
+            rebalance_min_profit=5, rebalance_min_profit_ppm=0,
+        )
+        dests, sources = _random_instance(random.Random(7), 40, 30)
+        expected_profit, expected_feasible = _reference_matrix(dests, sources, params)
+
+        profit, feasible = ev_matrix(dests, sources, params)
+        got = {(d, s) for d in range(len(dests)) for s in range(len(sources)) if feasible[d][s]}
+        assert got == expected_feasible
+        assert expected_feasible  # instance is not trivially empty
+        for d, s in expected_feasible:
+            assert profit[d][s] == pytest.approx(expected_profit[(d, s)])
+
+    def test_ppm_profit_gate(self):
+        params = EVParams(
+            hive_rebalance_tolerance=0, enable_kelly=False, kelly_fraction=0.5,
+            rebalance_min_profit=0, rebalance_min_profit_ppm=400,
+        )
+        # spread 300 ppm < 400 ppm gate; spread 500 ppm passes
+        dests = [_dest(0, 800, 0, threshold=-1000)]
+        sources = [_src(0, 100, 500), _src(1, 100, 300)]
+        _, feasible = ev_matrix(dests, sources, params)
+        assert not feasible[0][0]
+        assert feasible[0][1]
+
+
+class TestAssignSources:
+
+    @staticmethod
+    def _brute_force(profit, feasible, capacities, slots):
+        n_dest, n_src = len(profit), len(capacities)
+        best = 0.0
+        choices = [[None] + [s for s in range(n_src) if feasible[d][s]] for d in range(n_dest)]
+        for combo in itertools.product(*choices):
+            picked = [(d, s) for d, s in enumerate(combo) if s is not None]
+            if len(picked) > slots:
+                continue
+            used = [0] * n_src
+            for _, s in picked:
+                used[s] += 1
+            if any(used[s] > capacities[s] for s in range(n_src)):
+                continue
+            best = max(best, sum(profit[d][s] for d, s in picked))
+        return best
+
+    def test_optimal_on_small_instances(self):
+        rng = random.Random(3)
+        for _ in range(40):
+            n_dest, n_src = rng.randint(1, 5), rng.randint(1, 4)
+            profit = [[rng.randint(1, 100) for _ in range(n_src)] for _ in range(n_dest)]
+            feasible = [[rng.random() < 0.6 for _ in range(n_src)] for _ in range(n_dest)]
+            capacities = [rng.randint(0, 2) for _ in range(n_src)]
+            slots = rng.randint(1, 4)
+
+            assignment = assign_sources(profit, feasible, capacities, slots)
+
+            assert len(assignment) <= slots
+            used = [0] * n_src
+            for d, s in assignment.items():
+                assert feasible[d][s]
+                used[s] += 1
+            assert all(used[s] <= capacities[s] for s in range(n_src))
+            total = sum(profit[d][s] for d, s in assignment.items())
+            assert total == self._brute_force(profit, feasible, capacities, slots)
+
+    def test_beats_listing_order_greedy(self):
+        # Greedy gives source 0 to destination 0 (its best) and leaves
+        # destination 1 without a source; optimum uses both sources.
+        profit = [[10, 9], [8, 0]]
+        feasible = [[True, True], [True, False]]
+        assignment = assign_sources(profit, feasible, [1, 1], slots=2)
+        assert assignment == {0: 1, 1: 0}
+
+    def test_fills_slots_with_negative_profit(self):
+        # Pairs that passed the thresholds are used even below zero
+        profit = [[-5.0], [3.0]]
+        feasible = [[True], [True]]
+        assert assign_sources(profit, feasible, [2], slots=2) == {0: 0, 1: 0}
+        assert assign_sources(profit, feasible, [2], slots=1) == {1: 0}
+
+
+class TestPlanRebalanceCandidates:
+
+    @pytest.fixture
+    def rebalancer(self, mock_plugin, mock_database):
+        config = Config()
+        config.enable_velocity_gate = False
+        config.sling_chunk_size_sats = 500_000
+        mock_database.get_channel_state.return_value = {
+            "state": "balanced", "sats_in": 20_000_000, "sats_out": 20_000_000
+        }
+        mock_database.get_peer_uptime_percent.return_value = 100.0
+        mock_database.get_fee_strategy_state.return_value = {}
+        mock_database.get_peer_reputation.return_value = {"score": 0.5}
+        reb = EVRebalancer(mock_plugin, config, mock_database, MagicMock())
+        inbound = {"d0": 100, "d1": 200, "d2": 400, "d3": 800}
+        reb._estimate_inbound_fee = lambda peer_id, amount_msat=100000000: inbound.get(peer_id, 100)
+        return reb
+
+    @staticmethod
+    def _channels():
+        # Destinations listed from least to most valuable (with full
+        # utilization, expected profit grows with the inbound fee saved)
+        dests = [
+            (f"{100 + i}x1x0", {"peer_id": f"d{i}", "capacity": 5_000_000,
+                                 "spendable_sats": 100_000, "fee_ppm": fee}, 0.02)
+            for i, fee in enumerate([1000, 1500, 2000, 2500])
+        ]
+        sources = [
+            (f"{900 + i}x1x0", {"peer_id": f"s{i}", "capacity": 5_000_000,
+                                 "spendable_sats": 4_500_000, "fee_ppm": 50}, 0.9)
+            for i in range(3)
+        ]
+        return dests, sources
+
+    def test_planner_picks_most_valuable_destinations(self, rebalancer):
+        dests, sources = self._channels()
+        planned = rebalancer._plan_rebalance_candidates(dests, sources, {}, slots=2)
+
+        greedy = []
+        for dest_id, info, ratio in dests:
+            candidate = rebalancer._analyze_rebalance_ev(dest_id, info, ratio, sources, {})
+            if candidate:
+                greedy.append(candidate)
+            if len(greedy) >= 2:
+                break
+
+        assert {c.to_channel for c in planned} == {"103x1x0", "102x1x0"}
+        assert (sum(c.expected_profit_sats for c in planned)
+                > sum(c.expected_profit_sats for c in greedy))
+
+    def test_candidate_matches_single_destination_path(self, rebalancer):
+        dests, sources = self._channels()
+        planned = rebalancer._plan_rebalance_candidates(dests[-1:], sources, {}, slots=1)
+        single = rebalancer._analyze_rebalance_ev(*dests[-1], sources, {})
+        assert len(planned) == 1
+        assert planned[0].expected_profit_sats == single.expected_profit_sats
+        assert planned[0].max_fee_ppm == single.max_fee_ppm
+        assert sorted(planned[0].source_candidates) == sorted(single.source_candidates)
+
+    def test_source_capacity_limits_primaries(self, rebalancer):
+        dests, sources = self._channels()
+        # One chunk available per source: primaries must be distinct
+        for _, info, _ in sources:
+            info["spendable_sats"] = 600_000
+        planned = rebalancer._plan_rebalance_candidates(dests, sources, {}, slots=4)
+        primaries = [c.source_candidates[0] for c in planned]
+        assert len(planned) == 3
+        assert len(set(primaries)) == 3
@@ -0,0 +1,76 @@
+"""
+Tests for RPC broker metrics.
+"""
+
+import pytest
+
+from modules.rpc_metrics import LATENCY_BUCKETS_MS, LatencyHistogram, RpcMetrics
+
+
+class TestLatencyHistogram:
+
+    def test_percentiles_within_bucket_width(self):
+        hist = LatencyHistogram()
+        for ms in range(1, 101):
+            hist.observe(float(ms))
+        assert hist.count == 100
+        assert 20 <= hist.percentile(50) <= 100
+        assert 50 <= hist.percentile(95) <= 100
+        assert hist.percentile(99) <= hist.max_ms == 100
+
+    def test_single_slow_call(self):
+        hist = LatencyHistogram()
+        hist.observe(4200.0)
+        assert hist.percentile(50) <= 4200.0
+        assert hist.to_dict()["max_ms"] == 4200.0
+
+    def test_overflow_bucket_capped_at_max(self):
+        hist = LatencyHistogram()
+        hist.observe(LATENCY_BUCKETS_MS[-1] * 2.0)
+        assert hist.counts[-1] == 1
+        assert hist.percentile(99) <= LATENCY_BUCKETS_MS[-1] * 2.0
+
+    def test_empty(self):
+        assert LatencyHistogram().to_dict()["p99_ms"] == 0.0
+
+
+class TestRpcMetrics:
+
+    @pytest.fixture
+    def metrics(self):
+        return RpcMetrics(clock=lambda: 1_700_000_000.0)
+
+    def test_methods_and_groups(self, metrics):
+        metrics.record_call("listforwards", "listforwards", 2.0)
+        metrics.record_call("listpeerchannels", "general", 0.02)
+        metrics.record_call("listpeerchannels", "general", 0.03, "rpc_error")
+        metrics.record_call("setchannel", "general", None, "breaker_open")
+        metrics.record_response("listforwards", 5_000_000)
+        metrics.record_lock_wait("listpeerchannels", 0.5)
+
+        snap = metrics.snapshot()
+        assert snap["calls"] == 4 and snap["errors"] == 2
+        assert list(snap["methods"])[0] == "listforwards"   # slowest first
+
+        peers = snap["methods"]["listpeerchannels"]
+        assert peers["outcomes"] == {"ok": 1, "rpc_error": 1}
+        assert peers["lock_wait"]["max_ms"] == 500.0
+
+        setchannel = snap["methods"]["setchannel"]
+        assert setchannel["errors"] == 1 and setchannel["latency"]["max_ms"] == 0.0
+
+        general = snap["groups"]["general"]
+        assert general["calls"] == 3 and general["errors"] == 2
+        assert snap["methods"]["listforwards"]["response_bytes"]["max"] == 5_000_000
+
+    def test_restarts_and_reset(self, metrics):
+        metrics.record_call("getinfo", "general", 0.01, "timeout")
+        metrics.record_restart("timeout waiting for RPC response (15s) on getinfo")
+
+        snap = metrics.snapshot(reset=True)
+        assert snap["broker_restarts"] == 1
+        assert snap["recent_restarts"][0]["reason"].endswith("getinfo")
+
+        cleared = metrics.snapshot()
+        assert cleared["calls"] == 0 and cleared["broker_restarts"] == 0
+        assert cleared["methods"] == {}
@@ -0,0 +1,202 @@
+"""
+Tests for the background task scheduler.
+"""
+
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.scheduler import IDLE_WINDOW_SECONDS, Scheduler, Task
+
+
+@pytest.fixture
+def launched():
+    """Runs handed to the executor; tests finish them explicitly."""
+    return []
+
+
+@pytest.fixture
+def scheduler(clock, launched):
+    return Scheduler(MagicMock(), threading.Event(), max_workers=3,
+                     degraded_errors=(TimeoutError,), executor=launched.append, clock=clock)
+
+
+def _finish_all(launched):
+    while launched:
+        launched.pop(0)()
+
+
+class TestDispatch:
+
+    def test_priority_order_and_worker_cap(self, clock, launched):
+        order = []
+        sched = Scheduler(MagicMock(), threading.Event(), max_workers=2,
+                          executor=launched.append, clock=clock)
+        for name, prio in (("low", 90), ("high", 10), ("mid", 50)):
+            sched.add(Task(name, lambda n=name: order.append(n), 60, priority=prio))
+
+        sched.tick()
+        assert len(launched) == 2
+        _finish_all(launched)
+        assert order == ["high", "mid"]
+
+        sched.tick()
+        _finish_all(launched)
+        assert order == ["high", "mid", "low"]
+
+    def test_fixed_delay_reschedule_and_history(self, scheduler, clock, launched):
+        scheduler.add(Task("flow", lambda: None, 3600, initial_delay=10))
+        assert scheduler.tick() == 10
+        clock.now += 25
+        scheduler.tick()
+        clock.now += 5                       # run takes 5s
+        _finish_all(launched)
+
+        task = scheduler.get("flow")
+        assert task.next_run == clock.now + 3600
+        status = scheduler.get_status()
+        run = status["recent_runs"][0]
+        assert run["lateness_s"] == 15.0
+        assert run["duration_s"] == 5.0
+        assert status["tasks"]["flow"]["max_lateness_s"] == 15.0
+
+    def test_errors_are_recorded(self, scheduler, launched):
+        def degraded():
+            raise TimeoutError("broker")
+
+        def broken():
+            raise ValueError("boom")
+
+        scheduler.add(Task("a", degraded, 60))
+        scheduler.add(Task("b", broken, 60))
+        scheduler.tick()
+        _finish_all(launched)
+
+        statuses = {r["task"]: r["status"] for r in scheduler.get_status()["recent_runs"]}
+        assert statuses == {"a": "degraded", "b": "error"}
+        assert scheduler.get("b").failures == 1
+        assert scheduler.get("b").last_error == "boom"
+
+    def test_one_shot_and_disabled(self, scheduler, launched):
+        calls = []
+        scheduler.add(Task("once", lambda: calls.append("once"), 0, one_shot=True))
+        scheduler.add(Task("off", lambda: calls.append("off"), 60, enabled=lambda: False))
+        scheduler.tick()
+        _finish_all(launched)
+        scheduler.tick()
+        assert launched == []
+        assert calls == ["once"]
+        assert scheduler.get("once").done
+
+
+class TestConstraints:
+
+    def test_fee_runs_after_flow(self, scheduler, clock, launched):
+        scheduler.add(Task("flow", lambda: None, 3600, priority=30))
+        scheduler.add(Task("fee", lambda: None, 1800, priority=40, after=("flow",)))
+
+        scheduler.tick()
+        assert len(launched) == 1             # fee waits for the first flow run
+        _finish_all(launched)
+        scheduler.tick()
+        assert len(launched) == 1
+        _finish_all(launched)
+        assert [r["task"] for r in scheduler.get_status()["recent_runs"]] == ["fee", "flow"]
+
+        # Both due again: flow still goes first
+        clock.now += 4000
+        scheduler.tick()
+        assert len(launched) == 1
+        assert scheduler.get("flow").running == 1
+
+    def test_rebalance_deferred_while_fee_runs(self, scheduler, clock, launched):
+        scheduler.add(Task("fee", lambda: None, 1800, priority=40))
+        scheduler.add(Task("rebalance", lambda: None, 900, priority=50, conflicts=("fee",)))
+        scheduler.tick()
+        assert scheduler.get("rebalance").running == 0
+        clock.now += 30
+        _finish_all(launched)
+        scheduler.tick()
+        assert scheduler.get("rebalance").running == 1
+        assert scheduler.get_status()["tasks"]["rebalance"]["next_run_in_s"] is None
+        _finish_all(launched)
+        assert scheduler.get("rebalance").max_lateness == 30
+
+    def test_per_task_concurrency(self, scheduler, clock, launched):
+        scheduler.add(Task("poll", lambda: None, 10, max_concurrent=2))
+        scheduler.tick()
+        clock.now += 10
+        scheduler.tick()
+        clock.now += 10
+        scheduler.tick()
+        assert scheduler.get("poll").running == 2
+        assert len(launched) == 2
+
+
+class TestIdleWindows:
+
+    def test_maintenance_waits_for_idle_window(self, scheduler, clock, launched):
+        scheduler.add(Task("flow", lambda: None, 3600, initial_delay=60))
+        scheduler.add(Task("jobs", lambda: None, 30, blocks_idle=False))
+        scheduler.add(Task("maint", lambda: None, 3600, idle_only=True, max_delay=7200))
+
+        scheduler.tick()                      # flow due within the idle window
+        assert scheduler.get("maint").running == 0
+        _finish_all(launched)
+
+        clock.now += 60
+        scheduler.tick()                      # flow running
+        assert scheduler.get("maint").running == 0
+        _finish_all(launched)
+
+        clock.now += 30
+        scheduler.tick()                      # idle: flow next due in ~3600s
+        assert scheduler.get("maint").running == 1
+
+    def test_max_delay_forces_maintenance(self, scheduler, clock, launched):
+        scheduler.add(Task("busy", lambda: None, IDLE_WINDOW_SECONDS // 2))
+        scheduler.add(Task("maint", lambda: None, 3600, idle_only=True, max_delay=600))
+        scheduler.tick()
+        assert scheduler.get("maint").running == 0
+        _finish_all(launched)
+        clock.now += 600
+        scheduler.tick()
+        assert scheduler.get("maint").running == 1
+
+
+def test_dispatcher_thread_runs_tasks():
+    shutdown = threading.Event()
+    ran = threading.Event()
+    sched = Scheduler(MagicMock(), shutdown)
+    sched.add(Task("t", ran.set, 60))
+    sched.start()
+    try:
+        assert ran.wait(5)
+    finally:
+        shutdown.set()
+
+
+def test_runs_reuse_pool_threads():
+    shutdown = threading.Event()
+    threads, exits = set(), []
+    done = threading.Event()
+
+    def work():
+        threads.add(threading.current_thread().name)
+        if sched.get("t").runs >= 5:
+            done.set()
+
+    sched = Scheduler(MagicMock(), shutdown, max_workers=2,
+                      on_worker_exit=lambda: exits.append(threading.current_thread().name))
+    sched.add(Task("t", work, 0))
+    sched.start()
+    try:
+        assert done.wait(5)
+    finally:
+        shutdown.set()
+    for worker in sched._workers:
+        worker.join(5)
+
+    assert threads <= {"scheduler-worker-0", "scheduler-worker-1"}
+    assert sorted(exits) == ["scheduler-worker-0", "scheduler-worker-1"]
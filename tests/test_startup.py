@@ -0,0 +1,88 @@
+"""
+Tests for deferred startup: phase timings, readiness flags and the batched
+startup database writes.
+"""
+
+import time
+
+import pytest
+
+from modules import rebalance_planner
+from modules.database import Database
+from modules.startup import READINESS_FLAGS, StartupTracker
+
+
+class TestStartupTracker:
+
+    def test_checkpoints_time_init_phases(self, mock_plugin, clock):
+        startup = StartupTracker(mock_plugin, clock=clock)
+        clock.now += 0.002
+        startup.checkpoint("config")
+        clock.now += 0.250
+        startup.checkpoint("database")
+        startup.init_done()
+
+        status = startup.get_status()
+        assert status["init_ms"] == pytest.approx(252.0)
+        assert [(p["phase"], p["ms"]) for p in status["phases"]] == [
+            ("config", 2.0), ("database", 250.0)
+        ]
+        logged = mock_plugin.log.call_args[0][0]
+        assert "config=2ms, database=250ms" in logged
+        assert "deferred: " + ", ".join(READINESS_FLAGS) in logged
+
+    def test_background_phase_recorded_on_error(self, mock_plugin, clock):
+        startup = StartupTracker(mock_plugin, clock=clock)
+        with pytest.raises(RuntimeError):
+            with startup.phase("forwards_hydration"):
+                clock.now += 3
+                raise RuntimeError("listforwards failed")
+        phase = startup.get_status()["phases"][0]
+        assert phase == {"phase": "forwards_hydration", "ms": 3000.0,
+                         "background": True, "status": "error"}
+
+    def test_readiness_flags(self, mock_plugin, clock):
+        startup = StartupTracker(mock_plugin, flags=("forwards", "hive"), clock=clock)
+        assert not startup.wait("forwards", timeout=0)
+        clock.now += 4
+        startup.mark_ready("forwards")
+        startup.mark_ready("forwards")
+        assert startup.is_ready("forwards")
+        assert not startup.all_ready()
+
+        startup.mark_ready("hive")
+        status = startup.get_status()
+        assert status["ready"]
+        assert status["readiness"]["forwards"] == {"ready": True, "after_s": 4.0}
+        assert "all deferred state ready" in mock_plugin.log.call_args[0][0]
+
+
+class TestStartupWrites:
+
+    def test_connection_snapshots_skip_recent_history(self, database):
+        database.record_connection_event("peerA", "connected")
+        recorded = database.record_connection_snapshots(["peerA", "peerB", "peerC", "peerB"], 3600)
+        assert recorded == 2
+        assert not database.has_recent_connection_history("peerD", 3600)
+        assert database.has_recent_connection_history("peerC", 3600)
+        # Second run within the window records nothing
+        assert database.record_connection_snapshots(["peerA", "peerB", "peerC"], 3600) == 0
+
+    def test_bulk_insert_spans_batches(self, database, monkeypatch):
+        monkeypatch.setattr(Database, "HYDRATION_BATCH_SIZE", 7)
+        now = int(time.time())
+        forwards = [
+            {"in_channel": "1x1x0", "out_channel": "2x1x0", "in_msat": 1_001_000,
+             "out_msat": 1_000_000, "fee_msat": 1000, "received_time": now - i}
+            for i in range(20)
+        ]
+        forwards.insert(3, {"received_time": "not-a-timestamp"})  # skipped
+        assert database.bulk_insert_forwards(forwards) == 20
+        # Idempotent: a second hydration inserts nothing
+        assert database.bulk_insert_forwards(forwards) == 0
+        assert database.get_latest_forward_timestamp() == now
+
+
+def test_numpy_is_imported_on_first_use():
+    # rebalance_planner exposes np lazily; accessing it resolves the import
+    assert rebalance_planner._numpy() is rebalance_planner.np
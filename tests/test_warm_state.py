@@ -0,0 +1,136 @@
+"""
+Tests for the warm-restart state snapshot.
+"""
+
+import time
+
+import pytest
+from unittest.mock import MagicMock
+
+from modules.channel_state_model import WARM_RESTORE_MAX_AGE, ChannelStateModel
+from modules.config import Config
+from modules.fee_controller import PIDFeeController, ThompsonAIMDState
+from modules.flow_analysis import FlowAnalyzer
+from modules.hive_bridge import STALE_CACHE_TTL_SECONDS, HiveFeeIntelligenceBridge
+from modules.warm_state import MAX_WARM_STATE_AGE, WARM_STATE_VERSION, WarmStateStore
+
+
+def _controller(database):
+    return PIDFeeController(MagicMock(), Config(), database, MagicMock())
+
+
+def _store(database, controller, clock=time.time):
+    store = WarmStateStore(MagicMock(), database, "2.0.0", clock=clock)
+    store.register("fee_controller", controller.export_warm_state, controller.restore_warm_state)
+    return store
+
+
+def _thompson_state(fee_ppm):
+    state = ThompsonAIMDState(last_fee_ppm=fee_ppm, last_broadcast_fee_ppm=fee_ppm,
+                              last_update=int(time.time()) - 600, last_gossip_refresh=12345)
+    state.thompson.observations = [(fee_ppm, 4.2, 0.8, int(time.time()) - 900)]
+    state.thompson._recompute_posterior()
+    return state
+
+
+class TestFeeControllerRoundTrip:
+
+    def test_restores_controller_states(self, database):
+        before = _controller(database)
+        before._save_thompson_aimd_state("100x1x0", _thompson_state(250))
+        before._observation_due["100x1x0"] = [int(time.time()) + 1200, 3]
+        _store(database, before, clock=lambda: time.time() + 2).save(reason="shutdown")
+
+        after = _controller(database)
+        report = _store(database, after).load()
+        assert report["loaded"]
+        assert report["restored"] == {"fee_controller": 1}
+
+        state = after._thompson_aimd_states["100x1x0"]
+        assert state.last_broadcast_fee_ppm == 250
+        assert state.last_gossip_refresh == 12345    # not persisted in fee_strategy_state
+        assert state.thompson.observations == before._thompson_aimd_states["100x1x0"].thompson.observations
+        assert after.next_observation_due() == before.next_observation_due()
+
+    def test_newer_database_row_wins(self, database):
+        before = _controller(database)
+        before._save_thompson_aimd_state("100x1x0", _thompson_state(250))
+        _store(database, before, clock=lambda: time.time() - 60).save()
+
+        # Saved again after the snapshot was taken
+        before._save_thompson_aimd_state("100x1x0", _thompson_state(400))
+
+        after = _controller(database)
+        assert _store(database, after).load()["restored"] == {"fee_controller": 0}
+        assert after._get_thompson_aimd_state("100x1x0", "peerA").last_broadcast_fee_ppm == 400
+
+
+class TestValidity:
+
+    @pytest.fixture
+    def saved(self, database):
+        controller = _controller(database)
+        controller._save_thompson_aimd_state("100x1x0", _thompson_state(250))
+        return controller
+
+    def test_no_snapshot(self, database, saved):
+        report = _store(database, saved).load()
+        assert report == {"loaded": False, "reason": "no snapshot"}
+
+    def test_plugin_version_mismatch(self, database, saved):
+        _store(database, saved).save()
+        store = WarmStateStore(MagicMock(), database, "2.1.0")
+        assert "plugin version" in store.load()["reason"]
+
+    def test_format_version_and_corruption(self, database, saved):
+        database.save_warm_state(WARM_STATE_VERSION + 1, "2.0.0", int(time.time()), "{}")
+        assert "format version" in _store(database, saved).load()["reason"]
+        database.save_warm_state(WARM_STATE_VERSION, "2.0.0", int(time.time()), "{not json")
+        assert "corrupt" in _store(database, saved).load()["reason"]
+
+    def test_expired_snapshot(self, database, saved):
+        _store(database, saved, clock=lambda: time.time() - MAX_WARM_STATE_AGE - 60).save()
+        assert "age" in _store(database, _controller(database)).load()["reason"]
+
+    def test_failing_section_does_not_block_others(self, database, saved):
+        store = _store(database, saved, clock=lambda: time.time() + 2)
+        store.register("broken", lambda: {"x": 1}, MagicMock(side_effect=ValueError("bad")))
+        store.save()
+        report = store.load()
+        assert report["errors"] == {"broken": "bad"}
+        assert "fee_controller" in report["restored"]
+
+
+class TestCacheSections:
+
+    def test_channel_state_restore(self, mock_plugin):
+        rows = [{"short_channel_id": "100x1x0", "channel_id": "aa", "peer_id": "peerA",
+                 "to_us_msat": 5_000_000, "state": "CHANNELD_NORMAL"}]
+        model = ChannelStateModel(mock_plugin)
+        assert model.restore(rows, int(time.time()) - WARM_RESTORE_MAX_AGE - 1) == 0
+        assert model.restore(rows, int(time.time()) - 60) == 1
+        assert model.ready and model.local_balance_msat("100x1x0") == 5_000_000
+
+        # The first reconcile reports drift against the restored rows
+        mock_plugin.rpc.listpeerchannels.return_value = {
+            "channels": [dict(rows[0], to_us_msat=4_000_000)]
+        }
+        report = model.reconcile()
+        assert report["drifted_channels"] == 1
+
+    def test_hive_cache_keeps_timestamps(self, mock_plugin, database):
+        bridge = HiveFeeIntelligenceBridge(mock_plugin, database)
+        bridge._set_cached("peerA", {"avg_fee_charged": 300})
+        entries = bridge.export_cache()
+        entries["peerOld"] = {"data": {}, "timestamp": time.time() - STALE_CACHE_TTL_SECONDS - 1}
+
+        restarted = HiveFeeIntelligenceBridge(mock_plugin, database)
+        assert restarted.restore_cache(entries) == 1
+        data, fresh = restarted._get_cached("peerA")
+        assert data == {"avg_fee_charged": 300} and fresh
+
+    def test_kalman_filters_preloaded(self, mock_plugin, database):
+        database.save_kalman_state("100x1x0", {"flow_ratio": 0.4, "last_update": 1700000000})
+        analyzer = FlowAnalyzer(mock_plugin, Config(), database)
+        assert analyzer.preload_kalman_filters() == 1
+        assert analyzer._kalman_filters["100x1x0"].state.flow_ratio == 0.4